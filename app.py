@@ -6,18 +6,52 @@ Converted from Streamlit to Shiny Python
 from shiny import App, render, ui, reactive
 import pandas as pd
 import copy
+from datetime import date, timedelta
 
 # Import our configuration manager and new modules
-from shiny_modules.config import config_manager, db_manager
+from shiny_modules.config import CONFIG_POLL_SECS, config_manager, db_manager
 from shiny_modules.workflow import ShinyWorkflow
+from shiny_modules.instances import WorkflowInstanceStore
+from shiny_modules.persistence import InstancePersistence
+from shiny_modules.audit_view import AuditPager, audit_pager_ui
+from shiny_modules.audit_query import AuditFilter, AuditQuery
+from shiny_modules.metrics import with_metrics_endpoint, step_metrics_frame, engine_metrics_frame
+from shiny_modules.attachments import with_attachment_endpoint
+from shiny_modules.form import FORM_SECTIONS_ID
+from approv.WorkflowGraph import compile_workflow
 
-# Initialize configurations
-workflow_config = config_manager.get_workflow_config()
-form_config = config_manager.get_form_config()
-initial_form_data = config_manager.get_form_data()
+# Initialize configurations. The snapshot holds the compiled workflow graph
+# (shared by workflow instances), the form data codec and the initial form
+# data typed by it (dates, times, numbers, options instead of the loose
+# values in data.json)
+startup_config = config_manager.snapshot()
+
+# Workflow instances shared by all sessions; each session opens one by id.
+# Changes are written to bpms.db in batches so in-flight approvals survive restarts.
+instance_persistence = InstancePersistence(db_manager, codec=startup_config.codec)
+instance_store = WorkflowInstanceStore(startup_config.form_data, persistence=instance_persistence)
+try:
+    instance_store.load()
+    instance_persistence.start()
+except Exception as e:
+    print(f"Warning: Workflow instance persistence unavailable: {e}")
+    instance_store.persistence = None
+audit_query = AuditQuery(instance_persistence)
+
+
+# The configuration files are checked for changes every few seconds, once for
+# all sessions; a changed file is reparsed and compiled, and sessions switch
+# to the new snapshot (see apply_reloaded_config)
+@reactive.poll(config_manager.check_for_changes, CONFIG_POLL_SECS)
+def current_config():
+    config = config_manager.snapshot()
+    instance_store.set_defaults(config.form_data)
+    try:
+        instance_persistence.set_codec(config.codec)
+    except Exception as e:
+        print(f"Warning: Form data schema not recorded: {e}")
+    return config
 
-# Initialize workflow instance
-workflow_instance = ShinyWorkflow(workflow_config, form_config, initial_form_data)
 # Workflow renderer removed - using unified approach
 
 # Custom CSS for enhanced styling
@@ -195,6 +229,22 @@ app_ui = ui.page_navbar(
                                 )
                             )
                         ),
+                        ui.row(
+                            ui.column(6,
+                                ui.div(
+                                    ui.h5("🗂️ Instance", style="color: var(--dark-text); margin-bottom: 1rem;"),
+                                    ui.input_numeric("open_instance_id", None, value=None, min=1)
+                                )
+                            ),
+                            ui.column(6,
+                                ui.div(
+                                    ui.h5("📂 Open", style="color: var(--dark-text); margin-bottom: 1rem;"),
+                                    ui.input_action_button("open_instance", "📂 Open Instance", 
+                                                          class_="btn btn-secondary btn-enhanced",
+                                                          style="width: 100%;")
+                                )
+                            )
+                        ),
                         ui.div(
                             ui.output_text("workflow_status_display"),
                             ui.output_text("workflow_error_display"),
@@ -223,7 +273,7 @@ app_ui = ui.page_navbar(
                 ui.div(
                     ui.h3("📊 Audit Trail", class_="card-header", style="margin: 0; padding: 1.5rem;"),
                     ui.div(
-                        ui.output_data_frame("audit_trail"),
+                        audit_pager_ui("audit_trail"),
                         class_="card-body"
                     ),
                     class_="enhanced-card table-enhanced"
@@ -337,6 +387,27 @@ app_ui = ui.page_navbar(
                 )
             ),
             
+            # Engine Metrics Section
+            ui.row(
+                ui.column(12,
+                    ui.div(
+                        ui.div(
+                            ui.h3("📈 Engine Metrics", class_="card-header", style="margin: 0; padding: 1.5rem;"),
+                            ui.div(
+                                ui.p("Step latency per node, slowest first (refreshes every 5 seconds). "
+                                     "Prometheus scrape endpoint: /metrics",
+                                     class_="text-muted"),
+                                ui.output_data_frame("step_metrics_table"),
+                                ui.h5("Engine", style="color: var(--dark-text); margin: 1.5rem 0 1rem;"),
+                                ui.output_data_frame("engine_metrics_table"),
+                                class_="card-body"
+                            ),
+                            class_="enhanced-card table-enhanced"
+                        )
+                    )
+                )
+            ),
+            
             style="max-width: 1400px; margin: 0 auto; padding: 2rem;"
         )
     ),
@@ -508,6 +579,36 @@ app_ui = ui.page_navbar(
                             ui.output_text("user_admin_status_display"),
                             style="margin-bottom: 1.5rem;"
                         ),
+                        ui.div(
+                            ui.h5("🗂️ Audit Search", style="color: var(--dark-text); margin-bottom: 1rem;"),
+                            ui.row(
+                                ui.column(2, ui.input_numeric("audit_search_instance", "Instance #:", value=None, min=1)),
+                                ui.column(2, ui.input_text("audit_search_user", "User:", placeholder="Any user")),
+                                ui.column(3, ui.input_text("audit_search_status", "Status:", placeholder="e.g. workflow_aborted")),
+                                ui.column(2, ui.input_text("audit_search_action", "Action:", placeholder="Any action")),
+                                ui.column(3, ui.input_select("audit_search_period", "Period:",
+                                                             choices={"": "Any time", "1": "Today", "7": "Last 7 days",
+                                                                      "30": "Last 30 days"}))
+                            ),
+                            ui.div(
+                                ui.input_action_button("audit_search", "🔎 Search Audit",
+                                                      class_="btn btn-info btn-enhanced"),
+                                ui.input_action_button("audit_search_prev", "◀ Previous",
+                                                      class_="btn btn-sm btn-outline-secondary"),
+                                ui.input_action_button("audit_search_next", "Next ▶",
+                                                      class_="btn btn-sm btn-outline-secondary"),
+                                ui.download_button("audit_search_export", "⬇️ Export CSV",
+                                                   class_="btn btn-sm btn-outline-secondary"),
+                                ui.output_text("audit_search_info", inline=True),
+                                class_="d-flex align-items-center gap-2",
+                                style="margin-top: 0.5rem;"
+                            ),
+                            ui.div(
+                                ui.output_data_frame("audit_search_results"),
+                                style="margin-top: 1rem;"
+                            ),
+                            style="margin-bottom: 2rem;"
+                        ),
                         ui.div(
                             ui.h5("🔍 SQL Console (Read-Only)", style="color: var(--dark-text); margin-bottom: 1rem;"),
                             ui.input_text("sql_query", "SQL Query:", placeholder="Enter read-only SQL query (SELECT, SHOW, DESCRIBE, EXPLAIN)..."),
@@ -538,8 +639,14 @@ app_ui = ui.page_navbar(
 
 # Server logic
 def server(input, output, session):
+    # Each session drives its own workflow view; the state lives in instance_store
+    with reactive.isolate():
+        config = current_config()
+    workflow_instance = ShinyWorkflow(config.workflow_config, config.form_config, copy.deepcopy(config.form_data),
+                                      graph=config.graph, store=instance_store)
+    
     # Reactive values for state management
-    form_data = reactive.Value(initial_form_data)
+    form_data = reactive.Value(workflow_instance.form_data)
     user_role_reactive = reactive.Value("GENERAL_USER")
     
     # Update user role when changed
@@ -550,23 +657,20 @@ def server(input, output, session):
     # No longer using workflow renderer - using unified approach instead
     
     # Setup action handlers for form buttons
-    def handle_form_action(action_name: str):
+    async def handle_form_action(action_name: str):
         """Handle form action button clicks"""
         user_role = input.user_role()
         
-        # Collect current input values
+        # Collect current input values. Fields without an input (sections
+        # never opened, dataframes) keep their stored values.
         current_input = {}
         for field_name in workflow_instance.form.form_fields.keys():
-            if hasattr(input, field_name):
-                try:
-                    current_input[field_name] = getattr(input, field_name)()
-                except:
-                    # Handle cases where input doesn't exist yet
-                    current_input[field_name] = None
+            if field_name in input:
+                current_input[field_name] = input[field_name]()
         
         # Process the workflow with the submitted action
         try:
-            updated_data = workflow_instance.handle_form_submission(current_input, action_name, user_role)
+            updated_data = await workflow_instance.handle_form_submission_async(current_input, action_name, user_role)
             form_data.set(updated_data)
             workflow_instance.form_data = updated_data
         except Exception as e:
@@ -575,15 +679,27 @@ def server(input, output, session):
     # Register action handlers
     workflow_instance.form_renderer.setup_action_handlers(input, handle_form_action)
     
+    # Validate fields as they are edited (after a pause; only the fields an edit affects)
+    workflow_instance.form_renderer.setup_live_validation(input, session, lambda: [input.user_role()])
+    
+    # Edited configuration files apply to this session without a restart
+    @reactive.Effect
+    def apply_reloaded_config():
+        config = current_config()
+        with reactive.isolate():
+            workflow_instance.apply_config(config.workflow_config, config.form_config, config.graph)
+    
     # Home page: Workflow status display
     @output
     @render.text
     def workflow_status_display():
         status = workflow_instance.current_status()
         processing = workflow_instance.processing()
+        instance_id = workflow_instance.instance.instance_id
+        instance_label = f" | Instance #{instance_id}" if instance_id else ""
         if processing:
-            return f"Current Status: {status} (Processing...)"
-        return f"Current Status: {status}"
+            return f"Current Status: {status} (Processing...){instance_label}"
+        return f"Current Status: {status}{instance_label}"
     
     # Home page: Workflow error display
     @output
@@ -595,45 +711,102 @@ def server(input, output, session):
     # Home page: Start workflow button
     @reactive.Effect
     @reactive.event(input.start_workflow)
-    def handle_start_workflow():
+    async def handle_start_workflow():
         user_role = input.user_role()
+        # Every start creates a new instance in the shared store
+        workflow_instance.open_instance(instance_store.create())
+        form_data.set(workflow_instance.form_data)
         workflow_instance.initiate()
         # Process workflow to move beyond 'start' status
         try:
-            updated_data = workflow_instance.process_workflow(user_role, form_data())
+            updated_data = await workflow_instance.process_workflow_async(user_role, workflow_instance.form_data)
             form_data.set(updated_data)
             workflow_instance.form_data = updated_data
         except Exception as e:
             workflow_instance.error_message.set(str(e))
     
-    # Workflow continuation effect for non-blocking processing
+    # Home page: Open an existing workflow instance by id
     @reactive.Effect
-    def workflow_continuation():
+    @reactive.event(input.open_instance)
+    def handle_open_instance():
+        instance_id = input.open_instance_id()
+        if instance_id is None:
+            workflow_instance.error_message.set("Enter an instance id to open")
+            return
+        try:
+            workflow_instance.open_instance(instance_store.open(int(instance_id)))
+            form_data.set(workflow_instance.form_data)
+        except KeyError as e:
+            workflow_instance.error_message.set(str(e).strip("'"))
+    
+    # Workflow continuation effect for non-blocking processing; async steps
+    # are awaited so the session stays responsive while they run
+    @reactive.Effect
+    async def workflow_continuation():
         current_status = workflow_instance.current_status()
         user_role = input.user_role()
         
         # Auto-advance through non-user-action steps
         if current_status not in ['start', 'stop']:
-            workflow_config = workflow_instance.config
-            if current_status in workflow_config.get('workflow', {}):
-                step_config = workflow_config['workflow'][current_status]
-                
-                # If this step doesn't require user action, auto-advance
-                if not step_config.get('require_user_action', True):
-                    # Schedule continuation with a slight delay
-                    reactive.invalidate_later(0.5)
-                    try:
-                        current_data = form_data()
-                        updated_data = workflow_instance.process_workflow(user_role, current_data)
-                        form_data.set(updated_data)
-                        workflow_instance.form_data = updated_data
-                    except Exception as e:
-                        workflow_instance.error_message.set(str(e))
-    
-    # Dynamic form rendering
+            delay = workflow_instance.auto_advance_delay()
+            if delay is None:
+                return
+            
+            # Paced steps are rescheduled instead of blocking the session
+            if delay > 0:
+                reactive.invalidate_later(delay)
+                return
+            
+            try:
+                form_data()
+                updated_data = await workflow_instance.process_workflow_async(user_role, workflow_instance.form_data)
+                form_data.set(updated_data)
+                workflow_instance.form_data = updated_data
+            except Exception as e:
+                workflow_instance.error_message.set(str(e))
+    
+    # Dynamic form rendering. The container is only rebuilt when the form
+    # structure changes; value and permission changes are sent as targeted
+    # updates by sync_form_fields, so focus and scroll survive
+    form_structure = reactive.Value(None)
+    
+    @reactive.Effect
+    def track_form_structure():
+        # The form changes with a reloaded configuration (see apply_reloaded_config)
+        workflow_instance.form_version()
+        structure = workflow_instance.form_structure()
+        if structure != form_structure.get():
+            form_structure.set(structure)
+    
+    @reactive.Effect
+    def sync_form_fields():
+        workflow_instance.form_version()
+        workflow_instance.current_status()
+        user_role = input.user_role()
+        with reactive.isolate():
+            try:
+                workflow_instance.update_form_ui(user_role, input)
+            except Exception as e:
+                print(f"Warning: Error updating form fields: {e}")
+    
+    @reactive.Effect
+    def render_opened_sections():
+        # Fields of a form section are built the first time it is opened
+        opened = input[FORM_SECTIONS_ID]() if FORM_SECTIONS_ID in input else None
+        with reactive.isolate():
+            try:
+                workflow_instance.render_sections(input.user_role(), opened)
+            except Exception as e:
+                print(f"Warning: Error rendering form section: {e}")
+    
     @output
     @render.ui
     def dynamic_form_container():
+        form_structure()
+        with reactive.isolate():
+            return build_form_container()
+    
+    def build_form_container():
         current_status = workflow_instance.current_status()
         user_role = input.user_role()
         
@@ -665,14 +838,22 @@ def server(input, output, session):
                 class_="text-danger"
             )
     
-    # Audit trail data frame
-    @output
-    @render.data_frame
-    def audit_trail():
-        audit_data = workflow_instance.audit_data()
-        if audit_data:
-            return pd.DataFrame(audit_data)
-        return pd.DataFrame(columns=['status', 'action', 'description', 'time', 'user'])
+    # Audit trail, paged on the server. Lambdas so a reloaded workflow_instance is picked up.
+    AuditPager(
+        "audit_trail",
+        lambda: workflow_instance.audit_data(),
+        lambda: workflow_instance.audit_version()
+    ).setup(input, output)
+    
+    # Dataframe fields of the form: the audit field gets its own pager, grid
+    # fields (mode: 'grid') a server-side data grid
+    workflow_instance.form_renderer.setup_dataframe_outputs(
+        output, input,
+        audit_trail=lambda: workflow_instance.audit_data(),
+        audit_version=lambda: workflow_instance.audit_version(),
+        form_data=lambda: workflow_instance.form.form_data,
+        data_version=lambda: workflow_instance.form_version()
+    )
     
     # Reactive value to store query results
     query_result = reactive.Value(pd.DataFrame())
@@ -717,6 +898,79 @@ def server(input, output, session):
         error = query_error()
         return error if error else ""
     
+    # User Admin: Audit search (filters run in DuckDB, results come a page at a time)
+    audit_search_filter = reactive.Value(None)
+    audit_search_page = reactive.Value(0)
+    
+    def current_audit_filter():
+        instance_id = input.audit_search_instance()
+        period = input.audit_search_period()
+        return AuditFilter(
+            instance_id=int(instance_id) if instance_id else None,
+            user=input.audit_search_user().strip() or None,
+            status=input.audit_search_status().strip() or None,
+            action=input.audit_search_action().strip() or None,
+            since=date.today() - timedelta(days=int(period) - 1) if period else None
+        )
+    
+    @reactive.Effect
+    @reactive.event(input.audit_search)
+    def handle_audit_search():
+        audit_search_filter.set(current_audit_filter())
+        audit_search_page.set(0)
+    
+    @reactive.Calc
+    def audit_search_result():
+        criteria = audit_search_filter()
+        if criteria is None:
+            return None
+        try:
+            return audit_query.page(criteria, audit_search_page(), page_size=100)
+        except Exception as e:
+            return str(e)
+    
+    @reactive.Effect
+    @reactive.event(input.audit_search_prev)
+    def audit_search_previous_page():
+        audit_search_page.set(max(audit_search_page() - 1, 0))
+    
+    @reactive.Effect
+    @reactive.event(input.audit_search_next)
+    def audit_search_next_page():
+        result = audit_search_result()
+        if result is not None and not isinstance(result, str) and result.has_more:
+            audit_search_page.set(audit_search_page() + 1)
+    
+    @output
+    @render.data_frame
+    def audit_search_results():
+        result = audit_search_result()
+        if result is None or isinstance(result, str) or result.frame.empty:
+            return pd.DataFrame(columns=['No data'])
+        return result.frame
+    
+    @output
+    @render.text
+    def audit_search_info():
+        result = audit_search_result()
+        if result is None:
+            return ""
+        if isinstance(result, str):
+            return f"Database error: {result}"
+        if result.frame.empty:
+            return "No matching audit events"
+        first = result.page * result.page_size + 1
+        more = "+" if result.has_more else ""
+        return f"Events {first}–{first + len(result.frame) - 1}{more}"
+    
+    @render.download_button(filename=lambda: f"audit_{date.today().isoformat()}.csv")
+    def audit_search_export():
+        criteria = audit_search_filter() or current_audit_filter()
+        header = True
+        for batch in audit_query.stream(criteria):
+            yield batch.to_csv(index=False, header=header)
+            header = False
+    
     # Database helper function
     def execute_db_query(query):
         """Execute database query and return DataFrame"""
@@ -1565,7 +1819,7 @@ def server(input, output, session):
         class_options = [
             "Start", "Simple", "ExclusiveChoice", "RESTCall", 
             "EmailNotify", "SMSNotify", "Cancel", "MultiChoice", 
-            "MutexChoice", "Stop"
+            "MutexChoice", "Join", "Stop"
         ]
         
         return ui.div(
@@ -1627,7 +1881,8 @@ def server(input, output, session):
             'SMSNotify': '#20c997',  # Teal
             'Cancel': '#6c757d',     # Gray
             'MultiChoice': '#e83e8c', # Pink
-            'MutexChoice': '#17a2b8'  # Cyan
+            'MutexChoice': '#17a2b8', # Cyan
+            'Join': '#343a40'        # Dark
         }
         
         # Create nodes
@@ -1871,7 +2126,7 @@ def server(input, output, session):
         valid_classes = [
             "Start", "Simple", "ExclusiveChoice", "RESTCall", 
             "EmailNotify", "SMSNotify", "Cancel", "MultiChoice", 
-            "MutexChoice", "Stop"
+            "MutexChoice", "Join", "Stop"
         ]
         
         for node_name, node_details in workflow_copy.items():
@@ -1947,6 +2202,13 @@ def server(input, output, session):
             if unreachable_nodes:
                 warnings.append(f"Unreachable nodes found: {unreachable_nodes}")
         
+        # Engine-level checks (condition targets, fork/join structure)
+        if not errors:
+            try:
+                compile_workflow(config)
+            except ValueError as e:
+                errors.append(str(e))
+        
         return errors, warnings
     
     # Helper function to update references when node is renamed
@@ -2196,31 +2458,35 @@ def server(input, output, session):
                 return
             
             # Store reference to old instance for rollback
-            global workflow_instance, form_data
+            nonlocal workflow_instance
             old_instance = workflow_instance
             old_form_data = form_data.get()
             
             try:
                 # *** COMPLETE WORKFLOW RECONSTRUCTION ***
                 # 1. Create entirely new ShinyWorkflow instance
+                current = config_manager.snapshot()
                 new_workflow_instance = ShinyWorkflow(
                     candidate_config, 
-                    form_config, 
-                    copy.deepcopy(initial_form_data)
+                    current.form_config, 
+                    copy.deepcopy(current.form_data),
+                    graph=compile_workflow(candidate_config),
+                    store=instance_store
                 )
                 
-                # 2. Atomic swap of global workflow instance
+                # 2. Atomic swap of the session's workflow instance
                 workflow_instance = new_workflow_instance
                 
                 # 3. Reset reactive state to match new instance
-                form_data.set(copy.deepcopy(initial_form_data))
+                form_data.set(workflow_instance.form_data)
                 
                 # 4. *** CRITICAL: Rebind all action handlers to new instance ***
                 workflow_instance.form_renderer.setup_action_handlers(input, handle_form_action)
                 
                 # 5. Reset workflow state to start
                 workflow_instance.current_status.set('start')
-                workflow_instance.audit_data.set([])
+                # The new workflow's placeholder instance has a fresh, empty audit trail
+                workflow_instance.audit_data.set(workflow_instance.instance.audit)
                 workflow_instance.error_message.set("")
                 
                 save_status.set("✓ COMPLETE RELOAD: New workflow instance created, handlers rebound, state reset!" + 
@@ -2241,9 +2507,24 @@ def server(input, output, session):
     def save_status_display():
         """Display save operation status"""
         return save_status()
+    
+    # Workflow Admin: Engine metrics panel
+    @output
+    @render.data_frame
+    def step_metrics_table():
+        reactive.invalidate_later(5)
+        return step_metrics_frame()
+    
+    @output
+    @render.data_frame
+    def engine_metrics_table():
+        reactive.invalidate_later(5)
+        return engine_metrics_frame()
 
-# Create the app
-app = App(app_ui, server)
+# Create the app; /metrics (Prometheus text) and /attachments/<digest> downloads are served next to it
+shiny_app = App(app_ui, server)
+app = with_attachment_endpoint(with_metrics_endpoint(shiny_app))
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=5000)
\ No newline at end of file
@@ -0,0 +1,603 @@
+"""
+Columnar, append-only audit log
+
+Audit events are stored column by column in typed arrays instead of one dict
+per event: the instance id and an integer nanosecond timestamp as 64-bit
+integers, and status, action, description and user as 32-bit codes into
+per-column string dictionaries. An event costs a few dozen bytes instead of
+a dict with formatted strings, and recording one is a handful of array
+appends. Each workflow instance sees its events through an AuditTrail, a
+list of row numbers into the shared log.
+
+The log keeps a flush cursor: a writer (see shiny_modules/persistence.py)
+takes the rows after the cursor as one batch, writes them, and only then
+moves the cursor, so a failed write is simply retried with the next batch.
+A log with a reader for the stored events keeps only the unflushed rows and
+the most recent flushed ones in memory: older rows are evicted once written,
+and trails read their older events back through the reader, a page at a
+time. Memory therefore stays bounded however long the history grows.
+
+Events also carry the instance state, so it can be rebuilt from the log.
+An event recorded with the instance's form data stores, as a JSON payload,
+the fields that changed since the instance's previous event; every
+SNAPSHOT_INTERVAL events it stores the complete form data instead. The
+state at any event (or time) is the latest snapshot at or before it plus
+the changes recorded since, so rebuilding it never replays more than
+SNAPSHOT_INTERVAL events.
+"""
+
+import json
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time as time_of_day
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+AUDIT_COLUMNS = ['status', 'action', 'description', 'time', 'user']
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# Events of one instance between two full snapshots of its form data
+SNAPSHOT_INTERVAL = 50
+# Flushed rows an AuditLog with a reader keeps in memory
+DEFAULT_RETAIN = 10_000
+SNAPSHOT_PREFIX = '{"snapshot":'
+
+# UTC offsets only change on a quarter hour (DST and zone changes)
+_QUARTER_HOUR_NS = 900 * 1_000_000_000
+
+
+def format_time(time_ns: int) -> str:
+    """Format a nanosecond epoch timestamp the way audit entries show it (server local time)"""
+    seconds, nanoseconds = divmod(time_ns, 1_000_000_000)
+    local = datetime.fromtimestamp(seconds).astimezone()
+    return local.replace(microsecond=nanoseconds // 1000).strftime(TIME_FORMAT)
+
+
+def format_times(times_ns: np.ndarray) -> np.ndarray:
+    """
+    Vectorized format_time
+
+    The local UTC offset is looked up for each quarter hour the times fall
+    in, so times on either side of a DST change each get their own offset.
+    """
+    if not len(times_ns):
+        return np.array([], dtype=object)
+    quarters, inverse = np.unique(times_ns // _QUARTER_HOUR_NS, return_inverse=True)
+    offsets = np.array([
+        int(datetime.fromtimestamp(int(quarter) * 900).astimezone().utcoffset().total_seconds()) * 1_000_000_000
+        for quarter in quarters
+    ], dtype=np.int64)
+    stamps = pd.to_datetime(times_ns + offsets[inverse.reshape(-1)], unit='ns')
+    return np.asarray(stamps.strftime(TIME_FORMAT), dtype=object)
+
+
+class StringDictionary:
+    """Maps strings to dense integer codes and back"""
+
+    __slots__ = ('codes', 'values', '_decoder')
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+        self._decoder: Optional[np.ndarray] = None
+
+    def encode(self, value: Any) -> int:
+        value = "" if value is None else str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def decode(self, code: int) -> str:
+        return self.values[code]
+
+    def decode_many(self, codes: np.ndarray) -> np.ndarray:
+        """Decode an array of codes into an object array of strings"""
+        if len(codes) <= 256:
+            # Small batches (a page, a flush of a few events) index the list
+            # directly instead of rebuilding the decoder after new strings
+            decoded = np.empty(len(codes), dtype=object)
+            decoded[:] = [self.values[code] for code in codes.tolist()]
+            return decoded
+        decoder = self._decoder
+        if decoder is None or len(decoder) != len(self.values):
+            decoder = self._decoder = np.asarray(self.values, dtype=object)
+        return decoder[codes]
+
+    def compact(self, codes: array) -> array:
+        """
+        Drop the strings codes does not use
+
+        Returns:
+            codes renumbered for the remaining strings
+        """
+        used, renumbered = np.unique(np.frombuffer(codes, dtype=np.int32), return_inverse=True)
+        self.values = [self.values[code] for code in used.tolist()]
+        self.codes = {value: code for code, value in enumerate(self.values)}
+        self._decoder = None
+        compacted = array('i')
+        compacted.frombytes(renumbered.astype(np.int32).tobytes())
+        return compacted
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class AuditLog:
+    """
+    Append-only audit events of any number of workflow instances
+
+    Rows are numbered in recording order and keep their number when older
+    rows are evicted (see mark_flushed).
+    """
+
+    def __init__(self, reader=None, retain: int = DEFAULT_RETAIN):
+        """
+        Args:
+            reader: Source of the stored events of an instance, for the rows
+                evicted from memory (see AuditTrail); with no reader every
+                row stays in memory
+            retain: Flushed rows kept in memory, besides the unflushed ones
+        """
+        self._instance_ids = array('q')
+        self._times = array('q')
+        self._status = array('i')
+        self._action = array('i')
+        self._description = array('i')
+        self._user = array('i')
+        # JSON state payloads (see AuditTrail.record); None for events without one
+        self._payload: List[Optional[str]] = []
+        self.statuses = StringDictionary()
+        self.actions = StringDictionary()
+        self.descriptions = StringDictionary()
+        self.users = StringDictionary()
+        self.reader = reader
+        self.retain = retain
+        # Number of the first row still in memory
+        self._base = 0
+        self._flushed = 0
+        self._lock = threading.RLock()
+
+    def append(self, instance_id: int, status: str, action: str, description: str = "", user: str = "",
+               time_ns: Optional[int] = None, payload: Optional[str] = None) -> int:
+        """
+        Record one event
+
+        Returns:
+            Row number of the event in the log
+        """
+        if time_ns is None:
+            time_ns = time.time_ns()
+        with self._lock:
+            row = self._base + len(self._times)
+            self._instance_ids.append(instance_id)
+            self._times.append(time_ns)
+            self._status.append(self.statuses.encode(status))
+            self._action.append(self.actions.encode(action))
+            self._description.append(self.descriptions.encode(description))
+            self._user.append(self.users.encode(user))
+            self._payload.append(payload)
+        return row
+
+    def extend(self, events: Sequence[Tuple[int, int, str, str, str, str, Optional[str]]]) -> range:
+        """
+        Record many (instance id, time ns, status, action, description, user, payload) events
+
+        Returns:
+            Range of the new row numbers
+        """
+        with self._lock:
+            start = len(self)
+            for instance_id, time_ns, status, action, description, user, payload in events:
+                self._instance_ids.append(instance_id)
+                self._times.append(time_ns)
+                self._status.append(self.statuses.encode(status))
+                self._action.append(self.actions.encode(action))
+                self._description.append(self.descriptions.encode(description))
+                self._user.append(self.users.encode(user))
+                self._payload.append(payload)
+            return range(start, len(self))
+
+    def __len__(self) -> int:
+        """Number of rows ever recorded, evicted ones included"""
+        return self._base + len(self._times)
+
+    def _index(self, row: int) -> int:
+        index = row - self._base
+        if index < 0:
+            raise IndexError(f"audit row {row} was evicted from memory")
+        return index
+
+    def entry(self, row: int) -> Dict[str, Any]:
+        """One event in the dict layout used by the UI (status, action, description, time, user)"""
+        with self._lock:
+            index = self._index(row)
+            return {
+                'status': self.statuses.decode(self._status[index]),
+                'action': self.actions.decode(self._action[index]),
+                'description': self.descriptions.decode(self._description[index]),
+                'time': format_time(self._times[index]),
+                'user': self.users.decode(self._user[index]),
+            }
+
+    def event(self, row: int) -> Tuple[int, str, str, str, str, Optional[str]]:
+        """One event as (time ns, status, action, description, user, payload), the reader's layout"""
+        with self._lock:
+            index = self._index(row)
+            return (self._times[index], self.statuses.decode(self._status[index]),
+                    self.actions.decode(self._action[index]), self.descriptions.decode(self._description[index]),
+                    self.users.decode(self._user[index]), self._payload[index])
+
+    def time_of(self, row: int) -> int:
+        with self._lock:
+            return self._times[self._index(row)]
+
+    def payload_of(self, row: int) -> Optional[str]:
+        with self._lock:
+            return self._payload[self._index(row)]
+
+    def _take(self, column: array, rows: Optional[np.ndarray], start: int, stop: int) -> np.ndarray:
+        values = np.frombuffer(column, dtype=np.int64 if column.typecode == 'q' else np.int32)
+        if rows is None:
+            return values[start - self._base:stop - self._base].copy()
+        return values[rows - self._base]
+
+    def frame(self, rows: Optional[Sequence[int]] = None, start: Optional[int] = None,
+              stop: Optional[int] = None) -> pd.DataFrame:
+        """
+        Decode events into a DataFrame with the AUDIT_COLUMNS
+
+        Args:
+            rows: Row numbers to take (in that order); all rows in memory when None
+            start: First row when rows is None (the first row in memory when None)
+            stop: End row (exclusive) when rows is None
+        """
+        with self._lock:
+            start = self._base if start is None else start
+            stop = len(self) if stop is None else stop
+            indices = None if rows is None else np.asarray(rows, dtype=np.int64)
+            if indices is not None and len(indices) and indices.min() < self._base:
+                raise IndexError("audit rows were evicted from memory")
+            times = self._take(self._times, indices, start, stop)
+            # Decoded under the lock: evicting rows renumbers the dictionaries
+            columns = {
+                'status': self.statuses.decode_many(self._take(self._status, indices, start, stop)),
+                'action': self.actions.decode_many(self._take(self._action, indices, start, stop)),
+                'description': self.descriptions.decode_many(self._take(self._description, indices, start, stop)),
+                'user': self.users.decode_many(self._take(self._user, indices, start, stop)),
+            }
+        columns['time'] = format_times(times)
+        return pd.DataFrame(columns, columns=AUDIT_COLUMNS)
+
+    def pending(self) -> Tuple[int, int]:
+        """Row range (start, stop) recorded since the last mark_flushed"""
+        with self._lock:
+            return self._flushed, len(self)
+
+    def batch(self, start: int, stop: int) -> pd.DataFrame:
+        """
+        Rows [start, stop) in storage layout: process_instance_id, timestamp
+        (naive UTC datetime64), status, action, comments, user_name and
+        data_payload
+        """
+        with self._lock:
+            instance_ids = self._take(self._instance_ids, None, start, stop)
+            times = self._take(self._times, None, start, stop)
+            columns = {
+                'status': self.statuses.decode_many(self._take(self._status, None, start, stop)),
+                'action': self.actions.decode_many(self._take(self._action, None, start, stop)),
+                'comments': self.descriptions.decode_many(self._take(self._description, None, start, stop)),
+                'user_name': self.users.decode_many(self._take(self._user, None, start, stop)),
+            }
+            payload = self._payload[start - self._base:stop - self._base]
+        return pd.DataFrame({
+            'process_instance_id': instance_ids,
+            'timestamp': times.astype('datetime64[ns]'),
+            **columns,
+            'data_payload': pd.Series(payload, dtype=object),
+        })
+
+    def mark_flushed(self, stop: int):
+        """
+        Record that every row before stop has been written
+
+        With a reader, flushed rows beyond the newest `retain` are then
+        evicted from memory (in chunks of at least `retain` rows, so the
+        columns are not shifted on every flush).
+        """
+        with self._lock:
+            self._flushed = max(self._flushed, stop)
+            if self.reader is None:
+                return
+            evicted = self._flushed - self.retain - self._base
+            if evicted <= 0 or evicted < self.retain:
+                return
+            for column in (self._instance_ids, self._times, self._status, self._action,
+                           self._description, self._user):
+                del column[:evicted]
+            del self._payload[:evicted]
+            self._base += evicted
+            # Free the strings only the evicted rows used (free-text comments are mostly unique)
+            for name, dictionary in (('_status', self.statuses), ('_action', self.actions),
+                                     ('_description', self.descriptions), ('_user', self.users)):
+                codes = getattr(self, name)
+                if len(dictionary) > 2 * len(codes):
+                    setattr(self, name, dictionary.compact(codes))
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the event columns in memory (excluding the dictionaries and payloads)"""
+        columns = (self._instance_ids, self._times, self._status, self._action, self._description, self._user)
+        return sum(column.buffer_info()[1] * column.itemsize for column in columns)
+
+
+class InstanceState(NamedTuple):
+    """State of a workflow instance right after one of its audit events"""
+    status: str
+    form_data: Dict[str, Any]
+    position: int
+    time_ns: int
+
+
+# Typed form values (see FormCodec) are immutable too
+_IMMUTABLE = frozenset((str, int, float, bool, type(None), date, datetime, time_of_day))
+
+
+def _encode(value: Any) -> str:
+    return json.dumps(value, default=str)
+
+
+class AuditTrail:
+    """
+    The audit events of one workflow instance, as a view on an AuditLog
+
+    Behaves like a read-only list of entry dicts (len, indexing, iteration)
+    and can decode itself, or a page of itself, into a DataFrame. Events
+    recorded with the instance's form data make the trail an event log of
+    the instance state, see state_at.
+
+    The first `stored` events are no longer (or were never loaded) in the
+    log; they are read through the log's reader when needed. A reader
+    provides events(instance_id, start, stop), the stored events at those
+    positions as (time ns, status, action, description, user, payload);
+    snapshots(instance_id, stop), the positions before stop holding a full
+    snapshot; and position_at(instance_id, time_ns, stop), the number of
+    events before stop recorded at or before time_ns.
+    """
+
+    __slots__ = ('log', 'instance_id', 'rows', 'stored', 'snapshots', '_head')
+
+    def __init__(self, log: Optional[AuditLog] = None, instance_id: int = 0, rows: Optional[Sequence[int]] = None,
+                 stored: int = 0):
+        self.log = log if log is not None else AuditLog()
+        self.instance_id = instance_id
+        self.stored = stored
+        # Row numbers in the log of the events after the stored ones
+        self.rows = array('q', rows or ())
+        # Positions (in this trail) of the events holding a full snapshot;
+        # loaded on first use when some events are stored
+        self.snapshots: Optional[array] = None
+        if not stored:
+            self.snapshots = array('q', (position for position, row in enumerate(self.rows)
+                                         if (self.log.payload_of(row) or '').startswith(SNAPSHOT_PREFIX)))
+        # Form data as of the last recorded event: field -> (value, JSON encoding)
+        self._head: Optional[Dict[str, Tuple[Any, str]]] = None
+
+    def _sync(self):
+        """Move the rows the log has evicted to the stored events (call with the log's lock held)"""
+        base = self.log._base
+        if self.rows and self.rows[0] < base:
+            evicted = bisect_left(self.rows, base)
+            del self.rows[:evicted]
+            self.stored += evicted
+
+    def record(self, status: str, action: str, description: str = "", user: str = "",
+               time_ns: Optional[int] = None, form_data: Optional[Mapping[str, Any]] = None) -> int:
+        """
+        Append an event for this instance
+
+        Args:
+            status: Status of the instance after the event
+            action: What happened
+            description: Free text (comments)
+            user: Acting user or role
+            time_ns: Event time (now when omitted)
+            form_data: Form data of the instance after the event; stored
+                as the changes since the previous event, or as a full
+                snapshot every SNAPSHOT_INTERVAL events
+
+        Returns:
+            Position of the event in this trail
+        """
+        payload = None if form_data is None else self._payload(form_data)
+        with self.log._lock:
+            self.rows.append(self.log.append(self.instance_id, status, action, description, user, time_ns, payload))
+            position = len(self) - 1
+        if payload is not None and payload.startswith(SNAPSHOT_PREFIX) and self.snapshots is not None:
+            self.snapshots.append(position)
+        return position
+
+    def _snapshot_positions(self) -> array:
+        if self.snapshots is None:
+            log = self.log
+            with log._lock:
+                self._sync()
+                stored = self.stored
+                resident = [stored + index for index, row in enumerate(self.rows)
+                            if (log.payload_of(row) or '').startswith(SNAPSHOT_PREFIX)]
+            self.snapshots = array('q', log.reader.snapshots(self.instance_id, stored) + resident)
+        return self.snapshots
+
+    def _payload(self, form_data: Mapping[str, Any]) -> Optional[str]:
+        head = self._head
+        if head is None:
+            head = self._head = {field: (value, _encode(value))
+                                 for field, value in self.state_at().form_data.items()}
+        changed = {}
+        seen = 0
+        for field, value in form_data.items():
+            previous = head.get(field)
+            # Unchanged immutable values are skipped without encoding them
+            if previous is not None and previous[0] is value and type(value) in _IMMUTABLE:
+                seen += 1
+                continue
+            if isinstance(value, AuditTrail):
+                # The Streamlit form keeps the trail itself under its audit field
+                continue
+            seen += 1
+            encoded = _encode(value)
+            if previous is None or previous[1] != encoded:
+                changed[field] = encoded
+            head[field] = (value, encoded)
+        removed = []
+        if seen != len(head):
+            removed = [field for field in head
+                       if field not in form_data or isinstance(form_data[field], AuditTrail)]
+            for field in removed:
+                del head[field]
+
+        snapshots = self._snapshot_positions()
+        last_snapshot = snapshots[-1] if snapshots else None
+        if last_snapshot is None or len(self) - last_snapshot >= SNAPSHOT_INTERVAL:
+            fields = ",".join(f"{_encode(field)}:{encoded}" for field, (_, encoded) in head.items())
+            return f'{SNAPSHOT_PREFIX}{{{fields}}}}}'
+        if not changed and not removed:
+            return None
+        fields = ",".join(f"{_encode(field)}:{encoded}" for field, encoded in changed.items())
+        payload = f'{{"set":{{{fields}}}'
+        if removed:
+            payload += f',"unset":{_encode(removed)}'
+        return payload + "}"
+
+    def _events(self, start: int, stop: int) -> List[Tuple[int, str, str, str, str, Optional[str]]]:
+        """Events [start, stop) as (time ns, status, action, description, user, payload)"""
+        log = self.log
+        with log._lock:
+            self._sync()
+            stored = self.stored
+            resident = [log.event(row) for row in self.rows[max(start - stored, 0):max(stop - stored, 0)]]
+        if start < stored:
+            # Outside the lock: the stored events stay stored
+            return list(log.reader.events(self.instance_id, start, min(stop, stored))) + resident
+        return resident
+
+    def state_at(self, position: Optional[int] = None, time_ns: Optional[int] = None) -> InstanceState:
+        """
+        Rebuild the instance state from the recorded events
+
+        Starts from the latest snapshot at or before the target event and
+        applies the changes recorded after it.
+
+        Args:
+            position: Event position in this trail (the last event when
+                neither position nor time_ns is given)
+            time_ns: Rebuild the state as of this time instead: the last
+                event recorded at or before it
+
+        Returns:
+            InstanceState; position -1 and status 'start' before the first event
+        """
+        log = self.log
+        if time_ns is not None:
+            with log._lock:
+                self._sync()
+                stored, rows = self.stored, self.rows
+                resident = bisect_right(range(len(rows)), time_ns, key=lambda i: log.time_of(rows[i]))
+            if not resident and stored:
+                position = log.reader.position_at(self.instance_id, time_ns, stored) - 1
+            else:
+                position = stored + resident - 1
+        elif position is None:
+            position = len(self) - 1
+        elif position < 0:
+            position += len(self)
+        if position < 0:
+            return InstanceState('start', {}, -1, 0)
+        if position >= len(self):
+            raise IndexError("audit trail position out of range")
+
+        start = 0
+        snapshots = self._snapshot_positions()
+        index = bisect_right(snapshots, position) - 1
+        if index >= 0:
+            start = snapshots[index]
+        events = self._events(start, position + 1)
+        time_ns, status = events[-1][:2]
+        return InstanceState(status, replay(event[5] for event in events), position, time_ns)
+
+    def __len__(self) -> int:
+        return self.stored + len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            positions = range(*index.indices(len(self)))
+            if not positions:
+                return []
+            first = min(positions[0], positions[-1])
+            entries = self.to_frame(first, max(positions[0], positions[-1]) + 1).to_dict('records')
+            return [entries[position - first] for position in positions]
+        position = index + len(self) if index < 0 else index
+        if not 0 <= position < len(self):
+            raise IndexError("audit trail index out of range")
+        return self.to_frame(position, position + 1).to_dict('records')[0]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        page = 1000
+        for start in range(0, len(self), page):
+            yield from self.to_frame(start, start + page).to_dict('records')
+
+    def to_frame(self, start: int = 0, stop: Optional[int] = None) -> pd.DataFrame:
+        """Decode events [start, stop) of this trail into a DataFrame"""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        log = self.log
+        with log._lock:
+            self._sync()
+            stored = self.stored
+            # Slicing copies, so the view does not pin the (growing) rows array
+            resident = log.frame(rows=np.frombuffer(
+                self.rows[max(start - stored, 0):max(stop - stored, 0)], dtype=np.int64))
+        if start >= stored:
+            return resident
+        older = events_frame(log.reader.events(self.instance_id, start, min(stop, stored)))
+        return pd.concat([older, resident], ignore_index=True) if len(resident) else older
+
+
+def replay(payloads: Iterable[Optional[str]]) -> Dict[str, Any]:
+    """Form data after applying state payloads in order (a snapshot replaces everything before it)"""
+    form_data: Dict[str, Any] = {}
+    for payload in payloads:
+        if payload is None:
+            continue
+        change = json.loads(payload)
+        if 'snapshot' in change:
+            form_data = change['snapshot']
+            continue
+        form_data.update(change.get('set', {}))
+        for field in change.get('unset', ()):
+            form_data.pop(field, None)
+    return form_data
+
+
+def events_frame(events: Sequence[Tuple[int, str, str, str, str, Optional[str]]]) -> pd.DataFrame:
+    """DataFrame with the AUDIT_COLUMNS for (time ns, status, action, description, user, payload) events"""
+    times = np.fromiter((event[0] for event in events), dtype=np.int64, count=len(events))
+    columns = {}
+    for name, index in (('status', 1), ('action', 2), ('description', 3), ('user', 4)):
+        column = columns[name] = np.empty(len(events), dtype=object)
+        column[:] = [event[index] for event in events]
+    columns['time'] = format_times(times)
+    return pd.DataFrame(columns, columns=AUDIT_COLUMNS)
+
+
+def audit_frame(audit_data) -> pd.DataFrame:
+    """DataFrame for an AuditTrail or a plain list of audit entry dicts"""
+    if isinstance(audit_data, AuditTrail):
+        return audit_data.to_frame()
+    if audit_data:
+        return pd.DataFrame(list(audit_data))
+    return pd.DataFrame(columns=AUDIT_COLUMNS)
@@ -5,6 +5,9 @@ from utils import center_align_string, round_up_to_nearest_5
 import yaml
 import pandas as pd
 from ast import literal_eval
+from approv.Audit import audit_frame
+from approv.FormCodec import form_codec
+from approv.FormPlan import compile_form
 
 class Form:
     def __init__(self, st, form_config, form_data=None, audit_data=None):
@@ -17,6 +20,10 @@ class Form:
         self.audit_data = audit_data
 
         self.form_fields,self.actions,self.permissions= self._get_config()
+        # Field permissions as bitsets, with a cached render plan per role
+        self.compiled = compile_form(self.form_config)
+        # Typed values: dates and times are only parsed when stored as text
+        self.codec = form_codec(self.form_config)
 
     def _get_config(self):
         # Read from the YAML file
@@ -50,22 +57,8 @@ class Form:
         return form_fields,actions,permissions
     
     def _is_disabled(self, item, user_roles):
-        try:
-            disabled_field = not self.form_fields[item]['editable']
-        except:
-            disabled_field = False
-
-        try:
-            for role in self.permissions[item]:
-                if role in user_roles:
-                    disabled_perm = False
-                else:
-                    disabled_perm = True
-                    break
-        except:
-            disabled_perm = False
-
-        return disabled_field or disabled_perm
+        # A restricted field needs every role listed in its permissions
+        return self.compiled.is_disabled(item, user_roles, require_all=True)
 
     def _default_value(self, item):
         try:
@@ -91,72 +84,67 @@ class Form:
             elif self.form_fields[item]['type'] == 'color_picker':
                  return '#ffffff'
             elif self.form_fields[item]['type'] == 'dataframe' and item == 'audit':
-                 return pd.DataFrame(st.session_state.workflow.audit_data) 
+                 return audit_frame(st.session_state.workflow.audit_data)
             else:
                 return ""
 
     def get_form(self, data=None, user=None, actions=None):
         
-        for item in self.form_fields.keys():
+        plan = self.compiled.plan(user, self.st.session_state.workflow.current_status, require_all=True)
+        for field, field_disabled in plan.field_states():
+            item = field.name
+            field_type = field.type
             try:
-                default_value = data[item]
+                default_value = self.codec.coerce_value(item, data[item])
                 if item == 'audit':
                     print("item is audit")
-                    default_value = st.session_state.workflow.audit_data
-                if self.form_fields[item]['type'] in ['radio','selectbox']:
+                    default_value = audit_frame(st.session_state.workflow.audit_data)
+                if field_type in ['radio','selectbox']:
                     default_value = self.form_fields[item]['options'].index(default_value) #index
-                if self.form_fields[item]['type'] in ['date_input']:
-                    default_value = datetime.strptime(default_value, "%Y-%m-%d")
-                if self.form_fields[item]['type'] in ['time_input']:
-                    # Split the string into hours, minutes, and seconds
-                    hours, minutes, seconds = map(int, default_value.split(':'))
-                    default_value = time(hours, minutes, seconds)
+                if field_type in ['date_input', 'time_input'] and isinstance(default_value, str):
+                    # Not a date/time: use the field default
+                    raise ValueError(default_value)
             except:
                 if item == 'audit':
                     print(item)
                     print(st.session_state.workflow.audit_data)
                 default_value = self._default_value(item)
 
-            try:
-                field_disabled = self._is_disabled(item,user)
-            except:
-                field_disabled = False
-
-            if self.form_fields[item]['type'] == 'checkbox':
+            if field_type == 'checkbox':
                 st.checkbox(f"{self.form_fields[item]['title']}", 
                             value=default_value, 
                             key=item, 
                             disabled=field_disabled
                             )
 
-            elif self.form_fields[item]['type'] == 'toggle':
+            elif field_type == 'toggle':
                 st.toggle(f"{self.form_fields[item]['title']}",
                           key=item, 
                           disabled=field_disabled,
                           value=default_value)
 
-            elif self.form_fields[item]['type'] == 'radio':
+            elif field_type == 'radio':
                 st.radio(f"{self.form_fields[item]['title']}", 
                          self.form_fields[item]['options'], 
                          key=item, 
                          disabled=field_disabled,
                          index=default_value)
             
-            elif self.form_fields[item]['type'] == 'selectbox':
+            elif field_type == 'selectbox':
                 st.selectbox(f"{self.form_fields[item]['title']}",
                              options=self.form_fields[item]['options'], 
                              key=item, 
                              disabled=field_disabled,
                              index=default_value)
             
-            elif self.form_fields[item]['type'] == 'multiselect':
+            elif field_type == 'multiselect':
                 st.multiselect(f"{self.form_fields[item]['title']}", 
                                options=self.form_fields[item]['options'], 
                                key=item, 
                                disabled=field_disabled,
                                default=default_value)
 
-            elif self.form_fields[item]['type'] == 'slider':
+            elif field_type == 'slider':
                 st.write('Slider')
                 st.write(self.form_fields[item]['min_value'])
                 st.write(self.form_fields[item]['max_value'])
@@ -177,51 +165,51 @@ class Form:
                 # st.slider("When do you start?", value=datetime(2020, 1, 1, 9, 30), format="DD/MM/YYYY - hh:mm", key=item+"datetime", disabled=field_disabled)
                 #             #value=default_value)
 
-            elif self.form_fields[item]['type'] == "select_slider":
+            elif field_type == "select_slider":
                 st.select_slider(label=f"{self.form_fields[item]['title']}", options=['red', 'orange', 'yellow', 'green', 'blue', 'indigo', 'violet'], key=item, disabled=field_disabled)#,
                             #value=default_value)
             
-            elif self.form_fields[item]['type'] == 'text_input':
+            elif field_type == 'text_input':
                 st.text_input(f"{self.form_fields[item]['title']}", key=item, disabled=field_disabled,
                             value=default_value)
                 
-            elif self.form_fields[item]['type'] == 'number_input':
+            elif field_type == 'number_input':
                 st.number_input(f"{self.form_fields[item]['title']}", key=item, disabled=field_disabled,
                             value=default_value)
             
-            elif self.form_fields[item]['type'] == 'text_area':
+            elif field_type == 'text_area':
                 st.text_area(f"{self.form_fields[item]['title']}", key=item, disabled=field_disabled,
                             value=default_value)
 
-            elif self.form_fields[item]['type'] == 'date_input':
+            elif field_type == 'date_input':
                 st.date_input(f"{self.form_fields[item]['title']}", 
                               key=item, 
                               disabled=field_disabled,
                               format="DD/MM/YYYY",
                               value=default_value)
             
-            elif self.form_fields[item]['type'] == 'time_input':
+            elif field_type == 'time_input':
                 st.time_input(f"{self.form_fields[item]['title']}", 
                               key=item, 
                               disabled=field_disabled,
                               value=default_value)
 
-            elif self.form_fields[item]['type'] == 'file_uploader':
+            elif field_type == 'file_uploader':
                 st.file_uploader(f"{self.form_fields[item]['title']}", 
                                  key=item, 
                                  disabled=field_disabled)
 
-            elif self.form_fields[item]['type'] == 'camera_input':
+            elif field_type == 'camera_input':
                 st.camera_input(f"{self.form_fields[item]['title']}", 
                                 key=item, 
                                 disabled=field_disabled)
 
-            elif self.form_fields[item]['type'] == 'color_picker':
+            elif field_type == 'color_picker':
                 st.color_picker(f"{self.form_fields[item]['title']}", 
                                 key=item, 
                                 disabled=field_disabled,
                                 value=default_value)
-            elif self.form_fields[item]['type'] == 'dataframe':
+            elif field_type == 'dataframe':
                 if default_value is not None:
                     st.write(self.form_fields[item]['title'])
                     try:
@@ -235,7 +223,8 @@ class Form:
         ncol = 5
         cols = st.columns(ncol)
         
-        if st.session_state.workflow.current_status != 'start' and st.session_state.workflow.current_status != 'stop':
+        # The plan has no actions at the start and stop statuses
+        if plan.actions:
             actions = self.actions if actions is None else actions
             for i, x in enumerate(cols):
                 try:
@@ -0,0 +1,446 @@
+"""
+Typed form data codec
+
+form_codec builds a FormCodec from a form configuration (form.yaml): one
+converter per field, chosen by the field type. coerce turns loosely typed
+form data (strings from data.json and from inputs, ...) into typed
+values - dates as date, times as time, numbers as float/int, choices as the
+option itself - so renderers and comparisons do not parse them again.
+dumps/loads store form data in a compact binary format: a tag per field in
+form order, then the value in the field's own encoding (day number for
+dates, option index for choices, ...); field names are not stored. The
+header carries the codec's schema id, so data written with an older form
+configuration can be read with the codec rebuilt from its schema.
+"""
+
+import hashlib
+import json
+import struct
+import threading
+from datetime import date, datetime, time
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from approv.FormPlan import compile_form
+
+MAGIC = b'FD\x01'
+
+# Per-field tags
+_ABSENT, _TYPED, _JSON, _NONE = 0, 1, 2, 3
+
+_F64 = struct.Struct('<d')
+
+# Field types by codec kind; anything else is stored as JSON
+FIELD_KINDS = {
+    'checkbox': 'bool',
+    'toggle': 'bool',
+    'number_input': 'float',
+    'date_input': 'date',
+    'time_input': 'time',
+    'radio': 'choice',
+    'selectbox': 'choice',
+    'select_slider': 'choice',
+    'multiselect': 'choices',
+    'text_input': 'text',
+    'text_area': 'text',
+    'color_picker': 'text',
+}
+
+
+def _write_varint(out: bytearray, value: int):
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _write_bytes(out: bytearray, raw: bytes):
+    _write_varint(out, len(raw))
+    out += raw
+
+
+def _read_bytes(data: bytes, pos: int) -> Tuple[bytes, int]:
+    size, pos = _read_varint(data, pos)
+    return data[pos:pos + size], pos + size
+
+
+def _zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+class Converter(NamedTuple):
+    """Typed conversion and binary encoding of one field"""
+    kind: str
+    # Typed value from a loose one; raises ValueError/TypeError if it cannot
+    coerce: Callable[[Any], Any]
+    # Appends a typed value; raises ValueError/TypeError if it cannot
+    write: Callable[[bytearray, Any], None]
+    # (value, next position) from data at a position
+    read: Callable[[bytes, int], Tuple[Any, int]]
+
+
+def _coerce_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ('true', 'false', '1', '0', ''):
+        return value.strip().lower() in ('true', '1')
+    raise ValueError(f"Not a boolean: {value!r}")
+
+
+def _write_bool(out, value):
+    if not isinstance(value, bool):
+        raise TypeError(value)
+    out.append(value)
+
+
+def _read_bool(data, pos):
+    return bool(data[pos]), pos + 1
+
+
+def _coerce_float(value):
+    if isinstance(value, float):
+        return value
+    if isinstance(value, bool):
+        raise ValueError(f"Not a number: {value!r}")
+    return float(value)
+
+
+def _write_float(out, value):
+    out += _F64.pack(value)
+
+
+def _read_float(data, pos):
+    return _F64.unpack_from(data, pos)[0], pos + 8
+
+
+def _coerce_int(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    number = _coerce_float(value)
+    if not number.is_integer():
+        raise ValueError(f"Not an integer: {value!r}")
+    return int(number)
+
+
+def _write_int(out, value):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise TypeError(value)
+    _write_varint(out, _zigzag(value))
+
+
+def _read_int(data, pos):
+    value, pos = _read_varint(data, pos)
+    return _unzigzag(value), pos
+
+
+def _coerce_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        return date.fromisoformat(value.strip()[:10])
+    raise TypeError(f"Not a date: {value!r}")
+
+
+def _write_date(out, value):
+    if type(value) is not date:
+        raise TypeError(value)
+    _write_varint(out, value.toordinal())
+
+
+def _read_date(data, pos):
+    ordinal, pos = _read_varint(data, pos)
+    return date.fromordinal(ordinal), pos
+
+
+def _coerce_time(value):
+    if isinstance(value, time):
+        return value
+    if isinstance(value, datetime):
+        return value.time()
+    if isinstance(value, str):
+        text = value.strip()
+        # Date and time ("2023-09-12 01:01"): keep the time
+        if len(text) > 10 and text[10] in ' T':
+            text = text[11:]
+        return time.fromisoformat(text)
+    raise TypeError(f"Not a time: {value!r}")
+
+
+def _write_time(out, value):
+    if not isinstance(value, time) or value.tzinfo is not None:
+        raise TypeError(value)
+    _write_varint(out, ((value.hour * 60 + value.minute) * 60 + value.second) * 1000000 + value.microsecond)
+
+
+def _read_time(data, pos):
+    micros, pos = _read_varint(data, pos)
+    seconds, microsecond = divmod(micros, 1000000)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    return time(hour, minute, second, microsecond), pos
+
+
+def _coerce_text(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise TypeError(f"Not text: {value!r}")
+
+
+def _write_text(out, value):
+    if not isinstance(value, str):
+        raise TypeError(value)
+    _write_bytes(out, value.encode('utf-8'))
+
+
+def _read_text(data, pos):
+    raw, pos = _read_bytes(data, pos)
+    return raw.decode('utf-8'), pos
+
+
+def _choice_converters(options: Sequence[Any]) -> Tuple[Callable, Callable, Callable]:
+    """coerce/write/read for one choice: an option (stored as its index + 1) or other text (0 + text)"""
+    options = list(options)
+    index = {}
+    by_text = {}
+    for position, option in enumerate(options):
+        index.setdefault(option, position)
+        by_text.setdefault(str(option), option)
+
+    def coerce(value):
+        # Only option values are accepted: an int is never read as an option
+        # index, which would be ambiguous for integer options
+        if value in index:
+            return value
+        if isinstance(value, str):
+            # Inputs send non-text options as their text
+            return by_text.get(value, value)
+        raise ValueError(f"Not an option: {value!r}")
+
+    def write(out, value):
+        position = index.get(value)
+        if position is not None:
+            _write_varint(out, position + 1)
+        elif isinstance(value, str):
+            out.append(0)
+            _write_text(out, value)
+        else:
+            raise TypeError(value)
+
+    def read(data, pos):
+        position, pos = _read_varint(data, pos)
+        if position:
+            return options[position - 1], pos
+        return _read_text(data, pos)
+
+    return coerce, write, read
+
+
+def _converter(kind: str, options: Sequence[Any]) -> Optional[Converter]:
+    if kind == 'bool':
+        return Converter(kind, _coerce_bool, _write_bool, _read_bool)
+    if kind == 'float':
+        return Converter(kind, _coerce_float, _write_float, _read_float)
+    if kind == 'int':
+        return Converter(kind, _coerce_int, _write_int, _read_int)
+    if kind == 'date':
+        return Converter(kind, _coerce_date, _write_date, _read_date)
+    if kind == 'time':
+        return Converter(kind, _coerce_time, _write_time, _read_time)
+    if kind == 'text':
+        return Converter(kind, _coerce_text, _write_text, _read_text)
+    if kind == 'choice':
+        return Converter(kind, *_choice_converters(options))
+    if kind == 'choices':
+        coerce_one, write_one, read_one = _choice_converters(options)
+
+        def coerce(value):
+            if isinstance(value, str):
+                raise TypeError(f"Not a list of options: {value!r}")
+            return [coerce_one(item) for item in value]
+
+        def write(out, value):
+            if not isinstance(value, list):
+                raise TypeError(value)
+            _write_varint(out, len(value))
+            for item in value:
+                write_one(out, item)
+
+        def read(data, pos):
+            count, pos = _read_varint(data, pos)
+            items = []
+            for _ in range(count):
+                item, pos = read_one(data, pos)
+                items.append(item)
+            return items, pos
+
+        return Converter(kind, coerce, write, read)
+    return None
+
+
+def _field_kind(field_type: str, config: Mapping[str, Any]) -> str:
+    if field_type == 'slider':
+        # Integer sliders hold ints; any float bound or step makes it a float slider
+        bounds = (config.get('min_value', 0), config.get('max_value', 100), config.get('step', 1))
+        return 'int' if all(isinstance(bound, int) for bound in bounds) else 'float'
+    return FIELD_KINDS.get(field_type, 'json')
+
+
+def _json_default(value):
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    return str(value)
+
+
+class FormCodec:
+    """Typed conversion and binary serialization of one form's data"""
+
+    def __init__(self, schema: Sequence[Sequence[Any]]):
+        """
+        Args:
+            schema: [name, kind, options] per field, in form order (see schema())
+        """
+        self._schema = [[name, kind, list(options)] for name, kind, options in schema]
+        canonical = json.dumps(self._schema, sort_keys=True, separators=(',', ':'), default=str)
+        self.schema_key = hashlib.sha256(canonical.encode('utf-8')).digest()[:8]
+        self.schema_id = self.schema_key.hex()
+        self.names: Tuple[str, ...] = tuple(name for name, _, _ in self._schema)
+        self.converters: Tuple[Optional[Converter], ...] = tuple(
+            _converter(kind, options) for _, kind, options in self._schema)
+        self._by_name: Dict[str, Optional[Converter]] = dict(zip(self.names, self.converters))
+
+    @classmethod
+    def from_form(cls, form_config: Mapping[str, Any]) -> 'FormCodec':
+        """Codec for a form configuration (see form_codec for the cached one)"""
+        schema = []
+        for field in compile_form(form_config).fields:
+            kind = _field_kind(field.type, field.config)
+            options = (field.config.get('options') or ()) if kind in ('choice', 'choices') else ()
+            schema.append([field.name, kind, list(options)])
+        return cls(schema)
+
+    def schema(self) -> List[List[Any]]:
+        """JSON-compatible description of the fields; FormCodec(schema) rebuilds the codec"""
+        return [list(entry) for entry in self._schema]
+
+    def coerce_value(self, name: str, value: Any) -> Any:
+        """
+        A field's value as its typed form
+
+        Values that cannot be converted (and fields the codec does not type)
+        are returned unchanged.
+        """
+        converter = self._by_name.get(name)
+        if converter is None or value is None:
+            return value
+        try:
+            return converter.coerce(value)
+        except (ValueError, TypeError):
+            return value
+
+    def coerce(self, form_data: Mapping[str, Any]) -> Dict[str, Any]:
+        """Form data with every field value typed (see coerce_value); other keys are kept as they are"""
+        return {name: self.coerce_value(name, value) for name, value in form_data.items()}
+
+    def dumps(self, form_data: Mapping[str, Any]) -> bytes:
+        """
+        Serialize form data
+
+        Field values are coerced first; a value that still does not fit its
+        field's encoding, and keys that are not form fields, are stored as JSON.
+        """
+        out = bytearray(MAGIC)
+        out += self.schema_key
+        for name, converter in zip(self.names, self.converters):
+            if name not in form_data:
+                out.append(_ABSENT)
+                continue
+            value = form_data[name]
+            if value is None:
+                out.append(_NONE)
+                continue
+            if converter is not None:
+                mark = len(out)
+                out.append(_TYPED)
+                try:
+                    converter.write(out, converter.coerce(value))
+                    continue
+                except (ValueError, TypeError):
+                    del out[mark:]
+            out.append(_JSON)
+            _write_bytes(out, json.dumps(value, default=_json_default).encode('utf-8'))
+        extra = {key: value for key, value in form_data.items() if key not in self._by_name}
+        _write_bytes(out, json.dumps(extra, default=_json_default).encode('utf-8') if extra else b'')
+        return bytes(out)
+
+    def loads(self, data: bytes) -> Dict[str, Any]:
+        """
+        Deserialize form data written by dumps with this codec
+
+        Raises:
+            ValueError: If data is not form data of this codec's schema
+        """
+        data = bytes(data)
+        if data[:3] != MAGIC or data[3:11] != self.schema_key:
+            raise ValueError("Form data was written with another form schema")
+        form_data = {}
+        pos = 11
+        for name, converter in zip(self.names, self.converters):
+            tag = data[pos]
+            pos += 1
+            if tag == _TYPED:
+                form_data[name], pos = converter.read(data, pos)
+            elif tag == _JSON:
+                raw, pos = _read_bytes(data, pos)
+                form_data[name] = json.loads(raw)
+            elif tag == _NONE:
+                form_data[name] = None
+        raw, pos = _read_bytes(data, pos)
+        if raw:
+            form_data.update(json.loads(raw))
+        return form_data
+
+
+def schema_id_of(data: bytes) -> Optional[str]:
+    """Schema id in the header of serialized form data (None if it is not form data)"""
+    data = bytes(data[:11])
+    if data[:3] != MAGIC or len(data) < 11:
+        return None
+    return data[3:11].hex()
+
+
+_codecs: Dict[int, Tuple[Mapping[str, Any], FormCodec]] = {}
+_codecs_lock = threading.Lock()
+
+
+def form_codec(form_config: Mapping[str, Any]) -> FormCodec:
+    """Codec of a form configuration, reused for the same config object (like compile_form)"""
+    key = id(form_config)
+    cached = _codecs.get(key)
+    if cached is not None and cached[0] is form_config:
+        return cached[1]
+    codec = FormCodec.from_form(form_config)
+    with _codecs_lock:
+        if len(_codecs) >= 32:
+            _codecs.clear()
+        _codecs[key] = (form_config, codec)
+    return codec
@@ -0,0 +1,248 @@
+"""
+Precompiled form render plans
+
+compile_form turns a form configuration (form.yaml) into a CompiledForm
+once: the field list with its static settings, a bit per role named in the
+field permissions, and for every field the mask of roles allowed to edit it.
+CompiledForm.plan then gives the RenderPlan for a role set and workflow
+status - which fields are disabled (as a bitset over the field order) and
+whether action buttons are shown - computed on first use and cached, so
+rendering a form only has to combine the current values with a cached plan.
+Optional `sections` group fields into accordion panels or tabs that a
+renderer can build when they are opened.
+"""
+
+import threading
+from datetime import date, datetime
+from typing import Any, Dict, FrozenSet, Mapping, NamedTuple, Optional, Tuple
+
+# Statuses without action buttons
+NO_ACTION_STATUSES = frozenset(('start', 'stop'))
+
+# Default values computed at render time rather than compile time
+DYNAMIC_DEFAULTS = frozenset(('date_input', 'time_input'))
+
+
+class FieldSpec(NamedTuple):
+    """Static settings of one form field"""
+    name: str
+    type: str
+    title: str
+    config: Mapping[str, Any]
+    editable: bool
+    # Roles allowed to edit the field (bits of CompiledForm.role_bits); 0 when unrestricted
+    permission_mask: int
+    default: Any
+
+
+class SectionSpec(NamedTuple):
+    """A group of fields shown as one accordion panel or tab"""
+    name: str
+    title: str
+    # Positions of the section's fields in CompiledForm.fields
+    fields: Tuple[int, ...]
+    # The same positions as a bitset
+    mask: int
+    # Shown (and built) when the form is first rendered
+    open: bool
+
+
+SECTION_LAYOUTS = ('accordion', 'tabs')
+
+
+class RenderPlan(NamedTuple):
+    """Everything a render needs besides the current values"""
+    fields: Tuple[FieldSpec, ...]
+    # Bit i is set when fields[i] is disabled
+    disabled: int
+    actions: Tuple[Tuple[str, str], ...]
+
+    def is_disabled(self, index: int) -> bool:
+        return bool(self.disabled >> index & 1)
+
+    def field_states(self):
+        """(FieldSpec, disabled) pairs in form order"""
+        disabled = self.disabled
+        return ((field, bool(disabled >> index & 1)) for index, field in enumerate(self.fields))
+
+
+def _static_default(name: str, config: Mapping[str, Any]) -> Any:
+    if 'default' in config:
+        return config['default']
+    field_type = config.get('type')
+    if field_type in ('checkbox', 'toggle'):
+        return False
+    if field_type in ('radio', 'selectbox'):
+        # Choices hold option values; the first option is preselected
+        options = config.get('options') or ()
+        return options[0] if options else None
+    if field_type == 'slider':
+        return config.get('min_value', 0)
+    if field_type == 'multiselect':
+        return []
+    if field_type == 'number_input':
+        return 0.0
+    if field_type == 'color_picker':
+        return '#ffffff'
+    if field_type in DYNAMIC_DEFAULTS or (field_type == 'dataframe' and name == 'audit'):
+        return None
+    return ""
+
+
+def default_value(field: FieldSpec) -> Any:
+    """Default of a field, computing the ones that depend on the current time"""
+    if field.type in DYNAMIC_DEFAULTS and 'default' not in field.config:
+        return date.today() if field.type == 'date_input' else datetime.now().time()
+    return field.default
+
+
+def _flatten_roles(user_roles) -> FrozenSet[str]:
+    if user_roles is None:
+        return frozenset()
+    if isinstance(user_roles, str):
+        return frozenset((user_roles,))
+    roles = set()
+    for role in user_roles:
+        # Nested role lists are accepted (defensive guard)
+        if isinstance(role, (list, tuple, set, frozenset)):
+            roles.update(role)
+        else:
+            roles.add(role)
+    return frozenset(roles)
+
+
+class CompiledForm:
+    """A form configuration compiled for rendering"""
+
+    # Plans kept per form; a form has a handful of statuses and role masks
+    max_plans = 1024
+
+    def __init__(self, form_config: Mapping[str, Any]):
+        form = form_config['form']
+        fields = form['fields'] or {}
+        permissions = form.get('permissions') or {}
+        self.actions: Tuple[Tuple[str, str], ...] = tuple(
+            (key, (config or {}).get('title', key)) for key, config in (form.get('actions') or {}).items())
+
+        roles = sorted({role for allowed in permissions.values() for role in (allowed or ())})
+        self.role_bits: Dict[str, int] = {role: 1 << bit for bit, role in enumerate(roles)}
+
+        specs = []
+        for name, config in fields.items():
+            mask = 0
+            for role in permissions.get(name) or ():
+                mask |= self.role_bits[role]
+            specs.append(FieldSpec(name, config['type'], config.get('title', name), config,
+                                   config.get('editable', True), mask, _static_default(name, config)))
+        self.fields: Tuple[FieldSpec, ...] = tuple(specs)
+        self.index: Dict[str, int] = {field.name: index for index, field in enumerate(self.fields)}
+        self.layout, self.sections = self._compile_sections(form)
+        # Fields that belong to a section; the others are always shown
+        self.sectioned = sum(section.mask for section in self.sections)
+
+        # Fields disabled whatever the role
+        self._not_editable = sum(1 << index for index, field in enumerate(self.fields) if not field.editable)
+        self._plans: Dict[Tuple[int, str, bool], RenderPlan] = {}
+        self._lock = threading.Lock()
+
+    def _compile_sections(self, form: Mapping[str, Any]) -> Tuple[str, Tuple[SectionSpec, ...]]:
+        layout = form.get('layout', 'accordion')
+        if layout not in SECTION_LAYOUTS:
+            raise ValueError(f"Unknown form layout {layout!r}; expected one of {SECTION_LAYOUTS}")
+        sections = []
+        assigned = 0
+        for name, config in (form.get('sections') or {}).items():
+            config = config or {}
+            positions = []
+            for field_name in config.get('fields') or ():
+                if field_name not in self.index:
+                    raise ValueError(f"Section {name!r} lists unknown field {field_name!r}")
+                position = self.index[field_name]
+                if assigned >> position & 1:
+                    raise ValueError(f"Field {field_name!r} is in more than one section")
+                assigned |= 1 << position
+                positions.append(position)
+            positions.sort()
+            sections.append(SectionSpec(name, config.get('title', name), tuple(positions),
+                                        sum(1 << position for position in positions), bool(config.get('open', False))))
+        return layout, tuple(sections)
+
+    def role_mask(self, user_roles) -> int:
+        """Bitset of the given roles; roles no permission mentions have no bit"""
+        mask = 0
+        for role in _flatten_roles(user_roles):
+            mask |= self.role_bits.get(role, 0)
+        return mask
+
+    def disabled_mask(self, role_mask: int, require_all: bool = False) -> int:
+        """
+        Bitset of the fields disabled for a role mask
+
+        Args:
+            role_mask: Result of role_mask
+            require_all: A restricted field needs every listed role instead
+                of any one of them
+        """
+        disabled = self._not_editable
+        for index, field in enumerate(self.fields):
+            allowed = field.permission_mask
+            if not allowed:
+                continue
+            granted = role_mask & allowed
+            if (granted != allowed) if require_all else not granted:
+                disabled |= 1 << index
+        return disabled
+
+    def plan(self, user_roles, status: Optional[str] = None, require_all: bool = False) -> RenderPlan:
+        """
+        Cached render plan for a role set and workflow status
+
+        Args:
+            user_roles: A role or an iterable of roles (nested lists allowed)
+            status: Current workflow status; no actions at start and stop
+            require_all: See disabled_mask
+        """
+        key = (self.role_mask(user_roles), status or "", require_all)
+        plan = self._plans.get(key)
+        if plan is None:
+            actions = () if status in NO_ACTION_STATUSES else self.actions
+            plan = RenderPlan(self.fields, self.disabled_mask(key[0], require_all), actions)
+            with self._lock:
+                if len(self._plans) >= self.max_plans:
+                    self._plans.clear()
+                self._plans[key] = plan
+        return plan
+
+    def is_disabled(self, field_name: str, user_roles, require_all: bool = False) -> bool:
+        """Whether a field is disabled for the given roles"""
+        return self.plan(user_roles, require_all=require_all).is_disabled(self.index[field_name])
+
+
+_compiled: Dict[int, Tuple[Mapping[str, Any], CompiledForm]] = {}
+_compiled_lock = threading.Lock()
+
+
+def compile_form(form_config: Mapping[str, Any]) -> CompiledForm:
+    """
+    Compile a form configuration, reusing the result for the same config object
+
+    Configurations are treated as immutable once compiled; a reloaded
+    configuration is a new object and gets compiled again.
+
+    Raises:
+        KeyError: If the form, fields, actions or permissions section is missing
+    """
+    key = id(form_config)
+    cached = _compiled.get(key)
+    if cached is not None and cached[0] is form_config:
+        return cached[1]
+    form = form_config['form']
+    for section in ('fields', 'actions', 'permissions'):
+        if section not in form:
+            raise KeyError(section)
+    compiled = CompiledForm(form_config)
+    with _compiled_lock:
+        if len(_compiled) >= 32:
+            _compiled.clear()
+        _compiled[key] = (form_config, compiled)
+    return compiled
@@ -0,0 +1,181 @@
+"""
+Keep-alive HTTP connection pool for service-call steps
+
+RESTCall steps share one pool, so consecutive calls to the same service reuse
+an open connection instead of paying for a TCP (and TLS) handshake each time.
+Idle connections are kept per (scheme, host, port). A connection that the
+server closed while it sat idle is dropped when it is taken from the pool;
+one found closed while it is used is replaced and the request retried once,
+unless the server may already have processed it: a request that was sent is
+only repeated for idempotent methods, so a POST is never made twice.
+"""
+
+import http.client
+import json
+import select
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+# Errors raised when a pooled connection was closed by the server while idle
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                 BrokenPipeError, ConnectionResetError, ConnectionAbortedError)
+
+# Methods that can be repeated without changing the result (RFC 9110, 9.2.2)
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'TRACE', 'PUT', 'DELETE'))
+
+PoolKey = Tuple[str, str, int]
+
+
+class HttpResponse(NamedTuple):
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+    def json(self) -> Any:
+        """Decode the body as JSON (None for an empty body)"""
+        if not self.body:
+            return None
+        return json.loads(self.body.decode('utf-8'))
+
+
+class ConnectionPool:
+    """Thread-safe pool of keep-alive http.client connections"""
+
+    def __init__(self, max_idle_per_host: int = 10, default_timeout: float = 10.0):
+        self.max_idle_per_host = max_idle_per_host
+        self.default_timeout = default_timeout
+        self._idle: Dict[PoolKey, Deque[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def request(self, method: str, url: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None) -> HttpResponse:
+        """
+        Send a request over a pooled connection
+
+        Args:
+            method: HTTP method
+            url: Absolute http(s) URL
+            body: Request body
+            headers: Extra request headers
+            timeout: Socket timeout in seconds for this request
+
+        Returns:
+            HttpResponse with the status, headers and full body
+
+        Raises:
+            ValueError: If the URL is not an absolute http(s) URL
+            OSError: On connection errors and timeouts
+            http.client.HTTPException: On protocol errors
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"Unsupported URL '{url}'")
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        path = parts.path or '/'
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        timeout = self.default_timeout if timeout is None else timeout
+
+        connection, reused = self._acquire(key, timeout)
+        sent = False
+        try:
+            connection.request(method, path, body=body, headers=headers or {})
+            sent = True
+            response, data = self._receive(connection)
+        except _STALE_ERRORS:
+            connection.close()
+            # Once sent, the server may have processed the request before
+            # dropping the connection; only idempotent requests are repeated
+            if not reused or (sent and method.upper() not in IDEMPOTENT_METHODS):
+                raise
+            # The idle connection went away; retry once on a new one
+            connection, reused = self._connect(key, timeout), False
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                response, data = self._receive(connection)
+            except BaseException:
+                connection.close()
+                raise
+        except BaseException:
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(key, connection)
+        return HttpResponse(response.status, dict(response.getheaders()), data)
+
+    def _receive(self, connection: http.client.HTTPConnection) -> Tuple[http.client.HTTPResponse, bytes]:
+        response = connection.getresponse()
+        # Read the whole body so the connection can be reused
+        return response, response.read()
+
+    def _acquire(self, key: PoolKey, timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                connection = idle.pop() if idle else None
+            if connection is None:
+                return self._connect(key, timeout), False
+            if not _closed_by_server(connection):
+                break
+            connection.close()
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection, True
+
+    def _connect(self, key: PoolKey, timeout: float) -> http.client.HTTPConnection:
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=timeout)
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _release(self, key: PoolKey, connection: http.client.HTTPConnection):
+        with self._lock:
+            idle = self._idle.setdefault(key, deque())
+            if len(idle) < self.max_idle_per_host:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def idle_count(self) -> int:
+        """Number of idle connections currently held"""
+        with self._lock:
+            return sum(len(idle) for idle in self._idle.values())
+
+    def close(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+def _closed_by_server(connection: http.client.HTTPConnection) -> bool:
+    """Whether an idle connection was closed by the server (its socket reads EOF)"""
+    sock = connection.sock
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    # An idle connection has nothing to read unless the server closed it
+    return bool(readable)
+
+
+def with_query(url: str, params: Dict[str, Any]) -> str:
+    """Append params to a URL's query string"""
+    if not params:
+        return url
+    separator = '&' if urlsplit(url).query else '?'
+    return f"{url}{separator}{urlencode(params, doseq=True)}"
+
+
+# Pool shared by all RESTCall steps of the process
+default_pool = ConnectionPool()
@@ -0,0 +1,277 @@
+"""
+In-process metrics for the workflow engines
+
+Counters, gauges and latency histograms keyed by label values, kept in a
+MetricsRegistry that renders the Prometheus text exposition format. The
+engines record into the module-level `registry`:
+
+- every step.process call (per node and step class, with its outcome) and
+  the transition it chose,
+- whole process_workflow runs and the number of instances being processed,
+- permission checks, audit writes, form renders and form validation.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds (seconds) of the latency buckets, from 10us to 10s
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_number(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, values: Tuple) -> LabelValues:
+        if len(values) != len(self.labels):
+            raise ValueError(f"Metric '{self.name}' expects labels {self.labels}, got {values}")
+        return tuple(str(value) for value in values)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self.samples().items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_number(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value that can go up and down per label set"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {} if labels else {(): 0.0}
+
+    def inc(self, *labels, amount: float = 1.0):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, *labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self.samples().items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_number(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (latencies) per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels) -> Iterator[None]:
+        """Observe the duration of the with-block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self) -> Dict[LabelValues, Tuple[List[int], float, int]]:
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+
+    def quantile(self, q: float, *labels) -> Optional[float]:
+        """Estimate a quantile from the buckets (upper bound of the bucket it falls in)"""
+        series = self.samples().get(self._key(labels))
+        if not series or not series[2]:
+            return None
+        counts, _, count = series
+        rank = q * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        bounds = self.buckets + (float('inf'),)
+        for key, (counts, total, count) in sorted(self.samples().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_number(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named collection of metrics that renders as Prometheus text"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labels != metric.labels:
+                    raise ValueError(f"Metric '{metric.name}' is already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Registry shared by both engines
+registry = MetricsRegistry()
+
+STEP_DURATION = registry.histogram(
+    "approv_step_duration_seconds", "Time spent in step.process per node", ("node", "step_class"))
+STEP_EXECUTIONS = registry.counter(
+    "approv_step_executions_total", "Step executions per node and outcome", ("node", "step_class", "outcome"))
+TRANSITIONS = registry.counter(
+    "approv_transitions_total", "Transitions taken per node and next status", ("node", "next_status"))
+WORKFLOW_DURATION = registry.histogram(
+    "approv_process_workflow_duration_seconds", "Duration of process_workflow runs", ("engine",))
+INSTANCES_IN_FLIGHT = registry.gauge(
+    "approv_instances_in_flight", "Workflow instances currently being processed")
+PERMISSION_CHECKS = registry.counter(
+    "approv_permission_checks_total", "Permission checks per node and result", ("node", "result"))
+PERMISSION_CHECK_DURATION = registry.histogram(
+    "approv_permission_check_duration_seconds", "Time spent in permission checks")
+AUDIT_WRITE_DURATION = registry.histogram(
+    "approv_audit_write_duration_seconds", "Time spent recording an audit entry", ("engine",))
+FORM_RENDER_DURATION = registry.histogram(
+    "approv_form_render_duration_seconds", "Time spent building the form UI", ("engine",))
+VALIDATION_DURATION = registry.histogram(
+    "approv_validation_duration_seconds", "Time spent validating a submitted field", ("field",))
+VALIDATION_RESULTS = registry.counter(
+    "approv_validation_results_total", "Field validations per field and result", ("field", "result"))
+VALIDATION_TIMEOUTS = registry.counter(
+    "approv_validation_timeouts_total", "Guarded regex matches stopped by their time limit", ("rule",))
+
+
+@contextmanager
+def track_workflow(engine: str) -> Iterator[None]:
+    """Count an instance as in flight and time the with-block as one process_workflow run"""
+    INSTANCES_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        WORKFLOW_DURATION.observe(time.perf_counter() - started, engine)
+        INSTANCES_IN_FLIGHT.dec()
+
+
+def check_permission(node, user_role: str) -> bool:
+    """Timed and counted CompiledNode permission check for a user task"""
+    started = time.perf_counter()
+    allowed = not node.require_user_action or node.permits(user_role)
+    PERMISSION_CHECK_DURATION.observe(time.perf_counter() - started)
+    PERMISSION_CHECKS.inc(node.name, "allowed" if allowed else "denied")
+    return allowed
@@ -0,0 +1,451 @@
+"""
+Guarded regular expressions
+
+Python's re engine backtracks, and cannot be interrupted: a pattern such as
+^[0-9]+([-.\\s]?[0-9]+)*$ takes seconds on twenty-odd digits followed by a
+letter. backtracking_risk inspects a pattern's parse tree for the shapes
+that cause this (nested quantifiers, overlapping alternatives or adjacent
+quantifiers over the same characters). GuardedMatcher runs matches of such
+patterns in a pool of worker processes with a time limit per match; a match
+that runs out of time gets its worker killed and replaced.
+"""
+
+import pickle
+import queue
+import re
+import string
+import struct
+import subprocess
+import sys
+import threading
+import time
+from typing import FrozenSet, List, NamedTuple, Optional, Sequence
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+# Time limit per match, in milliseconds
+MATCH_TIMEOUT_MS = 50.0
+
+# Characters first-character sets are computed over
+_ALPHABET: FrozenSet[str] = frozenset(string.printable + "\x00\xa0\xe9Ω　٣")
+
+_CATEGORIES = {
+    'CATEGORY_DIGIT': str.isdecimal,
+    'CATEGORY_SPACE': str.isspace,
+    'CATEGORY_WORD': lambda ch: ch.isalnum() or ch == "_",
+}
+
+
+def _category(name: str, ch: str) -> bool:
+    if name.startswith('CATEGORY_NOT_'):
+        return not _CATEGORIES.get('CATEGORY_' + name[len('CATEGORY_NOT_'):], lambda _: False)(ch)
+    return _CATEGORIES.get(name, lambda _: True)(ch)
+
+
+def _in_set(items, ch: str) -> bool:
+    """Whether a character class ([...]) matches ch"""
+    negate = False
+    matched = False
+    for op, av in items:
+        name = str(op)
+        if name == 'NEGATE':
+            negate = True
+        elif name == 'LITERAL':
+            matched |= ord(ch) == av
+        elif name == 'RANGE':
+            matched |= av[0] <= ord(ch) <= av[1]
+        elif name == 'CATEGORY':
+            matched |= _category(str(av), ch)
+    return matched != negate
+
+
+def _is_variable(op, av) -> bool:
+    """A repeat that can match a varying number of times"""
+    return str(op) in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT') and av[0] != av[1]
+
+
+def _group_body(name: str, av):
+    # SUBPATTERN carries (group, add_flags, del_flags, body); ATOMIC_GROUP is the body
+    return av if name == 'ATOMIC_GROUP' else av[-1]
+
+
+def _first_chars(items) -> FrozenSet[str]:
+    """Characters a sequence can start with (approximated over _ALPHABET)"""
+    first: FrozenSet[str] = frozenset()
+    for op, av in items:
+        name = str(op)
+        if name in ('AT', 'ASSERT', 'ASSERT_NOT'):
+            continue
+        if name == 'LITERAL':
+            return first | {chr(av)}
+        if name == 'NOT_LITERAL':
+            return first | (_ALPHABET - {chr(av)})
+        if name == 'IN':
+            return first | frozenset(ch for ch in _ALPHABET if _in_set(av, ch))
+        if name in ('SUBPATTERN', 'ATOMIC_GROUP'):
+            body = _group_body(name, av)
+            first |= _first_chars(body)
+            if not _can_be_empty(body):
+                return first
+            continue
+        if name == 'BRANCH':
+            for branch in av[1]:
+                first |= _first_chars(branch)
+            if not any(_can_be_empty(branch) for branch in av[1]):
+                return first
+            continue
+        if name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT'):
+            first |= _first_chars(av[2])
+            if av[0] > 0 and not _can_be_empty(av[2]):
+                return first
+            continue
+        # ANY, back references and anything else: could be any character
+        return _ALPHABET
+    return first
+
+
+def _can_be_empty(items) -> bool:
+    for op, av in items:
+        name = str(op)
+        if name in ('AT', 'ASSERT', 'ASSERT_NOT'):
+            continue
+        if name in ('SUBPATTERN', 'ATOMIC_GROUP'):
+            if not _can_be_empty(_group_body(name, av)):
+                return False
+        elif name == 'BRANCH':
+            if not any(_can_be_empty(branch) for branch in av[1]):
+                return False
+        elif name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT'):
+            if av[0] > 0 and not _can_be_empty(av[2]):
+                return False
+        else:
+            return False
+    return True
+
+
+def _contains_variable_repeat(items) -> bool:
+    for op, av in items:
+        name = str(op)
+        if _is_variable(op, av) and not _can_be_empty(av[2]):
+            return True
+        if name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT'):
+            if _contains_variable_repeat(av[2]):
+                return True
+        elif name in ('SUBPATTERN', 'ASSERT', 'ASSERT_NOT'):
+            if _contains_variable_repeat(av[-1]):
+                return True
+        elif name == 'BRANCH':
+            # The parser turns (x|xy) into x(?:|y): an optional part, like y?
+            empty = [_can_be_empty(branch) for branch in av[1]]
+            if any(empty) and not all(empty):
+                return True
+            if any(_contains_variable_repeat(branch) for branch in av[1]):
+                return True
+    return False
+
+
+def _branches(items) -> List:
+    """Alternatives directly inside a repeat body (through groups)"""
+    found = []
+    for op, av in items:
+        name = str(op)
+        if name == 'BRANCH':
+            found.append(av[1])
+        elif name == 'SUBPATTERN':
+            found.extend(_branches(av[-1]))
+    return found
+
+
+def _risk(items, adjacent: bool) -> Optional[str]:
+    """First risky shape in a sequence: quantifier nesting and alternatives, or (adjacent) quantifier pairs"""
+    items = list(items)
+    for index, (op, av) in enumerate(items):
+        name = str(op)
+        if name in ('MAX_REPEAT', 'MIN_REPEAT'):
+            low, high, body = av
+            if high > 1 and low != high and not adjacent:
+                if _contains_variable_repeat(body):
+                    return "nested quantifier"
+                for branches in _branches(body):
+                    firsts = [_first_chars(branch) for branch in branches]
+                    if any(firsts[i] & firsts[j] for i in range(len(firsts)) for j in range(i + 1, len(firsts))):
+                        return "quantified alternatives that overlap"
+            if adjacent and high == sre_constants.MAXREPEAT and low != high and index + 1 < len(items):
+                next_op, next_av = items[index + 1]
+                if (_is_variable(next_op, next_av) and next_av[1] == sre_constants.MAXREPEAT
+                        and str(next_op) != 'POSSESSIVE_REPEAT'
+                        and _first_chars(body) & _first_chars([(next_op, next_av)])):
+                    return "adjacent quantifiers over the same characters"
+            nested = _risk(body, adjacent)
+        elif name in ('SUBPATTERN', 'ASSERT', 'ASSERT_NOT'):
+            nested = _risk(av[-1], adjacent)
+        elif name == 'BRANCH':
+            nested = next((risk for risk in (_risk(branch, adjacent) for branch in av[1]) if risk), None)
+        else:
+            nested = None
+        if nested:
+            return nested
+    return None
+
+
+def backtracking_risk(pattern: str) -> Optional[str]:
+    """
+    Why a pattern may backtrack catastrophically, or None if no risky shape is found
+
+    The check is structural (possessive quantifiers and atomic groups are
+    treated as safe); a pattern it passes can still be slow, but not
+    exponentially so in the shapes above. It errs on the side of flagging:
+    a nested quantifier behind a delimiter, like (?:x\\d+)*, is flagged too.
+    """
+    parsed = sre_parse.parse(pattern)
+    return _risk(parsed, adjacent=False) or _risk(parsed, adjacent=True)
+
+
+# Worker process: reads length-prefixed pickled (regex, flags, texts) requests
+# on stdin and answers one byte per text as it is matched. It runs with -I -S
+# and imports nothing but the standard library, so it boots in milliseconds.
+_WORKER_SOURCE = """
+import pickle, re, struct, sys
+read, out = sys.stdin.buffer.read, sys.stdout.buffer
+patterns = {}
+out.write(b"r")
+out.flush()
+while True:
+    header = read(4)
+    if len(header) < 4:
+        break
+    regex, flags, texts = pickle.loads(read(struct.unpack(">I", header)[0]))
+    pattern = patterns.get((regex, flags))
+    if pattern is None:
+        pattern = patterns[(regex, flags)] = re.compile(regex, flags)
+    for text in texts:
+        out.write(b"\\x01" if pattern.match(text) is not None else b"\\x00")
+        out.flush()
+"""
+
+
+class _Worker:
+    """A matching process, with a thread queueing its answers"""
+
+    def __init__(self):
+        self.process = subprocess.Popen([sys.executable, "-I", "-S", "-c", _WORKER_SOURCE],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, bufsize=0)
+        self.answers: "queue.Queue[bytes]" = queue.Queue()
+        # Set once the interpreter has booted (or died trying)
+        self.booted = threading.Event()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        stdout = self.process.stdout
+        if stdout.read(1) != b"r":
+            self.answers.put(b"")
+        self.booted.set()
+        while True:
+            answer = stdout.read(1)
+            self.answers.put(answer)
+            if not answer:
+                # The process is gone; its pipe is closed here rather than in
+                # stop, which would pull it from under this read
+                stdout.close()
+                return
+
+    def wait_ready(self):
+        self.booted.wait()
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def send(self, pattern: re.Pattern, texts: List[str]):
+        request = pickle.dumps((pattern.pattern, pattern.flags, texts))
+        self.process.stdin.write(struct.pack(">I", len(request)) + request)
+
+    def answer(self, timeout: float) -> Optional[bool]:
+        """Result of the next match, or None if it does not come within timeout"""
+        try:
+            answer = self.answers.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return answer == b"\x01" if answer else None
+
+    def stop(self):
+        self.process.kill()
+        self.process.wait()
+        self.process.stdin.close()
+
+
+class Matches(NamedTuple):
+    """Results of GuardedMatcher.match_timed"""
+    # Per text: whether it matched, or None if the match ran out of time
+    results: List[Optional[bool]]
+    # Seconds spent waiting for a worker (behind other callers, or for one
+    # to boot) rather than matching
+    waited: float
+
+
+class GuardedMatcher:
+    """
+    Runs re.match in worker processes, with a time limit per match
+
+    A small pool of workers serves the callers, one request per worker at a
+    time, so a slow or timed-out match only holds up its own caller. Results
+    are sent back as each text is matched, so the limit applies to every
+    match rather than to the batch. A match that runs out of time counts as
+    timed out and its worker is killed; a spare worker is kept booted to
+    take over at once, so a hostile value does not hold up the next request.
+    """
+
+    def __init__(self, timeout_ms: float = MATCH_TIMEOUT_MS, workers: int = 2):
+        """
+        Args:
+            timeout_ms: Default time limit per match
+            workers: Most matches run at the same time; further callers wait
+                for a worker
+        """
+        self.timeout_ms = timeout_ms
+        self.workers = workers
+        self._available = threading.Condition()
+        self._idle: List[_Worker] = []
+        # Workers idle or in use
+        self._started = 0
+        self._spare: Optional[_Worker] = None
+
+    def start(self):
+        """
+        Start the workers, and the spare, ahead of the first match
+
+        Returns at once; the workers boot in the background. Starting an
+        already started pool does nothing.
+        """
+        with self._available:
+            missing = max(self.workers - self._started, 0)
+            self._started += missing
+        workers: List[_Worker] = []
+        try:
+            for _ in range(missing):
+                workers.append(_Worker())
+        finally:
+            with self._available:
+                self._started -= missing - len(workers)
+                self._idle.extend(workers)
+                self._available.notify_all()
+        if self._spare is None:
+            spare: Optional[_Worker] = _Worker()
+            with self._available:
+                if self._spare is None:
+                    self._spare, spare = spare, None
+            if spare is not None:
+                spare.stop()
+
+    def _checkout(self) -> _Worker:
+        with self._available:
+            while True:
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.alive():
+                        return worker
+                    self._started -= 1
+                if self._started < self.workers:
+                    self._started += 1
+                    spare, self._spare = self._spare, None
+                    break
+                self._available.wait()
+        # Processes are started outside the lock
+        try:
+            worker = spare if spare is not None and spare.alive() else _Worker()
+            replacement = _Worker()
+        except BaseException:
+            self._discard(None)
+            raise
+        with self._available:
+            if self._spare is None:
+                self._spare = replacement
+                replacement = None
+        if replacement is not None:
+            replacement.stop()
+        return worker
+
+    def _wait_booting(self):
+        with self._available:
+            workers = self._idle + ([self._spare] if self._spare is not None else [])
+        for worker in workers:
+            worker.wait_ready()
+
+    def _checkin(self, worker: _Worker):
+        with self._available:
+            self._idle.append(worker)
+            self._available.notify()
+
+    def _discard(self, worker: Optional[_Worker]):
+        if worker is not None:
+            worker.stop()
+        with self._available:
+            self._started -= 1
+            self._available.notify()
+
+    def close(self):
+        with self._available:
+            workers = self._idle + ([self._spare] if self._spare is not None else [])
+            self._started -= len(self._idle)
+            self._idle, self._spare = [], None
+        for worker in workers:
+            worker.stop()
+
+    def match_all(self, pattern: re.Pattern, texts: Sequence[str],
+                  timeout_ms: Optional[float] = None) -> List[Optional[bool]]:
+        """
+        Match each text against pattern
+
+        Returns:
+            Per text: whether it matched, or None if the match ran out of time
+        """
+        return self.match_timed(pattern, texts, timeout_ms).results
+
+    def match_timed(self, pattern: re.Pattern, texts: Sequence[str],
+                    timeout_ms: Optional[float] = None) -> Matches:
+        """Like match_all, also returning how long was spent waiting for a worker"""
+        timeout = (self.timeout_ms if timeout_ms is None else timeout_ms) / 1000
+        results: List[Optional[bool]] = []
+        waited = 0.0
+        pending = list(texts)
+        while pending:
+            started = time.perf_counter()
+            worker = self._checkout()
+            done = 0
+            try:
+                worker.wait_ready()
+                # Workers still booting (the pool starting, or a replacement
+                # for a killed one) would compete with the match for the CPU
+                self._wait_booting()
+                waited += time.perf_counter() - started
+                worker.send(pattern, pending)
+                for _ in pending:
+                    result = worker.answer(timeout)
+                    if result is None:
+                        break
+                    results.append(result)
+                    done += 1
+            except BaseException:
+                self._discard(worker)
+                raise
+            if done == len(pending):
+                self._checkin(worker)
+                break
+            results.append(None)
+            self._discard(worker)
+            pending = pending[done + 1:]
+        return Matches(results, waited)
+
+    def match(self, pattern: re.Pattern, text: str, timeout_ms: Optional[float] = None) -> Optional[bool]:
+        return self.match_all(pattern, [text], timeout_ms)[0]
+
+
+# Shared by all rules of the process: interactive checks (submissions, live
+# validation) and bulk checks of imported datasets have separate workers, so
+# a large import never delays a user's form
+regex_guard = GuardedMatcher()
+bulk_regex_guard = GuardedMatcher(workers=1)
@@ -0,0 +1,157 @@
+"""
+Indexed condition routing for decision steps
+
+ConditionRouter is built once per decision node when the workflow is
+compiled. Equal and InList conditions go into a hash index per attribute and
+the range operators into sorted threshold tables, so picking a branch costs a
+dictionary lookup or a binary search per attribute instead of evaluating every
+condition. Conditions that cannot be indexed (Contains, unhashable or
+unorderable values) are still evaluated one by one. When several conditions
+match, the one declared first wins, as with a linear scan.
+"""
+
+import operator as op
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+# Operator name -> predicate(attribute_value, condition_value)
+OPERATORS = {
+    "Equal": op.eq,
+    "GreaterThan": op.gt,
+    "LessThan": op.lt,
+    "GreaterThanOrEqual": op.ge,
+    "LessThanOrEqual": op.le,
+    "Contains": lambda attribute_value, condition_value: condition_value in attribute_value,
+    "InList": lambda attribute_value, condition_value: attribute_value in condition_value,
+}
+
+RANGE_OPERATORS = ("GreaterThan", "GreaterThanOrEqual", "LessThan", "LessThanOrEqual")
+
+# A routing candidate: (declaration order, condition name, next status)
+Candidate = Tuple[int, str, str]
+
+
+def _is_hashable(value: Any) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class _RangeTable:
+    """Sorted thresholds of one range operator with the best candidate per prefix/suffix"""
+
+    def __init__(self, operator: str, entries: List[Tuple[Any, Candidate]]):
+        entries = sorted(entries, key=lambda entry: entry[0])
+        self.operator = operator
+        self.thresholds = [threshold for threshold, _ in entries]
+        self.best: List[Candidate] = []
+
+        # GreaterThan(OrEqual) matches every threshold below the value (a prefix),
+        # LessThan(OrEqual) every threshold above it (a suffix)
+        candidates = [candidate for _, candidate in entries]
+        if operator in ("LessThan", "LessThanOrEqual"):
+            candidates.reverse()
+        for candidate in candidates:
+            self.best.append(min(candidate, self.best[-1]) if self.best else candidate)
+        if operator in ("LessThan", "LessThanOrEqual"):
+            self.best.reverse()
+
+    def lookup(self, value: Any) -> Optional[Candidate]:
+        if self.operator == "GreaterThan":
+            index = bisect_left(self.thresholds, value)
+            return self.best[index - 1] if index > 0 else None
+        if self.operator == "GreaterThanOrEqual":
+            index = bisect_right(self.thresholds, value)
+            return self.best[index - 1] if index > 0 else None
+        if self.operator == "LessThan":
+            index = bisect_right(self.thresholds, value)
+        else:
+            index = bisect_left(self.thresholds, value)
+        return self.best[index] if index < len(self.best) else None
+
+
+class ConditionRouter:
+    """Routing index over the conditions of a decision step"""
+
+    def __init__(self, conditions: List[Tuple[str, str, str, Any, str]]):
+        """
+        Args:
+            conditions: (name, operator, attribute, value, next_status) tuples
+                in declaration order
+        """
+        self._equal: Dict[str, Dict[Any, Candidate]] = {}
+        self._ranges: Dict[str, List[_RangeTable]] = {}
+        self._linear: List[Tuple[Candidate, str, str, Any]] = []
+
+        range_entries: Dict[Tuple[str, str], List[Tuple[Any, Candidate]]] = {}
+        for order, (name, operator, attribute, value, next_status) in enumerate(conditions):
+            candidate = (order, name, next_status)
+
+            if operator == "Equal" and _is_hashable(value):
+                self._equal.setdefault(attribute, {}).setdefault(value, candidate)
+            elif (operator == "InList" and isinstance(value, (list, tuple, set, frozenset))
+                    and all(_is_hashable(item) for item in value)):
+                index = self._equal.setdefault(attribute, {})
+                for item in value:
+                    index.setdefault(item, candidate)
+            elif operator in RANGE_OPERATORS:
+                range_entries.setdefault((attribute, operator), []).append((value, candidate))
+            else:
+                self._linear.append((candidate, operator, attribute, value))
+
+        for (attribute, operator), entries in range_entries.items():
+            try:
+                table = _RangeTable(operator, entries)
+            except TypeError:
+                # Thresholds that cannot be ordered against each other
+                for value, candidate in entries:
+                    self._linear.append((candidate, operator, attribute, value))
+                continue
+            self._ranges.setdefault(attribute, []).append(table)
+
+        self._linear.sort(key=lambda entry: entry[0])
+
+    def route(self, form_data: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        """
+        Find the first declared condition matched by the form data
+
+        Returns:
+            Tuple of (condition name, next status), or None if nothing matches
+        """
+        best: Optional[Candidate] = None
+
+        for attribute, index in self._equal.items():
+            try:
+                candidate = index.get(form_data.get(attribute))
+            except TypeError:
+                candidate = None
+            if candidate is not None and (best is None or candidate < best):
+                best = candidate
+
+        for attribute, tables in self._ranges.items():
+            value = form_data.get(attribute)
+            for table in tables:
+                try:
+                    candidate = table.lookup(value)
+                except TypeError:
+                    candidate = None
+                if candidate is not None and (best is None or candidate < best):
+                    best = candidate
+
+        for candidate, operator, attribute, value in self._linear:
+            if best is not None and candidate > best:
+                break
+            predicate = OPERATORS.get(operator)
+            try:
+                matched = predicate is not None and predicate(form_data.get(attribute), value)
+            except TypeError:
+                matched = False
+            if matched:
+                best = candidate
+                break
+
+        if best is None:
+            return None
+        return best[1], best[2]
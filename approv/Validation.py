@@ -1,63 +1,647 @@
-import yaml
+"""
+Form validation
+
+Rules are defined in type_validation.yaml under `validations:`, each a regex
+and a description. RuleSet compiles every pattern once when the rules are
+loaded. A field lists the rules its value must match with a `validation`
+key in form.yaml - a rule name, a list of names, or an inline rule:
+
+    email:
+      type: 'text_input'
+      validation: ['required_field', 'email_validation']
+      validation_budget_ms: 2
+
+FormValidator checks submitted form data against the bound rules. Each
+field has a time budget (`validation_budget_ms` on the field or the form,
+DEFAULT_BUDGET_MS otherwise): once a field's checks have used it up, its
+remaining rules are not run and the field fails validation, so a slow
+field is rejected rather than accepted unchecked. The budget is checked
+between rules; a single guarded match is bounded by its own timeout, and
+time spent waiting for a guard worker does not count against the budget.
+
+A rule can use another field's value through a {{field}} placeholder, e.g.
+'^{{password}}$' for a confirmation field. FormValidator keeps the
+dependencies this creates between fields, so live validation re-checks only
+the fields an edit can affect.
+
+Rules whose pattern may backtrack catastrophically are flagged when they are
+compiled and matched in a worker process with a time limit per match (see
+approv/RegexGuard.py); a value that runs out of time fails the rule.
+
+Imported datasets are checked a column at a time with validate_frame: each
+rule is matched against a column's distinct values with pandas' vectorized
+str.match, columns are spread over worker processes, and the failures come
+back as one tidy frame (row, field, rule).
+
+Run as a script to validate sample data against type_validation.yaml.
+"""
+
+import functools
+import multiprocessing
+import os
 import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, time as time_of_day
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, NamedTuple, Optional, Pattern, Sequence, Set, Tuple
 
-# Load the YAML configuration file
-with open('type_validation.yaml', 'r') as config_file:
-    config = yaml.safe_load(config_file)
-
-data = {
-    "required_field": "Sample Data",
-    "length_validation": "12345",
-    "numeric_validation": "12345",
-    "email_validation": "user@324234.com",
-    "phone_number_validation": "123-456-7890",
-    "date_validation": "09/14/2023",
-    "password_validation": "P@ssw0rd",
-    "username_validation": "user_123",
-    "url_validation": "https://www.example.com",
-    "dropdown_selection_validation": "Option 1",
-    "radio_checkbox_validation": "Option 2",
-    "file_upload_validation": "example.txt",
-    "captcha_validation": "CaptchaResponse123",
-    "unique_field_validation": "UniqueValue123",
-    "consistency_validation": "SampleData",
-    "credit_card_validation": "1234567890123456",
-    "postal_code_validation": "12345",
-    "custom_validation": "CustomValidData",
-    "cross_field_validation": "CrossFieldValidData",
-    "server_side_validation": "ServerSideValidData",
-    "sanitization": "<script>alert('Hello');</script>",
-    "regex_validation": "RegexValidData123",
-    "geographical_validation": "ValidLocation",
-    "language_character_set_validation": "ValidCharsetData",
-    "accessibility_validation": "AccessibleData",
-    "date_time_format_validation": "09/14/2023 10:30 AM"
-}
-
-def validate_data(data, config):
-    errors = {}
-    for field, value in data.items():
-        if field not in config['validations']:
-            continue  # Skip fields without validation rules
+import numpy as np
+import pandas as pd
+import yaml
+
+from approv.FormPlan import compile_form
+from approv.Metrics import VALIDATION_DURATION, VALIDATION_RESULTS, VALIDATION_TIMEOUTS
+from approv.RegexGuard import MATCH_TIMEOUT_MS, GuardedMatcher, backtracking_risk, bulk_regex_guard, regex_guard
+
+RULES_PATH = 'type_validation.yaml'
+
+# Time budget per field, in milliseconds
+DEFAULT_BUDGET_MS = 5.0
+
+# Columns of the frame returned by validate_frame
+ERROR_COLUMNS = ['row', 'field', 'rule']
+
+# Below this many regex matches (distinct values x rules, over all columns)
+# validate_frame stays in process: at well under a microsecond a match,
+# starting worker processes costs more than it saves
+PARALLEL_MIN_MATCHES = 2_000_000
+
+
+class Rule(NamedTuple):
+    """A validation rule with its compiled pattern"""
+    name: str
+    pattern: Pattern[str]
+    description: str
+    # Why the pattern may backtrack catastrophically (see backtracking_risk)
+    risk: Optional[str] = None
+    # Time limit per match in ms when matches run guarded, None to match in process
+    timeout_ms: Optional[float] = None
+    # Fields whose values fill the pattern's {{field}} placeholders (see bind)
+    refs: Tuple[str, ...] = ()
+
+    def matches(self, text: str) -> bool:
+        """Whether text matches; a guarded match that runs out of time does not"""
+        # Anchored at the start only, as the rules were written for re.match
+        if self.timeout_ms is None:
+            return self.pattern.match(text) is not None
+        return self.match_all([text])[0]
+
+    def match_all(self, texts: Sequence[str], guard: GuardedMatcher = regex_guard) -> np.ndarray:
+        """Guarded matches of several texts (one worker round trip), as a bool array"""
+        results = self._count_timeouts(guard.match_all(self.pattern, texts, self.timeout_ms))
+        return np.fromiter((result is True for result in results), dtype=bool, count=len(results))
+
+    def check(self, texts: Sequence[str]) -> Tuple[bool, float]:
+        """
+        Whether every text matches, and the seconds spent waiting for a guard
+        worker (queued behind other callers or booting) rather than matching
+        """
+        if self.timeout_ms is None:
+            return all(self.pattern.match(text) is not None for text in texts), 0.0
+        matches = regex_guard.match_timed(self.pattern, texts, self.timeout_ms)
+        results = self._count_timeouts(matches.results)
+        return all(result is True for result in results), matches.waited
+
+    def _count_timeouts(self, results: List[Optional[bool]]) -> List[Optional[bool]]:
+        timeouts = results.count(None)
+        if timeouts:
+            VALIDATION_TIMEOUTS.inc(self.name, amount=timeouts)
+        return results
+
+    def bind(self, values: Mapping[str, Any]) -> 'Rule':
+        """
+        The rule with its {{field}} placeholders replaced by those fields' values
+
+        Values are matched literally; a list value matches any of its items.
+        Rules without placeholders are returned as they are.
+        """
+        if not self.refs:
+            return self
+        texts = tuple((ref, tuple(_texts(values.get(ref)))) for ref in self.refs)
+        return self._replace(pattern=_bound_pattern(self.pattern.pattern, self.pattern.flags, texts))
+
+
+# Reference to another field's value in a rule's regex
+_PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+@functools.lru_cache(maxsize=1024)
+def _bound_pattern(template: str, flags: int, texts: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> Pattern[str]:
+    values = dict(texts)
+
+    def substitute(match):
+        escaped = [re.escape(text) for text in values.get(match.group(1), ("",))]
+        return escaped[0] if len(escaped) == 1 else "(?:" + "|".join(escaped) + ")"
+
+    return re.compile(_PLACEHOLDER.sub(substitute, template), flags)
+
+
+def _match_texts(rule: Rule, texts: pd.Series) -> np.ndarray:
+    """Whether each text (object dtype) matches the rule, as a bool array"""
+    if rule.timeout_ms is None:
+        return texts.str.match(rule.pattern, na=False).to_numpy(dtype=bool)
+    return rule.match_all(texts.tolist(), bulk_regex_guard)
+
+
+# (rule name, regex, handling) combinations already warned about
+_warned: Set[Tuple[str, str, Optional[float]]] = set()
+_warned_lock = threading.Lock()
+
+
+def _warn_backtracking(name: str, regex: str, risk: str, timeout_ms: Optional[float]):
+    """Warn about a risky rule once per process, not every time the rules are (re)loaded"""
+    with _warned_lock:
+        if (name, regex, timeout_ms) in _warned:
+            return
+        _warned.add((name, regex, timeout_ms))
+    handling = f"matches are limited to {timeout_ms:g} ms" if timeout_ms is not None else "not guarded"
+    print(f"Warning: Validation rule {name!r} may backtrack catastrophically ({risk}); {handling}")
+
+
+def compile_rule(name: str, config: Mapping[str, Any]) -> Rule:
+    """
+    Compile one rule definition ({regex, description, guard, timeout_ms})
+
+    A regex may use the value of another field through a {{field}}
+    placeholder, e.g. '^{{password}}$' for a confirmation field; such rules
+    are cross-field rules, compiled per set of values when matched (see
+    Rule.bind).
+
+    Patterns that may backtrack catastrophically are matched guarded, in a
+    worker process with a time limit per match (`timeout_ms`, default
+    MATCH_TIMEOUT_MS). `guard: true` guards any rule, `guard: false` trusts
+    a flagged one.
+
+    Raises:
+        ValueError: If the rule has no regex or the regex does not compile
+    """
+    regex = (config or {}).get('regex')
+    if regex is None or regex == "":
+        raise ValueError(f"Validation rule {name!r} has no regex")
+    try:
+        pattern = re.compile(str(regex))
+    except re.error as e:
+        raise ValueError(f"Invalid regex in validation rule {name!r}: {e}") from e
+    risk = backtracking_risk(pattern.pattern)
+    timeout_ms = None
+    if config.get('guard', risk is not None):
+        timeout_ms = float(config.get('timeout_ms', MATCH_TIMEOUT_MS))
+    if risk:
+        _warn_backtracking(name, pattern.pattern, risk, timeout_ms)
+    refs = tuple(dict.fromkeys(_PLACEHOLDER.findall(pattern.pattern)))
+    return Rule(name, pattern, str(config.get('description') or name), risk, timeout_ms, refs)
+
+
+class RuleSet:
+    """Named validation rules, compiled once"""
+
+    def __init__(self, validations: Optional[Mapping[str, Mapping[str, Any]]] = None):
+        """
+        Args:
+            validations: The `validations` mapping of type_validation.yaml
+
+        Raises:
+            ValueError: If a rule does not compile
+        """
+        self.rules: Dict[str, Rule] = {
+            name: compile_rule(name, config) for name, config in (validations or {}).items()}
+
+    @classmethod
+    def from_file(cls, path: str = RULES_PATH) -> 'RuleSet':
+        with open(path, 'r') as file:
+            config = yaml.safe_load(file) or {}
+        return cls(config.get('validations'))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.rules
+
+    def __getitem__(self, name: str) -> Rule:
+        return self.rules[name]
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def validate_frame(self, frame: pd.DataFrame, max_workers: Optional[int] = None) -> pd.DataFrame:
+        """Check each column against the rule of the same name (like validate_data); see validate_frame"""
+        bindings = {column: (self.rules[column],) for column in frame.columns if column in self.rules}
+        return validate_frame(frame, bindings, max_workers)
+
+
+_default_rules: Optional[RuleSet] = None
+_default_rules_lock = threading.Lock()
+
+
+def default_rules() -> RuleSet:
+    """Rules from type_validation.yaml, loaded once (empty if the file is missing)"""
+    global _default_rules
+    with _default_rules_lock:
+        if _default_rules is None:
+            try:
+                _default_rules = RuleSet.from_file(RULES_PATH)
+            except FileNotFoundError:
+                _default_rules = RuleSet()
+        return _default_rules
 
-        validation_rule = config['validations'][field]
-        regex_pattern = validation_rule.get('regex')
-        description = validation_rule.get('description')
 
-        if regex_pattern:
-            # Validate the field using the regex pattern
-            if not re.match(regex_pattern, value):
-                errors[field] = f"Invalid {description}: {value}"
+class FieldRules(NamedTuple):
+    """The rules bound to one field"""
+    field: str
+    title: str
+    rules: Tuple[Rule, ...]
+    # Seconds
+    budget: float
+    # Other fields whose values the rules read
+    depends_on: Tuple[str, ...] = ()
 
+
+class FieldError(NamedTuple):
+    field: str
+    rule: str
+    message: str
+
+
+class ValidationResult(NamedTuple):
+    errors: Tuple[FieldError, ...]
+    # Fields that failed because their budget ran out before all their rules
+    # were checked (each also has an error)
+    over_budget: Tuple[str, ...]
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+
+class ValidationError(ValueError):
+    """Submitted form data failed validation"""
+
+    def __init__(self, result: ValidationResult):
+        self.result = result
+        super().__init__("; ".join(error.message for error in result.errors))
+
+
+def _texts(value: Any) -> List[str]:
+    """The strings a field value is checked as; every item of a list must match"""
+    if value is None or value is pd.NaT or value is pd.NA or (isinstance(value, float) and value != value):
+        return [""]
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, (date, time_of_day)):
+        return [value.isoformat()]
+    if isinstance(value, (list, tuple, set, frozenset)):
+        if not value:
+            return [""]
+        texts = []
+        for item in value:
+            # File fields hold attachment dicts; their file name is checked
+            texts.extend(_texts(item.get('name') if isinstance(item, dict) else item))
+        return texts
+    return [str(value)]
+
+
+class FormValidator:
+    """
+    The validation rules of a form configuration, bound to its fields
+
+    A field depends on the fields its rules reference through {{field}}
+    placeholders and on those listed in its `depends_on` key (for rules
+    whose meaning spans fields without reading them). `dependents` inverts
+    that, so an edit re-validates only the fields it can affect.
+    """
+
+    def __init__(self, form_config: Mapping[str, Any], rules: Optional[RuleSet] = None):
+        """
+        Args:
+            form_config: Form configuration (form.yaml)
+            rules: Named rules to resolve `validation` keys against
+                (defaults to type_validation.yaml)
+
+        Raises:
+            ValueError: If a field names an unknown rule or an inline rule
+                does not compile, or a field depends on an unknown field
+        """
+        rules = default_rules() if rules is None else rules
+        form = form_config['form']
+        default_budget = float(form.get('validation_budget_ms', DEFAULT_BUDGET_MS))
+        compiled = compile_form(form_config)
+        bound = []
+        for spec in compiled.fields:
+            validation = spec.config.get('validation')
+            if not validation:
+                continue
+            items = validation if isinstance(validation, list) else [validation]
+            field_rules = tuple(self._bind(spec.name, item, rules) for item in items)
+            budget = float(spec.config.get('validation_budget_ms', default_budget)) / 1000
+            depends_on = [ref for rule in field_rules for ref in rule.refs]
+            depends_on.extend(spec.config.get('depends_on') or ())
+            for other in depends_on:
+                if other not in compiled.index:
+                    raise ValueError(f"Validation of field {spec.name!r} depends on unknown field {other!r}")
+            depends_on = tuple(dict.fromkeys(other for other in depends_on if other != spec.name))
+            bound.append(FieldRules(spec.name, spec.title, field_rules, budget, depends_on))
+        self.fields: Tuple[FieldRules, ...] = tuple(bound)
+        if any(rule.timeout_ms is not None for field_rules in bound for rule in field_rules.rules):
+            # Boot the guard's workers now rather than on the first submission
+            regex_guard.start()
+        self._by_field: Dict[str, FieldRules] = {field_rules.field: field_rules for field_rules in bound}
+
+        # Field -> fields to re-validate when it changes: itself (if it has
+        # rules) and every field depending on it
+        dependents: Dict[str, set] = {}
+        for field_rules in bound:
+            dependents.setdefault(field_rules.field, set()).add(field_rules.field)
+            for other in field_rules.depends_on:
+                dependents.setdefault(other, set()).add(field_rules.field)
+        self.dependents: Dict[str, FrozenSet[str]] = {
+            field: frozenset(affected) for field, affected in dependents.items()}
+
+    def affected(self, changed: Iterable[str]) -> Set[str]:
+        """Fields whose validity may change when the given fields change"""
+        affected: Set[str] = set()
+        for field in changed:
+            affected |= self.dependents.get(field, frozenset())
+        return affected
+
+    def inputs(self, fields: Iterable[str]) -> Set[str]:
+        """Fields whose values validating the given fields reads"""
+        needed = set(fields)
+        for field in list(needed):
+            field_rules = self._by_field.get(field)
+            if field_rules is not None:
+                needed.update(field_rules.depends_on)
+        return needed
+
+    @staticmethod
+    def _bind(field: str, item: Any, rules: RuleSet) -> Rule:
+        if isinstance(item, dict):
+            return compile_rule(f"{field}.validation", item)
+        if item not in rules:
+            raise ValueError(f"Field {field!r} uses unknown validation rule {item!r}")
+        return rules[item]
+
+    def validate(self, form_data: Mapping[str, Any], fields: Optional[Iterable[str]] = None) -> ValidationResult:
+        """
+        Check form data against the rules of each field
+
+        A field stops at its first failing rule. Fields are checked within
+        their time budget; when it runs out before the last rule, the field
+        fails with an error for the first rule not checked and is also
+        reported in over_budget. A field is never valid unless every one of
+        its rules passed.
+
+        Args:
+            form_data: Field values to check
+            fields: Only check these fields (default: every field with rules)
+
+        Returns:
+            ValidationResult
+        """
+        selected = None if fields is None else set(fields)
+        errors: List[FieldError] = []
+        over_budget: List[str] = []
+        for field_rules in self.fields:
+            field = field_rules.field
+            if selected is not None and field not in selected:
+                continue
+            started = time.perf_counter()
+            deadline = started + field_rules.budget
+            # Waiting for a guard worker is not the field's own checking time
+            waited = 0.0
+            texts = _texts(form_data.get(field))
+            result = 'valid'
+            last = len(field_rules.rules) - 1
+            for index, rule in enumerate(field_rules.rules):
+                rule = rule.bind(form_data)
+                matched, rule_waited = rule.check(texts)
+                waited += rule_waited
+                if not matched:
+                    errors.append(FieldError(field, rule.name, f"{field_rules.title}: Invalid {rule.description}"))
+                    result = 'invalid'
+                    break
+                if index < last and time.perf_counter() - waited > deadline:
+                    unchecked = field_rules.rules[index + 1]
+                    errors.append(FieldError(field, unchecked.name,
+                                             f"{field_rules.title}: Could not be validated in time"))
+                    over_budget.append(field)
+                    result = 'over_budget'
+                    break
+            VALIDATION_DURATION.observe(time.perf_counter() - started, field)
+            VALIDATION_RESULTS.inc(field, result)
+        return ValidationResult(tuple(errors), tuple(over_budget))
+
+    def validate_frame(self, frame: pd.DataFrame, max_workers: Optional[int] = None) -> pd.DataFrame:
+        """
+        Check a dataset with one column per form field (see validate_frame)
+
+        Columns without rules, and fields without a column, are not checked;
+        a referenced field without a column counts as empty. Bulk checks
+        have no time budget.
+        """
+        bindings = {field_rules.field: field_rules.rules for field_rules in self.fields
+                    if field_rules.field in frame.columns}
+        return validate_frame(frame, bindings, max_workers)
+
+
+def _column_values(columns: pd.DataFrame) -> Tuple[np.ndarray, pd.Series, Optional[pd.DataFrame]]:
+    """
+    A field's column, and the columns its rules reference, as codes into
+    their distinct rows
+
+    Rules are matched once per distinct row; imported data repeats values a
+    lot (statuses, choices, dates).
+
+    Args:
+        columns: The field's column first, then the referenced columns
+
+    Returns:
+        (codes, the field's value as text per distinct row, the referenced
+        values per distinct row or None). A missing value of a lone column
+        has code -1, which picks the empty text appended last; rows with
+        referenced columns keep missing values in their distinct rows.
+    """
+    if len(columns.columns) == 1:
+        codes, uniques = pd.factorize(columns.iloc[:, 0], use_na_sentinel=True)
+        refs = None
+    else:
+        codes, uniques = pd.factorize(pd.MultiIndex.from_frame(columns))
+        distinct = uniques.to_frame(index=False)
+        distinct.columns = columns.columns
+        uniques, refs = distinct.iloc[:, 0], distinct.iloc[:, 1:]
+    if pd.api.types.infer_dtype(uniques, skipna=False) == 'string':
+        texts = list(uniques)
+    else:
+        texts = [_texts(value)[0] for value in uniques]
+    if refs is None:
+        texts.append("")
+    # Object dtype keeps Python's re semantics (lookaheads) whatever the string backend
+    return codes, pd.Series(texts, dtype=object), refs
+
+
+def _match_bound(rule: Rule, texts: pd.Series, refs: Optional[pd.DataFrame], pending: np.ndarray) -> np.ndarray:
+    """Matches of a cross-field rule on the pending distinct rows, bound once per set of referenced values"""
+    if refs is None:
+        return _match_texts(rule.bind({}), texts.iloc[pending])
+    matched = np.zeros(len(pending), dtype=bool)
+    keys = refs.reindex(columns=list(rule.refs)).iloc[pending]
+    groups = keys.groupby(list(rule.refs), dropna=False, sort=False).indices
+    for key, positions in groups.items():
+        values = dict(zip(rule.refs, key if isinstance(key, tuple) else (key,)))
+        matched[positions] = _match_texts(rule.bind(values), texts.iloc[pending[positions]])
+    return matched
+
+
+def _check_column(field: str, codes: np.ndarray, texts: pd.Series, refs: Optional[pd.DataFrame],
+                  rules: Tuple[Rule, ...]) -> Tuple[str, np.ndarray, np.ndarray]:
+    """
+    Rows of one column failing its rules
+
+    Returns:
+        (field, row positions, index of the first rule each row fails)
+    """
+    failed = np.full(len(texts), -1, dtype=np.int32)
+    for index, rule in enumerate(rules):
+        pending = np.flatnonzero(failed < 0)
+        if not len(pending):
+            break
+        if rule.refs:
+            matched = _match_bound(rule, texts, refs, pending)
+        else:
+            matched = _match_texts(rule, texts.iloc[pending])
+        failed[pending[~matched]] = index
+    per_row = failed[codes]
+    rows = np.flatnonzero(per_row >= 0)
+    return field, rows, per_row[rows]
+
+
+def validate_frame(frame: pd.DataFrame, bindings: Mapping[str, Sequence[Rule]],
+                   max_workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Check whole columns of a dataset against their rules
+
+    Each rule is applied to a column at once (to its distinct values), and a
+    row is reported for the first rule of a field it fails, as validate
+    does for one submission. Large datasets are checked a column per
+    worker process.
+
+    Args:
+        frame: Dataset, one column per field
+        bindings: Rules per column
+        max_workers: Worker processes (default: one per CPU); 1 checks in process
+
+    Returns:
+        DataFrame with ERROR_COLUMNS, one row per failing cell, ordered by
+        row and then by field; `row` holds the frame's index labels
+    """
+    jobs = []
+    for field, rules in bindings.items():
+        if rules and field in frame.columns:
+            refs = [ref for ref in dict.fromkeys(ref for rule in rules for ref in rule.refs)
+                    if ref != field and ref in frame.columns]
+            jobs.append((field, *_column_values(frame[[field, *refs]]), tuple(rules)))
+    workers = min(len(jobs), max_workers or os.cpu_count() or 1)
+    matches = sum(len(texts) * len(rules) for _, _, texts, _, rules in jobs)
+    if workers > 1 and matches >= PARALLEL_MIN_MATCHES:
+        # Regex matching holds the GIL, so columns go to processes; spawn
+        # rather than fork, the app has threads running
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(_check_column, *zip(*jobs)))
+    else:
+        results = [_check_column(*job) for job in jobs]
+
+    rule_names = {field: [rule.name for rule in rules] for field, _, _, _, rules in jobs}
+    parts = [pd.DataFrame({
+        'row': rows,
+        'field': field,
+        'rule': np.asarray(rule_names[field], dtype=object)[failed],
+    }) for field, rows, failed in results if len(rows)]
+    if not parts:
+        return pd.DataFrame(columns=ERROR_COLUMNS)
+    errors = pd.concat(parts, ignore_index=True).sort_values('row', kind='stable', ignore_index=True)
+    errors['row'] = frame.index[errors['row'].to_numpy()]
     return errors
 
-# Validate the data
-validation_errors = validate_data(data, config)
 
-# Print validation results
-if validation_errors:
-    print("Validation Errors:")
-    for field, error in validation_errors.items():
-        print(f"{field}: {error}")
-else:
-    print("Data is valid.")
+def load_table(path: str) -> pd.DataFrame:
+    """
+    Read a CSV or Parquet dataset for validate_frame
+
+    CSV cells are read as text, as they were typed (no number or date
+    parsing); empty cells are missing.
+    """
+    if path.lower().endswith(('.parquet', '.pq')):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[""])
+
+
+_validators: Dict[int, Tuple[Mapping[str, Any], FormValidator]] = {}
+_validators_lock = threading.Lock()
+
+
+def form_validator(form_config: Mapping[str, Any]) -> FormValidator:
+    """Validator of a form configuration, reused for the same config object (like compile_form)"""
+    key = id(form_config)
+    cached = _validators.get(key)
+    if cached is not None and cached[0] is form_config:
+        return cached[1]
+    validator = FormValidator(form_config)
+    with _validators_lock:
+        if len(_validators) >= 32:
+            _validators.clear()
+        _validators[key] = (form_config, validator)
+    return validator
+
+
+def validate_data(data: Mapping[str, Any], rules: RuleSet) -> Dict[str, str]:
+    """
+    Check each value against the rule of the same name
+
+    Returns:
+        Error message per invalid field; fields without a rule are skipped
+    """
+    errors = {}
+    for field, value in data.items():
+        if field in rules:
+            rule = rules[field]
+            if not rule.matches(str(value)):
+                errors[field] = f"Invalid {rule.description}: {value}"
+    return errors
+
+
+if __name__ == "__main__":
+    data = {
+        "required_field": "Sample Data",
+        "length_validation": "12345",
+        "numeric_validation": "12345",
+        "email_validation": "user@324234.com",
+        "phone_number_validation": "123-456-7890",
+        "date_validation": "09/14/2023",
+        "password_validation": "P@ssw0rd",
+        "username_validation": "user_123",
+        "url_validation": "https://www.example.com",
+        "dropdown_selection_validation": "Option 1",
+        "radio_checkbox_validation": "Option 2",
+        "file_upload_validation": "example.txt",
+        "captcha_validation": "CaptchaResponse123",
+        "unique_field_validation": "UniqueValue123",
+        "consistency_validation": "SampleData",
+        "credit_card_validation": "1234567890123456",
+        "postal_code_validation": "12345",
+        "custom_validation": "CustomValidData",
+        "cross_field_validation": "CrossFieldValidData",
+        "server_side_validation": "ServerSideValidData",
+        "sanitization": "<script>alert('Hello');</script>",
+        "regex_validation": "RegexValidData123",
+        "geographical_validation": "ValidLocation",
+        "language_character_set_validation": "ValidCharsetData",
+        "accessibility_validation": "AccessibleData",
+        "date_time_format_validation": "09/14/2023 10:30 AM"
+    }
+
+    validation_errors = validate_data(data, RuleSet.from_file(RULES_PATH))
+
+    if validation_errors:
+        print("Validation Errors:")
+        for field, error in validation_errors.items():
+            print(f"{field}: {error}")
+    else:
+        print("Data is valid.")
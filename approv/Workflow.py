@@ -1,13 +1,17 @@
 import yaml
-from approv.WorkflowStep import Start, Stop, Simple, RESTCall, ExclusiveChoice
+from approv.WorkflowStep import evaluate_condition
+from approv.WorkflowGraph import compile_workflow
 import time
 from datetime import datetime
 from ast import literal_eval
 from approv.Form import Form
+from approv.Audit import AuditTrail
+from approv.Metrics import AUDIT_WRITE_DURATION, FORM_RENDER_DURATION, check_permission, track_workflow
 
 class Workflow:
-    def __init__(self, st, workflow_config, form_config, form_data=None):
+    def __init__(self, st, workflow_config, form_config, form_data=None, graph=None):
         self.config = workflow_config
+        self.graph = graph if graph is not None else compile_workflow(workflow_config)
         try:
             self.current_status = 'start' if form_data['status'] == '' else form_data['status']
         except:
@@ -17,7 +21,7 @@ class Workflow:
         self.form_config = form_config
         self.st = st
         if 'audit' not in st.session_state:
-            st.session_state['audit'] = []
+            st.session_state['audit'] = AuditTrail()
             self.audit_data = st.session_state.audit
         else:
             self.audit_data = st.session_state.audit
@@ -25,8 +29,8 @@ class Workflow:
         self.form = Form(self.st, self.form_config, self.audit_data)
 
     def audit(self, action, user, description=""):
-        new_audit = {'status': self.current_status, 'action': action, 'description': description, 'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f'), 'user': user}
-        self.audit_data.append(new_audit)
+        with AUDIT_WRITE_DURATION.time("streamlit"):
+            self.audit_data.record(self.current_status, action, description, user, form_data=self.form_data)
         # self.form_data['audit'] = str(self.audit_data)
                 
     def initiate(self):
@@ -39,6 +43,7 @@ class Workflow:
         self.audit("Workflow canceled", 'system')
         return self.form_data
         
+    @staticmethod
     def evaluate_condition(operator, attribute_value, condition_value):
         """
         Evaluates a condition based on the given operator.
@@ -48,30 +53,16 @@ class Workflow:
         :param condition_value: The value specified in the condition
         :return: Boolean indicating if the condition is met
         """
-
-        if operator == "Equal":
-            return attribute_value == condition_value
-        elif operator == "GreaterThan":
-            return attribute_value > condition_value
-        elif operator == "LessThan":
-            return attribute_value < condition_value
-        elif operator == "GreaterThanOrEqual":
-            return attribute_value >= condition_value
-        elif operator == "LessThanOrEqual":
-            return attribute_value <= condition_value
-        elif operator == "Contains":
-            # Assuming both are lists or strings
-            return condition_value in attribute_value
-        elif operator == "InList":
-            # Assuming attribute_value is a single item and condition_value is a list
-            return attribute_value in condition_value
-
-        return False
+        return evaluate_condition(operator, attribute_value, condition_value)
 
     def get_status(self):
         return self.current_status()
 
     def process_workflow(self, user_role, form_data):
+        with track_workflow("streamlit"):
+            return self._process_workflow(user_role, form_data)
+
+    def _process_workflow(self, user_role, form_data):
         # New: Check if the user has permission to execute this step
         # try:
         #     self.audit_data = literal_eval(form_data['audit'])
@@ -85,28 +76,24 @@ class Workflow:
         except:
             form_data['comments'] = ""
 
+        node = self.graph.node(self.current_status)
         while True:
-            time.sleep(1)            
-            step_config = self.config['workflow'][self.current_status]
-            if not self.check_user_permission(step_config, user_role) and self.config['workflow'][self.current_status]['require_user_action']:
+            if not check_permission(node, user_role):
                 raise PermissionError("User does not have permission to execute this step.")
 
-            step_class = step_config['class']
-            step = globals()[step_class](step_config)
-            self.current_status, decision = step.process(form_data)
-            self.audit(decision, user_role)
+            next_id, decision = self.graph.advance(node.id, form_data)
+            node = self.graph.nodes[next_id]
+            self.current_status = node.name
             self.form_data['status'] = self.current_status #post process status
+            self.audit(decision, user_role)
 
-            if self.current_status == 'stop':
-                break
-            try:
-                if self.config['workflow'][self.current_status]['require_user_action'] == False:
-                    continue
-                else:
-                    break
-            except:
+            if node.id == self.graph.stop_id or node.require_user_action:
                 break
 
+            # Automated steps run back-to-back unless the step asks for pacing
+            if node.pacing:
+                time.sleep(node.pacing)
+
         return self.form_data
 
     def check_user_permission(self, step_config, user_role):
@@ -115,7 +102,8 @@ class Workflow:
         return True
 
     def get_form(self, user_role):
-        self.form.get_form(data=self.form_data , user=user_role, actions=None)
+        with FORM_RENDER_DURATION.time("streamlit"):
+            self.form.get_form(data=self.form_data , user=user_role, actions=None)
         
         if 'submitted_by' in self.st.session_state:
             if self.st.session_state.submitted_by != "":
@@ -0,0 +1,245 @@
+"""
+Compiled workflow graph shared by the Streamlit and Shiny workflow engines
+
+compile_workflow() turns the 'workflow' section of workflow.yaml into an
+immutable graph: nodes get integer ids, transitions become tuples of ids and
+each node carries a single pre-built step object, so the engines no longer
+look up the raw YAML dict or instantiate step classes on every transition.
+A compiled graph holds no instance state and can be shared by any number of
+workflow instances.
+"""
+
+import asyncio
+import inspect
+import time
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Mapping, NamedTuple, Optional, Tuple
+
+from approv.Metrics import STEP_DURATION, STEP_EXECUTIONS, TRANSITIONS
+from approv.WorkflowStep import STEP_CLASSES, MultiChoice, Simple
+
+
+class CompiledNode(NamedTuple):
+    """A single workflow step with its configuration resolved"""
+    id: int
+    name: str
+    step_class: str
+    step: Any
+    require_user_action: bool
+    roles: FrozenSet[str]
+    outputs: Tuple[int, ...]
+    config: Mapping[str, Any]
+    pacing: float = 0.0
+    is_async: bool = False
+    blocking: bool = False
+
+    def permits(self, user_role: str) -> bool:
+        """Check if a role may act on this step (no roles configured means anyone)"""
+        return not self.roles or user_role in self.roles
+
+
+class CompiledWorkflow(NamedTuple):
+    """Immutable, executable form of a workflow configuration"""
+    nodes: Tuple[CompiledNode, ...]
+    index: Mapping[str, int]
+    start_id: Optional[int]
+    stop_id: Optional[int]
+    description: str = ""
+
+    def id_of(self, name: str) -> Optional[int]:
+        """Get the node id for a status name, or None if the status is unknown"""
+        return self.index.get(name)
+
+    def node(self, name: str) -> CompiledNode:
+        """Get the compiled node for a status name"""
+        return self.nodes[self.index[name]]
+
+    def resolve(self, status: Optional[str]) -> int:
+        """Map a status returned by a step to a node id"""
+        if status is None:
+            if self.stop_id is None:
+                raise ValueError("Workflow step finished the workflow, but the workflow has no 'stop' node")
+            return self.stop_id
+        try:
+            return self.index[status]
+        except KeyError:
+            raise ValueError(f"Workflow step returned unknown status '{status}'")
+
+    def advance(self, node_id: int, form_data: Dict[str, Any]) -> Tuple[int, str]:
+        """
+        Run the step bound to a node and resolve the transition
+
+        Args:
+            node_id: Id of the node to process
+            form_data: Current form data
+
+        Returns:
+            Tuple of (next node id, decision text for the audit trail)
+
+        Raises:
+            RuntimeError: If the step is async and an event loop is running
+                (use advance_async from async code)
+        """
+        node = self.nodes[node_id]
+        started = time.perf_counter()
+        try:
+            if node.is_async:
+                try:
+                    asyncio.get_running_loop()
+                except RuntimeError:
+                    next_status, decision = asyncio.run(node.step.process(form_data))
+                else:
+                    raise RuntimeError(f"Step '{node.name}' is async; use advance_async inside an event loop")
+            else:
+                next_status, decision = node.step.process(form_data)
+        except BaseException:
+            _record_step(node, started, "error")
+            raise
+        _record_step(node, started, "ok")
+        next_id = self.resolve(next_status)
+        TRANSITIONS.inc(node.name, self.nodes[next_id].name)
+        return next_id, decision
+
+    async def advance_async(self, node_id: int, form_data: Dict[str, Any]) -> Tuple[int, str]:
+        """
+        Async variant of advance(): awaits steps whose process() is a
+        coroutine and runs blocking steps in a worker thread
+
+        Args:
+            node_id: Id of the node to process
+            form_data: Current form data
+
+        Returns:
+            Tuple of (next node id, decision text for the audit trail)
+        """
+        node = self.nodes[node_id]
+        started = time.perf_counter()
+        try:
+            if node.is_async:
+                next_status, decision = await node.step.process(form_data)
+            elif node.blocking:
+                # Blocking I/O (e.g. RESTCall) runs in a worker thread
+                next_status, decision = await asyncio.to_thread(node.step.process, form_data)
+            else:
+                next_status, decision = node.step.process(form_data)
+        except BaseException:
+            _record_step(node, started, "error")
+            raise
+        _record_step(node, started, "ok")
+        next_id = self.resolve(next_status)
+        TRANSITIONS.inc(node.name, self.nodes[next_id].name)
+        return next_id, decision
+
+
+def _record_step(node: CompiledNode, started: float, outcome: str):
+    """Record the latency and outcome of one step.process call"""
+    STEP_DURATION.observe(time.perf_counter() - started, node.name, node.step_class)
+    STEP_EXECUTIONS.inc(node.name, node.step_class, outcome)
+
+
+def compile_workflow(workflow_config: Dict[str, Any]) -> CompiledWorkflow:
+    """
+    Compile a workflow configuration into an immutable graph
+
+    Args:
+        workflow_config: Parsed workflow.yaml content
+
+    Returns:
+        CompiledWorkflow ready to be shared by workflow instances
+
+    Raises:
+        ValueError: If a step references a status that is not defined, or
+            the workflow has steps but no 'stop' node
+    """
+    steps = (workflow_config or {}).get('workflow') or {}
+    index = {name: node_id for node_id, name in enumerate(steps)}
+    if steps and 'stop' not in index:
+        # Steps that finish the workflow (e.g. Stop) return no status, which resolves to it
+        raise ValueError("Workflow has no 'stop' node")
+
+    nodes = []
+    successors = {}
+    for node_id, (name, step_config) in enumerate(steps.items()):
+        step_class = step_config.get('class', 'Simple')
+        # Classes without an implementation behave like Simple steps
+        step = STEP_CLASSES.get(step_class, Simple)(step_config)
+
+        targets = list(step_config.get('outputs') or [])
+        # A step's own on_error default (e.g. RESTCall's 'error') is a target too
+        on_error = getattr(step, 'on_error', None) or step_config.get('on_error')
+        if on_error:
+            targets.append(on_error)
+        for condition_name, condition in (step_config.get('conditions') or {}).items():
+            target = condition.get('next_status') if isinstance(condition, dict) else condition
+            if target:
+                targets.append(target)
+
+        for target in targets:
+            if target not in index:
+                raise ValueError(f"Node '{name}' references unknown status '{target}'")
+        successors[name] = targets
+
+        nodes.append(CompiledNode(
+            id=node_id,
+            name=name,
+            step_class=step_class,
+            step=step,
+            require_user_action=bool(step_config.get('require_user_action', True)),
+            roles=frozenset(step_config.get('role') or ()),
+            outputs=tuple(index[target] for target in step_config.get('outputs') or []),
+            config=MappingProxyType(step_config),
+            # Optional delay (seconds) before an automated step is run
+            pacing=float(step_config.get('pacing') or 0.0),
+            is_async=inspect.iscoroutinefunction(step.process),
+            blocking=bool(getattr(step, 'blocking', False)),
+        ))
+
+    for node in nodes:
+        if isinstance(node.step, MultiChoice):
+            _check_fork(node, steps, successors)
+
+    workflow = CompiledWorkflow(
+        nodes=tuple(nodes),
+        index=MappingProxyType(index),
+        start_id=index.get('start'),
+        stop_id=index.get('stop'),
+        description=(workflow_config or {}).get('description', ""),
+    )
+
+    # Steps that drive other nodes (fork nodes) get the finished graph
+    for node in workflow.nodes:
+        if hasattr(node.step, 'bind'):
+            node.step.bind(workflow, node.id)
+
+    return workflow
+
+
+def _check_fork(node: CompiledNode, steps: Dict[str, Any], successors: Dict[str, list]):
+    """
+    Check that every branch of a fork node can reach its join node
+
+    Branch paths are followed through automated steps only; a user task or
+    the stop node ends a path (the branch leaves the fork there).
+
+    Raises:
+        ValueError: If the join node is missing or a branch cannot reach it
+    """
+    join = node.step.join
+    if not join or join not in steps:
+        raise ValueError(f"Fork node '{node.name}' needs a 'join' naming an existing node")
+    if steps[join].get('class') != 'Join':
+        raise ValueError(f"Fork node '{node.name}' joins at '{join}', which is not a Join node")
+
+    for branch in successors[node.name]:
+        seen = set()
+        pending = [branch]
+        reached = False
+        while pending and not reached:
+            name = pending.pop()
+            if name == join:
+                reached = True
+            elif name not in seen and name != 'stop' and not steps[name].get('require_user_action', True):
+                seen.add(name)
+                pending.extend(successors[name])
+        if not reached:
+            raise ValueError(f"Branch '{branch}' of fork node '{node.name}' never reaches join node '{join}'")
@@ -1,37 +1,113 @@
+import http.client
+import json
+import threading
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
+
+from approv.Http import default_pool, with_query
+from approv.Routing import OPERATORS, ConditionRouter
+
+def evaluate_condition(operator, attribute_value, condition_value):
+    """
+    Evaluates a condition based on the given operator.
+
+    :param operator: The condition operator
+    :param attribute_value: The value from the form_data
+    :param condition_value: The value specified in the condition
+    :return: Boolean indicating if the condition is met
+    """
+    predicate = OPERATORS.get(operator)
+    if predicate is None:
+        return False
+    return predicate(attribute_value, condition_value)
+
+def _lookup(data, path):
+    """
+    Follows a dotted path (e.g. 'result.id' or 'items.0.name') into decoded JSON.
+
+    :return: The value, or None if the path does not exist
+    """
+    for key in path.split('.'):
+        if isinstance(data, dict):
+            data = data.get(key)
+        elif isinstance(data, list) and key.isdigit() and int(key) < len(data):
+            data = data[int(key)]
+        else:
+            return None
+    return data
+
 class RESTCall:
-    def __init__(self, config):
+    """
+    Calls a service over HTTP and maps the JSON response back into form data.
+
+    Configured in workflow.yaml:
+
+        url: http://service/strike      # no url -> simulated success
+        method: POST                    # default POST (GET sends the payload as query params)
+        headers: {Authorization: ...}
+        timeout: 5                      # seconds, per request
+        payload:                        # request field: form field
+          code: launch_code
+        response:                       # form field: dotted path in the JSON response
+          strike_id: result.id
+        on_error: workflow_aborted      # status when the call fails (default 'error')
+
+    Requests go through the shared keep-alive pool in approv.Http. The call
+    blocks, so the async engine runs it in a worker thread (blocking = True).
+    """
+
+    def __init__(self, config, pool=None):
         self.config = config
+        self.url = config.get('url')
+        self.method = str(config.get('method', 'POST')).upper()
+        self.headers = dict(config.get('headers') or {})
+        self.timeout = float(config.get('timeout', 10))
+        self.payload = dict(config.get('payload') or {})
+        self.response = dict(config.get('response') or {})
+        # Status when the call fails; a simulated call (no url) cannot fail
+        self.on_error = config.get('on_error', 'error' if self.url else None)
+        self.pool = pool or default_pool
+        self.blocking = bool(self.url)
 
     def process(self, form_data):
-        # Here, we're simulating a REST call.
-        # You'd replace this with an actual HTTP request in a real-world application.
-        response = True  # simulated success response
-        if response:
+        if not self.url:
+            # No service configured: simulated success response
             return self.config['outputs'][0], "RESTCall executed successfully"
-        else:
-            return "error", "RESTCall failed"
 
-class Stop:
-    def __init__(self, config):
-        self.config = config
+        payload = {field: form_data.get(form_field) for field, form_field in self.payload.items()}
+        try:
+            if self.method in ('GET', 'DELETE', 'HEAD'):
+                response = self.pool.request(self.method, with_query(self.url, payload),
+                                             headers=self.headers, timeout=self.timeout)
+            else:
+                headers = {'Content-Type': 'application/json', **self.headers}
+                body = json.dumps(payload, default=str).encode('utf-8')
+                response = self.pool.request(self.method, self.url, body=body,
+                                             headers=headers, timeout=self.timeout)
+            if response.status >= 400:
+                return self.on_error, f"RESTCall failed: HTTP {response.status}"
+            result = response.json() if self.response else None
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            return self.on_error, f"RESTCall failed: {e}"
 
-    def process(self, form_data):
-        return None, "Workflow stopped"
+        for form_field, path in self.response.items():
+            form_data[form_field] = _lookup(result, path)
+        return self.config['outputs'][0], f"RESTCall executed successfully (HTTP {response.status})"
 
 class Simple:
     def __init__(self, config):
         self.config = config
-        
+
     def process(self, form_data):
         return self.config['outputs'][0], "Simple step executed"
 
 class Start:
     def __init__(self, config):
         self.config = config
-        
+
     def process(self, form_data):
         return self.config['outputs'][0], "Started"
-    
+
 class Stop:
     def __init__(self, config):
         self.config = config
@@ -42,22 +118,203 @@ class Stop:
 class ExclusiveChoice:
     def __init__(self, config):
         self.config = config
-        
+
+        # Conditions are parsed once here; the compiled workflow keeps a single
+        # instance of each step, so process() only evaluates them.
+        self.conditions = []
+        self.default = None
+        for condition_name, condition in self.config.get('conditions', {}).items():
+            if condition_name == "default":
+                self.default = condition
+                continue
+            if not isinstance(condition, dict):
+                continue
+            operator = condition.get('operator')
+            attribute = condition.get('attribute')
+            value = condition.get('value')
+            next_status = condition.get('next_status')
+            if operator and attribute and value is not None and next_status:
+                self.conditions.append((condition_name, operator, attribute, value, next_status))
+
+        if self.default is None and self.config.get('outputs'):
+            self.default = self.config['outputs'][0]
+
+        # Hash/interval index over the conditions, built once per compiled node
+        self.router = ConditionRouter(self.conditions)
+
     def process(self, form_data):
-        #print("ExclusiveChoice Config: ", self.config)
-        #print("FormData: ", form_data)
-        for condition_name, condition in self.config['conditions'].items():
-            if condition_name != "default":
-                #print("\n\n\ncondition_name: ", condition_name)
-                #print("condition: ", condition)
-                operator = condition['operator']
-                attribute = condition['attribute']
-                value = condition['value']
-
-                # Here we check the condition based on the operator.
-                # We only handle the Equal operator for simplicity.
-                if operator == "Equal" and form_data[attribute] == value:
-                    return condition['next_status'], f"Decision made: {condition_name}"
+        match = self.router.route(form_data)
+        if match is not None:
+            condition_name, next_status = match
+            return next_status, f"Decision made: {condition_name}"
 
         # If none of the conditions are met, return the default
-        return self.config['conditions']['default'], "Decision made: default"
\ No newline at end of file
+        return self.default, "Decision made: default"
+
+# Worker threads shared by all fork nodes, created on first use
+_branch_pool = None
+_branch_pool_lock = threading.Lock()
+# Set while a thread is running a branch, so nested forks run their branches
+# inline instead of waiting on the (possibly exhausted) pool
+_branch_state = threading.local()
+
+def _branch_executor():
+    global _branch_pool
+    with _branch_pool_lock:
+        if _branch_pool is None:
+            _branch_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="workflow-branch")
+        return _branch_pool
+
+class MultiChoice:
+    """
+    Fork node: activates every branch whose condition matches and runs the
+    branches concurrently on a thread pool until they meet at the join node.
+
+        parallel_checks:
+          class: MultiChoice
+          require_user_action: False
+          join: checks_done           # a Join node every branch leads to
+          conditions:                 # optional; without conditions all outputs run
+            credit:
+              operator: GreaterThan
+              attribute: amount
+              value: 1000
+              next_status: api_credit
+            default: api_basic        # branch taken when nothing matches
+          outputs:
+            - api_credit
+            - api_basic
+
+    Branches must be automated. Each branch reads the shared form data and
+    writes to its own layer; the layers are merged in branch order once all
+    branches are done. A branch that leaves the fork (e.g. through an
+    on_error status or at a user task) decides where the instance goes next.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.join = config.get('join')
+        self.default = None
+        self.conditions = []
+        for condition_name, condition in (config.get('conditions') or {}).items():
+            if condition_name == "default":
+                self.default = condition
+            elif isinstance(condition, dict) and condition.get('next_status'):
+                self.conditions.append((condition_name, condition.get('operator'), condition.get('attribute'),
+                                        condition.get('value'), condition['next_status']))
+        self.graph = None
+        # Waiting on worker threads blocks, so the async engine runs this in a thread
+        self.blocking = True
+
+    def bind(self, graph, node_id):
+        """Attach the compiled graph the branches are run on"""
+        self.graph = graph
+
+    def branches(self, form_data):
+        """
+        Statuses of the branches to activate, in declaration order.
+        """
+        if not self.conditions:
+            return list(self.config.get('outputs') or [])
+
+        selected = []
+        for _, operator, attribute, value, next_status in self.conditions:
+            try:
+                matched = evaluate_condition(operator, form_data.get(attribute), value)
+            except TypeError:
+                matched = False
+            if matched and next_status not in selected:
+                selected.append(next_status)
+        if not selected and self.default:
+            selected.append(self.default)
+        return selected
+
+    def run_branch(self, status, form_data):
+        """
+        Runs one branch until it reaches the join node or leaves the fork.
+
+        :return: Tuple of (node the branch stopped at, branch form data layer, decisions)
+        """
+        graph = self.graph
+        join_id = graph.index[self.join]
+        layer = ChainMap({}, form_data)
+        decisions = []
+        node = graph.node(status)
+        nested = getattr(_branch_state, 'active', False)
+        _branch_state.active = True
+        try:
+            while node.id != join_id and node.id != graph.stop_id and not node.require_user_action:
+                next_id, decision = graph.advance(node.id, layer)
+                decisions.append(decision)
+                node = graph.nodes[next_id]
+        finally:
+            _branch_state.active = nested
+        return node, layer.maps[0], decisions
+
+    def process(self, form_data):
+        if self.graph is None:
+            raise RuntimeError(f"{type(self).__name__} step is not bound to a workflow graph")
+
+        statuses = self.branches(form_data)
+        if not statuses:
+            return self.join, "No branches activated"
+
+        if len(statuses) > 1 and not getattr(_branch_state, 'active', False):
+            executor = _branch_executor()
+            futures = [executor.submit(self.run_branch, status, form_data) for status in statuses]
+            results = [future.result() for future in futures]
+        else:
+            results = [self.run_branch(status, form_data) for status in statuses]
+
+        for _, changes, _ in results:
+            form_data.update(changes)
+
+        summary = "; ".join(f"{status}: {', '.join(decisions) or 'no steps'}"
+                            for status, (_, _, decisions) in zip(statuses, results))
+        for status, (node, _, _) in zip(statuses, results):
+            if node.name != self.join:
+                return node.name, f"Branch '{status}' left the fork at '{node.name}' ({summary})"
+        return self.join, f"Branches completed ({summary})"
+
+class MutexChoice(MultiChoice):
+    """
+    Mutually exclusive choice: exactly one branch is taken, that of the
+    first matching condition in declaration order, else the default (the
+    first output when there are no conditions). The branch runs to the join
+    node like a MultiChoice branch.
+    """
+
+    def branches(self, form_data):
+        for _, operator, attribute, value, next_status in self.conditions:
+            try:
+                matched = evaluate_condition(operator, form_data.get(attribute), value)
+            except TypeError:
+                matched = False
+            if matched:
+                return [next_status]
+        if self.default:
+            return [self.default]
+        if not self.conditions and self.config.get('outputs'):
+            return [self.config['outputs'][0]]
+        return []
+
+class Join:
+    def __init__(self, config):
+        self.config = config
+
+    def process(self, form_data):
+        return self.config['outputs'][0], "Branches joined"
+
+# Step classes that can be referenced from the 'class' key in workflow.yaml.
+# A step's process(form_data) returns (next_status, decision); I/O-bound steps
+# may define it as 'async def' and are then awaited by the async engine path.
+STEP_CLASSES = {
+    'Start': Start,
+    'Stop': Stop,
+    'Simple': Simple,
+    'RESTCall': RESTCall,
+    'ExclusiveChoice': ExclusiveChoice,
+    'MultiChoice': MultiChoice,
+    'MutexChoice': MutexChoice,
+    'Join': Join,
+}
@@ -0,0 +1,79 @@
+"""
+Latency from submit to the next human task
+
+Replays the nuclear strike workflow: the president approves, and the engine
+runs nuclear_strike -> api_call_nuclear_strike -> stop on its own. The time
+measured is from the submit call until process_workflow hands control back
+(next user task or stop). With the old fixed one second sleep per loop
+iteration the same path cost roughly one second per step.
+
+Run from the repository root:
+    python benchmarks/auto_advance_latency.py [iterations]
+"""
+
+import copy
+import json
+import os
+import statistics
+import sys
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shiny import reactive
+
+from approv.WorkflowGraph import compile_workflow
+from shiny_modules.workflow import ShinyWorkflow
+
+
+def load_configs():
+    with open('workflow.yaml', 'r') as f:
+        workflow_config = yaml.safe_load(f.read())
+    with open('form.yaml', 'r') as f:
+        form_config = yaml.safe_load(f.read())
+    with open('data.json', 'r') as f:
+        form_data = json.loads(f.read())
+    return workflow_config, form_config, form_data
+
+
+def run_once(workflow_config, form_config, form_data, graph):
+    """Drive one instance up to the president decision and time the submit"""
+    data = copy.deepcopy(form_data)
+    workflow = ShinyWorkflow(workflow_config, form_config, data, graph=graph)
+
+    with reactive.isolate():
+        workflow.process_workflow('GENERAL_USER', data)
+        data['general_confirmation'] = True
+        workflow.process_workflow('GENERAL_USER', data)
+        data['president_confirmation'] = True
+
+        started = time.perf_counter()
+        workflow.process_workflow('PRESIDENT_USER', data)
+        elapsed = time.perf_counter() - started
+
+        steps = len(workflow.audit_data()) - 2
+        return elapsed, steps, workflow.current_status()
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    workflow_config, form_config, form_data = load_configs()
+    graph = compile_workflow(workflow_config)
+
+    samples = []
+    for _ in range(iterations):
+        elapsed, steps, status = run_once(workflow_config, form_config, form_data, graph)
+        samples.append(elapsed)
+
+    samples.sort()
+    print(f"iterations:            {iterations}")
+    print(f"steps per submit:      {steps} (ends at '{status}')")
+    print(f"median latency:        {statistics.median(samples) * 1e6:.1f} us")
+    print(f"p99 latency:           {samples[int(len(samples) * 0.99) - 1] * 1e6:.1f} us")
+    print(f"fixed 1s sleep (old):  {steps:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
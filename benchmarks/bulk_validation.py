@@ -0,0 +1,88 @@
+"""
+Bulk validation of an imported dataset
+
+Builds a dataset with one column per rule of type_validation.yaml (the
+sample values of approv/Validation.py, with a share of invalid ones) and
+checks it twice: calling validate_data once per record, and with
+validate_frame over whole columns. Both must report the same failures.
+
+Run from the repository root:
+    python benchmarks/bulk_validation.py [rows] [max_workers]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from approv.Validation import RULES_PATH, RuleSet, validate_data
+
+VALID = {
+    "required_field": "Sample Data",
+    "length_validation": "12345",
+    "numeric_validation": "12345",
+    "email_validation": "user@324234.com",
+    "phone_number_validation": "123-456-7890",
+    "date_validation": "09/14/2023",
+    "password_validation": "P@ssw0rd12",
+    "username_validation": "user_123",
+    "url_validation": "https://www.example.com",
+    "credit_card_validation": "1234567890123456",
+}
+INVALID = {
+    "required_field": "",
+    "length_validation": "123",
+    "numeric_validation": "12a45",
+    "email_validation": "user^.com",
+    "phone_number_validation": "phone",
+    "date_validation": "2023-09-14",
+    "password_validation": "password",
+    "username_validation": "u!",
+    "url_validation": "ftp://example",
+    "credit_card_validation": "1234",
+}
+
+
+def build_dataset(rows: int, seed: int = 7) -> pd.DataFrame:
+    """Rows of the sample values; about 2% of cells invalid, and distinct ids in every value"""
+    random = np.random.default_rng(seed)
+    columns = {}
+    for field, valid in VALID.items():
+        ids = random.integers(0, 5000, rows).astype(str)
+        values = np.where(random.random(rows) < 0.02, INVALID[field], valid)
+        if field in ('required_field', 'username_validation'):
+            # Mostly distinct values, like names
+            values = np.char.add(values, ids)
+        columns[field] = values.astype(object)
+    return pd.DataFrame(columns)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    rules = RuleSet.from_file(RULES_PATH)
+    frame = build_dataset(rows)
+
+    started = time.perf_counter()
+    per_record = {(row, field) for row, record in enumerate(frame.to_dict('records'))
+                  for field in validate_data(record, rules)}
+    record_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    errors = rules.validate_frame(frame, max_workers)
+    frame_time = time.perf_counter() - started
+
+    assert set(zip(errors['row'], errors['field'])) == per_record, "validate_frame disagrees with validate_data"
+    print(f"rows x columns:         {rows} x {len(frame.columns)}")
+    print(f"failing cells:          {len(errors)}")
+    print(f"validate_data per row:  {record_time * 1000:.0f} ms")
+    print(f"validate_frame:         {frame_time * 1000:.0f} ms")
+    print(f"speedup:                {record_time / frame_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
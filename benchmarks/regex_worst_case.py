@@ -0,0 +1,76 @@
+"""
+Worst-case inputs for every rule of type_validation.yaml
+
+Feeds each rule pumped strings (a run of one or a few characters, then a
+character that makes the match fail) of growing length, and reports per
+rule the slowest input:
+
+- unguarded: the plain re match, run in a GuardedMatcher with a generous
+  limit so a runaway match cannot hang the benchmark (">" marks a match
+  stopped at that limit),
+- guarded: Rule.matches as validation runs it, in process for safe rules
+  and with the per-match limit for flagged ones.
+
+Run from the repository root:
+    python benchmarks/regex_worst_case.py [limit_ms]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from approv.RegexGuard import GuardedMatcher
+from approv.Validation import RULES_PATH, RuleSet
+
+PUMPS = ["1", "a", "A", ".", "-", " ", "_", "@", "1-", "1 ", "a.", "aA1@", "a@a."]
+SUFFIXES = ["!", "\x00", ""]
+LENGTHS = [16, 24, 32, 10_000]
+
+
+def hostile_inputs():
+    for length in LENGTHS:
+        for pump in PUMPS:
+            for suffix in SUFFIXES:
+                yield pump * (length // len(pump)) + suffix
+
+
+def timed(match, text):
+    started = time.perf_counter()
+    match(text)
+    return time.perf_counter() - started
+
+
+def describe(text: str) -> str:
+    pump = next(pump for pump in reversed(PUMPS) if text.startswith(pump * 2) or text == pump)
+    suffix = text[len(text.rstrip("!\x00")):]
+    return f"{pump!r} x {len(text) - len(suffix)} + {suffix!r}"
+
+
+def main():
+    limit_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 1000.0
+    rules = RuleSet.from_file(RULES_PATH)
+    unguarded = GuardedMatcher(timeout_ms=limit_ms)
+    inputs = list(hostile_inputs())
+    # Boot the worker processes before timing anything
+    for rule in rules.rules.values():
+        unguarded.match(rule.pattern, "")
+        rule.matches("")
+
+    print(f"{'rule':<36}{'risk':<20}{'slowest input':<26}{'unguarded ms':>14}{'guarded ms':>12}")
+    for name, rule in rules.rules.items():
+        worst_text, worst = "", 0.0
+        for text in inputs:
+            elapsed = timed(lambda value: unguarded.match(rule.pattern, value), text)
+            if elapsed > worst:
+                worst_text, worst = text, elapsed
+        guarded = max(timed(rule.matches, text) for text in inputs)
+        stopped = ">" if worst * 1000 >= limit_ms else ""
+        print(f"{name:<36}{(rule.risk or '-')[:19]:<20}{describe(worst_text):<26}"
+              f"{stopped + format(worst * 1000, '.1f'):>14}{guarded * 1000:>12.1f}")
+    unguarded.close()
+
+
+if __name__ == "__main__":
+    main()
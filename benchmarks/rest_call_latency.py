@@ -0,0 +1,70 @@
+"""
+RESTCall latency with and without connection reuse
+
+Runs the api_call_nuclear_strike step against the local stub service, once
+through the shared keep-alive pool and once with pooling disabled (a new TCP
+connection per call, as a naive urllib call would do), and checks that the
+response mapping lands in the form data.
+
+Run from the repository root:
+    python benchmarks/rest_call_latency.py [calls]
+"""
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from approv.Http import ConnectionPool
+from approv.WorkflowStep import RESTCall
+from stub_service import start_stub_server
+
+
+def step_config(url):
+    return {
+        'class': 'RESTCall',
+        'url': f"{url}/strike",
+        'method': 'POST',
+        'timeout': 5,
+        'payload': {'general': 'general_confirmation', 'president': 'president_confirmation'},
+        'response': {'strike_id': 'id', 'strike_echo': 'received.president'},
+        'on_error': 'workflow_aborted',
+        'outputs': ['stop'],
+    }
+
+
+def measure(step, calls):
+    samples = []
+    form_data = {'general_confirmation': True, 'president_confirmation': True}
+    for _ in range(calls):
+        started = time.perf_counter()
+        next_status, decision = step.process(form_data)
+        samples.append(time.perf_counter() - started)
+        assert next_status == 'stop', decision
+    assert form_data['strike_echo'] is True and form_data['strike_id']
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    server, url = start_stub_server()
+    try:
+        pooled = RESTCall(step_config(url), pool=ConnectionPool())
+        unpooled = RESTCall(step_config(url), pool=ConnectionPool(max_idle_per_host=0))
+
+        for label, step in (("keep-alive pool", pooled), ("new connection", unpooled)):
+            median, p99 = measure(step, calls)
+            print(f"{label:16s} median {median * 1e6:8.1f} us   p99 {p99 * 1e6:8.1f} us")
+
+        failing = RESTCall({**step_config(url), 'url': f"{url}/fail"}, pool=ConnectionPool())
+        print(f"failing service  -> {failing.process({})}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
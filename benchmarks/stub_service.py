@@ -0,0 +1,107 @@
+"""
+Local stub HTTP service for RESTCall steps
+
+Speaks HTTP/1.1 with keep-alive, so it exercises connection reuse the way a
+real service would. Every request gets a JSON reply:
+
+    {"ok": true, "id": <request number>, "method": ..., "path": ...,
+     "query": {...}, "received": <decoded JSON body or null>}
+
+Paths starting with /fail answer 500, and ?delay=<seconds> (or the server
+wide delay) holds the reply back to simulate a slow service.
+
+Run from the repository root:
+    python benchmarks/stub_service.py [port] [delay]
+Then point a RESTCall step at it, e.g. url: http://127.0.0.1:8765/strike
+"""
+
+import itertools
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, Nagle plus
+    # delayed ACKs add ~40ms to every reply on a reused connection
+    disable_nagle_algorithm = True
+
+    def _reply(self):
+        parts = urlsplit(self.path)
+        query = dict(parse_qsl(parts.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            received = json.loads(raw) if raw else None
+        except ValueError:
+            received = raw.decode('utf-8', 'replace')
+
+        delay = float(query.get('delay', self.server.delay))
+        if delay:
+            time.sleep(delay)
+
+        status = 500 if parts.path.startswith('/fail') else 200
+        body = json.dumps({
+            'ok': status == 200,
+            'id': next(self.server.counter),
+            'method': self.command,
+            'path': parts.path,
+            'query': query,
+            'received': received,
+        }).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _reply
+    do_POST = _reply
+    do_PUT = _reply
+    do_PATCH = _reply
+    do_DELETE = _reply
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port: int = 0, delay: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Start the stub service on a background thread
+
+    Args:
+        port: Port to listen on (0 picks a free one)
+        delay: Seconds to wait before every reply
+
+    Returns:
+        Tuple of (server, base URL); call server.shutdown() when done
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.counter = itertools.count(1)
+    threading.Thread(target=server.serve_forever, name="stub-service", daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    server, url = start_stub_server(port, delay)
+    print(f"Stub service listening on {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
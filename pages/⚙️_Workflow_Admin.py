@@ -58,7 +58,7 @@ edit_node_name = st.selectbox("Select Node to Edit", list(workflow.keys()))
 selected_node = workflow[edit_node_name]
 with st.form('edit_node_form'):
     node_name = st.text_input("Node Name", value=edit_node_name)
-    node_class = st.selectbox("Node Class", ["Start", "Simple", "ExclusiveChoice", "RESTCall", "EmailNotify", "SMSNotify", "Cancel", "MultiChoice", "MutexChoice"], index=["Start", "Simple", "ExclusiveChoice", "RESTCall", "EmailNotify", "SMSNotify", "Cancel", "MultiChoice", "MutexChoice"].index(selected_node['class']))
+    node_class = st.selectbox("Node Class", ["Start", "Simple", "ExclusiveChoice", "RESTCall", "EmailNotify", "SMSNotify", "Cancel", "MultiChoice", "MutexChoice", "Join"], index=["Start", "Simple", "ExclusiveChoice", "RESTCall", "EmailNotify", "SMSNotify", "Cancel", "MultiChoice", "MutexChoice", "Join"].index(selected_node['class']))
     node_id = st.number_input("Node ID", value=selected_node['id'], format='%d')
     node_require_user_action = st.checkbox("Require User Action?", value=selected_node['require_user_action'])
     edit_node = st.form_submit_button("Edit Node")
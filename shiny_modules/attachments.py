@@ -0,0 +1,252 @@
+"""
+Content-addressed attachment storage for the Shiny BPMS app
+Keeps file_uploader and camera_input uploads on disk under their SHA-256
+digest, so form data only holds a reference and identical files are stored once
+"""
+
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+
+CHUNK_SIZE = 1024 * 1024
+
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+class Attachment(NamedTuple):
+    """Reference to a stored file, as kept in form data"""
+    sha256: str
+    name: str
+    size: int
+    type: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+def attachment_refs(value: Any) -> List[Attachment]:
+    """
+    Attachments referenced by a file field's value
+
+    Args:
+        value: Field value from form data (a list of attachment dicts);
+            anything else, such as upload info from before attachments were
+            stored, gives no attachments
+    """
+    refs = []
+    for item in value if isinstance(value, list) else ():
+        if isinstance(item, dict) and _DIGEST.fullmatch(str(item.get('sha256', ''))):
+            refs.append(Attachment(item['sha256'], str(item.get('name') or item['sha256']),
+                                   int(item.get('size') or 0), str(item.get('type') or "")))
+    return refs
+
+
+class AttachmentStore:
+    """
+    Files stored by content hash under <root>/sha256/<first two hex digits>/<digest>
+
+    Uploads are copied in chunks while being hashed, so a file is never held
+    in memory; a file whose digest is already stored is discarded, so the
+    same document attached to many instances takes its disk space once.
+    Stored files are never modified, which lets downloads map them into
+    memory and lets clients cache them for good.
+    """
+
+    def __init__(self, root: str = "attachments", chunk_size: int = CHUNK_SIZE):
+        """
+        Args:
+            root: Directory holding the stored files (created on first write)
+            chunk_size: Bytes read and written at a time
+        """
+        self.root = root
+        self.chunk_size = chunk_size
+
+    def path(self, digest: str) -> str:
+        """
+        Path of a stored file
+
+        Raises:
+            ValueError: If digest is not a lowercase hex SHA-256 digest
+        """
+        if not _DIGEST.fullmatch(digest):
+            raise ValueError(f"Invalid attachment digest: {digest!r}")
+        return os.path.join(self.root, "sha256", digest[:2], digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def put_file(self, source_path: str, name: Optional[str] = None, content_type: str = "") -> Attachment:
+        """
+        Store a file, reusing the stored copy if the same content is stored already
+
+        Args:
+            source_path: File to store (e.g. the temp file of a Shiny upload)
+            name: File name to keep in the reference (defaults to the source's)
+            content_type: MIME type to keep in the reference
+
+        Returns:
+            Attachment reference
+        """
+        incoming = os.path.join(self.root, "incoming")
+        os.makedirs(incoming, exist_ok=True)
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=incoming)
+        try:
+            with open(source_path, 'rb') as source, os.fdopen(fd, 'wb') as target:
+                while True:
+                    chunk = source.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    sha256.update(chunk)
+                    target.write(chunk)
+                    size += len(chunk)
+            digest = sha256.hexdigest()
+            path = self.path(digest)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.chmod(temp_path, 0o444)
+                # Atomic: a concurrent upload of the same content replaces it with identical bytes
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return Attachment(digest, name or os.path.basename(source_path), size, content_type or "")
+
+    def put_uploads(self, uploads: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Store the files of a Shiny file input
+
+        Args:
+            uploads: Value of input_file (dicts with name, size, type and datapath)
+
+        Returns:
+            Attachment dicts to keep in form data
+        """
+        return [self.put_file(upload['datapath'], upload.get('name'), upload.get('type') or "").to_dict()
+                for upload in uploads or ()]
+
+    def open_mapped(self, digest: str) -> Tuple[Optional[mmap.mmap], int]:
+        """
+        Memory-map a stored file read-only
+
+        Returns:
+            (map, size); the map is None for an empty file and must be closed
+            by the caller
+
+        Raises:
+            FileNotFoundError: If no file with that digest is stored
+        """
+        with open(self.path(digest), 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if not size:
+                return None, 0
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ), size
+
+    def iter_range(self, digest: str, start: int = 0, stop: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Bytes [start, stop) of a stored file in chunks, read from a memory map
+
+        Only one chunk is copied out of the page cache at a time.
+        """
+        mapped, size = self.open_mapped(digest)
+        if mapped is None:
+            return
+        try:
+            stop = size if stop is None else min(stop, size)
+            for offset in range(start, stop, self.chunk_size):
+                yield mapped[offset:min(offset + self.chunk_size, stop)]
+        finally:
+            mapped.close()
+
+
+# Attachments of all instances, next to bpms.db
+attachment_store = AttachmentStore()
+
+
+def attachment_url(attachment: Attachment, prefix: str = "attachments/") -> str:
+    """Relative download URL of an attachment (see with_attachment_endpoint)"""
+    return f"{prefix}{attachment.sha256}?name={quote(attachment.name)}"
+
+
+def _parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """[start, stop) of a single-range Range header, or None to send the whole file"""
+    match = _RANGE.match(header or "")
+    if not match or not size:
+        return None
+    first, last = match.groups()
+    if first:
+        start, stop = int(first), (int(last) + 1 if last else size)
+    elif last:
+        start, stop = max(size - int(last), 0), size
+    else:
+        return None
+    stop = min(stop, size)
+    return (start, stop) if start < stop else None
+
+
+def with_attachment_endpoint(app, store: Optional[AttachmentStore] = None, path: str = "/attachments/"):
+    """
+    Wrap an ASGI app so that GET <path><digest> downloads a stored attachment
+
+    The file is streamed from a memory map, a chunk at a time, with single
+    byte ranges supported (for PDF viewers). Content never changes for a
+    digest, so responses carry the digest as ETag and may be cached
+    indefinitely. The `name` query parameter sets the download file name.
+
+    Args:
+        app: The Shiny App (or any ASGI app)
+        store: Attachment store to serve (defaults to attachment_store)
+        path: URL prefix to serve attachments under
+
+    Returns:
+        ASGI callable
+    """
+    store = store or attachment_store
+
+    async def attachments_app(scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith(path):
+            await app(scope, receive, send)
+            return
+        request = Request(scope, receive)
+        digest = scope['path'][len(path):]
+        if request.method not in ('GET', 'HEAD'):
+            response = PlainTextResponse("Method Not Allowed", status_code=405)
+        elif not _DIGEST.fullmatch(digest) or not store.exists(digest):
+            response = PlainTextResponse("Not Found", status_code=404)
+        elif request.headers.get('if-none-match') == f'"{digest}"':
+            response = Response(status_code=304, headers={'ETag': f'"{digest}"'})
+        else:
+            size = os.path.getsize(store.path(digest))
+            name = request.query_params.get('name') or digest
+            headers = {
+                'ETag': f'"{digest}"',
+                'Cache-Control': 'private, max-age=31536000, immutable',
+                'Accept-Ranges': 'bytes',
+                'Content-Disposition': f"attachment; filename*=UTF-8''{quote(name)}",
+            }
+            byte_range = _parse_range(request.headers.get('range'), size)
+            start, stop = byte_range or (0, size)
+            headers['Content-Length'] = str(stop - start)
+            status = 200
+            if byte_range:
+                status = 206
+                headers['Content-Range'] = f"bytes {start}-{stop - 1}/{size}"
+            body = store.iter_range(digest, start, stop) if request.method == 'GET' else iter(())
+            # Sync iterator: Starlette reads it in a worker thread, so page faults do not block the loop
+            response = StreamingResponse(body, status_code=status, headers=headers,
+                                         media_type='application/octet-stream')
+        await response(scope, receive, send)
+
+    return attachments_app
@@ -0,0 +1,203 @@
+"""
+Audit trail queries for the Shiny BPMS app
+Searches the stored audit events (bpms_audit_log or the Parquet audit files)
+with the filters pushed down into DuckDB, returning results page by page
+"""
+
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from approv.Audit import format_times
+from .persistence import InstancePersistence
+
+AUDIT_RESULT_COLUMNS = ['instance', 'time', 'status', 'action', 'description', 'user']
+
+TimeBound = Union[date, datetime, None]
+
+
+class AuditFilter(NamedTuple):
+    """
+    Audit search criteria; None (or empty) fields do not filter
+
+    Dates are whole days in the server's local time: `since` from its first
+    moment, `until` up to and including its last.
+    """
+    instance_id: Optional[int] = None
+    user: Optional[str] = None
+    status: Optional[str] = None
+    action: Optional[str] = None
+    since: TimeBound = None
+    until: TimeBound = None
+
+
+class AuditPage(NamedTuple):
+    """One page of search results"""
+    frame: pd.DataFrame
+    page: int
+    page_size: int
+    has_more: bool
+
+
+def _utc_bound(value: TimeBound, end: bool = False) -> Optional[datetime]:
+    """Naive UTC datetime for a local date/datetime bound (as stored in the timestamp column)"""
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.combine(value + timedelta(days=1) if end else value, time())
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class AuditQuery:
+    """
+    Filtered, paged access to the persisted audit trail
+
+    Every filter becomes a bound parameter in the WHERE clause so DuckDB
+    evaluates it during the scan: the time range is checked against the
+    row group min/max of the timestamp column (and prunes date partitions
+    of Parquet audit files), and an instance filter uses the
+    process_instance_id index. Results are read a page or a batch at a time,
+    never materialized as a whole.
+    """
+
+    def __init__(self, persistence: InstancePersistence):
+        """
+        Args:
+            persistence: Persistence layer that owns the audit storage
+        """
+        self.persistence = persistence
+
+    def _where(self, criteria: AuditFilter, parquet: bool) -> Tuple[List[str], List[Any]]:
+        clauses, params = [], []
+        if criteria.instance_id is not None:
+            clauses.append("process_instance_id = ?")
+            params.append(int(criteria.instance_id))
+        for column, value in (('user_name', criteria.user), ('status', criteria.status),
+                              ('action', criteria.action)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        since = _utc_bound(criteria.since)
+        until = _utc_bound(criteria.until, end=True)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+            if parquet:
+                # Lets DuckDB skip whole date=... partitions
+                clauses.append("date >= ?")
+                params.append(since.date())
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+            if parquet:
+                clauses.append("date <= ?")
+                params.append(until.date())
+        return clauses, params
+
+    def _select(self, criteria: AuditFilter) -> Optional[Tuple[str, List[str], List[Any], List[str]]]:
+        """
+        Source, WHERE clauses, their parameters and the key columns that order
+        events newest first (None when nothing is stored)
+
+        Events recorded since the last background flush are not stored yet,
+        so they show up after the persistence thread's next flush.
+        """
+        source = self.persistence.audit_source(row_ids=True)
+        if source is None:
+            return None
+        table = source == "bpms_audit_log"
+        clauses, params = self._where(criteria, parquet=not table)
+        # Parquet files have no audit_id; the file and row within it break ties instead
+        keys = ['timestamp', 'audit_id'] if table else ['timestamp', 'filename', 'file_row_number']
+        return source, clauses, params, keys
+
+    @staticmethod
+    def _sql(source: str, clauses: List[str], keys: List[str], limit: str) -> str:
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        return f"""
+            SELECT process_instance_id, epoch_ns(timestamp), status, action, comments, user_name, {', '.join(keys)}
+            FROM {source}{where}
+            ORDER BY {', '.join(f'{key} DESC' for key in keys)}
+            {limit}
+        """
+
+    @staticmethod
+    def _frame(rows: List[Tuple]) -> pd.DataFrame:
+        if not rows:
+            return pd.DataFrame(columns=AUDIT_RESULT_COLUMNS)
+        instance_ids, times, statuses, actions, comments, users = zip(*rows)
+        return pd.DataFrame({
+            'instance': instance_ids,
+            'time': format_times(np.asarray(times, dtype=np.int64)),
+            'status': statuses,
+            'action': actions,
+            'description': comments,
+            'user': users,
+        }, columns=AUDIT_RESULT_COLUMNS)
+
+    def page(self, criteria: AuditFilter, page: int = 0, page_size: int = 100) -> AuditPage:
+        """
+        One page of matching events, newest first
+
+        Args:
+            criteria: Search filters
+            page: Zero-based page number
+            page_size: Events per page
+
+        Returns:
+            AuditPage; has_more tells whether a next page exists
+        """
+        page = max(page, 0)
+        select = self._select(criteria)
+        if select is None:
+            return AuditPage(self._frame([]), page, page_size, False)
+        source, clauses, params, keys = select
+        with self.persistence.db_manager.connection(read_only=True) as con:
+            # One extra row tells whether there is a next page
+            rows = con.execute(self._sql(source, clauses, keys, "LIMIT ? OFFSET ?"),
+                               params + [page_size + 1, page * page_size]).fetchall()
+        return AuditPage(self._frame([row[:6] for row in rows[:page_size]]), page, page_size,
+                         len(rows) > page_size)
+
+    def stream(self, criteria: AuditFilter, batch_size: int = 10000) -> Iterator[pd.DataFrame]:
+        """
+        All matching events, newest first, as DataFrames of up to batch_size rows
+
+        Each batch is read with its own short-lived connection and continues
+        after the key of the previous batch's last row (keyset pagination),
+        so the database is not held while the caller consumes a batch, and
+        an abandoned iterator holds nothing.
+        """
+        select = self._select(criteria)
+        if select is None:
+            return
+        source, clauses, params, keys = select
+        after: Optional[Tuple] = None
+        while True:
+            batch_clauses, batch_params = clauses, params
+            if after is not None:
+                placeholders = ', '.join('?' * len(keys))
+                # The plain timestamp bound lets DuckDB prune row groups and partitions
+                batch_clauses = clauses + ["timestamp <= ?", f"({', '.join(keys)}) < ({placeholders})"]
+                batch_params = params + [after[0], *after]
+            with self.persistence.db_manager.connection(read_only=True) as con:
+                rows = con.execute(self._sql(source, batch_clauses, keys, "LIMIT ?"),
+                                   batch_params + [batch_size]).fetchall()
+            if not rows:
+                return
+            yield self._frame([row[:6] for row in rows])
+            if len(rows) < batch_size:
+                return
+            after = rows[-1][6:]
+
+    def count(self, criteria: AuditFilter) -> int:
+        """Number of matching events"""
+        select = self._select(criteria)
+        if select is None:
+            return 0
+        source, clauses, params, _ = select
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        with self.persistence.db_manager.connection(read_only=True) as con:
+            return con.execute(f"SELECT count(*) FROM {source}{where}", params).fetchone()[0]
@@ -0,0 +1,186 @@
+"""
+Paginated audit trail display for the Shiny BPMS app
+Renders one page of an instance's audit trail at a time from cached frames
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Tuple
+
+import pandas as pd
+from shiny import reactive, render, ui
+
+from approv.Audit import AUDIT_COLUMNS, AuditTrail
+
+DEFAULT_PAGE_SIZE = 50
+
+
+class AuditPageCache:
+    """
+    LRU cache of decoded audit pages
+
+    Audit trails are append-only, so a full page never changes once decoded
+    and is served from the cache; only the last, still-growing page is
+    extended with the rows added since it was cached. Rendering a page
+    therefore costs at most one page of decoding, however long the trail.
+    """
+
+    def __init__(self, page_size: int = DEFAULT_PAGE_SIZE, max_pages: int = 512):
+        self.page_size = page_size
+        self.max_pages = max_pages
+        # (id(trail), page) -> (trail, frame)
+        self._pages: "OrderedDict[Tuple[int, int], Tuple[Any, pd.DataFrame]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def page_count(self, trail) -> int:
+        """Number of pages of a trail (at least 1, for the empty page)"""
+        return max(1, -(-len(trail) // self.page_size))
+
+    def page(self, trail, page: int) -> pd.DataFrame:
+        """
+        Get one page of a trail as a DataFrame
+
+        Args:
+            trail: AuditTrail (or a plain list of audit entry dicts)
+            page: Zero-based page number; clamped to the existing pages
+
+        Returns:
+            DataFrame with the AUDIT_COLUMNS
+        """
+        page = min(max(page, 0), self.page_count(trail) - 1)
+        start = page * self.page_size
+        stop = min(start + self.page_size, len(trail))
+        if stop <= start:
+            return pd.DataFrame(columns=AUDIT_COLUMNS)
+
+        key = (id(trail), page)
+        with self._lock:
+            cached = self._pages.get(key)
+            if cached is not None and cached[0] is trail:
+                self._pages.move_to_end(key)
+                frame = cached[1]
+            else:
+                frame = None
+
+        if frame is not None and len(frame) == stop - start:
+            return frame
+        if frame is not None and len(frame) < stop - start:
+            # Append only the rows added to the page since it was cached
+            new_rows = self._decode(trail, start + len(frame), stop)
+            frame = pd.concat([frame, new_rows], ignore_index=True)
+        else:
+            frame = self._decode(trail, start, stop)
+
+        with self._lock:
+            self._pages[key] = (trail, frame)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        return frame
+
+    def _decode(self, trail, start: int, stop: int) -> pd.DataFrame:
+        if isinstance(trail, AuditTrail):
+            return trail.to_frame(start, stop)
+        return pd.DataFrame(list(trail[start:stop]), columns=AUDIT_COLUMNS)
+
+
+# Pages shared by all sessions (several users may watch the same instance)
+page_cache = AuditPageCache()
+
+
+def audit_pager_ui(output_id: str) -> ui.Tag:
+    """
+    Audit table with pager controls
+
+    Args:
+        output_id: Id of the data frame output; the controls use it as prefix
+    """
+    return ui.div(
+        ui.output_data_frame(output_id),
+        ui.div(
+            ui.input_action_button(f"{output_id}_first", "⏮", class_="btn btn-sm btn-outline-secondary"),
+            ui.input_action_button(f"{output_id}_prev", "◀", class_="btn btn-sm btn-outline-secondary"),
+            ui.output_text(f"{output_id}_page_info", inline=True),
+            ui.input_action_button(f"{output_id}_next", "▶", class_="btn btn-sm btn-outline-secondary"),
+            ui.input_action_button(f"{output_id}_latest", "⏭", class_="btn btn-sm btn-outline-secondary"),
+            class_="d-flex align-items-center gap-2",
+            style="margin-top: 0.5rem;"
+        )
+    )
+
+
+class AuditPager:
+    """
+    Server side of audit_pager_ui: renders the selected page of a trail
+
+    The pager follows the newest page until the user moves to an earlier
+    one, and re-renders when the trail's version changes.
+    """
+
+    def __init__(self, output_id: str, trail: Callable[[], Any], version: Callable[[], int],
+                 cache: AuditPageCache = page_cache):
+        """
+        Args:
+            output_id: Id passed to audit_pager_ui
+            trail: Reactive callable returning the AuditTrail to show
+            version: Reactive callable that changes whenever an event is recorded
+            cache: Page cache to render from
+        """
+        self.output_id = output_id
+        self.trail = trail
+        self.version = version
+        self.cache = cache
+        # Selected page, or None to follow the newest page
+        self.selected_page = reactive.Value(None)
+
+    def _current(self) -> Tuple[Any, int, int]:
+        self.version()
+        trail = self.trail()
+        pages = self.cache.page_count(trail)
+        selected = self.selected_page()
+        page = pages - 1 if selected is None else min(selected, pages - 1)
+        return trail, page, pages
+
+    def setup(self, input, output):
+        """Register the table, the page info text and the pager buttons"""
+
+        @output(id=self.output_id)
+        @render.data_frame
+        def _audit_page():
+            trail, page, _ = self._current()
+            return self.cache.page(trail, page)
+
+        @output(id=f"{self.output_id}_page_info")
+        @render.text
+        def _audit_page_info():
+            trail, page, pages = self._current()
+            total = len(trail)
+            if not total:
+                return "No audit events"
+            first = page * self.cache.page_size + 1
+            last = min(first + self.cache.page_size - 1, total)
+            return f"Events {first}–{last} of {total} · page {page + 1} of {pages}"
+
+        @reactive.Effect
+        @reactive.event(input[f"{self.output_id}_first"])
+        def _first_page():
+            self.selected_page.set(0)
+
+        @reactive.Effect
+        @reactive.event(input[f"{self.output_id}_prev"])
+        def _previous_page():
+            _, page, _ = self._current()
+            self.selected_page.set(max(page - 1, 0))
+
+        @reactive.Effect
+        @reactive.event(input[f"{self.output_id}_next"])
+        def _next_page():
+            _, page, pages = self._current()
+            self.selected_page.set(None if page + 1 >= pages - 1 else page + 1)
+
+        @reactive.Effect
+        @reactive.event(input[f"{self.output_id}_latest"])
+        def _latest_page():
+            self.selected_page.set(None)
+
+        return _audit_page
@@ -0,0 +1,230 @@
+"""
+Bulk decisions for the Shiny BPMS app
+Evaluates a decision node for many waiting instances at once with pandas
+"""
+
+import time
+from typing import Dict, Any, Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from approv.Metrics import check_permission
+from approv.WorkflowGraph import CompiledWorkflow
+from approv.WorkflowStep import evaluate_condition
+from .instances import WorkflowInstanceStore
+
+
+def _elementwise(operator: str, column: pd.Series, value: Any) -> pd.Series:
+    """Row-by-row fallback with the same semantics as evaluate_condition"""
+    def matches(attribute_value):
+        try:
+            return bool(evaluate_condition(operator, attribute_value, value))
+        except TypeError:
+            return False
+    return column.map(matches).astype(bool)
+
+
+def _compare(compare: Callable[[pd.Series, Any], pd.Series]) -> Callable[[pd.Series, Any], pd.Series]:
+    def vectorized(column: pd.Series, value: Any) -> pd.Series:
+        return compare(column, value).fillna(False).astype(bool)
+    return vectorized
+
+
+def _contains(column: pd.Series, value: Any) -> pd.Series:
+    if isinstance(value, str) and pd.api.types.is_string_dtype(column):
+        # Non-string cells (lists, None) become NaN and are handled below
+        result = column.str.contains(value, regex=False)
+        if result.isna().any():
+            missing = result.isna()
+            result = result.where(~missing, _elementwise("Contains", column[missing], value))
+        return result.astype(bool)
+    return _elementwise("Contains", column, value)
+
+
+def _in_list(column: pd.Series, value: Any) -> pd.Series:
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return column.isin(list(value))
+    # `in` on a string is a substring test (and on a dict a key test), not list membership
+    return _elementwise("InList", column, value)
+
+
+# Operator name -> vectorized predicate(column, condition_value), mirroring
+# the operators of ShinyWorkflow.evaluate_condition
+VECTOR_OPERATORS: Dict[str, Callable[[pd.Series, Any], pd.Series]] = {
+    "Equal": _compare(lambda column, value: column == value),
+    "GreaterThan": _compare(lambda column, value: column > value),
+    "LessThan": _compare(lambda column, value: column < value),
+    "GreaterThanOrEqual": _compare(lambda column, value: column >= value),
+    "LessThanOrEqual": _compare(lambda column, value: column <= value),
+    "Contains": _contains,
+    "InList": _in_list,
+}
+
+
+def evaluate_decisions(graph: CompiledWorkflow, node_name: str, frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Evaluate a decision node's conditions for every row of a DataFrame
+
+    The first declared matching condition wins for each row, as in
+    ExclusiveChoice.process; rows matching nothing take the default branch.
+
+    Args:
+        graph: Compiled workflow the node belongs to
+        node_name: Name of the decision node
+        frame: One row per instance, with columns for the form fields
+
+    Returns:
+        DataFrame with 'condition' and 'next_status' columns, aligned with frame
+
+    Raises:
+        ValueError: If the node is not a decision node, or frame has no
+            column for an attribute its conditions test
+    """
+    step = graph.node(node_name).step
+    if not hasattr(step, 'router'):
+        raise ValueError(f"Node '{node_name}' is not a decision node")
+
+    for condition_name, _, attribute, _, _ in step.conditions:
+        if attribute not in frame.columns:
+            # Checked up front, so the error does not depend on which rows the frame holds
+            raise ValueError(f"Condition '{condition_name}' of node '{node_name}' needs a '{attribute}' column")
+
+    count = len(frame)
+    conditions = np.full(count, "default", dtype=object)
+    next_statuses = np.full(count, step.default, dtype=object)
+    decided = np.zeros(count, dtype=bool)
+
+    for condition_name, operator, attribute, value, next_status in step.conditions:
+        if operator not in VECTOR_OPERATORS:
+            # Unknown operators never match (see evaluate_condition)
+            continue
+        column = frame[attribute]
+        try:
+            matched = VECTOR_OPERATORS[operator](column, value)
+        except (TypeError, ValueError):
+            # Mixed column types the vectorized comparison cannot handle
+            matched = _elementwise(operator, column, value)
+        mask = matched.to_numpy(dtype=bool) & ~decided
+        conditions[mask] = condition_name
+        next_statuses[mask] = next_status
+        decided |= mask
+        if decided.all():
+            break
+
+    return pd.DataFrame({'condition': conditions, 'next_status': next_statuses}, index=frame.index)
+
+
+def _decide(graph: CompiledWorkflow, instance, values: Dict[str, Any], condition_name: str, next_status: str,
+            user_role: str, timestamp: int):
+    """Take one instance's decision and the automated steps after it; the instance is unchanged if a step raises"""
+    # The transitions are worked out on a copy of the form data
+    form_data = {**instance.form_data, **values}
+    transitions = [(graph.resolve(next_status), f"Decision made: {condition_name}")]
+
+    # Run the automated steps that follow, as process_workflow would
+    current = graph.nodes[transitions[-1][0]]
+    while not (current.id == graph.stop_id or current.require_user_action or current.pacing):
+        next_id, decision = graph.advance(current.id, form_data)
+        transitions.append((next_id, decision))
+        current = graph.nodes[next_id]
+
+    instance.form_data.update(form_data)
+    for node_id, decision in transitions:
+        instance.status = graph.nodes[node_id].name
+        instance.form_data['status'] = instance.status
+        instance.audit.record(instance.status, decision, "Bulk decision", user_role, timestamp,
+                              form_data=instance.form_data)
+    instance.touch()
+
+
+def bulk_decide(store: WorkflowInstanceStore, graph: CompiledWorkflow, node_name: str, frame: pd.DataFrame,
+                user_role: str, id_column: str = 'instance_id') -> pd.DataFrame:
+    """
+    Decide many instances waiting at the same decision node in one batch
+
+    Conditions are evaluated column-wise over the whole frame, then each
+    instance takes its transition (and any automated steps after it), and
+    the state changes are handed to the store as a batch. Like a single
+    decision, conditions see each instance's stored form data; the frame's
+    columns override it.
+
+    Args:
+        store: Store holding the instances
+        graph: Compiled workflow the instances run on
+        node_name: Decision node the instances are waiting at
+        frame: Form data to set, one row per instance, with an id column
+        user_role: Role of the user making the bulk decision
+        id_column: Column holding the instance ids
+
+    An instance that another session is processing, or whose automated
+    steps raise, is not changed (applied is False and error holds the
+    message); the others are still decided.
+
+    Returns:
+        DataFrame with instance_id, condition, status (after the batch),
+        applied and error columns
+
+    Raises:
+        PermissionError: If the role may not act on the node
+        ValueError: If the node is not a decision node
+    """
+    node = graph.node(node_name)
+    if not check_permission(node, user_role):
+        raise PermissionError("User does not have permission to execute this step.")
+
+    instances = [store.get(int(instance_id)) for instance_id in frame[id_column]]
+    evaluation = frame
+    conditions = getattr(node.step, 'conditions', ())
+    stored = {attribute for _, _, attribute, _, _ in conditions if attribute not in frame.columns}
+    if stored:
+        # Attributes the frame does not set are read from the instances, as form_data.get would
+        evaluation = frame.assign(**{attribute: pd.Series(
+            [instance.form_data.get(attribute) if instance is not None else None for instance in instances],
+            index=frame.index) for attribute in stored})
+    decisions = evaluate_decisions(graph, node_name, evaluation)
+    field_columns = [column for column in frame.columns if column != id_column]
+    # to_dict gives no records at all for a frame of ids only
+    records = frame[field_columns].to_dict('records') if field_columns else [{} for _ in range(len(frame))]
+    timestamp = time.time_ns()
+
+    touched = []
+    final_statuses: List[Optional[str]] = []
+    applied: List[bool] = []
+    errors: List[Optional[str]] = []
+
+    try:
+        for instance, values, condition_name, next_status in zip(
+                instances, records, decisions['condition'], decisions['next_status']):
+            if instance is None or instance.status != node_name:
+                # Unknown instance or one that already moved on
+                final_statuses.append(instance.status if instance is not None else None)
+                applied.append(False)
+                errors.append(None)
+                continue
+
+            try:
+                with instance.claim(node_name):
+                    _decide(graph, instance, values, condition_name, next_status, user_role, timestamp)
+            except Exception as e:
+                # Another session has the instance, or its automated steps failed
+                final_statuses.append(instance.status)
+                applied.append(False)
+                errors.append(str(e))
+                continue
+
+            touched.append(instance)
+            final_statuses.append(instance.status)
+            applied.append(True)
+            errors.append(None)
+    finally:
+        # Instances already decided are saved even if the batch is cut short
+        store.save_many(touched)
+
+    return pd.DataFrame({
+        'instance_id': frame[id_column].to_numpy(),
+        'condition': decisions['condition'].to_numpy(),
+        'status': final_statuses,
+        'applied': applied,
+        'error': errors,
+    })
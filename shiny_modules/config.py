@@ -1,14 +1,57 @@
 """
 Configuration management for Shiny BPMS app
 Migrated from Streamlit configuration loading
+
+Configuration files are re-read only when they change on disk (modification
+time first, then content hash), and each new version is compiled once and
+published as a ConfigSnapshot for running sessions to switch to.
 """
 
 import yaml
 import json
 import duckdb
-from typing import Dict, Any, Tuple
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
 from pathlib import Path
 
+from approv.FormCodec import FormCodec, form_codec
+from approv.FormPlan import compile_form
+from approv.Validation import form_validator
+from approv.WorkflowGraph import CompiledWorkflow, compile_workflow
+
+# Seconds between checks of the configuration files for changes
+CONFIG_POLL_SECS = 5.0
+
+# ConfigManager attribute, file and parser of each configuration file
+_CONFIG_FILES = (
+    ('workflow_config', 'workflow.yaml', yaml.safe_load),
+    ('form_config', 'form.yaml', yaml.safe_load),
+    ('form_data', 'data.json', json.loads),
+)
+
+
+class _FileState(NamedTuple):
+    """What was last read of a configuration file (mtime_ns None: the file was missing)"""
+    mtime_ns: Optional[int]
+    size: int
+    digest: Optional[str]
+    value: Any
+
+
+class ConfigSnapshot(NamedTuple):
+    """One version of the configurations, with what is compiled from them"""
+    version: int
+    workflow_config: Dict[str, Any]
+    form_config: Dict[str, Any]
+    # Initial form data (data.json), coerced to the form's types
+    form_data: Dict[str, Any]
+    graph: CompiledWorkflow
+    codec: FormCodec
+
+
 class ConfigManager:
     """Centralized configuration management for the BPMS application"""
     
@@ -16,41 +59,90 @@ class ConfigManager:
         self.workflow_config = {}
         self.form_config = {}
         self.form_data = {}
+        # Incremented whenever a configuration changes
+        self.version = 0
+        self._files: Dict[str, _FileState] = {}
+        self._snapshot: Optional[ConfigSnapshot] = None
+        self._lock = threading.RLock()
         self._load_all_configs()
     
     def _load_all_configs(self):
         """Load all configuration files"""
         try:
-            self.workflow_config = self._load_yaml('workflow.yaml')
-            self.form_config = self._load_yaml('form.yaml')
-            self.form_data = self._load_json('data.json')
+            self.check_for_changes()
         except Exception as e:
             print(f"Warning: Error loading configurations: {e}")
             self._set_defaults()
     
-    def _load_yaml(self, filename: str) -> Dict[str, Any]:
-        """Load YAML configuration file"""
+    def check_for_changes(self) -> int:
+        """
+        Reparse the configuration files that changed on disk
+        
+        A file whose modification time and size are unchanged is not read;
+        one that was touched but has the same content hash is not reparsed.
+        A file that fails to parse, or goes missing, keeps its previous
+        version (an empty configuration on first load).
+        
+        Returns:
+            The configuration version, incremented if any file changed
+        """
+        with self._lock:
+            changed = False
+            for attribute, filename, parse in _CONFIG_FILES:
+                value = self._load_file(filename, parse)
+                if value is not getattr(self, attribute):
+                    setattr(self, attribute, value)
+                    changed = True
+            if changed:
+                self.version += 1
+            return self.version
+    
+    def _load_file(self, filename: str, parse: Callable[[str], Any]) -> Any:
+        """Parsed content of a file, reusing the previous parse while the file is unchanged"""
+        previous = self._files.get(filename)
         try:
-            with open(filename, 'r') as f:
-                return yaml.safe_load(f.read())
+            stat = os.stat(filename)
         except FileNotFoundError:
-            print(f"Warning: {filename} not found")
-            return {}
-        except yaml.YAMLError as e:
-            print(f"Warning: Error parsing {filename}: {e}")
-            return {}
+            if previous is None or previous.mtime_ns is not None:
+                print(f"Warning: {filename} not found")
+            value = previous.value if previous is not None else {}
+            self._files[filename] = _FileState(None, 0, None, value)
+            return value
+        if previous is not None and (previous.mtime_ns, previous.size) == (stat.st_mtime_ns, stat.st_size):
+            return previous.value
+        
+        with open(filename, 'rb') as f:
+            content = f.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if previous is not None and previous.digest == digest:
+            value = previous.value
+        else:
+            try:
+                value = parse(content.decode('utf-8'))
+            except (yaml.YAMLError, json.JSONDecodeError, UnicodeDecodeError) as e:
+                if previous is not None and previous.digest is not None:
+                    print(f"Warning: Error parsing {filename}: {e}; keeping the previous version")
+                    value = previous.value
+                else:
+                    print(f"Warning: Error parsing {filename}: {e}")
+                    value = {}
+        self._files[filename] = _FileState(stat.st_mtime_ns, stat.st_size, digest, value)
+        return value
+    
+    def _remember(self, filename: str, value: Any):
+        """Record a file this process wrote, so that the next check does not reparse it"""
+        stat = os.stat(filename)
+        with open(filename, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._files[filename] = _FileState(stat.st_mtime_ns, stat.st_size, digest, value)
+    
+    def _load_yaml(self, filename: str) -> Dict[str, Any]:
+        """Load YAML configuration file"""
+        return self._load_file(filename, yaml.safe_load)
     
     def _load_json(self, filename: str) -> Dict[str, Any]:
         """Load JSON data file"""
-        try:
-            with open(filename, 'r') as f:
-                return json.loads(f.read())
-        except FileNotFoundError:
-            print(f"Warning: {filename} not found")
-            return {}
-        except json.JSONDecodeError as e:
-            print(f"Warning: Error parsing {filename}: {e}")
-            return {}
+        return self._load_file(filename, json.loads)
     
     def _set_defaults(self):
         """Set default configurations if files are missing"""
@@ -60,6 +152,11 @@ class ConfigManager:
                     'class': 'Start',
                     'id': 1,
                     'require_user_action': False
+                },
+                'stop': {
+                    'class': 'Stop',
+                    'id': 8888,
+                    'require_user_action': False
                 }
             }
         }
@@ -84,10 +181,13 @@ class ConfigManager:
     def save_workflow_config(self, config: Dict[str, Any]) -> bool:
         """Save workflow configuration to YAML file"""
         try:
-            with open('workflow.yaml', 'w') as f:
-                yaml.dump(config, f, default_flow_style=False, indent=2)
-            # Update internal configuration
-            self.workflow_config = config
+            with self._lock:
+                with open('workflow.yaml', 'w') as f:
+                    yaml.dump(config, f, default_flow_style=False, indent=2)
+                # Update internal configuration; running sessions switch to it
+                self._remember('workflow.yaml', config)
+                self.workflow_config = config
+                self.version += 1
             return True
         except Exception as e:
             print(f"Error saving workflow config: {e}")
@@ -102,19 +202,84 @@ class ConfigManager:
         return self.form_data.copy()
     
     def reload_configs(self):
-        """Reload all configurations from files"""
+        """Reload the configurations whose files changed (see check_for_changes)"""
         self._load_all_configs()
+    
+    def snapshot(self) -> ConfigSnapshot:
+        """
+        The current configurations, compiled
+        
+        Each version is compiled once: the workflow graph, the form's plan,
+        codec and validator (compile_form and form_validator cache them for
+        the sessions that build forms from it). A reloaded workflow or form
+        that does not compile is reported and the previous one kept, so a
+        bad edit does not break running sessions.
+        
+        Raises:
+            ValueError, KeyError: If the configurations do not compile on first load
+        """
+        with self._lock:
+            previous = self._snapshot
+            if previous is not None and previous.version == self.version:
+                return previous
+            
+            workflow_config, graph = self.workflow_config, None
+            if previous is not None and previous.workflow_config is workflow_config:
+                graph = previous.graph
+            if graph is None:
+                try:
+                    graph = compile_workflow(workflow_config)
+                except Exception as e:
+                    if previous is None:
+                        raise
+                    print(f"Warning: Reloaded workflow configuration not applied: {e}")
+                    workflow_config, graph = previous.workflow_config, previous.graph
+            
+            form_config, codec = self.form_config, None
+            if previous is not None and previous.form_config is form_config:
+                codec = previous.codec
+            if codec is None:
+                try:
+                    compile_form(form_config)
+                    codec = form_codec(form_config)
+                except Exception as e:
+                    if previous is None:
+                        raise
+                    print(f"Warning: Reloaded form configuration not applied: {e}")
+                    form_config, codec = previous.form_config, previous.codec
+                try:
+                    form_validator(form_config)
+                except ValueError:
+                    # Forms with invalid rules are used without validation (see ShinyForm)
+                    pass
+            
+            form_data = codec.coerce(self.form_data)
+            self._snapshot = ConfigSnapshot(self.version, workflow_config, form_config, form_data, graph, codec)
+            return self._snapshot
 
 class DatabaseManager:
     """Database connection and query management"""
     
     def __init__(self, db_path: str = 'bpms.db'):
         self.db_path = db_path
+        # DuckDB refuses read-only and read-write connections to the same file
+        # at the same time within one process, so connections are serialized
+        self._lock = threading.RLock()
     
     def get_connection(self, read_only: bool = True):
         """Get DuckDB connection"""
         return duckdb.connect(self.db_path, read_only=read_only)
     
+    @contextmanager
+    def connection(self, read_only: bool = True):
+        """Open a DuckDB connection that is closed (and released) on exit"""
+        with self._lock:
+            con = self.get_connection(read_only=read_only)
+            try:
+                yield con
+            finally:
+                con.close()
+    
     def execute_query(self, query: str):
         """Execute SQL query and return DataFrame - raises exceptions for proper error handling"""
         # Security: Reject multi-statement queries
@@ -127,12 +292,8 @@ class DatabaseManager:
         if ';' in query_clean:
             raise ValueError("Multi-statement queries are not allowed for security reasons")
             
-        con = self.get_connection(read_only=True)
-        try:
-            result = con.sql(query).df()
-            return result
-        finally:
-            con.close()
+        with self.connection(read_only=True) as con:
+            return con.sql(query).df()
     
     def get_users(self):
         """Get users from database"""
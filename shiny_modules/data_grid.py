@@ -0,0 +1,326 @@
+"""
+Server-side data grid for the Shiny BPMS app
+Shows large dataframe fields a window of rows at a time: the rows stay on
+the server, which sorts and filters them and sends only what is scrolled into view
+"""
+
+import html
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from htmltools import HTMLDependency
+from shiny import reactive, render, ui
+
+DEFAULT_WINDOW_ROWS = 60
+DEFAULT_ROW_HEIGHT = 32
+DEFAULT_HEIGHT = 400
+
+# Reports the first visible row of a scrolled grid (debounced) and header
+# clicks; scroll events do not bubble, so they are caught in the capture phase
+_GRID_HEAD = """
+<style>
+.approv-grid-scroll { overflow-y: auto; position: relative; border: 1px solid #dee2e6; }
+.approv-grid table { table-layout: fixed; width: 100%; margin: 0; }
+.approv-grid td, .approv-grid th { white-space: nowrap; overflow: hidden; text-overflow: ellipsis; padding: 0 0.5rem; }
+.approv-grid th[data-grid-sort] { cursor: pointer; user-select: none; }
+</style>
+<script>
+(function () {
+  if (window.approvDataGrid) { return; }
+  window.approvDataGrid = true;
+  var timers = {};
+  document.addEventListener("scroll", function (event) {
+    var box = event.target;
+    if (!box.classList || !box.classList.contains("approv-grid-scroll")) { return; }
+    var grid = box.dataset.grid, rowHeight = Number(box.dataset.rowHeight);
+    clearTimeout(timers[grid]);
+    timers[grid] = setTimeout(function () {
+      Shiny.setInputValue(grid + "_first", Math.floor(box.scrollTop / rowHeight));
+    }, 50);
+  }, true);
+  document.addEventListener("click", function (event) {
+    var header = event.target.closest && event.target.closest("th[data-grid-sort]");
+    if (header) {
+      Shiny.setInputValue(header.dataset.grid + "_sort", header.dataset.gridSort, {priority: "event"});
+    }
+  });
+})();
+</script>
+"""
+
+grid_dependency = HTMLDependency("approv-data-grid", "1.0.0", head=ui.HTML(_GRID_HEAD))
+
+
+def to_frame(value: Any) -> pd.DataFrame:
+    """
+    A dataframe field's value as a DataFrame with a RangeIndex
+
+    Args:
+        value: DataFrame, list of row dicts or dict of columns (as stored in
+            form data); None or empty gives an empty frame
+    """
+    if isinstance(value, pd.DataFrame):
+        frame = value
+    elif value is None or (hasattr(value, '__len__') and not len(value)):
+        return pd.DataFrame()
+    else:
+        frame = pd.DataFrame(value)
+    if not isinstance(frame.index, pd.RangeIndex) or frame.index.start != 0 or frame.index.step != 1:
+        frame = frame.reset_index(drop=True)
+    return frame
+
+
+class FrameCache:
+    """
+    Frames built from form data values, shared by all sessions
+
+    Values are keyed by identity, like the audit pages, so several users
+    looking at the same instance share one frame. A value is expected to be
+    replaced rather than edited when it changes; rows appended in place are
+    picked up through the length.
+    """
+
+    def __init__(self, max_frames: int = 16):
+        self.max_frames = max_frames
+        # id(value) -> (value, its length, frame)
+        self._frames: "OrderedDict[int, Tuple[Any, int, pd.DataFrame]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def frame(self, value: Any) -> pd.DataFrame:
+        if value is None:
+            return pd.DataFrame()
+        key = id(value)
+        with self._lock:
+            cached = self._frames.get(key)
+            if cached is not None and cached[0] is value and cached[1] == len(value):
+                self._frames.move_to_end(key)
+                return cached[2]
+        frame = to_frame(value)
+        with self._lock:
+            self._frames[key] = (value, len(value), frame)
+            while len(self._frames) > self.max_frames:
+                self._frames.popitem(last=False)
+        return frame
+
+
+frame_cache = FrameCache()
+
+
+class GridView(NamedTuple):
+    """A frame with the row order left by the current filter and sort"""
+    frame: pd.DataFrame
+    # Row positions in display order; None for all rows in frame order
+    order: Optional[np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.frame) if self.order is None else len(self.order)
+
+    def rows(self, start: int, stop: int) -> pd.DataFrame:
+        if self.order is None:
+            return self.frame.iloc[start:stop]
+        return self.frame.iloc[self.order[start:stop]]
+
+
+def filter_rows(frame: pd.DataFrame, text: str) -> Optional[np.ndarray]:
+    """
+    Positions of the rows with a cell containing text (case-insensitive)
+
+    Returns:
+        Row positions, or None when text is empty (all rows)
+    """
+    text = (text or "").strip()
+    if not text or frame.empty:
+        return None
+    mask = np.zeros(len(frame), dtype=bool)
+    for column in frame.columns:
+        cells = frame[column].astype(str)
+        mask |= cells.str.contains(text, case=False, regex=False).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def sort_rows(frame: pd.DataFrame, order: Optional[np.ndarray], column: str, ascending: bool) -> np.ndarray:
+    """
+    Row positions sorted by one column (stable, missing values last)
+
+    Args:
+        frame: Frame with a RangeIndex (see to_frame)
+        order: Positions to sort, or None for all rows
+        column: Column to sort by
+        ascending: Sort direction
+    """
+    values = frame[column] if order is None else frame[column].take(order)
+    try:
+        ordered = values.sort_values(ascending=ascending, kind='stable', na_position='last')
+    except TypeError:
+        # Mixed types in an object column: compare as text
+        ordered = values.astype(str).sort_values(ascending=ascending, kind='stable')
+    return ordered.index.to_numpy()
+
+
+def _cell(value: Any) -> str:
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return html.escape(str(value))
+
+
+def data_grid_ui(grid_id: str, height: int = DEFAULT_HEIGHT, row_height: int = DEFAULT_ROW_HEIGHT) -> ui.Tag:
+    """
+    Scrollable grid whose rows are rendered on demand by DataGrid
+
+    Args:
+        grid_id: Id of the grid; its outputs and inputs use it as prefix
+        height: Height of the scroll area in pixels
+        row_height: Height of every row in pixels (rows are clipped to one line)
+    """
+    return ui.div(
+        grid_dependency,
+        ui.input_text(f"{grid_id}_filter", None, placeholder="Filter rows…", update_on="blur"),
+        ui.output_ui(f"{grid_id}_header"),
+        ui.div(
+            ui.output_ui(f"{grid_id}_window"),
+            class_="approv-grid-scroll",
+            style=f"height: {height}px;",
+            data_grid=grid_id,
+            data_row_height=str(row_height),
+        ),
+        ui.output_text(f"{grid_id}_info"),
+        class_="approv-grid",
+        id=grid_id,
+    )
+
+
+class DataGrid:
+    """
+    Server side of data_grid_ui
+
+    The browser holds a scroll area as tall as all rows and reports the
+    first row in view; only a window of rows around it is rendered. Filter
+    and sort are applied on the server and kept as an array of row
+    positions, recomputed when the data, filter or sort change, so
+    scrolling re-renders nothing but the window.
+    """
+
+    def __init__(self, grid_id: str, data: Callable[[], Any], version: Callable[[], Any],
+                 window_rows: int = DEFAULT_WINDOW_ROWS, row_height: int = DEFAULT_ROW_HEIGHT,
+                 cache: FrameCache = frame_cache):
+        """
+        Args:
+            grid_id: Id passed to data_grid_ui
+            data: Callable returning the field value (DataFrame, row dicts or columns)
+            version: Reactive callable that changes whenever the data may have changed
+            window_rows: Rows rendered per window, including the rows above
+                and below the visible ones
+            row_height: Row height passed to data_grid_ui
+            cache: Frame cache to build frames from
+        """
+        self.grid_id = grid_id
+        self.data = data
+        self.version = version
+        self.window_rows = window_rows
+        self.row_height = row_height
+        self.cache = cache
+        # (column, ascending) or None for the data's own order
+        self.sort = reactive.Value(None)
+
+    def window(self, view: GridView, first: int) -> Tuple[int, int]:
+        """Rows [start, stop) to render when row `first` is the first in view"""
+        total = len(view)
+        overscan = self.window_rows // 4
+        start = min(max(first - overscan, 0), max(total - self.window_rows, 0))
+        return start, min(start + self.window_rows, total)
+
+    def render_window(self, view: GridView, first: int) -> str:
+        """HTML of the window: a spacer as tall as all rows, with the window's rows at their offset"""
+        start, stop = self.window(view, first)
+        rows = view.rows(start, stop)
+        body: List[str] = []
+        for values in rows.itertuples(index=False, name=None):
+            body.append("<tr>" + "".join(f"<td>{_cell(value)}</td>" for value in values) + "</tr>")
+        row_height = self.row_height
+        return (
+            f'<div style="height: {len(view) * row_height}px; position: relative;">'
+            f'<table class="table table-sm table-striped" style="position: absolute; top: {start * row_height}px;">'
+            f'<colgroup>{"<col>" * len(view.frame.columns)}</colgroup>'
+            f'<tbody style="line-height: {row_height - 1}px;">{"".join(body)}</tbody>'
+            f'</table></div>'
+        )
+
+    def setup(self, input, output):
+        """Register the header, window and info outputs and the sort handler"""
+        grid_id = self.grid_id
+
+        def _input(suffix: str, default: Any) -> Any:
+            # Grid inputs exist once the browser has bound the grid (or scrolled it)
+            name = f"{grid_id}_{suffix}"
+            return input[name]() if name in input else default
+
+        @reactive.Calc
+        def _frame():
+            self.version()
+            return self.cache.frame(self.data())
+
+        @reactive.Calc
+        def _filtered():
+            return filter_rows(_frame(), _input("filter", ""))
+
+        @reactive.Calc
+        def _view():
+            frame = _frame()
+            order = _filtered()
+            sort = self.sort()
+            if sort is not None:
+                # Column names come back from the browser as text
+                columns = {str(column): column for column in frame.columns}
+                if sort[0] in columns:
+                    order = sort_rows(frame, order, columns[sort[0]], sort[1])
+            return GridView(frame, order)
+
+        @output(id=f"{grid_id}_header")
+        @render.ui
+        def _grid_header():
+            frame = _frame()
+            sort = self.sort()
+            cells = []
+            for column in frame.columns:
+                label = html.escape(str(column))
+                if sort is not None and sort[0] == str(column):
+                    label += " ▲" if sort[1] else " ▼"
+                cells.append(f'<th data-grid="{html.escape(grid_id)}" '
+                             f'data-grid-sort="{html.escape(str(column))}">{label}</th>')
+            return ui.HTML(f'<table class="table table-sm"><thead><tr>{"".join(cells)}</tr></thead></table>')
+
+        @output(id=f"{grid_id}_window")
+        @render.ui
+        def _grid_window():
+            return ui.HTML(self.render_window(_view(), int(_input("first", 0) or 0)))
+
+        @output(id=f"{grid_id}_info")
+        @render.text
+        def _grid_info():
+            view = _view()
+            total = len(view)
+            if not total:
+                return "No rows" if view.frame.empty else "No matching rows"
+            text = f"{total} rows"
+            if total != len(view.frame):
+                text += f" (filtered from {len(view.frame)})"
+            return text
+
+        @reactive.Effect
+        @reactive.event(input[f"{grid_id}_sort"])
+        def _sort_column():
+            # Ascending, then descending, then the data's own order
+            column = input[f"{grid_id}_sort"]()
+            with reactive.isolate():
+                current = self.sort()
+            if current is None or current[0] != column:
+                self.sort.set((column, True))
+            elif current[1]:
+                self.sort.set((column, False))
+            else:
+                self.sort.set(None)
+
+        return _grid_window
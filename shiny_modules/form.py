@@ -7,8 +7,75 @@ from shiny import ui, reactive, render
 import pandas as pd
 import yaml
 from datetime import datetime, date, time
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, List, Optional, Union, Callable
 import uuid
+import inspect
+from collections import ChainMap
+
+from approv.FormCodec import form_codec
+from approv.FormPlan import FieldSpec, compile_form, default_value
+from approv.Validation import FormValidator, ValidationError, form_validator
+from .attachments import AttachmentStore, attachment_refs, attachment_store, attachment_url
+from .audit_view import AuditPager, audit_pager_ui
+from .data_grid import DEFAULT_HEIGHT, DEFAULT_WINDOW_ROWS, DataGrid, data_grid_ui
+from .live_validation import DEFAULT_DEBOUNCE_MS, LiveValidation, live_validation_dependency
+
+_MISSING = object()
+
+# ui.update_* call that sets a field's value in place, per field type. Types
+# without one (files, dataframes) keep whatever the client shows.
+_VALUE_UPDATERS: Dict[str, Callable[[str, Any], None]] = {
+    'checkbox': lambda field_id, value: ui.update_checkbox(field_id, value=value),
+    'toggle': lambda field_id, value: ui.update_checkbox(field_id, value=value),
+    'radio': lambda field_id, value: ui.update_radio_buttons(field_id, selected=value),
+    'selectbox': lambda field_id, value: ui.update_selectize(field_id, selected=value),
+    'select_slider': lambda field_id, value: ui.update_selectize(field_id, selected=value),
+    'multiselect': lambda field_id, value: ui.update_checkbox_group(field_id, selected=value),
+    'slider': lambda field_id, value: ui.update_slider(field_id, value=value),
+    'text_input': lambda field_id, value: ui.update_text(field_id, value=value),
+    'time_input': lambda field_id, value: ui.update_text(field_id, value=value),
+    'color_picker': lambda field_id, value: ui.update_text(field_id, value=value),
+    'number_input': lambda field_id, value: ui.update_numeric(field_id, value=value),
+    'text_area': lambda field_id, value: ui.update_text_area(field_id, value=value),
+    'date_input': lambda field_id, value: ui.update_date(field_id, value=value),
+}
+_NO_VALUE_TYPES = frozenset(('dataframe', 'file_uploader', 'camera_input'))
+# Fields whose uploads go to the attachment store
+_FILE_TYPES = frozenset(('file_uploader', 'camera_input'))
+
+
+def _comparable(value: Any) -> Any:
+    """Normalize widget values so server and client values compare equal"""
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value]
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def field_container_id(field_name: str) -> str:
+    """Id of the element wrapping a field's widget (see create_form_ui)"""
+    return f"{field_name}-field"
+
+
+# Input id of the form's section accordion/tabs (the open sections)
+FORM_SECTIONS_ID = "form_sections"
+
+
+def section_container_id(section_name: str) -> str:
+    """Id of the element a section's fields are built into"""
+    return f"{section_name}-section"
+
+
+def _attachment_links(value: Any) -> Optional[ui.Tag]:
+    """Download links for the attachments stored in a file field"""
+    refs = attachment_refs(value)
+    if not refs:
+        return None
+    return ui.tags.ul(
+        *[ui.tags.li(ui.a(ref.name, href=attachment_url(ref)), f" ({ref.size:,} bytes)") for ref in refs],
+        class_="list-unstyled small"
+    )
 
 class ShinyForm:
     """
@@ -16,23 +83,46 @@ class ShinyForm:
     Handles dynamic form rendering based on configuration with reactive state
     """
     
-    def __init__(self, form_config: Dict[str, Any], form_data: Optional[Dict] = None, audit_data: Optional[List] = None):
+    def __init__(self, form_config: Dict[str, Any], form_data: Optional[Dict] = None, audit_data: Optional[List] = None,
+                 attachments: Optional[AttachmentStore] = None):
         self.form_config = form_config
         self.form_data = form_data or {}
         self.audit_data = audit_data or []
+        # Uploaded files are stored here; form data keeps their digests
+        self.attachments = attachments or attachment_store
         
         # Parse configuration
         self.form_fields, self.actions, self.permissions = self._get_config()
+        # Fields, permission bitsets and cached per-role render plans
+        self.compiled = compile_form(self.form_config)
+        # Submitted values are stored typed (see FormCodec.coerce)
+        self.codec = form_codec(self.form_config)
+        # Rules bound through each field's `validation` key, compiled once
+        self.validator: Optional[FormValidator] = None
+        try:
+            self.validator = form_validator(self.form_config)
+        except ValueError as e:
+            print(f"Warning: Form validation disabled: {e}")
         
         # Create reactive values for form state
         self.field_values = {}
         self.submitted_action = reactive.Value("")
         
+        # What the client was last sent (see update_form_ui)
+        self._sent_values: Dict[str, Any] = {}
+        self._sent_disabled: Optional[int] = None
+        # Fields built so far (bitset over the compiled fields); fields of
+        # sections not opened yet are not
+        self._rendered = 0
+        # Last upload stored per file field; Shiny keeps an input's value after submit
+        self._stored_uploads: Dict[str, Any] = {}
+        
     def _get_config(self):
         """Parse form configuration from YAML or dict"""
         if isinstance(self.form_config, str):
             with open(self.form_config, 'r') as file:
                 config = yaml.safe_load(file)
+            self.form_config = config
         elif isinstance(self.form_config, dict):
             config = self.form_config
         else:
@@ -49,69 +139,59 @@ class ShinyForm:
     
     def _is_disabled(self, field_name: str, user_roles: List[str]) -> bool:
         """Check if field should be disabled based on editability and permissions"""
-        # Flatten user_roles in case of nested lists (defensive guard)
-        if user_roles and len(user_roles) > 0 and isinstance(user_roles[0], list):
-            user_roles = [role for sublist in user_roles for role in sublist]
-        
-        # Check if field is marked as non-editable
-        disabled_field = not self.form_fields[field_name].get('editable', True)
-        
-        # Check permission-based disabling
-        disabled_perm = False
-        try:
-            field_permissions = self.permissions.get(field_name, [])
-            if field_permissions:
-                disabled_perm = not any(role in user_roles for role in field_permissions)
-        except:
-            disabled_perm = False
-        
-        return disabled_field or disabled_perm
+        return self.compiled.is_disabled(field_name, user_roles)
     
     def _get_default_value(self, field_name: str) -> Any:
         """Get default value for a form field"""
-        field_config = self.form_fields[field_name]
-        field_type = field_config['type']
-        
-        # Check if explicit default is provided
-        if 'default' in field_config:
-            return field_config['default']
-        
-        # Type-specific defaults
-        if field_type in ['checkbox', 'toggle']:
-            return False
-        elif field_type in ['radio', 'selectbox']:
-            return 0  # index
-        elif field_type == 'slider':
-            return field_config.get('min_value', 0)
+        field = self.compiled.fields[self.compiled.index[field_name]]
+        if field.type == 'dataframe' and field.name == 'audit':
+            # Decoded page by page by AuditPager; no full frame on every render
+            return self.audit_data
+        return default_value(field)
+    
+    def _widget_value(self, field: FieldSpec) -> Any:
+        """Current value of a field in the form its widget takes"""
+        # Get current value from form_data or use default
+        current_value = self.form_data.get(field.name)
+        if current_value is None:
+            current_value = self._get_default_value(field.name)
+        
+        field_type = field.type
+        if field_type in ('radio', 'selectbox'):
+            # Form data holds the selected option value itself
+            return current_value
         elif field_type == 'multiselect':
-            return []
+            return list(current_value or [])
         elif field_type == 'number_input':
-            return 0.0
+            return float(current_value)
         elif field_type == 'date_input':
-            return date.today()
+            if isinstance(current_value, str):
+                return datetime.strptime(current_value, "%Y-%m-%d").date()
+            return current_value
         elif field_type == 'time_input':
-            return datetime.now().time()
-        elif field_type == 'color_picker':
-            return '#ffffff'
-        elif field_type == 'dataframe' and field_name == 'audit':
-            return pd.DataFrame(self.audit_data)
-        else:
-            return ""
+            if isinstance(current_value, time):
+                return current_value.strftime("%H:%M:%S")
+            return str(current_value)
+        elif field_type in ('checkbox', 'toggle', 'slider', 'select_slider', 'dataframe',
+                            'file_uploader', 'camera_input'):
+            return current_value
+        return str(current_value)
     
-    def _create_input_widget(self, field_name: str, user_roles: List[str]) -> ui.Tag:
-        """Create a Shiny input widget based on field configuration"""
-        field_config = self.form_fields[field_name]
-        field_type = field_config['type']
-        title = field_config.get('title', field_name)
-        
-        # Get current value from form_data or use default
-        try:
-            current_value = self.form_data.get(field_name, self._get_default_value(field_name))
-        except:
-            current_value = self._get_default_value(field_name)
-        
-        # Check if field is disabled
-        disabled = self._is_disabled(field_name, user_roles)
+    def _sent_state(self, field: FieldSpec) -> Any:
+        """What the client is sent of a field's value, to compare on update (_MISSING if nothing)"""
+        if field.type in _FILE_TYPES:
+            return tuple(ref.sha256 for ref in attachment_refs(self.form_data.get(field.name)))
+        if field.type in _NO_VALUE_TYPES:
+            return _MISSING
+        return _comparable(self._widget_value(field))
+    
+    def _create_input_widget(self, field: FieldSpec, disabled: bool) -> ui.Tag:
+        """Create a Shiny input widget for a field of the render plan"""
+        field_name = field.name
+        field_config = field.config
+        field_type = field.type
+        title = field.title
+        current_value = self._widget_value(field)
         
         # Create appropriate Shiny input widget with disabled state
         if field_type == 'checkbox':
@@ -123,17 +203,15 @@ class ShinyForm:
         
         elif field_type == 'radio':
             options = field_config['options']
-            selected = options[current_value] if isinstance(current_value, int) else current_value
-            widget = ui.input_radio_buttons(field_name, title, choices=options, selected=selected)
+            widget = ui.input_radio_buttons(field_name, title, choices=options, selected=current_value)
         
         elif field_type == 'selectbox':
             options = field_config['options']
-            selected = options[current_value] if isinstance(current_value, int) else current_value
-            widget = ui.input_selectize(field_name, title, choices=options, selected=selected)
+            widget = ui.input_selectize(field_name, title, choices=options, selected=current_value)
         
         elif field_type == 'multiselect':
             options = field_config['options']
-            widget = ui.input_checkbox_group(field_name, title, choices=options, selected=current_value or [])
+            widget = ui.input_checkbox_group(field_name, title, choices=options, selected=current_value)
         
         elif field_type == 'slider':
             min_val = field_config.get('min_value', 0)
@@ -147,40 +225,47 @@ class ShinyForm:
             widget = ui.input_selectize(field_name, title, choices=options, selected=current_value)
         
         elif field_type == 'text_input':
-            widget = ui.input_text(field_name, title, value=str(current_value))
+            widget = ui.input_text(field_name, title, value=current_value)
         
         elif field_type == 'number_input':
-            widget = ui.input_numeric(field_name, title, value=float(current_value))
+            widget = ui.input_numeric(field_name, title, value=current_value)
         
         elif field_type == 'text_area':
-            widget = ui.input_text_area(field_name, title, value=str(current_value))
+            widget = ui.input_text_area(field_name, title, value=current_value)
         
         elif field_type == 'date_input':
-            if isinstance(current_value, str):
-                current_value = datetime.strptime(current_value, "%Y-%m-%d").date()
             widget = ui.input_date(field_name, title, value=current_value)
         
         elif field_type == 'time_input':
             # Shiny doesn't have time input, use text input with time format
-            if isinstance(current_value, time):
-                time_str = current_value.strftime("%H:%M:%S")
-            else:
-                time_str = str(current_value)
-            widget = ui.input_text(field_name, f"{title} (HH:MM:SS)", value=time_str, placeholder="14:30:00")
+            widget = ui.input_text(field_name, f"{title} (HH:MM:SS)", value=current_value, placeholder="14:30:00")
         
         elif field_type == 'file_uploader':
-            widget = ui.input_file(field_name, title)
+            widget = ui.div(ui.input_file(field_name, title), _attachment_links(current_value))
         
         elif field_type == 'camera_input':
             # Shiny doesn't have camera input, use file input as fallback
-            widget = ui.input_file(field_name, f"{title} (Camera)", accept="image/*")
+            widget = ui.div(ui.input_file(field_name, f"{title} (Camera)", accept="image/*"),
+                            _attachment_links(current_value))
         
         elif field_type == 'color_picker':
             # Shiny doesn't have color picker, use text input with color format
-            widget = ui.input_text(field_name, f"{title} (Color)", value=str(current_value), placeholder="#ffffff")
+            widget = ui.input_text(field_name, f"{title} (Color)", value=current_value, placeholder="#ffffff")
         
         elif field_type == 'dataframe':
             # Return a placeholder div for dataframe display (will be handled separately)
+            if field_name == 'audit':
+                # The audit trail is paged on the server (see AuditPager)
+                return ui.div(
+                    ui.h5(title),
+                    audit_pager_ui(f"{field_name}_display")
+                )
+            if field_config.get('mode') == 'grid':
+                # Rows stay on the server and are sent a window at a time (see DataGrid)
+                return ui.div(
+                    ui.h5(title),
+                    data_grid_ui(f"{field_name}_display", height=field_config.get('height', DEFAULT_HEIGHT))
+                )
             return ui.div(
                 ui.h5(title),
                 ui.output_data_frame(f"{field_name}_display")
@@ -188,7 +273,7 @@ class ShinyForm:
         
         else:
             # Fallback to text input
-            widget = ui.input_text(field_name, title, value=str(current_value))
+            widget = ui.input_text(field_name, title, value=current_value)
         
         # Apply disabled state by wrapping in a div with appropriate styling
         if disabled:
@@ -202,26 +287,168 @@ class ShinyForm:
     
     def create_form_ui(self, user_roles: List[str] = None) -> List[ui.Tag]:
         """Create the complete form UI with all fields and actions"""
-        if user_roles is None:
-            user_roles = []
+        # Field permissions come precomputed with the cached plan for these roles
+        plan = self.compiled.plan(user_roles or [])
+        compiled = self.compiled
         
         form_elements = []
-        
-        # Create input widgets for each field
-        for field_name in self.form_fields.keys():
-            widget = self._create_input_widget(field_name, user_roles)
-            form_elements.append(widget)
+        sent_values = {}
+        
+        # Fields outside sections are always shown
+        for index, (field, disabled) in enumerate(plan.field_states()):
+            if not compiled.sectioned >> index & 1:
+                form_elements.extend(self._field_elements(field, disabled, sent_values))
+        rendered = ~compiled.sectioned
+        
+        # Sections are built when opened (see render_sections), except the initially open ones
+        if compiled.sections:
+            open_sections = self._initial_sections()
+            panels = []
+            for section in compiled.sections:
+                body = []
+                if section.name in open_sections:
+                    body = self._section_elements(section, plan, sent_values)
+                    rendered |= section.mask
+                container = ui.div(*body, id=section_container_id(section.name))
+                if compiled.layout == 'tabs':
+                    panels.append(ui.nav_panel(section.title, container, value=section.name))
+                else:
+                    panels.append(ui.accordion_panel(section.title, container, value=section.name))
+            if compiled.layout == 'tabs':
+                form_elements.append(ui.navset_tab(*panels, id=FORM_SECTIONS_ID, selected=open_sections[0]))
+            else:
+                form_elements.append(ui.accordion(*panels, id=FORM_SECTIONS_ID, open=open_sections or False))
             form_elements.append(ui.br())
         
+        self._sent_values = sent_values
+        self._sent_disabled = plan.disabled
+        self._rendered = rendered
+        if self.validator is not None and self.validator.fields:
+            # Shows the messages of live validation (see ShinyFormRenderer.setup_live_validation)
+            form_elements.append(live_validation_dependency)
         return form_elements
     
+    def _field_elements(self, field: FieldSpec, disabled: bool, sent_values: Dict[str, Any]) -> List[ui.Tag]:
+        """A field's widget in a container that update_form_ui can replace on its own"""
+        state = self._sent_state(field)
+        if state is not _MISSING:
+            sent_values[field.name] = state
+        return [ui.div(self._create_input_widget(field, disabled), id=field_container_id(field.name)), ui.br()]
+    
+    def _section_elements(self, section, plan, sent_values: Dict[str, Any]) -> List[ui.Tag]:
+        elements = []
+        for index in section.fields:
+            elements.extend(self._field_elements(plan.fields[index], plan.is_disabled(index), sent_values))
+        return elements
+    
+    def _initial_sections(self) -> List[str]:
+        """Sections shown on first render: the open ones, or for tabs the first tab"""
+        sections = self.compiled.sections
+        open_sections = [section.name for section in sections if section.open]
+        if self.compiled.layout == 'tabs':
+            return open_sections[:1] or [sections[0].name]
+        return open_sections
+    
+    def render_sections(self, opened, user_roles: List[str] = None) -> int:
+        """
+        Build the fields of sections opened for the first time
+        
+        Must run inside a Shiny session, after create_form_ui rendered the
+        same form. Sections stay built when closed again.
+        
+        Args:
+            opened: Value of the FORM_SECTIONS_ID input: the open section
+                names (accordion) or the selected one (tabs)
+            user_roles: Roles of the user
+        
+        Returns:
+            Number of fields built
+        """
+        if not opened:
+            return 0
+        opened = {opened} if isinstance(opened, str) else set(opened)
+        plan = self.compiled.plan(user_roles or [])
+        built = 0
+        for section in self.compiled.sections:
+            if section.name not in opened or self._rendered & section.mask == section.mask:
+                continue
+            sent_values = {}
+            elements = self._section_elements(section, plan, sent_values)
+            ui.insert_ui(elements, selector=f"#{section_container_id(section.name)}", where="beforeEnd")
+            self._sent_values.update(sent_values)
+            # Built with the current plan, so they show its disabled states
+            self._sent_disabled = (self._sent_disabled or 0) & ~section.mask | plan.disabled & section.mask
+            self._rendered |= section.mask
+            built += len(section.fields)
+        return built
+    
+    def update_form_ui(self, user_roles: List[str] = None, input=None) -> Dict[str, int]:
+        """
+        Bring a rendered form up to date without rebuilding it
+        
+        Compares the current form data and render plan with what the client
+        shows: its input values, or for inputs it has not reported, the values
+        last sent. Fields whose value differs get a ui.update_* call. Fields
+        whose disabled state changed, and file fields whose attachments
+        changed, are replaced on their own with remove_ui/insert_ui. Fields
+        of sections not opened yet are left for render_sections to build.
+        Must run inside a Shiny session, after create_form_ui rendered the
+        same form.
+        
+        Args:
+            user_roles: Roles of the user
+            input: Session inputs, to compare with the values in the browser
+        
+        Returns:
+            Counts of 'updated' and 'replaced' fields
+        """
+        plan = self.compiled.plan(user_roles or [])
+        changed_disabled = 0 if self._sent_disabled is None else plan.disabled ^ self._sent_disabled
+        updated = replaced = 0
+        
+        rendered = self._rendered
+        for index, (field, disabled) in enumerate(plan.field_states()):
+            if not rendered >> index & 1:
+                continue
+            name = field.name
+            # File fields are replaced too when their attachments change (new links, cleared input)
+            if changed_disabled >> index & 1 or (
+                    field.type in _FILE_TYPES and self._sent_state(field) != self._sent_values.get(name)):
+                selector = f"#{field_container_id(name)}"
+                ui.remove_ui(selector=f"{selector} > *", multiple=True)
+                ui.insert_ui(self._create_input_widget(field, disabled), selector=selector, where="afterBegin")
+                state = self._sent_state(field)
+                if state is not _MISSING:
+                    self._sent_values[name] = state
+                replaced += 1
+                continue
+            
+            updater = _VALUE_UPDATERS.get(field.type)
+            if updater is None:
+                continue
+            value = self._widget_value(field)
+            comparable = _comparable(value)
+            shown = self._sent_values.get(name, _MISSING)
+            if input is not None:
+                # Isolated: the sync must not re-run on every keystroke
+                with reactive.isolate():
+                    if name in input:
+                        shown = _comparable(input[name]())
+            if shown != comparable:
+                updater(name, value)
+                self._sent_values[name] = comparable
+                updated += 1
+        
+        self._sent_disabled = plan.disabled
+        return {'updated': updated, 'replaced': replaced}
+    
     def create_action_buttons(self, current_status: str = None) -> List[ui.Tag]:
         """Create action buttons based on workflow status"""
-        if not self.actions or current_status in ['start', 'stop']:
+        action_items = self.compiled.plan([], current_status).actions
+        if not action_items:
             return []
         
         button_elements = []
-        action_items = list(self.actions.items())
         
         # Create buttons in a grid layout (5 columns like Streamlit)
         num_cols = min(5, len(action_items))
@@ -229,13 +456,13 @@ class ShinyForm:
             col_width = 12 // num_cols
             
             button_rows = []
-            for i, (action_key, action_config) in enumerate(action_items):
+            for i, (action_key, action_title) in enumerate(action_items):
                 if i % 5 == 0:  # Start new row every 5 buttons
                     button_rows.append([])
                 
                 button = ui.input_action_button(
                     action_key,
-                    action_config.get('title', action_key),
+                    action_title,
                     class_="btn btn-primary"
                 )
                 button_rows[-1].append(button)
@@ -248,17 +475,37 @@ class ShinyForm:
         
         return button_elements
     
-    def get_form_data(self, input_values: Dict[str, Any], submitted_action: str = None) -> Optional[Dict[str, Any]]:
-        """Extract form data from Shiny input values"""
+    def get_form_data(self, input_values: Dict[str, Any], submitted_action: str = None,
+                      user_roles=None) -> Optional[Dict[str, Any]]:
+        """
+        Extract form data from Shiny input values
+        
+        Args:
+            input_values: Values from Shiny input widgets
+            submitted_action: The action that was submitted
+            user_roles: Roles of the submitting user; only fields they can
+                edit are validated (all fields when None)
+        
+        Raises:
+            ValidationError: If a value fails its field's validation rules
+        """
         if not submitted_action:
             return None
         
         values = {}
         
         # Extract field values
-        for field_name in self.form_fields.keys():
+        for field_name, field_config in self.form_fields.items():
             if field_name in input_values:
-                values[field_name] = input_values[field_name]
+                if field_config['type'] in _FILE_TYPES:
+                    # Store the uploaded files and keep only their references; no
+                    # upload in this session leaves the stored attachments as they are
+                    uploads = input_values[field_name]
+                    if uploads and self._stored_uploads.get(field_name) is not uploads:
+                        values[field_name] = self.attachments.put_uploads(uploads)
+                        self._stored_uploads[field_name] = uploads
+                    continue
+                values[field_name] = self.codec.coerce_value(field_name, input_values[field_name])
         
         # Add action information
         values['actions'] = {}
@@ -268,7 +515,67 @@ class ShinyForm:
         
         values['action'] = submitted_action
         
+        action_config = self.actions.get(submitted_action) or {}
+        if action_config.get('validate', True):
+            self._validate(values, user_roles)
+        
         return values
+    
+    def _editable_fields(self, user_roles) -> Optional[List[str]]:
+        """Fields the roles can edit (None for all fields when no roles are given)"""
+        if user_roles is None:
+            return None
+        plan = self.compiled.plan(user_roles)
+        return [field.name for field, disabled in plan.field_states() if not disabled]
+    
+    def _validate(self, values: Dict[str, Any], user_roles=None):
+        """Check submitted values (stored values for fields without an input) against the validation rules"""
+        if self.validator is None or not self.validator.fields:
+            return
+        result = self.validator.validate(ChainMap(values, self.form_data), self._editable_fields(user_roles))
+        if result.over_budget:
+            print(f"Warning: Validation time budget exceeded, submission rejected for: {', '.join(result.over_budget)}")
+        if not result.valid:
+            raise ValidationError(result)
+    
+    def field_messages(self, input_values: Dict[str, Any], fields, user_roles=None) -> Dict[str, Optional[str]]:
+        """
+        Validate some fields while the form is being edited (see LiveValidation)
+        
+        Args:
+            input_values: Current values of (some of) the form's inputs;
+                stored values are used for the others
+            fields: Fields to validate
+            user_roles: Only fields these roles can edit are validated (all
+                fields when None)
+        
+        Returns:
+            Per validated field: its error message, or None if it is valid
+        """
+        if self.validator is None:
+            return {}
+        fields = set(fields)
+        editable = self._editable_fields(user_roles)
+        if editable is not None:
+            fields.intersection_update(editable)
+        values = {}
+        for field_name, value in input_values.items():
+            field_config = self.form_fields.get(field_name)
+            if field_config is None:
+                continue
+            # Uploads are checked by file name, without storing them
+            values[field_name] = value if field_config['type'] in _FILE_TYPES else self.codec.coerce_value(field_name, value)
+        result = self.validator.validate(ChainMap(values, self.form_data), fields)
+        messages: Dict[str, Optional[str]] = {
+            field_rules.field: None for field_rules in self.validator.fields if field_rules.field in fields}
+        for error in result.errors:
+            messages[error.field] = error.message
+        return messages
+    
+    def differs_from_sent(self, field_name: str, value: Any) -> bool:
+        """Whether an input's value differs from what the client was last sent for it"""
+        sent = self._sent_values.get(field_name, _MISSING)
+        return sent is _MISSING or _comparable(value) != sent
 
 class ShinyFormRenderer:
     """
@@ -277,39 +584,122 @@ class ShinyFormRenderer:
     
     def __init__(self, form: ShinyForm):
         self.form = form
+        # Arguments of the setup_* calls so far, to set up a replaced form
+        # (see replace_form), and what they set up
+        self._dataframe_setup = None
+        self._dataframe_outputs = set()
+        self._action_setup = None
+        self._bound_actions = set()
+        self._live: Optional[LiveValidation] = None
     
-    def setup_dataframe_outputs(self, output, input):
-        """Setup reactive outputs for dataframe fields"""
+    def replace_form(self, form: ShinyForm):
+        """
+        Render another form (a reloaded configuration) from now on
+        
+        Outputs, handlers and live validation set up so far follow the new
+        form; its new dataframe fields and actions get theirs.
+        """
+        self.form = form
+        if self._dataframe_setup is not None:
+            output, input, kwargs = self._dataframe_setup
+            self.setup_dataframe_outputs(output, input, **kwargs)
+        if self._action_setup is not None:
+            self.setup_action_handlers(*self._action_setup)
+        if self._live is not None:
+            self._live.set_form(form)
+    
+    def setup_dataframe_outputs(self, output, input, audit_trail: Optional[Callable] = None,
+                                audit_version: Optional[Callable] = None,
+                                form_data: Optional[Callable] = None,
+                                data_version: Optional[Callable] = None):
+        """
+        Setup reactive outputs for dataframe fields
+        
+        Args:
+            output: Shiny output object
+            input: Shiny input object
+            audit_trail: Reactive callable returning the audit trail to page
+                through (defaults to the form's audit data)
+            audit_version: Reactive callable that changes when an audit event
+                is recorded
+            form_data: Callable returning the form data to show (defaults to
+                the form's form data)
+            data_version: Reactive callable that changes when the form data
+                may have changed
+        """
+        self._dataframe_setup = (output, input, dict(audit_trail=audit_trail, audit_version=audit_version,
+                                                     form_data=form_data, data_version=data_version))
+        form_data = form_data or (lambda: self.form.form_data)
+        data_version = data_version or (lambda: 0)
+        
         for field_name, field_config in self.form.form_fields.items():
             if field_config['type'] == 'dataframe':
                 output_name = f"{field_name}_display"
+                if output_name in self._dataframe_outputs:
+                    continue
+                self._dataframe_outputs.add(output_name)
                 
-                @output
-                @render.data_frame
-                def _dataframe_output():
-                    if field_name == 'audit':
-                        return pd.DataFrame(self.form.audit_data)
-                    else:
-                        # Get dataframe from form data
-                        df_data = self.form.form_data.get(field_name)
-                        if isinstance(df_data, pd.DataFrame):
-                            return df_data
-                        elif df_data:
-                            try:
-                                return pd.DataFrame(df_data)
-                            except:
-                                return pd.DataFrame()
-                        return pd.DataFrame()
+                if field_name == 'audit':
+                    AuditPager(
+                        output_name,
+                        audit_trail or (lambda: self.form.audit_data),
+                        audit_version or (lambda: 0)
+                    ).setup(input, output)
+                    continue
                 
-                # Register the output with a unique name
-                setattr(output, output_name, _dataframe_output)
+                if field_config.get('mode') == 'grid':
+                    DataGrid(
+                        output_name,
+                        lambda field_name=field_name: form_data().get(field_name),
+                        data_version,
+                        window_rows=field_config.get('page_size', DEFAULT_WINDOW_ROWS)
+                    ).setup(input, output)
+                    continue
+                
+                def _dataframe_output(field_name=field_name):
+                    data_version()
+                    # Get dataframe from form data
+                    df_data = form_data().get(field_name)
+                    if isinstance(df_data, pd.DataFrame):
+                        return df_data
+                    elif df_data:
+                        try:
+                            return pd.DataFrame(df_data)
+                        except:
+                            return pd.DataFrame()
+                    return pd.DataFrame()
+                
+                # Register the output under the field's display id
+                output(id=output_name)(render.data_frame(_dataframe_output))
+    
+    def setup_live_validation(self, input, session, user_roles: Optional[Callable[[], List[str]]] = None,
+                              debounce_ms: float = DEFAULT_DEBOUNCE_MS):
+        """
+        Validate fields as they are edited, once the user pauses
+        
+        Args:
+            input: Shiny input object
+            session: Shiny session
+            user_roles: Reactive callable returning the user's roles; only
+                fields they can edit are validated
+            debounce_ms: Pause after the last edit before validating
+        """
+        self._live = LiveValidation(self.form, debounce_ms)
+        self._live.setup(input, session, user_roles)
     
     def setup_action_handlers(self, input, on_action_callback):
         """Setup reactive handlers for action buttons"""
+        self._action_setup = (input, on_action_callback)
         for action_name in self.form.actions.keys():
+            if action_name in self._bound_actions:
+                continue
+            self._bound_actions.add(action_name)
             
             @reactive.Effect
             @reactive.event(getattr(input, action_name))
-            def _action_handler(action=action_name):
+            async def _action_handler(action=action_name):
                 if on_action_callback:
-                    on_action_callback(action)
\ No newline at end of file
+                    # Callbacks may be coroutines (see process_workflow_async)
+                    result = on_action_callback(action)
+                    if inspect.isawaitable(result):
+                        await result
\ No newline at end of file
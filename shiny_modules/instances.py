@@ -0,0 +1,213 @@
+"""
+Workflow instance store for the Shiny BPMS app
+Keeps the state of many concurrent workflow instances keyed by instance id
+"""
+
+import copy
+import threading
+import time
+from collections import ChainMap
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterator
+
+from approv.Audit import AuditLog, AuditTrail, InstanceState
+
+
+class InstanceConflict(RuntimeError):
+    """Another session is changing, or has changed, a workflow instance"""
+
+
+# Guards the claims of every instance; only held to check and set a claim
+_claims_lock = threading.Lock()
+
+
+class WorkflowInstance:
+    """
+    State of a single workflow instance
+
+    Only the per-instance state lives here; the compiled workflow graph and
+    the form configuration are shared by all instances. Form data is a
+    ChainMap over the store's initial values, so an instance only pays for
+    the fields it has actually changed, and the audit trail is a view on the
+    store's columnar AuditLog.
+    """
+
+    __slots__ = ('instance_id', 'status', 'form_data', 'audit', 'created_at', 'updated_at', 'claimed')
+
+    def __init__(self, instance_id: int, status: str = 'start', form_data: Optional[Dict[str, Any]] = None,
+                 audit: Optional[AuditTrail] = None):
+        self.instance_id = instance_id
+        self.status = status
+        self.form_data = form_data if form_data is not None else {}
+        self.audit = audit if audit is not None else AuditTrail(instance_id=instance_id)
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        # Whether a transition is in progress (see claim)
+        self.claimed = False
+
+    def touch(self):
+        """Record that the instance changed"""
+        self.updated_at = time.time()
+
+    @contextmanager
+    def claim(self, expected_status: Optional[str] = None):
+        """
+        Exclusive right to change the instance, for the duration of a transition
+
+        Sessions viewing the same instance, and bulk decisions, claim it
+        around each transition (including the steps it awaits), so their
+        changes to the status, form data and audit trail never interleave.
+        A claim does not wait: it is refused at once.
+
+        Args:
+            expected_status: Status the caller last saw; the claim is refused
+                if the instance has moved on since
+
+        Raises:
+            InstanceConflict: If the instance is claimed, or is no longer at
+                expected_status
+        """
+        with _claims_lock:
+            if self.claimed:
+                raise InstanceConflict(
+                    f"Workflow instance {self.instance_id} is being processed in another session")
+            if expected_status is not None and self.status != expected_status:
+                raise InstanceConflict(f"Workflow instance {self.instance_id} was moved on to "
+                                       f"'{self.status}' in another session")
+            self.claimed = True
+        try:
+            yield self
+        finally:
+            with _claims_lock:
+                self.claimed = False
+
+    def __repr__(self):
+        return f"WorkflowInstance(id={self.instance_id}, status={self.status!r})"
+
+
+class WorkflowInstanceStore:
+    """In-memory registry of workflow instances keyed by instance id"""
+
+    def __init__(self, initial_form_data: Optional[Dict[str, Any]] = None, persistence=None):
+        # Shared, read-only defaults for every instance's form data
+        self._defaults = copy.deepcopy(initial_form_data or {})
+        # Optional InstancePersistence that durably records changes
+        self.persistence = persistence
+        # Audit events of every instance in the store; once written, older
+        # events are read back from the persistence instead of kept in memory
+        self.audit_log = AuditLog(reader=persistence)
+        if persistence is not None:
+            persistence.track_audit(self.audit_log)
+        self._instances: Dict[int, WorkflowInstance] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def create(self, form_data: Optional[Dict[str, Any]] = None) -> WorkflowInstance:
+        """
+        Create and register a new workflow instance
+
+        Args:
+            form_data: Values overriding the store's initial form data
+
+        Returns:
+            The new instance, positioned at the 'start' status
+        """
+        overrides = dict(form_data) if form_data else {}
+        with self._lock:
+            instance_id = self._next_id
+            self._next_id += 1
+            instance = WorkflowInstance(instance_id, 'start', ChainMap(overrides, self._defaults),
+                                        AuditTrail(self.audit_log, instance_id))
+            self._instances[instance_id] = instance
+        self.save(instance)
+        return instance
+
+    def set_defaults(self, initial_form_data: Optional[Dict[str, Any]]):
+        """Replace the initial form data of instances created from now on (existing ones keep theirs)"""
+        defaults = copy.deepcopy(initial_form_data or {})
+        with self._lock:
+            self._defaults = defaults
+
+    def save(self, instance: WorkflowInstance):
+        """Persist the current status and form data of an instance"""
+        if self.persistence is not None:
+            self.persistence.save_instance(instance)
+
+    def save_many(self, instances: List[WorkflowInstance]):
+        """Persist several instances in one batch"""
+        if self.persistence is not None:
+            self.persistence.save_instances(instances)
+
+    def load(self) -> int:
+        """
+        Restore persisted instances into the store
+
+        Returns:
+            Number of instances restored
+        """
+        if self.persistence is None:
+            return 0
+        instances = self.persistence.load_instances(self.audit_log)
+        for instance in instances:
+            self.add(instance)
+        return len(instances)
+
+    def add(self, instance: WorkflowInstance) -> WorkflowInstance:
+        """Register an existing instance (e.g. one restored from storage)"""
+        with self._lock:
+            self._instances[instance.instance_id] = instance
+            # Keep newly issued ids above every registered id
+            self._next_id = max(self._next_id, instance.instance_id + 1)
+        return instance
+
+    def get(self, instance_id: int) -> Optional[WorkflowInstance]:
+        """Get an instance by id, or None if it does not exist"""
+        return self._instances.get(instance_id)
+
+    def open(self, instance_id: int) -> WorkflowInstance:
+        """
+        Get an instance by id for a session to work on
+
+        Several sessions can open the same instance; each change goes
+        through WorkflowInstance.claim.
+
+        Raises:
+            KeyError: If no instance with this id exists
+        """
+        instance = self._instances.get(instance_id)
+        if instance is None:
+            raise KeyError(f"Workflow instance {instance_id} not found")
+        return instance
+
+    def state_as_of(self, instance_id: int, time_ns: Optional[int] = None,
+                    position: Optional[int] = None) -> InstanceState:
+        """
+        Rebuild an instance's status and form data from its audit events
+
+        Args:
+            instance_id: Instance to look at
+            time_ns: Epoch nanoseconds to rebuild the state as of (latest when omitted)
+            position: Audit event position to rebuild the state after, instead of a time
+
+        Raises:
+            KeyError: If no instance with this id exists
+        """
+        return self.open(instance_id).audit.state_at(position=position, time_ns=time_ns)
+
+    def remove(self, instance_id: int) -> Optional[WorkflowInstance]:
+        """Remove an instance from the store"""
+        with self._lock:
+            return self._instances.pop(instance_id, None)
+
+    def instance_ids(self) -> List[int]:
+        """Get the ids of all registered instances"""
+        return list(self._instances)
+
+    def __len__(self) -> int:
+        return len(self._instances)
+
+    def __contains__(self, instance_id: int) -> bool:
+        return instance_id in self._instances
+
+    def __iter__(self) -> Iterator[WorkflowInstance]:
+        return iter(list(self._instances.values()))
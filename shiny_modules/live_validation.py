@@ -0,0 +1,142 @@
+"""
+Live validation for the Shiny BPMS app
+Validates form fields while they are edited: edits are collected until the
+user pauses, then only the fields they can affect (the edited fields and the
+fields whose rules depend on them) are validated, and their messages are sent
+to the browser
+"""
+
+import asyncio
+import time
+from typing import Callable, List, Optional, Set
+
+from htmltools import HTMLDependency
+from shiny import reactive, ui
+
+# Pause after the last edit before validating, in milliseconds
+DEFAULT_DEBOUNCE_MS = 300
+
+# Custom message: {field: message or null}. Marks a field's input invalid and
+# shows the message under it, or clears both
+_VALIDATION_HEAD = """
+<script>
+(function () {
+  if (window.approvLiveValidation) { return; }
+  window.approvLiveValidation = true;
+  function show(messages) {
+    Object.keys(messages).forEach(function (field) {
+      var input = document.getElementById(field);
+      if (!input) { return; }
+      var container = input.closest(".shiny-input-container") || input.parentElement;
+      var feedback = container.querySelector("[data-validation-for='" + field + "']");
+      var message = messages[field];
+      input.classList.toggle("is-invalid", !!message);
+      if (!message) {
+        if (feedback) { feedback.remove(); }
+        return;
+      }
+      if (!feedback) {
+        feedback = document.createElement("div");
+        feedback.className = "invalid-feedback d-block";
+        feedback.dataset.validationFor = field;
+        container.appendChild(feedback);
+      }
+      feedback.textContent = message;
+    });
+  }
+  function register() { Shiny.addCustomMessageHandler("approv-validation", show); }
+  if (window.Shiny && Shiny.addCustomMessageHandler) { register(); }
+  else { document.addEventListener("DOMContentLoaded", register); }
+})();
+</script>
+"""
+
+live_validation_dependency = HTMLDependency("approv-live-validation", "1.0.0", head=ui.HTML(_VALIDATION_HEAD))
+
+
+class LiveValidation:
+    """
+    Debounced, incremental validation of a form's inputs for one session
+
+    Args:
+        form: The ShinyForm whose validator and stored values are used
+        debounce_ms: Pause after the last edit before validating
+    """
+
+    def __init__(self, form, debounce_ms: float = DEFAULT_DEBOUNCE_MS):
+        self.form = form
+        self.debounce = debounce_ms / 1000
+        # Fields edited since the last validation
+        self._pending: Set[str] = set()
+        self._last_edit = 0.0
+        # Fields the user has changed; rendering or updating a field is not a change
+        self._touched: Set[str] = set()
+        self._edits = reactive.Value(0)
+        # Inputs with an edit handler (see _watch)
+        self._watched: Set[str] = set()
+        self._input = None
+
+    def setup(self, input, session, user_roles: Optional[Callable[[], List[str]]] = None):
+        """
+        Watch the inputs of fields that have rules or that rules depend on
+
+        Args:
+            input: Shiny input object
+            session: Shiny session, to send the messages
+            user_roles: Reactive callable returning the user's roles; only
+                fields they can edit are validated (all fields when None)
+        """
+        self._input = input
+        self._watch_fields()
+
+        @reactive.effect
+        async def _validate_edits():
+            self._edits()
+            if not self._pending:
+                return
+            wait = self._last_edit + self.debounce - time.monotonic()
+            if wait > 0:
+                reactive.invalidate_later(wait)
+                return
+            changed, self._pending = self._pending, set()
+            validator = self.form.validator
+            if validator is None:
+                return
+            with reactive.isolate():
+                roles = user_roles() if user_roles else None
+                fields = validator.affected(changed)
+                values = {name: input[name]() for name in validator.inputs(fields) if name in input}
+            # Guarded matches can take up to their timeout; keep them off the event loop
+            messages = await asyncio.to_thread(self.form.field_messages, values, fields, roles)
+            if messages:
+                await session.send_custom_message("approv-validation", messages)
+
+    def set_form(self, form):
+        """Validate another form (a reloaded configuration) from now on"""
+        self.form = form
+        self._pending = set()
+        self._touched = set()
+        self._watch_fields()
+
+    def _watch_fields(self):
+        validator = self.form.validator
+        if validator is None or self._input is None:
+            return
+        for field in validator.dependents:
+            if field not in self._watched:
+                self._watched.add(field)
+                self._watch(self._input, field)
+
+    def _watch(self, input, field: str):
+        # A function per field, so that the handler does not take the field as a parameter
+        @reactive.effect
+        @reactive.event(input[field], ignore_init=True)
+        def _field_edited():
+            if field not in self._touched:
+                if not self.form.differs_from_sent(field, input[field]()):
+                    return
+                self._touched.add(field)
+            self._pending.add(field)
+            self._last_edit = time.monotonic()
+            self._edits.set(self._edits() + 1)
+
@@ -0,0 +1,105 @@
+"""
+Metrics endpoint and summaries for the Shiny BPMS app
+Serves the engine metrics (approv.Metrics) as Prometheus text next to the app
+"""
+
+from typing import Optional
+
+import pandas as pd
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+
+from approv.Metrics import (MetricsRegistry, registry as default_registry, STEP_DURATION, STEP_EXECUTIONS,
+                            WORKFLOW_DURATION, INSTANCES_IN_FLIGHT, PERMISSION_CHECKS,
+                            PERMISSION_CHECK_DURATION, AUDIT_WRITE_DURATION, FORM_RENDER_DURATION,
+                            VALIDATION_DURATION)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def with_metrics_endpoint(app, path: str = "/metrics", registry: Optional[MetricsRegistry] = None):
+    """
+    Wrap an ASGI app so that GET <path> returns the metrics in Prometheus text
+
+    Every other request, websocket and lifespan event goes to the wrapped
+    app unchanged.
+
+    Args:
+        app: The Shiny App (or any ASGI app)
+        path: Path to serve the metrics on
+        registry: Registry to expose (defaults to the engine registry)
+
+    Returns:
+        ASGI callable
+    """
+    registry = registry or default_registry
+
+    async def metrics_app(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == path:
+            request = Request(scope, receive)
+            if request.method not in ('GET', 'HEAD'):
+                response = PlainTextResponse("Method Not Allowed", status_code=405)
+            else:
+                response = PlainTextResponse(registry.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+            await response(scope, receive, send)
+            return
+        await app(scope, receive, send)
+
+    return metrics_app
+
+
+def _milliseconds(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def step_metrics_frame() -> pd.DataFrame:
+    """
+    Per-node step metrics, slowest nodes first
+
+    Returns:
+        DataFrame with node, class, run/error counts and latency figures in ms
+        (p50/p95 are bucket upper bounds)
+    """
+    executions = STEP_EXECUTIONS.samples()
+    rows = []
+    for (node, step_class), (_, total, count) in STEP_DURATION.samples().items():
+        rows.append({
+            'node': node,
+            'class': step_class,
+            'runs': count,
+            'errors': int(executions.get((node, step_class, 'error'), 0)),
+            'mean_ms': _milliseconds(total / count if count else None),
+            'p50_ms': _milliseconds(STEP_DURATION.quantile(0.5, node, step_class)),
+            'p95_ms': _milliseconds(STEP_DURATION.quantile(0.95, node, step_class)),
+            'total_ms': _milliseconds(total),
+        })
+    columns = ['node', 'class', 'runs', 'errors', 'mean_ms', 'p50_ms', 'p95_ms', 'total_ms']
+    if not rows:
+        return pd.DataFrame(columns=columns)
+    return pd.DataFrame(rows, columns=columns).sort_values('total_ms', ascending=False, ignore_index=True)
+
+
+def engine_metrics_frame() -> pd.DataFrame:
+    """
+    Engine-wide metrics: workflow runs, permission checks, audit writes,
+    form renders and field validation
+
+    Returns:
+        DataFrame with metric, labels, count and mean/p95 latency in ms
+    """
+    rows = [{'metric': 'instances in flight', 'labels': '', 'count': int(INSTANCES_IN_FLIGHT.value()),
+             'mean_ms': None, 'p95_ms': None}]
+    for label, histogram in (('process_workflow', WORKFLOW_DURATION), ('permission check', PERMISSION_CHECK_DURATION),
+                             ('audit write', AUDIT_WRITE_DURATION), ('form render', FORM_RENDER_DURATION),
+                             ('validation', VALIDATION_DURATION)):
+        for key, (_, total, count) in sorted(histogram.samples().items()):
+            rows.append({
+                'metric': label,
+                'labels': ", ".join(key),
+                'count': count,
+                'mean_ms': _milliseconds(total / count if count else None),
+                'p95_ms': _milliseconds(histogram.quantile(0.95, *key)),
+            })
+    denied = sum(value for (_, result), value in PERMISSION_CHECKS.samples().items() if result == 'denied')
+    rows.append({'metric': 'permission denials', 'labels': '', 'count': int(denied), 'mean_ms': None, 'p95_ms': None})
+    return pd.DataFrame(rows, columns=['metric', 'labels', 'count', 'mean_ms', 'p95_ms'])
@@ -0,0 +1,444 @@
+"""
+Durable workflow instance persistence for the Shiny BPMS app
+Stores instance status and form data in DuckDB (bpms.db), and audit events
+in the bpms_audit_log table or in date-partitioned Parquet files
+"""
+
+import atexit
+import glob
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+import pandas as pd
+
+from approv.Audit import SNAPSHOT_PREFIX, AuditLog, AuditTrail, replay
+from approv.FormCodec import FormCodec, schema_id_of
+from .config import DatabaseManager
+from .instances import WorkflowInstance
+
+INSTANCE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS bpms_process_instances (
+    process_instance_id INTEGER PRIMARY KEY,
+    status VARCHAR NOT NULL,
+    form_data TEXT,
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP
+);
+
+-- Form data in the binary FormCodec format (form_data then stays NULL)
+ALTER TABLE bpms_process_instances ADD COLUMN IF NOT EXISTS form_data_bin BLOB;
+
+-- Field layouts of the form configurations form_data_bin was written with
+CREATE TABLE IF NOT EXISTS bpms_form_schemas (
+    schema_id VARCHAR PRIMARY KEY,
+    fields TEXT NOT NULL
+);
+"""
+
+# Same layout as the bpms_audit_log table designed in duckdb.ipynb. Foreign
+# keys are left out so the table can be created before the user tables exist;
+# user_name keeps the acting user/role as recorded by the workflow engine.
+AUDIT_TABLE_SQL = """
+CREATE SEQUENCE IF NOT EXISTS seq_auditid START 1;
+
+CREATE TABLE IF NOT EXISTS bpms_audit_log (
+    audit_id INTEGER PRIMARY KEY DEFAULT NEXTVAL('seq_auditid'),
+    process_instance_id INTEGER NOT NULL,
+    task_id INTEGER,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    event_type VARCHAR,
+    user_id INTEGER,
+    role_id INTEGER,
+    permission_id INTEGER,
+    action VARCHAR,
+    old_value TEXT,
+    new_value TEXT,
+    comments TEXT,
+    ip_address VARCHAR,
+    status VARCHAR,
+    error_details TEXT,
+    associated_document_id INTEGER,
+    outcome VARCHAR,
+    duration INTEGER,
+    external_system_reference VARCHAR,
+    parent_process_id INTEGER,
+    reason_for_change TEXT,
+    data_payload TEXT
+);
+
+ALTER TABLE bpms_audit_log ADD COLUMN IF NOT EXISTS user_name VARCHAR;
+
+-- Point lookups of one instance's trail (see audit_query.py); time ranges
+-- are served by the row group min/max of the append-ordered timestamp column
+CREATE INDEX IF NOT EXISTS idx_audit_instance ON bpms_audit_log (process_instance_id);
+"""
+
+
+INSTANCE_COLUMNS = ['process_instance_id', 'status', 'form_data', 'created_at', 'updated_at', 'form_data_bin']
+
+
+def _utc(epoch: float) -> datetime:
+    """Naive UTC datetime for a TIMESTAMP column (matches DuckDB's epoch())"""
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
+
+
+class InstancePersistence:
+    """
+    Buffered, group-committed DuckDB writer for workflow instances
+
+    Saves are queued in memory and written by a background thread in a
+    single transaction per batch, so a burst of submissions pays for one
+    DuckDB commit instead of one per event. Repeated saves of the same
+    instance within a batch are coalesced into its latest state. Audit
+    events are not queued here: the thread takes the unflushed rows of each
+    tracked AuditLog and writes them as one columnar batch.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, batch_size: int = 200, flush_interval: float = 0.5,
+                 audit_parquet_dir: Optional[str] = None, codec: Optional[FormCodec] = None):
+        """
+        Args:
+            db_manager: Database manager for bpms.db
+            batch_size: Queued instance saves that trigger an early flush
+            flush_interval: Seconds between background flushes
+            audit_parquet_dir: Write audit events as Parquet files partitioned
+                by date under this directory instead of bpms_audit_log
+            codec: Form data codec; form data is stored in its binary format
+                (and loaded as typed values) instead of as JSON text
+        """
+        self.db_manager = db_manager
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.audit_parquet_dir = audit_parquet_dir
+        self.codec = codec
+
+        self._pending_instances: Dict[int, Tuple] = {}
+        self._audit_logs: List[AuditLog] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._schema_ready = False
+
+    def ensure_schema(self):
+        """Create the instance and audit tables if they do not exist"""
+        if self._schema_ready:
+            return
+        with self.db_manager.connection(read_only=False) as con:
+            con.execute(INSTANCE_TABLE_SQL)
+            con.execute(AUDIT_TABLE_SQL)
+            if self.codec is not None:
+                con.execute("INSERT OR IGNORE INTO bpms_form_schemas VALUES (?, ?)",
+                            [self.codec.schema_id, json.dumps(self.codec.schema(), default=str)])
+        self._schema_ready = True
+
+    def set_codec(self, codec: FormCodec):
+        """
+        Store form data in another codec's format from now on (the form was reloaded)
+
+        Its schema is recorded first; data stored before keeps loading with
+        the schema it was written with.
+        """
+        if codec is self.codec:
+            return
+        if self._schema_ready and codec is not None:
+            with self.db_manager.connection(read_only=False) as con:
+                con.execute("INSERT OR IGNORE INTO bpms_form_schemas VALUES (?, ?)",
+                            [codec.schema_id, json.dumps(codec.schema(), default=str)])
+        self.codec = codec
+
+    def start(self):
+        """Start the background flush thread"""
+        if self._thread is not None:
+            return
+        self.ensure_schema()
+        self._thread = threading.Thread(target=self._run, name="bpms-persistence", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the background thread after writing everything still queued"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def save_instance(self, instance: WorkflowInstance):
+        """Queue the current status and form data of an instance"""
+        self.save_instances([instance])
+
+    def save_instances(self, instances: List[WorkflowInstance]):
+        """Queue the current state of several instances at once"""
+        codec = self.codec
+        rows = [(
+            instance.instance_id,
+            instance.status,
+            None if codec else json.dumps(dict(instance.form_data), default=str),
+            _utc(instance.created_at),
+            _utc(instance.updated_at),
+            codec.dumps(instance.form_data) if codec else None,
+        ) for instance in instances]
+        with self._lock:
+            for row in rows:
+                self._pending_instances[row[0]] = row
+            pending = len(self._pending_instances)
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def track_audit(self, audit_log: AuditLog):
+        """Write the events recorded in an audit log on every flush"""
+        with self._lock:
+            if audit_log not in self._audit_logs:
+                self._audit_logs.append(audit_log)
+
+    def flush(self) -> int:
+        """
+        Write all queued instance saves and unflushed audit events
+
+        Instance rows (and audit rows bound for bpms_audit_log) are written in
+        one transaction; Parquet audit files are written after it commits.
+
+        Returns:
+            Number of rows written
+        """
+        with self._flush_lock:
+            with self._lock:
+                instances = list(self._pending_instances.values())
+                self._pending_instances = {}
+                audit_logs = list(self._audit_logs)
+
+            audit = []
+            for audit_log in audit_logs:
+                start, stop = audit_log.pending()
+                if stop > start:
+                    audit.append((audit_log, stop, audit_log.batch(start, stop)))
+
+            if not instances and not audit:
+                return 0
+
+            written = 0
+            try:
+                self.ensure_schema()
+                with self.db_manager.connection(read_only=False) as con:
+                    con.begin()
+                    try:
+                        if instances:
+                            instance_batch = pd.DataFrame(instances, columns=INSTANCE_COLUMNS)
+                            con.register('instance_batch', instance_batch)
+                            con.execute(f"""
+                                INSERT OR REPLACE INTO bpms_process_instances ({', '.join(INSTANCE_COLUMNS)})
+                                SELECT * FROM instance_batch
+                            """)
+                            con.unregister('instance_batch')
+                        if audit and not self.audit_parquet_dir:
+                            for _, _, audit_batch in audit:
+                                self._insert_audit(con, audit_batch)
+                        con.commit()
+                    except Exception:
+                        con.rollback()
+                        raise
+                    written += len(instances)
+
+                    if audit and self.audit_parquet_dir:
+                        for _, _, audit_batch in audit:
+                            self._copy_audit_parquet(con, audit_batch)
+            except Exception as e:
+                print(f"Warning: Error persisting workflow instances: {e}")
+                if not written:
+                    self._requeue(instances)
+                return written
+
+            for audit_log, stop, audit_batch in audit:
+                audit_log.mark_flushed(stop)
+                written += len(audit_batch)
+            return written
+
+    def _insert_audit(self, con, audit_batch: pd.DataFrame):
+        con.register('audit_batch', audit_batch)
+        con.execute("""
+            INSERT INTO bpms_audit_log
+                (process_instance_id, timestamp, event_type, status, action, comments, user_name, data_payload)
+            SELECT process_instance_id, timestamp, 'workflow', status, action, comments, user_name, data_payload
+            FROM audit_batch
+        """)
+        con.unregister('audit_batch')
+
+    def _copy_audit_parquet(self, con, audit_batch: pd.DataFrame):
+        """Append a batch as new Parquet files under <dir>/date=YYYY-MM-DD/"""
+        os.makedirs(self.audit_parquet_dir, exist_ok=True)
+        con.register('audit_batch', audit_batch)
+        target = self.audit_parquet_dir.replace("'", "''")
+        con.execute(f"""
+            COPY (SELECT *, CAST(timestamp AS DATE) AS date FROM audit_batch)
+            TO '{target}' (FORMAT PARQUET, PARTITION_BY (date), APPEND)
+        """)
+        con.unregister('audit_batch')
+
+    def _requeue(self, instances: List[Tuple]):
+        """Put instance rows from a failed flush back unless newer ones were queued"""
+        with self._lock:
+            for row in instances:
+                self._pending_instances.setdefault(row[0], row)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def load_instances(self, audit_log: Optional[AuditLog] = None) -> List[WorkflowInstance]:
+        """
+        Restore persisted instances, with audit trails that read their events lazily
+
+        Audit events are not loaded: each trail only learns how many events
+        its instance has stored and reads them through this persistence (the
+        log's reader) when it is opened. The status and form data of
+        instances whose audit events carry state are rebuilt from their
+        latest snapshot and the events after it; bpms_process_instances
+        supplies them for older instances.
+
+        Args:
+            audit_log: Log the restored trails record new events in; a new
+                one reading from this persistence when omitted
+
+        Returns:
+            List of restored WorkflowInstance objects
+        """
+        audit_log = audit_log if audit_log is not None else AuditLog(reader=self)
+        self.ensure_schema()
+        audit_source = self.audit_source()
+        audit_order = self._audit_order()
+        counts: Dict[int, int] = {}
+        tails: Dict[int, List[Tuple[str, Optional[str]]]] = {}
+        with self.db_manager.connection(read_only=False) as con:
+            instance_rows = con.execute("""
+                SELECT process_instance_id, status, form_data, epoch(created_at), epoch(updated_at), form_data_bin
+                FROM bpms_process_instances
+                ORDER BY process_instance_id
+            """).fetchall()
+            codecs = {schema_id: FormCodec(json.loads(fields)) for schema_id, fields in con.execute(
+                "SELECT schema_id, fields FROM bpms_form_schemas").fetchall()}
+            if audit_source:
+                counts = dict(con.execute(f"""
+                    SELECT process_instance_id, count(*) FROM {audit_source} GROUP BY process_instance_id
+                """).fetchall())
+                # Each instance's events from its latest snapshot on
+                for instance_id, status, payload in con.execute(f"""
+                    WITH events AS (
+                        SELECT process_instance_id, status, data_payload,
+                               row_number() OVER (PARTITION BY process_instance_id ORDER BY {audit_order}) AS position
+                        FROM {audit_source}
+                    ),
+                    latest AS (
+                        SELECT process_instance_id, max(position) AS position FROM events
+                        WHERE starts_with(data_payload, ?)
+                        GROUP BY process_instance_id
+                    )
+                    SELECT events.process_instance_id, events.status, events.data_payload
+                    FROM events JOIN latest USING (process_instance_id)
+                    WHERE events.position >= latest.position
+                    ORDER BY events.process_instance_id, events.position
+                """, [SNAPSHOT_PREFIX]).fetchall():
+                    tails.setdefault(instance_id, []).append((status, payload))
+
+        instances = []
+        for instance_id, status, form_data, created_at, updated_at, form_data_bin in instance_rows:
+            trail = AuditTrail(audit_log, instance_id, stored=counts.get(instance_id, 0))
+            tail = tails.get(instance_id)
+            if tail:
+                # Event-sourced instance: rebuild its state from the latest
+                # snapshot and the events recorded after it
+                status, form_data = tail[-1][0], replay(payload for _, payload in tail)
+            elif form_data_bin is not None:
+                form_data = codecs[schema_id_of(form_data_bin)].loads(form_data_bin)
+            else:
+                form_data = json.loads(form_data) if form_data else {}
+            if self.codec is not None:
+                # JSON (events, older rows) holds dates and times as text
+                form_data = self.codec.coerce(form_data)
+            instance = WorkflowInstance(instance_id, status, form_data, trail)
+            if created_at is not None:
+                instance.created_at = created_at
+            if updated_at is not None:
+                instance.updated_at = updated_at
+            instances.append(instance)
+        return instances
+
+    def events(self, instance_id: int, start: int, stop: int) -> List[Tuple]:
+        """
+        Stored audit events [start, stop) of one instance, in recording order
+
+        Part of the AuditLog reader protocol, see AuditTrail.
+
+        Returns:
+            (time ns, status, action, description, user, payload) tuples
+        """
+        audit_source = self.audit_source()
+        if stop <= start or not audit_source:
+            return []
+        with self.db_manager.connection(read_only=False) as con:
+            return con.execute(f"""
+                SELECT epoch_ns(timestamp), coalesce(status, ''), coalesce(action, ''),
+                       coalesce(comments, ''), coalesce(user_name, ''), data_payload
+                FROM {audit_source}
+                WHERE process_instance_id = ?
+                ORDER BY {self._audit_order()}
+                LIMIT ? OFFSET ?
+            """, [instance_id, stop - start, start]).fetchall()
+
+    def snapshots(self, instance_id: int, stop: int) -> List[int]:
+        """Positions before stop of one instance's stored events holding a full snapshot (AuditLog reader)"""
+        audit_source = self.audit_source()
+        if stop <= 0 or not audit_source:
+            return []
+        with self.db_manager.connection(read_only=False) as con:
+            rows = con.execute(f"""
+                SELECT position FROM (
+                    SELECT row_number() OVER (ORDER BY {self._audit_order()}) - 1 AS position, data_payload
+                    FROM {audit_source}
+                    WHERE process_instance_id = ?
+                )
+                WHERE position < ? AND starts_with(data_payload, ?)
+                ORDER BY position
+            """, [instance_id, stop, SNAPSHOT_PREFIX]).fetchall()
+        return [position for position, in rows]
+
+    def position_at(self, instance_id: int, time_ns: int, stop: int) -> int:
+        """Number of one instance's first stop stored events recorded at or before time_ns (AuditLog reader)"""
+        audit_source = self.audit_source()
+        if stop <= 0 or not audit_source:
+            return 0
+        with self.db_manager.connection(read_only=False) as con:
+            count, = con.execute(f"""
+                SELECT count(*) FROM {audit_source}
+                WHERE process_instance_id = ? AND epoch_ns(timestamp) <= ?
+            """, [instance_id, time_ns]).fetchone()
+        return min(count, stop)
+
+    def _audit_order(self) -> str:
+        # Recording order: the audit_id sequence, or the event time in the Parquet files
+        return 'timestamp' if self.audit_parquet_dir else 'audit_id'
+
+    def audit_source(self, row_ids: bool = False) -> Optional[str]:
+        """
+        FROM clause for stored audit events (None when there are none yet)
+
+        Args:
+            row_ids: Also expose the filename and file_row_number columns of
+                Parquet audit files, which identify an event like audit_id
+        """
+        if not self.audit_parquet_dir:
+            return "bpms_audit_log"
+        pattern = os.path.join(self.audit_parquet_dir, '**', '*.parquet')
+        if not glob.glob(pattern, recursive=True):
+            return None
+        ids = ", filename = true, file_row_number = true" if row_ids else ""
+        # union_by_name: files written before data_payload existed lack the column
+        return (f"read_parquet('{pattern.replace(chr(39), chr(39) * 2)}', "
+                f"hive_partitioning = true, union_by_name = true{ids})")
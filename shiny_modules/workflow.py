@@ -4,12 +4,19 @@ Manages workflow state and processing with reactive programming
 """
 
 from shiny import reactive, render
+import asyncio
 import yaml
 import time
-from datetime import datetime
+from contextlib import ExitStack, contextmanager
 from typing import Dict, Any, List, Optional, Callable
 import pandas as pd
+from approv.WorkflowStep import evaluate_condition
+from approv.WorkflowGraph import CompiledWorkflow, compile_workflow
+from approv.Metrics import AUDIT_WRITE_DURATION, FORM_RENDER_DURATION, check_permission, track_workflow
+from approv.Validation import ValidationError
 from .form import ShinyForm, ShinyFormRenderer
+from .instances import InstanceConflict, WorkflowInstance, WorkflowInstanceStore
+from .audit_view import AuditPager
 
 class ShinyWorkflow:
     """
@@ -17,63 +24,161 @@ class ShinyWorkflow:
     Handles workflow state management and processing with reactive state
     """
     
-    def __init__(self, workflow_config: Dict[str, Any], form_config: Dict[str, Any], initial_form_data: Optional[Dict] = None):
+    def __init__(self, workflow_config: Dict[str, Any], form_config: Dict[str, Any], initial_form_data: Optional[Dict] = None,
+                 graph: Optional[CompiledWorkflow] = None, instance: Optional[WorkflowInstance] = None,
+                 store: Optional[WorkflowInstanceStore] = None):
         self.config = workflow_config
+        # Store that persists changes of the open instance (optional)
+        self.store = store
+        # Compiled graph can be shared between instances built from the same config
+        self.graph = graph if graph is not None else compile_workflow(workflow_config)
         self.form_config = form_config
-        self.form_data = initial_form_data or {}
+        
+        # Only instances of the store are saved to it (see open_instance)
+        self._registered = instance is not None
+        if instance is None:
+            # Standalone workflow: keep state in a private, unregistered
+            # instance, which is never saved
+            form_data = initial_form_data or {}
+            instance = WorkflowInstance(0, form_data.get('status') or 'start', form_data)
+        self.instance = instance
+        self.form_data = instance.form_data
         
         # Initialize workflow state
-        self.current_status = reactive.Value(
-            'start' if not self.form_data.get('status') else self.form_data['status']
-        )
+        self.current_status = reactive.Value(instance.status)
+        self.status_changed_at = time.monotonic()
+        # Status this view last saw; a change is refused once another session
+        # has moved the instance on (see _changing)
+        self._seen_status = instance.status
+        self._claimed = False
         
-        # Initialize audit trail
-        self.audit_data = reactive.Value([])
+        # Initialize audit trail. The trail object is appended to in place,
+        # and setting a Value to the same object does not invalidate it, so
+        # audit_version is bumped on every recorded event
+        self.audit_data = reactive.Value(instance.audit)
+        self._audit_version = 0
+        self.audit_version = reactive.Value(0)
+        # Bumped whenever the open instance's form data may have changed,
+        # so a rendered form can be synchronized (see update_form_ui)
+        self._form_version = 0
+        self.form_version = reactive.Value(0)
+        # form_structure() of the form last built by create_form_ui
+        self._rendered_structure = None
         
         # Create form instance (without reactive audit data during init)
-        self.form = ShinyForm(self.form_config, self.form_data, [])
+        self.form = ShinyForm(self.form_config, self.form_data, instance.audit)
         self.form_renderer = ShinyFormRenderer(self.form)
         
         # Reactive values for workflow processing
         self.processing = reactive.Value(False)
         self.error_message = reactive.Value("")
         self.submitted_action = reactive.Value("")
+    
+    def open_instance(self, instance: WorkflowInstance):
+        """
+        Switch this workflow view to another workflow instance
+        
+        Args:
+            instance: Instance whose status, form data and audit trail to show
+        """
+        self.instance = instance
+        self._registered = True
+        self.form_data = instance.form_data
+        self.form.form_data = instance.form_data
+        self.form.audit_data = instance.audit
+        
+        self.status_changed_at = time.monotonic()
+        self._seen_status = instance.status
+        self.current_status.set(instance.status)
+        self.audit_data.set(instance.audit)
+        self.error_message.set("")
+        self._bump_form_version()
+    
+    def apply_config(self, workflow_config: Dict[str, Any], form_config: Dict[str, Any],
+                     graph: Optional[CompiledWorkflow] = None):
+        """
+        Switch to reloaded configurations, keeping the open instance
+        
+        Configurations are compared by identity; only a changed one is
+        applied. An instance whose status the new workflow no longer has
+        moves to 'stop' when it is next processed.
+        
+        Args:
+            workflow_config: Workflow configuration
+            form_config: Form configuration; the form is rebuilt from it
+            graph: Compiled workflow_config (compiled here if not given)
+        """
+        if workflow_config is not self.config:
+            self.config = workflow_config
+            self.graph = graph if graph is not None else compile_workflow(workflow_config)
+        if form_config is not self.form_config:
+            self.form_config = form_config
+            self.form = ShinyForm(self.form_config, self.form_data, self.instance.audit)
+            self.form_renderer.replace_form(self.form)
+            self._bump_form_version()
+    
+    def _bump_form_version(self):
+        self._form_version += 1
+        self.form_version.set(self._form_version)
         
     def audit(self, action: str, user: str, description: str = ""):
         """Add an audit entry to the audit trail"""
-        new_audit = {
-            'status': self.current_status(),
-            'action': action,
-            'description': description,
-            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f'),
-            'user': user
-        }
+        with AUDIT_WRITE_DURATION.time("shiny"):
+            self._write_audit(action, user, description)
+    
+    def _write_audit(self, action: str, user: str, description: str):
+        # Appends to the columnar audit log; the persistence thread writes it out.
+        # The form data makes the event carry the instance state (see AuditTrail)
+        self.instance.audit.record(self.instance.status, action, description, user,
+                                   form_data=self.instance.form_data)
+        self.instance.touch()
+        self.audit_data.set(self.instance.audit)
+        self._audit_version += 1
+        self.audit_version.set(self._audit_version)
         
-        try:
-            current_audit = self.audit_data()
-            current_audit.append(new_audit)
-            self.audit_data.set(current_audit)
-            
-            # Update form's audit data
-            self.form.audit_data = current_audit
-        except RuntimeError:
-            # Handle case where we're not in reactive context
-            if not hasattr(self, '_temp_audit'):
-                self._temp_audit = []
-            self._temp_audit.append(new_audit)
+        # Update form's audit data
+        self.form.audit_data = self.instance.audit
     
     def initiate(self):
         """Initiate the workflow"""
-        self.current_status.set("start")
-        self.audit("Workflow Initiated", 'system')
+        with self._changing():
+            self._set_status("start")
+            self.audit("Workflow Initiated", 'system')
+            self._save()
         return self.form_data
     
     def cancel(self):
         """Cancel the workflow"""
-        self.current_status.set("stop")
-        self.audit("Workflow canceled", 'system')
+        with self._changing():
+            self._set_status("stop")
+            self.audit("Workflow canceled", 'system')
+            self._save()
         return self.form_data
     
+    @contextmanager
+    def _changing(self):
+        """
+        Claim the open instance for a change (see WorkflowInstance.claim)
+        
+        Nested calls share the outer claim. When the claim is refused, the
+        view is brought up to date with the instance before the
+        InstanceConflict is raised.
+        """
+        if self._claimed:
+            yield
+            return
+        with ExitStack() as stack:
+            try:
+                stack.enter_context(self.instance.claim(self._seen_status))
+            except InstanceConflict:
+                self.open_instance(self.instance)
+                raise
+            self._claimed = True
+            try:
+                yield
+            finally:
+                self._claimed = False
+    
     @staticmethod
     def evaluate_condition(operator: str, attribute_value: Any, condition_value: Any) -> bool:
         """
@@ -87,22 +192,7 @@ class ShinyWorkflow:
         Returns:
             Boolean indicating if the condition is met
         """
-        if operator == "Equal":
-            return attribute_value == condition_value
-        elif operator == "GreaterThan":
-            return attribute_value > condition_value
-        elif operator == "LessThan":
-            return attribute_value < condition_value
-        elif operator == "GreaterThanOrEqual":
-            return attribute_value >= condition_value
-        elif operator == "LessThanOrEqual":
-            return attribute_value <= condition_value
-        elif operator == "Contains":
-            return condition_value in attribute_value
-        elif operator == "InList":
-            return attribute_value in condition_value
-        
-        return False
+        return evaluate_condition(operator, attribute_value, condition_value)
     
     def check_user_permission(self, step_config: Dict[str, Any], user_role: str) -> bool:
         """Check if user has permission to execute a workflow step"""
@@ -110,119 +200,224 @@ class ShinyWorkflow:
             return user_role in step_config['role']
         return True
     
-    def process_workflow(self, user_role: str, form_data: Dict[str, Any]) -> Dict[str, Any]:
+    def process_workflow(self, user_role: str, form_data: Dict[str, Any], auto_advance: bool = True) -> Dict[str, Any]:
         """
         Process the workflow with the given form data
         
         Args:
             user_role: The role of the user executing the workflow
             form_data: The form data to process
+            auto_advance: Run following automated steps back-to-back until a
+                user task, a paced step or the stop node is reached
             
         Returns:
             Updated form data
             
         Raises:
             PermissionError: If user doesn't have permission for the step
+            InstanceConflict: If another session is processing the instance
+                or has moved it on
             Exception: If workflow processing fails
         """
-        self.processing.set(True)
-        self.error_message.set("")
-        
-        try:
-            # Handle comments if present
-            if form_data.get('comments'):
-                self.audit("Commented", user_role, form_data['comments'])
-                form_data['comments'] = ""
-            
-            # Process one workflow step (non-blocking approach)
-            current_status = self.current_status()
-            
-            # Check if we have workflow configuration for current status
-            if current_status not in self.config.get('workflow', {}):
-                form_data['status'] = 'stop'
-                self.current_status.set('stop')
-                return form_data
+        with self._changing():
+            self.processing.set(True)
+            self.error_message.set("")
             
-            step_config = self.config['workflow'][current_status]
-            
-            # Check user permissions for this step
-            if not self.check_user_permission(step_config, user_role) and step_config.get('require_user_action', False):
-                raise PermissionError("User does not have permission to execute this step.")
-            
-            # Process the step (simplified - in real implementation you'd import and use WorkflowStep classes)
-            step_class = step_config.get('class', 'Simple')
-            decision = f"Processed step: {current_status}"
+            try:
+                with track_workflow("shiny"):
+                    node = self._begin_processing(user_role, form_data)
+                    while node is not None:
+                        # Run the pre-bound step and resolve the next status
+                        next_id, decision = self.graph.advance(node.id, form_data)
+                        node = self._apply_transition(next_id, decision, user_role, form_data, auto_advance)
+                        
+            except Exception as e:
+                self.error_message.set(str(e))
+                raise e
+            finally:
+                self._save()
+                self.processing.set(False)
+        
+        return form_data
+    
+    async def process_workflow_async(self, user_role: str, form_data: Dict[str, Any],
+                                     auto_advance: bool = True) -> Dict[str, Any]:
+        """
+        Process the workflow on the running event loop
+        
+        Same semantics as process_workflow(), but steps with an async
+        process() are awaited, so other sessions and instances keep running
+        while a step waits on I/O. Independent instances can be advanced
+        concurrently with asyncio.gather over their workflows; the instance
+        stays claimed while its steps are awaited.
+        
+        Args:
+            user_role: The role of the user executing the workflow
+            form_data: The form data to process
+            auto_advance: Run following automated steps back-to-back until a
+                user task, a paced step or the stop node is reached
             
-            # Determine next status based on step configuration
-            next_status = self._determine_next_status(step_config, form_data)
+        Returns:
+            Updated form data
             
-            # Update status and audit
-            self.current_status.set(next_status)
-            self.audit(decision, user_role)
-            form_data['status'] = next_status
+        Raises:
+            PermissionError: If user doesn't have permission for the step
+            InstanceConflict: If another session is processing the instance
+                or has moved it on
+            Exception: If workflow processing fails
+        """
+        with self._changing():
+            self.processing.set(True)
+            self.error_message.set("")
             
-            # If next step doesn't require user action, schedule continued processing
-            if next_status != 'stop' and not step_config.get('require_user_action', True):
-                # Use reactive.invalidate_later for non-blocking continuation
-                # This would be implemented in the UI layer with reactive.Effect
-                pass
-                    
-        except Exception as e:
-            self.error_message.set(str(e))
-            raise e
-        finally:
-            self.processing.set(False)
+            try:
+                with track_workflow("shiny"):
+                    node = self._begin_processing(user_role, form_data)
+                    while node is not None:
+                        next_id, decision = await self.graph.advance_async(node.id, form_data)
+                        node = self._apply_transition(next_id, decision, user_role, form_data, auto_advance)
+                        
+            except Exception as e:
+                self.error_message.set(str(e))
+                raise e
+            finally:
+                self._save()
+                self.processing.set(False)
         
         return form_data
     
-    def _determine_next_status(self, step_config: Dict[str, Any], form_data: Dict[str, Any]) -> str:
+    def _begin_processing(self, user_role: str, form_data: Dict[str, Any]):
         """
-        Determine the next workflow status based on step configuration and form data
+        Record comments and find the node to process
         
-        Args:
-            step_config: Configuration for the current step
-            form_data: Current form data
-            
         Returns:
-            Next workflow status
+            The current CompiledNode, or None if there is nothing to process
         """
-        # Check if there are conditions to evaluate
-        if 'conditions' in step_config:
-            for condition_name, condition in step_config['conditions'].items():
-                operator = condition.get('operator')
-                attribute = condition.get('attribute')
-                value = condition.get('value')
-                next_status = condition.get('next_status')
-                
-                if operator and attribute and value is not None and next_status:
-                    attribute_value = form_data.get(attribute)
-                    if self.evaluate_condition(operator, attribute_value, value):
-                        return next_status
-        
-        # Check for simple outputs configuration
-        if 'outputs' in step_config and step_config['outputs']:
-            return step_config['outputs'][0]  # Use first output as default
-        
-        # Default to stop if no next status determined
-        return 'stop'
+        # Handle comments if present
+        if form_data.get('comments'):
+            self.audit("Commented", user_role, form_data['comments'])
+            form_data['comments'] = ""
+        
+        node_id = self.graph.id_of(self.instance.status)
+        
+        # Check if we have workflow configuration for current status
+        if node_id is None:
+            form_data['status'] = 'stop'
+            self._set_status('stop')
+            return None
+        
+        node = self.graph.nodes[node_id]
+        self._check_node_permission(node, user_role)
+        return node
+    
+    def _check_node_permission(self, node, user_role: str):
+        """Raise PermissionError if the role may not act on a user task"""
+        if not check_permission(node, user_role):
+            raise PermissionError("User does not have permission to execute this step.")
+    
+    def _apply_transition(self, next_id: int, decision: str, user_role: str, form_data: Dict[str, Any],
+                          auto_advance: bool):
+        """
+        Move the instance to the next node and audit the decision
+        
+        Returns:
+            The node to process next, or None if processing should stop here
+        """
+        node = self.graph.nodes[next_id]
+        
+        # Update status and audit
+        self._set_status(node.name)
+        form_data['status'] = node.name
+        self.audit(decision, user_role)
+        
+        # Paced steps are left to the UI layer, which schedules them
+        # with reactive.invalidate_later (see auto_advance_delay)
+        if (not auto_advance or node.id == self.graph.stop_id
+                or node.require_user_action or node.pacing):
+            return None
+        
+        self._check_node_permission(node, user_role)
+        return node
+    
+    def _save(self):
+        """Hand the open instance's current state to the store"""
+        self._bump_form_version()
+        if self.store is not None and self._registered:
+            self.store.save(self.instance)
+    
+    def _set_status(self, status: str):
+        """Set the current status and remember when the transition happened"""
+        self.status_changed_at = time.monotonic()
+        self._seen_status = status
+        self.instance.status = status
+        self.instance.touch()
+        self.current_status.set(status)
+    
+    def auto_advance_delay(self) -> Optional[float]:
+        """
+        Get the time left before the current automated step is due
+        
+        Returns:
+            Seconds to wait (0 when due now), or None if the current step
+            waits for a user or the workflow has stopped
+        """
+        node_id = self.graph.id_of(self.current_status())
+        if node_id is None or node_id == self.graph.stop_id:
+            return None
+        
+        node = self.graph.nodes[node_id]
+        if node.require_user_action:
+            return None
+        
+        return max(0.0, node.pacing - (time.monotonic() - self.status_changed_at))
     
     def create_form_ui(self, user_role: str) -> List:
         """Create the form UI for the current workflow status"""
         current_status = self.current_status()
         
-        # Update form data in the form instance
-        self.form.form_data = self.form_data
-        
-        # Create form elements
-        form_elements = self.form.create_form_ui([user_role])
-        
-        # Add action buttons if not in start/stop state
-        if current_status not in ['start', 'stop']:
-            action_buttons = self.form.create_action_buttons(current_status)
-            form_elements.extend(action_buttons)
+        with FORM_RENDER_DURATION.time("shiny"):
+            self._rendered_structure = self.form_structure()
+            # Update form data in the form instance
+            self.form.form_data = self.form_data
+            
+            # Create form elements
+            form_elements = self.form.create_form_ui([user_role])
+            
+            # Add action buttons if not in start/stop state
+            if current_status not in ['start', 'stop']:
+                action_buttons = self.form.create_action_buttons(current_status)
+                form_elements.extend(action_buttons)
         
         return form_elements
     
+    def form_structure(self) -> tuple:
+        """
+        Key of what the form container shows
+        
+        The container is rebuilt only when this changes: another form
+        configuration, or moving between the start/stop placeholders and the
+        form. Everything else is applied with update_form_ui.
+        """
+        status = self.current_status()
+        return (id(self.form.compiled), status if status in ('start', 'stop') else 'form')
+    
+    def update_form_ui(self, user_role: str, input=None) -> Dict[str, int]:
+        """Synchronize the rendered form with the current form data and role"""
+        if self.current_status() in ('start', 'stop') or self.form_structure() != self._rendered_structure:
+            # Nothing to update, or a rebuild with the current values is pending
+            return {'updated': 0, 'replaced': 0}
+        with FORM_RENDER_DURATION.time("shiny"):
+            self.form.form_data = self.form_data
+            return self.form.update_form_ui([user_role], input)
+    
+    def render_sections(self, user_role: str, opened) -> int:
+        """Build the form sections opened for the first time (see ShinyForm.render_sections)"""
+        if self.current_status() in ('start', 'stop') or self.form_structure() != self._rendered_structure:
+            return 0
+        with FORM_RENDER_DURATION.time("shiny"):
+            self.form.form_data = self.form_data
+            return self.form.render_sections(opened, [user_role])
+    
     def handle_form_submission(self, input_values: Dict[str, Any], action: str, user_role: str) -> Dict[str, Any]:
         """
         Handle form submission and process workflow
@@ -235,16 +430,55 @@ class ShinyWorkflow:
         Returns:
             Updated form data
         """
-        # Extract form data
-        form_data = self.form.get_form_data(input_values, action)
+        # Extract form data; invalid values are reported and nothing is processed
+        try:
+            form_data = self.form.get_form_data(input_values, action, [user_role])
+        except ValidationError as e:
+            self.error_message.set(str(e))
+            return self.form_data
         
         if form_data:
-            # Update internal form data
-            self.form_data.update(form_data)
+            try:
+                # The submitted values are applied under the same claim as the transition
+                with self._changing():
+                    # Update internal form data
+                    self.form_data.update(form_data)
+                    
+                    # Process workflow
+                    updated_data = self.process_workflow(user_role, self.form_data)
+                self.form_data = updated_data
+                return updated_data
+            except Exception as e:
+                self.error_message.set(str(e))
+                return self.form_data
+        
+        return self.form_data
+    
+    async def handle_form_submission_async(self, input_values: Dict[str, Any], action: str,
+                                           user_role: str) -> Dict[str, Any]:
+        """
+        Handle form submission and process workflow on the event loop
+        
+        Args:
+            input_values: Values from Shiny input widgets
+            action: The action that was submitted
+            user_role: The role of the user submitting
             
-            # Process workflow
+        Returns:
+            Updated form data
+        """
+        try:
+            # Validation (guarded matches) and storing uploads run off the event loop
+            form_data = await asyncio.to_thread(self.form.get_form_data, input_values, action, [user_role])
+        except ValidationError as e:
+            self.error_message.set(str(e))
+            return self.form_data
+        
+        if form_data:
             try:
-                updated_data = self.process_workflow(user_role, self.form_data)
+                with self._changing():
+                    self.form_data.update(form_data)
+                    updated_data = await self.process_workflow_async(user_role, self.form_data)
                 self.form_data = updated_data
                 return updated_data
             except Exception as e:
@@ -279,21 +513,17 @@ class ShinyWorkflowRenderer:
             error = self.workflow.error_message()
             return error if error else ""
         
-        @output
-        @render.data_frame
-        def audit_trail():
-            audit_data = self.workflow.audit_data()
-            if audit_data:
-                return pd.DataFrame(audit_data)
-            return pd.DataFrame(columns=['status', 'action', 'description', 'time', 'user'])
+        # Paginated audit trail (see audit_pager_ui)
+        AuditPager("audit_trail", self.workflow.audit_data, self.workflow.audit_version).setup(input, output)
         
         # Setup form dataframe outputs
-        self.workflow.form_renderer.setup_dataframe_outputs(output, input)
+        self.workflow.form_renderer.setup_dataframe_outputs(
+            output, input, audit_trail=self.workflow.audit_data, audit_version=self.workflow.audit_version)
     
     def setup_workflow_handlers(self, input, user_role_reactive: reactive.Value):
         """Setup reactive handlers for workflow actions"""
         
-        def handle_action(action: str):
+        async def handle_action(action: str):
             user_role = user_role_reactive()
             current_input = {}
             
@@ -303,7 +533,7 @@ class ShinyWorkflowRenderer:
                     current_input[field_name] = getattr(input, field_name)()
             
             # Process the workflow
-            self.workflow.handle_form_submission(current_input, action, user_role)
+            await self.workflow.handle_form_submission_async(current_input, action, user_role)
         
         # Setup action button handlers
         self.workflow.form_renderer.setup_action_handlers(input, handle_action)
@@ -0,0 +1,118 @@
+"""The async engine path and the async step protocol"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from approv.WorkflowGraph import compile_workflow
+from approv.WorkflowStep import STEP_CLASSES
+from shiny_modules.workflow import ShinyWorkflow
+
+DELAY = 0.2
+
+
+class Lookup:
+    """An async step that waits on I/O"""
+
+    def __init__(self, config):
+        self.config = config
+
+    async def process(self, form_data):
+        await asyncio.sleep(DELAY)
+        form_data['looked_up'] = True
+        return self.config['outputs'][0], "Looked up"
+
+
+class BlockingCall:
+    """A step that blocks its thread, flagged for a worker thread"""
+
+    blocking = True
+
+    def __init__(self, config):
+        self.config = config
+
+    def process(self, form_data):
+        form_data['thread'] = threading.current_thread().name
+        started = time.perf_counter()
+        time.sleep(DELAY)
+        form_data['span'] = (started, time.perf_counter())
+        return self.config['outputs'][0], "Called"
+
+
+def workflow(step_class):
+    return {'workflow': {
+        'start': {'class': 'Start', 'require_user_action': False, 'outputs': ['call']},
+        'call': {'class': step_class, 'require_user_action': False, 'outputs': ['done']},
+        'done': {'class': 'Simple', 'require_user_action': True, 'outputs': ['stop']},
+        'stop': {'class': 'Stop', 'require_user_action': False},
+    }}
+
+
+FORM = {'form': {'fields': {}, 'actions': {}, 'permissions': {}}}
+
+
+@pytest.fixture(autouse=True)
+def steps(monkeypatch):
+    monkeypatch.setitem(STEP_CLASSES, 'Lookup', Lookup)
+    monkeypatch.setitem(STEP_CLASSES, 'BlockingCall', BlockingCall)
+
+
+def test_async_steps_are_flagged_when_compiling():
+    graph = compile_workflow(workflow('Lookup'))
+    assert graph.node('call').is_async and not graph.node('start').is_async
+    assert compile_workflow(workflow('BlockingCall')).node('call').blocking
+
+
+def test_the_sync_engine_runs_an_async_step_to_completion():
+    graph = compile_workflow(workflow('Lookup'))
+    form_data = {}
+    next_id, decision = graph.advance(graph.id_of('call'), form_data)
+    assert (graph.nodes[next_id].name, decision, form_data) == ('done', "Looked up", {'looked_up': True})
+
+
+def test_the_sync_engine_refuses_an_async_step_inside_an_event_loop():
+    graph = compile_workflow(workflow('Lookup'))
+
+    async def advance():
+        graph.advance(graph.id_of('call'), {})
+
+    with pytest.raises(RuntimeError, match="use advance_async"):
+        asyncio.run(advance())
+
+
+def test_instances_waiting_on_async_steps_run_concurrently():
+    graph = compile_workflow(workflow('Lookup'))
+    workflows = [ShinyWorkflow(workflow('Lookup'), FORM, {}, graph=graph) for _ in range(5)]
+
+    async def run_all():
+        return await asyncio.gather(*(flow.process_workflow_async('anyone', flow.form_data) for flow in workflows))
+
+    started = time.perf_counter()
+    results = asyncio.run(run_all())
+    # Five awaits of DELAY overlap instead of adding up
+    assert time.perf_counter() - started < 3 * DELAY
+    assert all(result['looked_up'] and result['status'] == 'done' for result in results)
+    assert all(flow.instance.status == 'done' for flow in workflows)
+
+
+def test_a_blocking_step_runs_off_the_event_loop():
+    graph = compile_workflow(workflow('BlockingCall'))
+    flow = ShinyWorkflow(workflow('BlockingCall'), FORM, {}, graph=graph)
+    ticks = []
+
+    async def tick():
+        while len(ticks) < 20:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(DELAY / 10)
+
+    async def run():
+        await asyncio.gather(flow.process_workflow_async('anyone', flow.form_data), tick())
+
+    asyncio.run(run())
+    assert flow.instance.status == 'done'
+    assert flow.form_data['thread'] != threading.main_thread().name
+    # The loop kept ticking while the step blocked its worker thread
+    started, finished = flow.form_data['span']
+    assert sum(started < tick < finished for tick in ticks) >= 3
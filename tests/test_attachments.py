@@ -0,0 +1,130 @@
+"""Content-addressed attachments and their download endpoint"""
+
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from shiny_modules.attachments import (Attachment, AttachmentStore, attachment_refs, attachment_url,
+                                       with_attachment_endpoint)
+
+CONTENT = bytes(range(256)) * 40
+
+
+def request(app, method, path, query=b'', headers=()):
+    """Send one HTTP request to an ASGI app; returns (status, headers, body)"""
+    messages = []
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client stays connected
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query,
+             'headers': [(key.encode(), value.encode()) for key, value in headers]}
+    asyncio.run(app(scope, receive, send))
+    start = messages[0]
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return start['status'], {key.decode(): value.decode() for key, value in start['headers']}, body
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AttachmentStore(str(tmp_path / 'attachments'), chunk_size=1000)
+
+
+@pytest.fixture
+def stored(store, tmp_path):
+    source = tmp_path / 'report.pdf'
+    source.write_bytes(CONTENT)
+    return store.put_file(str(source), content_type='application/pdf')
+
+
+@pytest.fixture
+def endpoint(store):
+    async def app(scope, receive, send):
+        raise AssertionError("not an attachment request")
+    return with_attachment_endpoint(app, store)
+
+
+def test_files_are_stored_once_under_their_digest(store, stored, tmp_path):
+    digest = hashlib.sha256(CONTENT).hexdigest()
+    assert stored == Attachment(digest, 'report.pdf', len(CONTENT), 'application/pdf')
+    copy = tmp_path / 'copy.pdf'
+    copy.write_bytes(CONTENT)
+    again = store.put_uploads([{'name': 'copy.pdf', 'size': len(CONTENT), 'type': '', 'datapath': str(copy)}])
+    assert again == [{'sha256': digest, 'name': 'copy.pdf', 'size': len(CONTENT), 'type': ''}]
+    assert os.listdir(os.path.dirname(store.path(digest))) == [digest]
+    assert os.listdir(os.path.join(store.root, 'incoming')) == []
+    with open(store.path(digest), 'rb') as file:
+        assert file.read() == CONTENT
+
+
+def test_ranges_are_read_in_chunks(store, stored):
+    chunks = list(store.iter_range(stored.sha256, 500, 2600))
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 100]
+    assert b''.join(chunks) == CONTENT[500:2600]
+    with pytest.raises(ValueError):
+        store.path('../etc/passwd')
+
+
+def test_only_valid_references_are_attachments(stored):
+    value = [stored.to_dict(), {'name': 'old upload', 'datapath': '/tmp/x'}, "text"]
+    assert attachment_refs(value) == [stored]
+    assert attachment_refs("not a list") == []
+    assert attachment_url(stored) == f"attachments/{stored.sha256}?name=report.pdf"
+
+
+def test_a_download_streams_the_file_with_its_digest_as_etag(endpoint, stored):
+    status, headers, body = request(endpoint, 'GET', f"/attachments/{stored.sha256}", b'name=r%C3%A9sum%C3%A9.pdf')
+    assert status == 200
+    assert body == CONTENT
+    assert headers['etag'] == f'"{stored.sha256}"'
+    assert headers['content-length'] == str(len(CONTENT))
+    assert headers['accept-ranges'] == 'bytes'
+    assert headers['content-disposition'] == "attachment; filename*=UTF-8''r%C3%A9sum%C3%A9.pdf"
+    assert 'immutable' in headers['cache-control']
+
+
+def test_a_cached_copy_is_not_sent_again(endpoint, stored):
+    status, headers, body = request(endpoint, 'GET', f"/attachments/{stored.sha256}",
+                                    headers=[('if-none-match', f'"{stored.sha256}"')])
+    assert (status, body) == (304, b'')
+    assert headers['etag'] == f'"{stored.sha256}"'
+
+
+@pytest.mark.parametrize('header, start, stop', [
+    ('bytes=100-199', 100, 200),
+    ('bytes=10000-', 10000, len(CONTENT)),
+    ('bytes=-50', len(CONTENT) - 50, len(CONTENT)),
+    ('bytes=10000-99999', 10000, len(CONTENT)),
+])
+def test_byte_ranges_are_served_partially(endpoint, stored, header, start, stop):
+    status, headers, body = request(endpoint, 'GET', f"/attachments/{stored.sha256}", headers=[('range', header)])
+    assert status == 206
+    assert body == CONTENT[start:stop]
+    assert headers['content-range'] == f"bytes {start}-{stop - 1}/{len(CONTENT)}"
+    assert headers['content-length'] == str(stop - start)
+
+
+def test_unsatisfiable_or_malformed_ranges_send_the_whole_file(endpoint, stored):
+    for header in ('bytes=20000-', 'bytes=0-1,5-9', 'lines=1-2'):
+        status, _, body = request(endpoint, 'GET', f"/attachments/{stored.sha256}", headers=[('range', header)])
+        assert (status, body) == (200, CONTENT)
+
+
+def test_head_unknown_and_other_requests(endpoint, stored):
+    status, headers, body = request(endpoint, 'HEAD', f"/attachments/{stored.sha256}")
+    assert (status, body) == (200, b'')
+    assert headers['content-length'] == str(len(CONTENT))
+    assert request(endpoint, 'GET', f"/attachments/{'0' * 64}")[0] == 404
+    assert request(endpoint, 'GET', "/attachments/../bpms.db")[0] == 404
+    assert request(endpoint, 'POST', f"/attachments/{stored.sha256}")[0] == 405
@@ -0,0 +1,177 @@
+"""Rebuilding instance state from audit snapshots and deltas"""
+
+import random
+
+import pytest
+
+from approv.Audit import SNAPSHOT_INTERVAL, SNAPSHOT_PREFIX, AuditLog, AuditTrail, InstanceState
+from approv.WorkflowGraph import compile_workflow
+from shiny_modules.config import DatabaseManager
+from shiny_modules.instances import WorkflowInstanceStore
+from shiny_modules.persistence import InstancePersistence
+from shiny_modules.workflow import ShinyWorkflow
+
+T0 = 1_700_000_000_000_000_000
+
+
+def record_history(trails, events, seed=0):
+    """Record random form data changes; returns the expected (status, form data) per trail and position"""
+    rng = random.Random(seed)
+    states = {trail.instance_id: {} for trail in trails}
+    expected = {trail.instance_id: [] for trail in trails}
+    for number in range(events):
+        trail = rng.choice(trails)
+        form_data = states[trail.instance_id]
+        change = rng.random()
+        if change < 0.5:
+            form_data[f"field_{rng.randint(0, 5)}"] = rng.choice([number, str(number), [number], None, True])
+        elif change < 0.6 and form_data:
+            del form_data[rng.choice(sorted(form_data))]
+        status = f"status_{number % 4}"
+        # Some events carry no state at all
+        carries_state = rng.random() < 0.9
+        trail.record(status, "act", f"comment {number}", "user", T0 + number * 1000,
+                     form_data=dict(form_data) if carries_state else None)
+        expected[trail.instance_id].append((status, dict(form_data) if carries_state else None, T0 + number * 1000))
+    return expected
+
+
+def replayed(history, position):
+    """Expected form data at a position: the last state carried up to it"""
+    for _, form_data, _ in reversed(history[:position + 1]):
+        if form_data is not None:
+            return form_data
+    return {}
+
+
+def test_state_at_every_position_matches_the_recorded_state():
+    log = AuditLog()
+    trails = [AuditTrail(log, instance_id) for instance_id in (1, 2, 3)]
+    expected = record_history(trails, 600)
+    for trail in trails:
+        history = expected[trail.instance_id]
+        assert len(trail) == len(history)
+        for position, (status, _, time_ns) in enumerate(history):
+            state = trail.state_at(position)
+            assert (state.status, state.form_data, state.time_ns) == (status, replayed(history, position), time_ns)
+
+
+def test_snapshots_bound_the_replay():
+    log = AuditLog()
+    trail = AuditTrail(log, 1)
+    for number in range(3 * SNAPSHOT_INTERVAL + 1):
+        trail.record("open", "edit", form_data={'n': number, 'fixed': 'same'})
+    assert list(trail.snapshots) == [0, SNAPSHOT_INTERVAL, 2 * SNAPSHOT_INTERVAL, 3 * SNAPSHOT_INTERVAL]
+    assert all(log.payload_of(trail.rows[position]).startswith(SNAPSHOT_PREFIX) for position in trail.snapshots)
+    # Deltas only hold what changed
+    assert log.payload_of(trail.rows[1]) == '{"set":{"n":1}}'
+
+
+def test_state_as_of_a_time():
+    log = AuditLog()
+    trail = AuditTrail(log, 1)
+    history = record_history([trail], 120, seed=3)[1]
+    assert trail.state_at(time_ns=T0 - 1).position == -1
+    for position in (0, 37, 119):
+        time_ns = history[position][2]
+        assert trail.state_at(time_ns=time_ns).position == position
+        assert trail.state_at(time_ns=time_ns + 999).form_data == replayed(history, position)
+
+
+@pytest.mark.parametrize('parquet', [False, True])
+def test_evicted_and_reloaded_trails_rebuild_the_same_state(tmp_path, parquet):
+    db = DatabaseManager(str(tmp_path / 'bpms.db'))
+    persistence = InstancePersistence(db, audit_parquet_dir=str(tmp_path / 'audit') if parquet else None)
+    store = WorkflowInstanceStore(persistence=persistence)
+    store.audit_log.retain = 20
+    instances = [store.create() for _ in range(3)]
+    reference = AuditLog()
+    references = {instance.instance_id: AuditTrail(reference, instance.instance_id) for instance in instances}
+
+    rng = random.Random(7)
+    for number in range(300):
+        instance = rng.choice(instances)
+        instance.form_data['amount'] = number
+        instance.status = f"status_{number % 3}"
+        for trail in (instance.audit, references[instance.instance_id]):
+            # bpms_audit_log keeps microseconds
+            trail.record(instance.status, "edit", f"comment {number}", "user", T0 + number * 1000,
+                         form_data=instance.form_data)
+        store.save(instance)
+        if number % 25 == 0:
+            persistence.flush()
+    persistence.flush()
+    # Only the newest flushed rows stay in memory
+    assert len(store.audit_log) - store.audit_log.pending()[0] == 0
+    assert store.audit_log._base > 0
+
+    restored = WorkflowInstanceStore(persistence=InstancePersistence(db, audit_parquet_dir=persistence.audit_parquet_dir))
+    assert restored.load() == 3
+    for instance in instances:
+        reference_trail = references[instance.instance_id]
+        for trail in (instance.audit, restored.get(instance.instance_id).audit):
+            assert trail.to_frame().equals(reference_trail.to_frame())
+            for position in (0, 10, len(reference_trail) - 1):
+                assert trail.state_at(position) == reference_trail.state_at(position)
+        loaded = restored.get(instance.instance_id)
+        assert (loaded.status, dict(loaded.form_data)) == (instance.status, dict(instance.form_data))
+
+
+def test_state_at_replays_from_the_nearest_snapshot_only(monkeypatch):
+    log = AuditLog()
+    trail = AuditTrail(log, 1)
+    for number in range(4 * SNAPSHOT_INTERVAL):
+        trail.record("open", "edit", form_data={'n': number})
+    replayed_ranges = []
+    events = AuditTrail._events
+
+    def spy(self, start, stop):
+        replayed_ranges.append((start, stop))
+        return events(self, start, stop)
+
+    monkeypatch.setattr(AuditTrail, '_events', spy)
+    for position in (0, SNAPSHOT_INTERVAL - 1, 2 * SNAPSHOT_INTERVAL + 7, -1):
+        assert trail.state_at(position).form_data == {'n': position % len(trail)}
+    assert replayed_ranges == [(0, 1), (0, SNAPSHOT_INTERVAL), (2 * SNAPSHOT_INTERVAL, 2 * SNAPSHOT_INTERVAL + 8),
+                               (3 * SNAPSHOT_INTERVAL, 4 * SNAPSHOT_INTERVAL)]
+
+
+def log_payload(trail, position):
+    return trail.log.payload_of(trail.rows[position])
+
+
+def test_removed_fields_and_out_of_range_positions():
+    trail = AuditTrail(AuditLog(), 1)
+    assert trail.state_at() == InstanceState('start', {}, -1, 0)
+    trail.record("draft", "save", time_ns=T0, form_data={'amount': 1, 'note': "x"})
+    trail.record("review", "submit", time_ns=T0 + 1, form_data={'amount': 2})
+    assert log_payload(trail, 1) == '{"set":{"amount":2},"unset":["note"]}'
+    assert trail.state_at() == InstanceState('review', {'amount': 2}, 1, T0 + 1)
+    assert trail.state_at(0).form_data == {'amount': 1, 'note': "x"}
+    with pytest.raises(IndexError):
+        trail.state_at(2)
+
+
+def test_the_engine_records_the_state_of_every_step():
+    workflow = {'workflow': {
+        'start': {'class': 'Start', 'require_user_action': False, 'outputs': ['review']},
+        'review': {'class': 'Simple', 'require_user_action': True, 'role': ['clerk'], 'outputs': ['done']},
+        'done': {'class': 'Simple', 'require_user_action': True, 'role': ['clerk'], 'outputs': ['stop']},
+        'stop': {'class': 'Stop', 'require_user_action': False},
+    }}
+    form = {'form': {'fields': {'amount': {'title': 'Amount', 'type': 'number_input'}}, 'actions': {},
+                     'permissions': {}}}
+    store = WorkflowInstanceStore({'amount': 0})
+    instance = store.create()
+    session = ShinyWorkflow(workflow, form, graph=compile_workflow(workflow), instance=instance, store=store)
+    session.initiate()
+    session.process_workflow('clerk', session.form_data)
+    session.handle_form_submission({'amount': 5}, 'submit', 'clerk')
+    assert instance.status == 'done'
+
+    states = [store.state_as_of(instance.instance_id, position=position) for position in range(len(instance.audit))]
+    # Each event records the status the instance moved to and the form data at that point
+    assert [event['status'] for event in instance.audit] == [state.status for state in states]
+    assert states[-1].status == 'done' and states[-1].form_data['amount'] == 5
+    assert all(state.form_data['amount'] == 0 for state in states if state.status != 'done')
+    assert store.state_as_of(instance.instance_id) == states[-1]
@@ -0,0 +1,111 @@
+"""Searching the stored audit trail"""
+
+import time
+from datetime import date, datetime
+
+import pytest
+
+from shiny_modules.audit_query import AuditFilter, AuditQuery
+from shiny_modules.config import DatabaseManager
+from shiny_modules.instances import WorkflowInstanceStore
+from shiny_modules.persistence import InstancePersistence
+
+
+def local_ns(*args):
+    return int(datetime(*args).timestamp()) * 1_000_000_000
+
+
+# Server local time; Berlin is two hours ahead of UTC in May
+EVENTS = [
+    # (instance, local time, status, action, user)
+    (0, (2024, 4, 30, 23, 59), 'draft', 'save', 'alice'),
+    (0, (2024, 5, 1, 0, 30), 'review', 'submit', 'alice'),
+    (1, (2024, 5, 1, 12, 0), 'draft', 'save', 'bob'),
+    (1, (2024, 5, 1, 23, 30), 'review', 'submit', 'bob'),
+    (0, (2024, 5, 2, 9, 0), 'approved', 'approve', 'carol'),
+]
+
+
+@pytest.fixture
+def berlin(monkeypatch):
+    monkeypatch.setenv('TZ', 'Europe/Berlin')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.fixture(params=[False, True], ids=['table', 'parquet'])
+def persistence(request, tmp_path, berlin):
+    return InstancePersistence(DatabaseManager(str(tmp_path / 'bpms.db')),
+                               audit_parquet_dir=str(tmp_path / 'audit') if request.param else None)
+
+
+def record(persistence, events):
+    store = WorkflowInstanceStore(persistence=persistence)
+    instances = [store.create(), store.create()]
+    for index, moment, status, action, user in events:
+        instance = instances[index]
+        instance.audit.record(status, action, f"{action} by {user}", user, local_ns(*moment))
+        store.save(instance)
+    persistence.flush()
+    return [instance.instance_id for instance in instances]
+
+
+def descriptions(frame):
+    return list(frame['description'])
+
+
+def test_filters_select_the_matching_events_newest_first(persistence):
+    first, second = record(persistence, EVENTS)
+    query = AuditQuery(persistence)
+    assert descriptions(query.page(AuditFilter()).frame) == [
+        'approve by carol', 'submit by bob', 'save by bob', 'submit by alice', 'save by alice']
+    assert descriptions(query.page(AuditFilter(instance_id=first)).frame) == [
+        'approve by carol', 'submit by alice', 'save by alice']
+    assert descriptions(query.page(AuditFilter(user='bob', action='submit')).frame) == ['submit by bob']
+    assert descriptions(query.page(AuditFilter(instance_id=second, status='draft')).frame) == ['save by bob']
+    assert query.count(AuditFilter(status='review')) == 2
+    assert query.count(AuditFilter(user='nobody')) == 0
+
+
+def test_dates_are_whole_local_days(persistence):
+    record(persistence, EVENTS)
+    query = AuditQuery(persistence)
+    may_first = AuditFilter(since=date(2024, 5, 1), until=date(2024, 5, 1))
+    assert descriptions(query.page(may_first).frame) == ['submit by bob', 'save by bob', 'submit by alice']
+    assert query.count(AuditFilter(until=date(2024, 4, 30))) == 1
+    assert query.count(AuditFilter(since=datetime(2024, 5, 1, 12, 0))) == 3
+    frame = query.page(AuditFilter(since=date(2024, 5, 2))).frame
+    assert list(frame['time']) == ['2024-05-02 09:00:00.000000']
+
+
+def test_pages_tell_whether_more_follow(persistence):
+    record(persistence, EVENTS)
+    query = AuditQuery(persistence)
+    pages = [query.page(AuditFilter(), page, page_size=2) for page in range(3)]
+    assert [len(page.frame) for page in pages] == [2, 2, 1]
+    assert [page.has_more for page in pages] == [True, True, False]
+    assert descriptions(pages[1].frame) == ['save by bob', 'submit by alice']
+
+
+def test_streaming_returns_every_event_once_even_with_equal_times(persistence):
+    # Equal timestamps are ordered by the row key, so batch boundaries never skip or repeat an event
+    events = [(number % 2, (2024, 5, 1, 10, number // 4), 'open', 'edit', f'user{number}') for number in range(23)]
+    record(persistence, events)
+    query = AuditQuery(persistence)
+    batches = list(query.stream(AuditFilter(), batch_size=5))
+    assert [len(batch) for batch in batches] == [5, 5, 5, 5, 3]
+    users = [user for batch in batches for user in batch['user']]
+    assert sorted(users) == sorted(f'user{number}' for number in range(23))
+    assert users == list(query.page(AuditFilter(), page_size=100).frame['user'])
+    assert list(query.stream(AuditFilter(user='nobody'))) == []
+
+
+def test_nothing_stored_yet(tmp_path):
+    query = AuditQuery(InstancePersistence(DatabaseManager(str(tmp_path / 'bpms.db')),
+                                           audit_parquet_dir=str(tmp_path / 'audit')))
+    page = query.page(AuditFilter())
+    assert page.frame.empty and not page.has_more
+    assert list(query.stream(AuditFilter())) == []
+    assert query.count(AuditFilter()) == 0
@@ -0,0 +1,108 @@
+"""Paging audit trails and formatting their times"""
+
+import time
+
+import numpy as np
+import pytest
+from shiny import reactive
+
+from approv.Audit import AuditLog, AuditTrail, format_time, format_times
+from shiny_modules.audit_view import AuditPageCache, AuditPager
+
+T0 = 1_700_000_000_000_000_000
+# 2024-03-31 01:00 UTC: clocks in Berlin go from 02:00 to 03:00
+DST_START_NS = 1_711_846_800 * 1_000_000_000
+
+
+class CountingCache(AuditPageCache):
+    """Counts the rows decoded"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.decoded = 0
+
+    def _decode(self, trail, start, stop):
+        self.decoded += stop - start
+        return super()._decode(trail, start, stop)
+
+
+def trail_of(events):
+    trail = AuditTrail(AuditLog(), 1)
+    for number in range(events):
+        trail.record("open", "edit", f"event {number}", "clerk", T0 + number)
+    return trail
+
+
+@pytest.fixture
+def berlin(monkeypatch):
+    monkeypatch.setenv('TZ', 'Europe/Berlin')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_pages_are_clamped_and_hold_their_own_events():
+    cache = AuditPageCache(page_size=10)
+    trail = trail_of(25)
+    assert cache.page_count(trail) == 3
+    assert cache.page_count(trail_of(0)) == 1
+    assert list(cache.page(trail, 1)['description']) == [f"event {number}" for number in range(10, 20)]
+    assert list(cache.page(trail, 99)['description']) == [f"event {number}" for number in range(20, 25)]
+    assert cache.page(trail, -1)['description'].iloc[0] == "event 0"
+    assert cache.page(trail_of(0), 0).empty
+
+
+def test_full_pages_are_decoded_once_and_the_last_page_only_decodes_new_rows():
+    cache = CountingCache(page_size=10)
+    trail = trail_of(15)
+    cache.page(trail, 0)
+    cache.page(trail, 1)
+    assert cache.decoded == 15
+    cache.page(trail, 0)
+    cache.page(trail, 1)
+    assert cache.decoded == 15
+
+    trail.record("open", "edit", "event 15", "clerk", T0 + 15)
+    trail.record("open", "edit", "event 16", "clerk", T0 + 16)
+    page = cache.page(trail, 1)
+    assert cache.decoded == 17
+    assert list(page['description']) == [f"event {number}" for number in range(10, 17)]
+
+
+def test_least_recently_used_pages_are_evicted():
+    cache = CountingCache(page_size=10, max_pages=2)
+    trail = trail_of(30)
+    for page in (0, 1, 0, 2):
+        cache.page(trail, page)
+    assert cache.decoded == 30
+    cache.page(trail, 0)
+    assert cache.decoded == 30
+    cache.page(trail, 1)
+    assert cache.decoded == 40
+
+
+def test_plain_lists_of_entries_are_paged_too():
+    entries = [{'status': 'open', 'action': 'edit', 'description': str(number), 'time': '', 'user': 'clerk'}
+               for number in range(12)]
+    cache = AuditPageCache(page_size=5)
+    assert list(cache.page(entries, 2)['description']) == ['10', '11']
+
+
+def test_the_pager_follows_the_newest_page_until_one_is_selected():
+    trail = trail_of(25)
+    pager = AuditPager("audit", lambda: trail, lambda: len(trail), cache=AuditPageCache(page_size=10))
+    with reactive.isolate():
+        assert pager._current()[1:] == (2, 3)
+        pager.selected_page.set(0)
+        assert pager._current()[1:] == (0, 3)
+        pager.selected_page.set(7)
+        assert pager._current()[1:] == (2, 3)
+
+
+def test_times_get_the_utc_offset_in_effect_at_that_time(berlin):
+    before, after = DST_START_NS - 1, DST_START_NS + 123_456_789
+    assert format_time(before) == '2024-03-31 01:59:59.999999'
+    assert format_time(after) == '2024-03-31 03:00:00.123456'
+    assert list(format_times(np.array([before, after]))) == [format_time(before), format_time(after)]
+    assert list(format_times(np.array([], dtype=np.int64))) == []
@@ -0,0 +1,105 @@
+"""Automated steps run back-to-back, with optional pacing"""
+
+import copy
+import json
+import time
+
+import pytest
+import yaml
+from shiny import reactive
+
+from approv.WorkflowGraph import compile_workflow
+from shiny_modules.workflow import ShinyWorkflow
+
+AUTOMATED = ['nuclear_strike', 'api_call_nuclear_strike', 'stop']
+
+
+class SessionState(dict):
+    __getattr__ = dict.__getitem__
+
+
+class FakeStreamlit:
+    def __init__(self):
+        self.session_state = SessionState()
+
+
+@pytest.fixture
+def configs():
+    with open('workflow.yaml') as file:
+        workflow_config = yaml.safe_load(file)
+    with open('form.yaml') as file:
+        form_config = yaml.safe_load(file)
+    with open('data.json') as file:
+        form_data = json.load(file)
+    return workflow_config, form_config, form_data
+
+
+@pytest.fixture
+def streamlit_engine(monkeypatch):
+    """The Streamlit Workflow class, with time.sleep recording its calls"""
+    pytest.importorskip('streamlit')
+    from approv import Workflow as module
+    sleeps = []
+    monkeypatch.setattr(module.time, 'sleep', sleeps.append)
+    return module.Workflow, sleeps
+
+
+def paced(workflow_config, seconds):
+    config = copy.deepcopy(workflow_config)
+    config['workflow']['nuclear_strike']['pacing'] = seconds
+    return config
+
+
+def approve(run, data):
+    """Take data to the president's decision and approve it"""
+    run('GENERAL_USER', data)
+    data['general_confirmation'] = True
+    run('GENERAL_USER', data)
+    data['president_confirmation'] = True
+    run('PRESIDENT_USER', data)
+
+
+def test_the_streamlit_engine_does_not_sleep_between_automated_steps(configs, streamlit_engine):
+    workflow_config, form_config, form_data = configs
+    Workflow, sleeps = streamlit_engine
+    workflow = Workflow(FakeStreamlit(), workflow_config, form_config, copy.deepcopy(form_data))
+    approve(workflow.process_workflow, workflow.form_data)
+    assert workflow.current_status == 'stop'
+    assert [event['status'] for event in workflow.audit_data][-3:] == AUTOMATED
+    assert sleeps == []
+
+
+def test_the_streamlit_engine_sleeps_only_for_paced_steps(configs, streamlit_engine):
+    workflow_config, form_config, form_data = configs
+    Workflow, sleeps = streamlit_engine
+    workflow = Workflow(FakeStreamlit(), paced(workflow_config, 0.25), form_config, copy.deepcopy(form_data))
+    approve(workflow.process_workflow, workflow.form_data)
+    assert workflow.current_status == 'stop'
+    assert sleeps == [0.25]
+
+
+def test_the_shiny_engine_runs_automated_steps_in_one_call(configs):
+    workflow_config, form_config, form_data = configs
+    data = copy.deepcopy(form_data)
+    workflow = ShinyWorkflow(workflow_config, form_config, data, graph=compile_workflow(workflow_config))
+    started = time.perf_counter()
+    approve(workflow.process_workflow, data)
+    # One second per step before; now only the steps' own work
+    assert time.perf_counter() - started < 1.0
+    assert workflow.instance.status == 'stop'
+    assert [event['status'] for event in workflow.instance.audit][-3:] == AUTOMATED
+
+
+def test_the_shiny_engine_leaves_a_paced_step_to_be_scheduled(configs):
+    workflow_config, form_config, form_data = configs
+    data = copy.deepcopy(form_data)
+    workflow = ShinyWorkflow(workflow_config, form_config, data, graph=compile_workflow(paced(workflow_config, 30)))
+    approve(workflow.process_workflow, data)
+    assert workflow.instance.status == 'nuclear_strike'
+    with reactive.isolate():
+        assert 29 < workflow.auto_advance_delay() <= 30
+    workflow.status_changed_at -= 30
+    with reactive.isolate():
+        assert workflow.auto_advance_delay() == 0
+    workflow.process_workflow('PRESIDENT_USER', data)
+    assert workflow.instance.status == 'stop'
@@ -0,0 +1,138 @@
+"""Bulk decisions agree with deciding each instance on its own"""
+
+import pandas as pd
+import pytest
+
+from approv.WorkflowGraph import compile_workflow
+from approv.WorkflowStep import STEP_CLASSES, evaluate_condition
+from shiny_modules.bulk import VECTOR_OPERATORS, bulk_decide, evaluate_decisions
+from shiny_modules.instances import WorkflowInstanceStore
+
+
+def user_step(outputs=()):
+    return {'class': 'Simple', 'require_user_action': True, 'role': ['clerk'], 'outputs': list(outputs)}
+
+
+WORKFLOW = {'workflow': {
+    'start': {'class': 'Start', 'require_user_action': False, 'outputs': ['review']},
+    'review': {
+        'class': 'ExclusiveChoice',
+        'require_user_action': True,
+        'role': ['clerk'],
+        'outputs': ['manual', 'approved', 'rejected'],
+        'conditions': {
+            'default': 'manual',
+            'blocked': {'operator': 'InList', 'attribute': 'country', 'value': ['XX', 'YY'], 'next_status': 'rejected'},
+            'small': {'operator': 'LessThan', 'attribute': 'amount', 'value': 500, 'next_status': 'approved'},
+            'trusted': {'operator': 'Equal', 'attribute': 'customer', 'value': 'acme', 'next_status': 'approved'},
+        },
+    },
+    'manual': user_step(['stop']),
+    'approved': user_step(['stop']),
+    'rejected': user_step(['stop']),
+    'stop': {'class': 'Stop', 'require_user_action': False},
+}}
+
+STORED = [
+    {'amount': 100, 'country': 'DE', 'customer': 'x'},
+    {'amount': 900, 'country': 'DE', 'customer': 'acme'},
+    {'amount': 100, 'country': 'XX', 'customer': 'acme'},
+    {'amount': 900, 'country': 'FR', 'customer': 'y'},
+    {'amount': 499.5, 'country': 'YY', 'customer': 'z'},
+]
+
+
+@pytest.fixture
+def graph():
+    return compile_workflow(WORKFLOW)
+
+
+def waiting_instances(graph, rows):
+    store = WorkflowInstanceStore()
+    instances = []
+    for row in rows:
+        instance = store.create(row)
+        instance.status = 'review'
+        instances.append(instance)
+    return store, instances
+
+
+def scalar_decisions(graph, rows):
+    step = graph.node('review').step
+    return [step.process(row) for row in rows]
+
+
+def test_ids_only_frame_decides_on_the_stored_form_data(graph):
+    store, instances = waiting_instances(graph, STORED)
+    frame = pd.DataFrame({'instance_id': [instance.instance_id for instance in instances]})
+    result = bulk_decide(store, graph, 'review', frame, 'clerk')
+    expected = scalar_decisions(graph, STORED)
+    assert result['status'].tolist() == [next_status for next_status, _ in expected]
+    assert [f"Decision made: {condition}" for condition in result['condition']] == [message for _, message in expected]
+    assert result['applied'].all()
+
+
+def test_frame_columns_override_the_stored_form_data(graph):
+    store, instances = waiting_instances(graph, STORED)
+    amounts = [1000, 10, 10, 10, 1000]
+    frame = pd.DataFrame({'instance_id': [instance.instance_id for instance in instances], 'amount': amounts})
+    result = bulk_decide(store, graph, 'review', frame, 'clerk')
+    merged = [dict(row, amount=amount) for row, amount in zip(STORED, amounts)]
+    assert result['status'].tolist() == [next_status for next_status, _ in scalar_decisions(graph, merged)]
+    assert [instance.form_data['amount'] for instance in instances] == amounts
+    assert [instance.status for instance in instances] == result['status'].tolist()
+
+
+def test_evaluate_decisions_matches_the_scalar_step(graph):
+    frame = pd.DataFrame(STORED)
+    decisions = evaluate_decisions(graph, 'review', frame)
+    expected = scalar_decisions(graph, STORED)
+    assert decisions['next_status'].tolist() == [next_status for next_status, _ in expected]
+
+
+def test_evaluate_decisions_needs_every_attribute(graph):
+    with pytest.raises(ValueError, match="needs a 'customer' column"):
+        evaluate_decisions(graph, 'review', pd.DataFrame({'amount': [1], 'country': ['DE']}))
+
+
+class Explode:
+    """An automated step that fails for one customer"""
+
+    def __init__(self, config):
+        self.config = config
+
+    def process(self, form_data):
+        if form_data.get('customer') == 'acme':
+            raise RuntimeError("service unavailable")
+        form_data['booked'] = True
+        return self.config['outputs'][0], "Booked"
+
+
+def test_an_instance_whose_steps_fail_is_left_as_it_was(monkeypatch):
+    monkeypatch.setitem(STEP_CLASSES, 'Explode', Explode)
+    config = {'workflow': dict(WORKFLOW['workflow'], approved={
+        'class': 'Explode', 'require_user_action': False, 'outputs': ['booked']}, booked=user_step(['stop']))}
+    graph = compile_workflow(config)
+    store, instances = waiting_instances(graph, STORED[:3])
+    saved = []
+    monkeypatch.setattr(store, 'save_many', lambda touched: saved.extend(touched))
+    frame = pd.DataFrame({'instance_id': [instance.instance_id for instance in instances], 'note': ['n'] * 3})
+
+    result = bulk_decide(store, graph, 'review', frame, 'clerk')
+
+    assert result['applied'].tolist() == [True, False, True]
+    assert result['status'].tolist() == ['booked', 'review', 'rejected']
+    assert result['error'].isna().tolist() == [True, False, True]
+    assert result['error'][1] == "service unavailable"
+    failed = instances[1]
+    assert failed.status == 'review'
+    assert failed.form_data == dict(STORED[1])
+    assert len(failed.audit) == len(store.create().audit)
+    assert saved == [instances[0], instances[2]]
+    assert instances[0].form_data['booked'] is True
+
+
+def test_in_list_with_a_string_value_is_a_substring_test():
+    column = pd.Series(['ab', 'x', 'abc', None], dtype=object)
+    expected = [evaluate_condition('InList', value, 'abcd') if value is not None else False for value in column]
+    assert VECTOR_OPERATORS['InList'](column, 'abcd').tolist() == expected == [True, False, True, False]
@@ -0,0 +1,109 @@
+"""Validating imported datasets a column at a time"""
+
+import random
+
+import pandas as pd
+import pytest
+
+from approv import Validation
+from approv.Validation import ERROR_COLUMNS, FormValidator, RuleSet, load_table, validate_frame
+
+RULES = RuleSet({
+    'required_field': {'regex': '.+', 'description': 'required'},
+    'numeric_validation': {'regex': '^[0-9]+$', 'description': 'digits'},
+    'short': {'regex': '^.{0,3}$', 'description': 'at most three characters'},
+    'strong': {'regex': '^(?=.*[A-Z])(?=.*[0-9]).{6,}$', 'description': 'strong password'},
+    'same_password': {'regex': '^{{password}}$', 'description': 'the password again'},
+})
+
+FORM = {'form': {
+    'fields': {
+        'code': {'title': 'Code', 'type': 'text_input', 'validation': ['required_field', 'numeric_validation', 'short']},
+        'password': {'title': 'Password', 'type': 'text_input', 'validation': ['strong']},
+        'confirm': {'title': 'Confirm', 'type': 'text_input', 'validation': ['required_field', 'same_password']},
+        'comment': {'title': 'Comment', 'type': 'text_area'},
+    },
+    'validation_budget_ms': 10_000,
+    'actions': {},
+    'permissions': {},
+}}
+
+
+def random_frame(rows, seed=0):
+    rng = random.Random(seed)
+    codes = ['1', '12', '1234', 'abc', '', None, 7, 42.0]
+    passwords = ['Secret1', 'secret', 'ABCDEF9', 'a.b+C9', None]
+    data = []
+    for _ in range(rows):
+        password = rng.choice(passwords)
+        confirm = password if rng.random() < 0.6 else rng.choice(passwords + ['x'])
+        data.append({'code': rng.choice(codes), 'password': password, 'confirm': confirm, 'comment': 'free'})
+    return pd.DataFrame(data, index=pd.RangeIndex(100, 100 + rows))
+
+
+def one_by_one(validator, frame):
+    """The failures validate finds submission by submission, as (row, field, rule)"""
+    failures = []
+    for row, record in frame.iterrows():
+        values = {field: (None if pd.isna(value) else value) for field, value in record.items()}
+        failures.extend((row, error.field, error.rule) for error in validator.validate(values).errors)
+    return failures
+
+
+def as_tuples(errors):
+    return list(errors.itertuples(index=False, name=None))
+
+
+def test_columns_fail_like_submissions_do():
+    validator = FormValidator(FORM, RULES)
+    frame = random_frame(400)
+    errors = validator.validate_frame(frame, max_workers=1)
+    assert list(errors.columns) == ERROR_COLUMNS
+    assert as_tuples(errors) == one_by_one(validator, frame)
+    # Rows keep the frame's own labels
+    assert errors['row'].min() >= 100
+
+
+def test_only_the_first_failing_rule_of_a_field_is_reported():
+    validator = FormValidator(FORM, RULES)
+    frame = pd.DataFrame({'code': ['abcd', '', '12'], 'password': ['Secret1'] * 3})
+    assert as_tuples(validator.validate_frame(frame)) == [
+        (0, 'code', 'numeric_validation'), (1, 'code', 'required_field')]
+
+
+def test_a_referenced_column_that_is_missing_counts_as_empty():
+    validator = FormValidator(FORM, RULES)
+    frame = pd.DataFrame({'confirm': ['', 'Secret1']})
+    assert as_tuples(validator.validate_frame(frame)) == [(0, 'confirm', 'required_field'),
+                                                          (1, 'confirm', 'same_password')]
+
+
+def test_a_ruleset_binds_columns_named_after_its_rules():
+    frame = pd.DataFrame({'numeric_validation': ['1', 'x'], 'short': ['abcd', 'ab'], 'other': ['', '']})
+    assert as_tuples(RULES.validate_frame(frame)) == [
+        (0, 'short', 'short'), (1, 'numeric_validation', 'numeric_validation')]
+    assert RULES.validate_frame(pd.DataFrame({'other': ['x']})).empty
+
+
+def test_worker_processes_find_the_same_failures(monkeypatch):
+    monkeypatch.setattr(Validation, 'PARALLEL_MIN_MATCHES', 0)
+    validator = FormValidator(FORM, RULES)
+    frame = random_frame(300, seed=1)
+    bindings = {field_rules.field: field_rules.rules for field_rules in validator.fields}
+    assert validate_frame(frame, bindings, max_workers=2).equals(validate_frame(frame, bindings, max_workers=1))
+
+
+def test_csv_cells_are_read_as_typed(tmp_path):
+    path = tmp_path / 'import.csv'
+    path.write_text("code,confirm\n007,\n12,x\n")
+    frame = load_table(str(path))
+    assert list(frame['code']) == ['007', '12']
+    assert pd.isna(frame['confirm'][0])
+
+
+def test_parquet_datasets_are_read_too(tmp_path):
+    pytest.importorskip('pyarrow')
+    frame = pd.DataFrame({'code': ['007', None]})
+    parquet = tmp_path / 'import.parquet'
+    frame.to_parquet(parquet)
+    assert load_table(str(parquet)).equals(frame)
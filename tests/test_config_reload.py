@@ -0,0 +1,160 @@
+"""Reloading the configuration files when they change on disk"""
+
+import json
+import os
+
+import pytest
+import yaml
+
+from shiny_modules import config as config_module
+from shiny_modules.config import ConfigManager
+from shiny_modules.instances import WorkflowInstanceStore
+from shiny_modules.workflow import ShinyWorkflow
+
+WORKFLOW = {'workflow': {
+    'start': {'class': 'Start', 'require_user_action': False, 'outputs': ['review']},
+    'review': {'class': 'Simple', 'require_user_action': True, 'role': ['clerk'], 'outputs': ['stop']},
+    'stop': {'class': 'Stop', 'require_user_action': False},
+}}
+FORM = {'form': {
+    'fields': {'amount': {'title': 'Amount', 'type': 'number_input'}},
+    'actions': {'submit': {'title': 'Submit'}},
+    'permissions': {},
+}}
+
+# Modification times set explicitly, so changes are seen whatever the file system's resolution
+SECOND = 1_000_000_000
+
+
+def write(name, content, mtime):
+    with open(name, 'w') as file:
+        file.write(content)
+    os.utime(name, ns=(mtime * SECOND, mtime * SECOND))
+
+
+@pytest.fixture
+def parses(tmp_path, monkeypatch):
+    """Configuration files in a fresh directory; counts the parses per file"""
+    monkeypatch.chdir(tmp_path)
+    write('workflow.yaml', yaml.dump(WORKFLOW), 1)
+    write('form.yaml', yaml.dump(FORM), 1)
+    write('data.json', json.dumps({'amount': 5}), 1)
+    counts = {}
+
+    def counting(filename, parse):
+        def counted(text):
+            counts[filename] = counts.get(filename, 0) + 1
+            return parse(text)
+        return counted
+
+    monkeypatch.setattr(config_module, '_CONFIG_FILES', tuple(
+        (attribute, filename, counting(filename, parse)) for attribute, filename, parse in config_module._CONFIG_FILES))
+    return counts
+
+
+def test_unchanged_files_are_not_read_again(parses, monkeypatch):
+    manager = ConfigManager()
+    assert manager.version == 1
+    assert manager.form_data == {'amount': 5}
+    opened = []
+    monkeypatch.setattr(config_module, 'open', lambda *args: opened.append(args[0]), raising=False)
+    assert manager.check_for_changes() == 1
+    assert opened == []
+
+
+def test_a_touched_file_with_the_same_content_is_not_reparsed(parses):
+    manager = ConfigManager()
+    form_config = manager.form_config
+    write('form.yaml', yaml.dump(FORM), 2)
+    assert manager.check_for_changes() == 1
+    assert manager.form_config is form_config
+    assert parses['form.yaml'] == 1
+
+
+def test_a_changed_file_is_reparsed_and_bumps_the_version(parses):
+    manager = ConfigManager()
+    write('data.json', json.dumps({'amount': 7}), 2)
+    assert manager.check_for_changes() == 2
+    assert manager.get_form_data() == {'amount': 7}
+    assert parses == {'workflow.yaml': 1, 'form.yaml': 1, 'data.json': 2}
+    # A rewrite that keeps both the size and the mtime is only seen once the mtime moves
+    write('data.json', json.dumps({'amount': 8}), 2)
+    assert manager.check_for_changes() == 2
+    write('data.json', json.dumps({'amount': 8}), 3)
+    assert manager.check_for_changes() == 3
+    assert manager.get_form_data() == {'amount': 8}
+
+
+def test_a_broken_or_missing_file_keeps_the_previous_version(parses, capsys):
+    manager = ConfigManager()
+    workflow_config = manager.workflow_config
+    write('workflow.yaml', "workflow: [unclosed", 2)
+    assert manager.check_for_changes() == 1
+    assert manager.workflow_config is workflow_config
+    assert "keeping the previous version" in capsys.readouterr().out
+    os.remove('workflow.yaml')
+    assert manager.check_for_changes() == 1
+    assert manager.workflow_config is workflow_config
+    assert "workflow.yaml not found" in capsys.readouterr().out
+
+
+def test_each_version_is_compiled_once(parses):
+    manager = ConfigManager()
+    snapshot = manager.snapshot()
+    assert manager.snapshot() is snapshot
+    assert snapshot.form_data == {'amount': 5.0}
+    write('data.json', json.dumps({'amount': 6}), 2)
+    manager.check_for_changes()
+    reloaded = manager.snapshot()
+    assert reloaded.version == 2 and reloaded.form_data == {'amount': 6.0}
+    # Configurations that did not change keep what was compiled from them
+    assert reloaded.graph is snapshot.graph and reloaded.codec is snapshot.codec
+
+
+def test_a_workflow_that_does_not_compile_is_not_applied(parses, capsys):
+    manager = ConfigManager()
+    snapshot = manager.snapshot()
+    broken = {'workflow': {'start': {'class': 'Start', 'require_user_action': False, 'outputs': ['nowhere']}}}
+    write('workflow.yaml', yaml.dump(broken), 2)
+    manager.check_for_changes()
+    reloaded = manager.snapshot()
+    assert reloaded.version == 2
+    assert reloaded.workflow_config is snapshot.workflow_config and reloaded.graph is snapshot.graph
+    assert "Reloaded workflow configuration not applied" in capsys.readouterr().out
+
+
+def test_a_saved_workflow_is_published_without_reparsing_it(parses):
+    manager = ConfigManager()
+    changed = {'workflow': dict(WORKFLOW['workflow'], review=dict(WORKFLOW['workflow']['review'], role=['manager']))}
+    manager.save_workflow_config(changed)
+    assert manager.version == 2
+    assert manager.check_for_changes() == 2
+    assert manager.workflow_config is changed
+    assert parses['workflow.yaml'] == 1
+    assert manager.snapshot().graph.nodes[manager.snapshot().graph.id_of('review')].permits('manager')
+
+
+def test_a_session_switches_to_a_reloaded_form_and_keeps_its_instance(parses):
+    manager = ConfigManager()
+    snapshot = manager.snapshot()
+    store = WorkflowInstanceStore(snapshot.form_data)
+    instance = store.create()
+    session = ShinyWorkflow(snapshot.workflow_config, snapshot.form_config, graph=snapshot.graph,
+                            instance=instance, store=store)
+    session.initiate()
+    session.process_workflow('clerk', session.form_data)
+    form = session.form
+
+    extended = {'form': dict(FORM['form'], fields=dict(FORM['form']['fields'],
+                                                       note={'title': 'Note', 'type': 'text_input'}))}
+    write('form.yaml', yaml.dump(extended), 2)
+    manager.check_for_changes()
+    reloaded = manager.snapshot()
+    session.apply_config(reloaded.workflow_config, reloaded.form_config, reloaded.graph)
+    assert session.form is not form and 'note' in session.form.form_fields
+    assert session.graph is snapshot.graph
+    assert session.instance is instance and instance.status == 'review'
+    # An unchanged configuration is not applied again
+    current = session.form
+    session.apply_config(reloaded.workflow_config, reloaded.form_config, reloaded.graph)
+    assert session.form is current
@@ -0,0 +1,69 @@
+"""Server-side data grid for large dataframe fields"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from shiny_modules.data_grid import DataGrid, FrameCache, GridView, filter_rows, sort_rows, to_frame
+
+
+def grid(window_rows=10, row_height=20):
+    return DataGrid("items", lambda: None, lambda: 0, window_rows=window_rows, row_height=row_height)
+
+
+def test_field_values_become_frames_with_a_range_index():
+    assert list(to_frame([{'a': 1}, {'a': 2}])['a']) == [1, 2]
+    assert list(to_frame({'a': [1, 2]}).index) == [0, 1]
+    assert list(to_frame(pd.DataFrame({'a': [1, 2]}, index=[5, 9])).index) == [0, 1]
+    assert to_frame(None).empty and to_frame([]).empty
+
+
+def test_frames_are_cached_per_value_until_it_grows():
+    cache = FrameCache(max_frames=2)
+    rows = [{'a': 1}]
+    frame = cache.frame(rows)
+    assert cache.frame(rows) is frame
+    rows.append({'a': 2})
+    assert list(cache.frame(rows)['a']) == [1, 2]
+    for other in ([{'a': 3}], [{'a': 4}]):
+        cache.frame(other)
+    assert cache.frame(rows) is not frame
+
+
+def test_filter_matches_any_cell_ignoring_case():
+    frame = pd.DataFrame({'name': ['Alpha', 'beta', 'Gamma'], 'code': [10, 20, 310]})
+    assert list(filter_rows(frame, 'ALP')) == [0]
+    assert list(filter_rows(frame, '10')) == [0, 2]
+    assert filter_rows(frame, '  ') is None
+    assert len(filter_rows(frame, 'zeta')) == 0
+
+
+def test_sort_is_stable_with_missing_values_last():
+    frame = pd.DataFrame({'score': [3, None, 1, 3], 'mixed': ['b', 1, 'a', 2.5]})
+    assert list(sort_rows(frame, None, 'score', True)) == [2, 0, 3, 1]
+    assert list(sort_rows(frame, None, 'score', False)) == [0, 3, 2, 1]
+    # Only the filtered positions are sorted
+    assert list(sort_rows(frame, np.array([0, 1, 2]), 'score', True)) == [2, 0, 1]
+    # Mixed types compare as text
+    assert list(sort_rows(frame, None, 'mixed', True)) == [1, 3, 2, 0]
+
+
+def test_the_window_follows_the_first_visible_row():
+    view = GridView(pd.DataFrame({'n': range(100)}), None)
+    data_grid = grid(window_rows=20)
+    assert data_grid.window(view, 0) == (0, 20)
+    # A quarter of the window is rendered above the first visible row
+    assert data_grid.window(view, 50) == (45, 65)
+    assert data_grid.window(view, 99) == (80, 100)
+    assert data_grid.window(GridView(pd.DataFrame({'n': range(5)}), None), 3) == (0, 5)
+
+
+def test_only_the_window_rows_are_rendered_at_their_offset():
+    frame = pd.DataFrame({'n': range(1000), 'label': ['<b>'] * 1000})
+    view = GridView(frame, np.arange(999, -1, -1))
+    rendered = grid(window_rows=10, row_height=20).render_window(view, 500)
+    cells = re.findall(r"<tr><td>(\d+)</td>", rendered)
+    assert cells == [str(n) for n in range(501, 491, -1)]
+    assert 'height: 20000px' in rendered and 'top: 9960px' in rendered
+    assert '&lt;b&gt;' in rendered and '<b>' not in rendered
@@ -0,0 +1,126 @@
+"""Fork nodes running their branches up to a join"""
+
+import threading
+import time
+
+import pytest
+
+from approv.WorkflowGraph import compile_workflow
+from approv.WorkflowStep import STEP_CLASSES
+
+DELAY = 0.2
+
+
+class Mark:
+    """A branch step: records that it ran, on which thread, after a delay"""
+
+    def __init__(self, config):
+        self.config = config
+
+    def process(self, form_data):
+        time.sleep(self.config.get('delay', 0))
+        form_data[self.config['mark']] = threading.current_thread().name
+        form_data['last'] = self.config['mark']
+        return self.config['outputs'][0], f"{self.config['mark']} done"
+
+
+def automated(step_class, outputs, **config):
+    return {'class': step_class, 'require_user_action': False, 'outputs': outputs, **config}
+
+
+def workflow(fork_class, conditions=None):
+    fork = automated(fork_class, ['credit', 'fraud'], join='checks_done')
+    if conditions is not None:
+        fork['conditions'] = conditions
+    return {'workflow': {
+        'start': automated('Start', ['checks']),
+        'checks': fork,
+        'credit': automated('Mark', ['checks_done'], mark='credit', delay=DELAY),
+        'fraud': automated('Mark', ['fraud_check'], mark='fraud', delay=DELAY),
+        # A flagged case leaves the fork for a user task
+        'fraud_check': automated('ExclusiveChoice', ['checks_done', 'review'], conditions={
+            'default': 'checks_done',
+            'flagged': {'operator': 'Equal', 'attribute': 'flagged', 'value': True, 'next_status': 'review'},
+        }),
+        'checks_done': automated('Join', ['approved']),
+        'review': {'class': 'Simple', 'require_user_action': True, 'outputs': ['stop']},
+        'approved': {'class': 'Simple', 'require_user_action': True, 'outputs': ['stop']},
+        'stop': {'class': 'Stop', 'require_user_action': False},
+    }}
+
+
+CONDITIONS = {
+    'large': {'operator': 'GreaterThan', 'attribute': 'amount', 'value': 1000, 'next_status': 'credit'},
+    'foreign': {'operator': 'Equal', 'attribute': 'country', 'value': 'XX', 'next_status': 'fraud'},
+    'default': 'credit',
+}
+
+
+@pytest.fixture(autouse=True)
+def mark_step(monkeypatch):
+    monkeypatch.setitem(STEP_CLASSES, 'Mark', Mark)
+
+
+def fork(config, form_data):
+    graph = compile_workflow(config)
+    next_id, decision = graph.advance(graph.id_of('checks'), form_data)
+    return graph.nodes[next_id].name, decision
+
+
+def test_multichoice_runs_its_branches_in_parallel_and_merges_them_in_order():
+    form_data = {}
+    started = time.perf_counter()
+    status, decision = fork(workflow('MultiChoice'), form_data)
+    assert time.perf_counter() - started < 2 * DELAY
+    assert status == 'checks_done'
+    assert form_data['credit'] != form_data['fraud']
+    # Both branches set 'last'; the later branch in declaration order wins
+    assert form_data['last'] == 'fraud'
+    assert decision == ("Branches completed (credit: credit done; "
+                        "fraud: fraud done, Decision made: default)")
+
+
+def test_multichoice_activates_every_matching_branch_or_the_default():
+    form_data = {'amount': 5000, 'country': 'XX'}
+    fork(workflow('MultiChoice', CONDITIONS), form_data)
+    assert {'credit', 'fraud'} <= set(form_data)
+    form_data = {'amount': 10, 'country': 'DE'}
+    fork(workflow('MultiChoice', CONDITIONS), form_data)
+    assert 'credit' in form_data and 'fraud' not in form_data
+
+
+def test_mutexchoice_takes_exactly_one_branch():
+    for form_data, taken in (({'amount': 5000, 'country': 'XX'}, 'credit'),
+                             ({'amount': 10, 'country': 'XX'}, 'fraud'),
+                             ({'amount': 10, 'country': 'DE'}, 'credit')):
+        status, _ = fork(workflow('MutexChoice', CONDITIONS), form_data)
+        assert status == 'checks_done'
+        assert [mark for mark in ('credit', 'fraud') if mark in form_data] == [taken]
+    # Without conditions, the first output
+    form_data = {}
+    fork(workflow('MutexChoice'), form_data)
+    assert 'credit' in form_data and 'fraud' not in form_data
+
+
+def test_a_branch_that_leaves_the_fork_decides_where_the_instance_goes():
+    form_data = {'flagged': True}
+    status, decision = fork(workflow('MultiChoice'), form_data)
+    assert status == 'review'
+    assert decision.startswith("Branch 'fraud' left the fork at 'review'")
+    assert form_data['credit'] and form_data['fraud']
+
+
+def test_forks_are_checked_when_compiling():
+    config = workflow('MultiChoice')
+    del config['workflow']['checks']['join']
+    with pytest.raises(ValueError, match="needs a 'join'"):
+        compile_workflow(config)
+    config = workflow('MultiChoice')
+    config['workflow']['checks_done']['class'] = 'Simple'
+    with pytest.raises(ValueError, match="not a Join node"):
+        compile_workflow(config)
+    config = workflow('MultiChoice')
+    config['workflow']['fraud_check']['conditions']['default'] = 'review'
+    config['workflow']['fraud_check']['outputs'] = ['review']
+    with pytest.raises(ValueError, match="Branch 'fraud' of fork node 'checks' never reaches join node"):
+        compile_workflow(config)
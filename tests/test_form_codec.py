@@ -0,0 +1,76 @@
+"""Round trips of the typed form data codec"""
+
+import json
+from datetime import date, time
+
+import pytest
+import yaml
+
+from approv.FormCodec import FormCodec, schema_id_of
+
+
+@pytest.fixture
+def codec():
+    return FormCodec([
+        ['approved', 'bool', []],
+        ['amount', 'float', []],
+        ['count', 'int', []],
+        ['due', 'date', []],
+        ['at', 'time', []],
+        ['rating', 'choice', [1, 2, 3, 4]],
+        ['size', 'choice', ['S', 'M', 'L']],
+        ['extras', 'choices', ['gift', 'express', 'insured']],
+        ['note', 'text', []],
+        ['table', 'json', []],
+    ])
+
+
+def test_typed_values_round_trip(codec):
+    form_data = {
+        'approved': True,
+        'amount': 1234.5,
+        'count': -7,
+        'due': date(2026, 3, 29),
+        'at': time(1, 2, 3, 456000),
+        'rating': 4,
+        'size': 'M',
+        'extras': ['insured', 'gift'],
+        'note': 'übersicht ✓',
+        'table': [{'a': 1}],
+        'not_a_field': {'kept': 'as json'},
+    }
+    assert codec.loads(codec.dumps(form_data)) == form_data
+
+
+def test_loose_values_are_coerced_before_encoding(codec):
+    loose = {'approved': 'true', 'amount': '12', 'due': '2026-03-29', 'rating': '3', 'extras': ['express']}
+    expected = codec.coerce(loose)
+    assert expected['due'] == date(2026, 3, 29)
+    assert expected['rating'] == 3
+    assert codec.loads(codec.dumps(loose)) == expected
+
+
+def test_choices_hold_option_values_not_indexes(codec):
+    # 2 is an option value of rating, not the index of option 3
+    assert codec.coerce_value('rating', 2) == 2
+    # An int that is no option is never read as an index of size's options
+    assert codec.coerce_value('size', 1) == 1
+    assert codec.coerce_value('rating', 9) == 9
+    for value in ({'size': 1}, {'rating': 9}, {'size': 'XL'}, {'rating': None}):
+        assert codec.loads(codec.dumps(value)) == value
+
+
+def test_data_written_with_an_older_schema_still_loads(codec):
+    blob = codec.dumps({'size': 'L', 'note': 'old'})
+    reloaded = FormCodec(json.loads(json.dumps(codec.schema())))
+    assert schema_id_of(blob) == codec.schema_id == reloaded.schema_id
+    assert reloaded.loads(blob) == {'size': 'L', 'note': 'old'}
+
+
+def test_sample_form_data_round_trips():
+    with open('form.yaml') as file:
+        form_config = yaml.safe_load(file)
+    with open('data.json') as file:
+        data = json.load(file)
+    codec = FormCodec.from_form(form_config)
+    assert codec.loads(codec.dumps(data)) == codec.coerce(data)
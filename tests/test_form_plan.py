@@ -0,0 +1,85 @@
+"""Compiled forms and their cached per-role render plans"""
+
+import copy
+
+import pytest
+
+from approv.FormPlan import compile_form
+from shiny_modules.form import ShinyForm
+
+FORM = {'form': {
+    'fields': {
+        'amount': {'title': 'Amount', 'type': 'number_input'},
+        'approved': {'title': 'Approved', 'type': 'checkbox'},
+        'country': {'title': 'Country', 'type': 'selectbox', 'options': ['DE', 'FR']},
+        'note': {'title': 'Note', 'type': 'text_input', 'default': 'n/a'},
+        'reference': {'title': 'Reference', 'type': 'text_input', 'editable': False},
+    },
+    'actions': {'submit': {'title': 'Submit'}, 'reject': {}},
+    'permissions': {'amount': ['clerk', 'manager'], 'approved': ['manager']},
+}}
+
+
+def disabled_fields(plan):
+    return [field.name for field, disabled in plan.field_states() if disabled]
+
+
+def test_fields_are_disabled_per_role():
+    compiled = compile_form(copy.deepcopy(FORM))
+    assert disabled_fields(compiled.plan('clerk')) == ['approved', 'reference']
+    assert disabled_fields(compiled.plan(['manager'])) == ['reference']
+    assert disabled_fields(compiled.plan([])) == ['amount', 'approved', 'reference']
+    # Nested role lists are flattened
+    assert disabled_fields(compiled.plan([['clerk'], 'manager'])) == ['reference']
+    assert compiled.is_disabled('approved', 'clerk') and not compiled.is_disabled('note', 'clerk')
+
+
+def test_require_all_needs_every_listed_role():
+    compiled = compile_form(copy.deepcopy(FORM))
+    assert disabled_fields(compiled.plan('manager', require_all=True)) == ['amount', 'reference']
+    assert disabled_fields(compiled.plan(['clerk', 'manager'], require_all=True)) == ['reference']
+
+
+def test_plans_are_cached_per_role_mask_and_status():
+    compiled = compile_form(copy.deepcopy(FORM))
+    plan = compiled.plan('clerk', 'review')
+    assert compiled.plan(['clerk'], 'review') is plan
+    # Roles no permission mentions share the plan of the roles that are left
+    assert compiled.plan(['clerk', 'auditor', 'guest'], 'review') is plan
+    assert compiled.plan('clerk', 'done') is not plan
+    assert compiled.plan('manager', 'review') is not plan
+
+
+def test_actions_are_hidden_at_start_and_stop():
+    compiled = compile_form(copy.deepcopy(FORM))
+    assert compiled.plan([], 'review').actions == (('submit', 'Submit'), ('reject', 'reject'))
+    assert compiled.plan([], 'start').actions == ()
+    assert compiled.plan([], 'stop').actions == ()
+
+
+def test_static_defaults():
+    compiled = compile_form(copy.deepcopy(FORM))
+    defaults = {field.name: field.default for field in compiled.fields}
+    assert defaults == {'amount': 0.0, 'approved': False, 'country': 'DE', 'note': 'n/a', 'reference': ""}
+
+
+def test_a_config_object_is_compiled_once():
+    config = copy.deepcopy(FORM)
+    assert compile_form(config) is compile_form(config)
+    assert compile_form(copy.deepcopy(config)) is not compile_form(config)
+    broken = copy.deepcopy(FORM)
+    del broken['form']['permissions']
+    with pytest.raises(KeyError):
+        compile_form(broken)
+
+
+def test_the_shiny_form_renders_from_the_plan():
+    form = ShinyForm(copy.deepcopy(FORM))
+    assert form._is_disabled('approved', ['clerk'])
+    assert not form._is_disabled('amount', ['clerk'])
+    assert form._get_default_value('country') == 'DE'
+    html = str(form.create_form_ui(['clerk']))
+    assert 'id="approved"' in html and 'id="amount"' in html
+    buttons = str(form.create_action_buttons('review'))
+    assert 'Submit' in buttons
+    assert form.create_action_buttons('start') == []
@@ -0,0 +1,129 @@
+"""Form sections built when they are first opened"""
+
+import copy
+
+import pytest
+from shiny import ui
+
+from approv.FormPlan import compile_form
+from approv.WorkflowGraph import compile_workflow
+from shiny_modules.form import FORM_SECTIONS_ID, ShinyForm, field_container_id, section_container_id
+from shiny_modules.instances import WorkflowInstanceStore
+from shiny_modules.workflow import ShinyWorkflow
+
+FORM = {'form': {
+    'fields': {
+        'title': {'title': 'Title', 'type': 'text_input'},
+        'amount': {'title': 'Amount', 'type': 'number_input'},
+        'iban': {'title': 'IBAN', 'type': 'text_input'},
+        'approved': {'title': 'Approved', 'type': 'checkbox'},
+        'notes': {'title': 'Notes', 'type': 'text_area'},
+    },
+    'sections': {
+        'money': {'title': 'Money', 'fields': ['iban', 'amount'], 'open': True},
+        'review': {'title': 'Review', 'fields': ['approved', 'notes']},
+    },
+    'actions': {'submit': {'title': 'Submit'}},
+    'permissions': {'approved': ['manager']},
+}}
+
+WORKFLOW = {'workflow': {
+    'start': {'class': 'Start', 'require_user_action': False, 'outputs': ['review']},
+    'review': {'class': 'Simple', 'require_user_action': True, 'role': ['clerk'], 'outputs': ['done']},
+    'done': {'class': 'Simple', 'require_user_action': True, 'role': ['clerk'], 'outputs': ['stop']},
+    'stop': {'class': 'Stop', 'require_user_action': False},
+}}
+
+
+def form_config(**changes):
+    config = copy.deepcopy(FORM)
+    config['form'].update(changes)
+    return config
+
+
+@pytest.fixture
+def inserted(monkeypatch):
+    """Records the elements render_sections and update_form_ui insert"""
+    calls = []
+    monkeypatch.setattr(ui, 'insert_ui', lambda element, selector, **kwargs: calls.append((selector, str(element))))
+    monkeypatch.setattr(ui, 'remove_ui', lambda selector, **kwargs: None)
+    monkeypatch.setattr(ui, 'update_checkbox', lambda field_id, **kwargs: calls.append(('update', field_id)))
+    return calls
+
+
+def test_sections_are_compiled_in_field_order():
+    compiled = compile_form(form_config())
+    money, review = compiled.sections
+    assert (money.name, money.fields, money.open) == ('money', (1, 2), True)
+    assert (review.title, review.fields, review.open) == ('Review', (3, 4), False)
+    assert compiled.sectioned == money.mask | review.mask == 0b11110
+    assert compiled.layout == 'accordion'
+
+
+@pytest.mark.parametrize('changes, message', [
+    ({'layout': 'columns'}, "Unknown form layout"),
+    ({'sections': {'a': {'fields': ['missing']}}}, "unknown field 'missing'"),
+    ({'sections': {'a': {'fields': ['amount']}, 'b': {'fields': ['amount']}}}, "in more than one section"),
+])
+def test_invalid_sections_are_rejected(changes, message):
+    with pytest.raises(ValueError, match=message):
+        compile_form(form_config(**changes))
+
+
+def test_only_open_sections_are_built_first():
+    html = str(ShinyForm(form_config()).create_form_ui(['clerk']))
+    for built in ('title', 'amount', 'iban'):
+        assert f'id="{field_container_id(built)}"' in html
+    for lazy in ('approved', 'notes'):
+        assert f'id="{field_container_id(lazy)}"' not in html
+    assert f'id="{section_container_id("review")}"' in html
+    assert f'id="{FORM_SECTIONS_ID}"' in html
+
+
+def test_tabs_show_the_first_tab_when_none_is_open():
+    config = form_config(layout='tabs')
+    config['form']['sections']['money']['open'] = False
+    html = str(ui.div(*ShinyForm(config).create_form_ui([])))
+    assert f'id="{field_container_id("iban")}"' in html
+    assert f'id="{field_container_id("notes")}"' not in html
+
+
+def test_a_section_is_built_once_when_opened(inserted):
+    form = ShinyForm(form_config(), {'approved': True})
+    form.create_form_ui(['clerk'])
+    assert form.render_sections(None) == 0
+    assert form.render_sections(['money'], ['clerk']) == 0
+    assert form.render_sections(['money', 'review'], ['clerk']) == 2
+    selector, element = inserted[0]
+    assert selector == f"#{section_container_id('review')}"
+    assert f'id="{field_container_id("approved")}"' in element and 'id="notes"' in element
+    assert form.render_sections('review', ['clerk']) == 0
+    assert len(inserted) == 1
+
+
+def test_unbuilt_fields_are_left_alone_by_updates(inserted):
+    form_data = {'approved': False}
+    form = ShinyForm(form_config(), form_data)
+    form.create_form_ui(['clerk'])
+    form_data['approved'] = True
+    # The permission and value change of an unbuilt field wait until its section is built
+    assert form.update_form_ui(['manager']) == {'updated': 0, 'replaced': 0}
+    form.render_sections(['review'], ['manager'])
+    # Built with the manager's plan and the current value, so there is nothing left to send
+    assert form.update_form_ui(['manager']) == {'updated': 0, 'replaced': 0}
+
+
+def test_submitting_keeps_the_values_of_fields_never_shown():
+    form = ShinyForm(form_config(), {'notes': "stored"})
+    values = form.get_form_data({'title': "Trip", 'amount': 3, 'iban': "DE00"}, 'submit')
+    assert 'notes' not in values and 'approved' not in values
+    assert values['title'] == "Trip" and values['action'] == 'submit'
+
+    store = WorkflowInstanceStore({'notes': "stored"})
+    session = ShinyWorkflow(WORKFLOW, form_config(), graph=compile_workflow(WORKFLOW), instance=store.create(),
+                            store=store)
+    session.initiate()
+    session.process_workflow('clerk', session.form_data)
+    session.handle_form_submission({'title': "Trip", 'amount': 3, 'iban': "DE00"}, 'submit', 'clerk')
+    assert session.instance.status == 'done'
+    assert session.form_data['notes'] == "stored" and session.form_data['title'] == "Trip"
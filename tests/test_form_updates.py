@@ -0,0 +1,94 @@
+"""Updating a rendered form in place"""
+
+import copy
+
+import pytest
+from shiny import reactive, ui
+
+from approv.WorkflowGraph import compile_workflow
+from shiny_modules.form import ShinyForm, field_container_id
+from shiny_modules.instances import WorkflowInstanceStore
+from shiny_modules.workflow import ShinyWorkflow
+
+FORM = {'form': {
+    'fields': {
+        'amount': {'title': 'Amount', 'type': 'number_input'},
+        'approved': {'title': 'Approved', 'type': 'checkbox'},
+        'note': {'title': 'Note', 'type': 'text_input'},
+    },
+    'actions': {'submit': {'title': 'Submit'}},
+    'permissions': {'approved': ['manager']},
+}}
+
+WORKFLOW = {'workflow': {
+    'start': {'class': 'Start', 'require_user_action': False, 'outputs': ['review']},
+    'review': {'class': 'Simple', 'require_user_action': True, 'role': ['clerk'], 'outputs': ['done']},
+    'done': {'class': 'Simple', 'require_user_action': True, 'role': ['clerk'], 'outputs': ['stop']},
+    'stop': {'class': 'Stop', 'require_user_action': False},
+}}
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Records the messages update_form_ui would send to the browser"""
+    messages = []
+    for name in ('update_numeric', 'update_checkbox', 'update_text'):
+        monkeypatch.setattr(ui, name, lambda field_id, name=name, **kwargs: messages.append((name, field_id, kwargs)))
+    monkeypatch.setattr(ui, 'remove_ui', lambda selector, **kwargs: messages.append(('remove_ui', selector)))
+    monkeypatch.setattr(ui, 'insert_ui', lambda element, selector, **kwargs: messages.append(('insert_ui', selector)))
+    return messages
+
+
+def rendered_form(form_data):
+    form = ShinyForm(copy.deepcopy(FORM), form_data)
+    form.create_form_ui(['clerk'])
+    return form
+
+
+def test_nothing_is_sent_when_nothing_changed(sent):
+    form = rendered_form({'amount': 5, 'note': "hi"})
+    assert form.update_form_ui(['clerk']) == {'updated': 0, 'replaced': 0}
+    assert sent == []
+
+
+def test_a_changed_value_is_sent_once(sent):
+    form_data = {'amount': 5, 'note': "hi"}
+    form = rendered_form(form_data)
+    form_data['amount'] = 7
+    assert form.update_form_ui(['clerk']) == {'updated': 1, 'replaced': 0}
+    assert sent == [('update_numeric', 'amount', {'value': 7.0})]
+    assert form.update_form_ui(['clerk']) == {'updated': 0, 'replaced': 0}
+
+
+def test_values_are_compared_with_what_the_browser_shows(sent):
+    form_data = {'amount': 5, 'note': "hi"}
+    form = rendered_form(form_data)
+    form_data['note'] = "typed"
+    # The user already typed the new value; the old amount is still shown
+    shown = {'note': lambda: "typed", 'amount': lambda: 3}
+    assert form.update_form_ui(['clerk'], shown) == {'updated': 1, 'replaced': 0}
+    assert sent == [('update_numeric', 'amount', {'value': 5.0})]
+
+
+def test_a_field_whose_permission_changed_is_replaced_on_its_own(sent):
+    form = rendered_form({'amount': 5})
+    assert form.update_form_ui(['manager']) == {'updated': 0, 'replaced': 1}
+    container = f"#{field_container_id('approved')}"
+    assert sent == [('remove_ui', f"{container} > *"), ('insert_ui', container)]
+    assert form.update_form_ui(['manager']) == {'updated': 0, 'replaced': 0}
+
+
+def test_the_form_is_rebuilt_only_when_its_structure_changes():
+    store = WorkflowInstanceStore({'amount': 0})
+    session = ShinyWorkflow(WORKFLOW, copy.deepcopy(FORM), graph=compile_workflow(WORKFLOW),
+                            instance=store.create(), store=store)
+    session.initiate()
+    with reactive.isolate():
+        structures = [session.form_structure()]
+        for _ in range(2):
+            session.process_workflow('clerk', session.form_data)
+            structures.append(session.form_structure())
+    assert session.instance.status == 'done'
+    assert structures[0][1] == 'start'
+    # Moving from review to done keeps the form; only the values are updated
+    assert structures[1] == structures[2] and structures[1][1] == 'form'
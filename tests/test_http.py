@@ -0,0 +1,83 @@
+"""Keep-alive connection pool against a local stub server"""
+
+import http.client
+import http.server
+import threading
+import time
+
+import pytest
+
+from approv.Http import ConnectionPool
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    hits = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        self._respond()
+
+    def _respond(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        type(self).hits += 1
+        if self.path == '/drop':
+            # Processed, then the connection is dropped without a response
+            self.close_connection = True
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+        if self.path == '/close':
+            # Closed after the response, without announcing it
+            self.close_connection = True
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    StubHandler.hits = 0
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_reused(server):
+    pool = ConnectionPool()
+    for _ in range(3):
+        assert pool.request('GET', server + '/ok').status == 200
+    assert pool.idle_count() == 1
+
+
+def test_a_connection_closed_while_idle_is_not_used(server):
+    pool = ConnectionPool()
+    pool.request('POST', server + '/close', b'x')
+    time.sleep(0.1)
+    StubHandler.hits = 0
+    assert pool.request('POST', server + '/ok', b'x').status == 200
+    assert StubHandler.hits == 1
+
+
+def test_post_is_not_resent_after_the_server_dropped_it(server):
+    pool = ConnectionPool()
+    pool.request('POST', server + '/ok', b'x')
+    StubHandler.hits = 0
+    with pytest.raises((http.client.RemoteDisconnected, ConnectionError)):
+        pool.request('POST', server + '/drop', b'x')
+    assert StubHandler.hits == 1
+
+
+def test_idempotent_requests_are_retried_on_a_fresh_connection(server):
+    pool = ConnectionPool()
+    pool.request('GET', server + '/ok')
+    StubHandler.hits = 0
+    with pytest.raises((http.client.RemoteDisconnected, ConnectionError)):
+        pool.request('GET', server + '/drop')
+    assert StubHandler.hits == 2
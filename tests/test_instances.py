@@ -0,0 +1,159 @@
+"""Sessions sharing a workflow instance"""
+
+import asyncio
+
+import pandas as pd
+import pytest
+from shiny import reactive
+
+from approv.WorkflowGraph import compile_workflow
+from approv.WorkflowStep import STEP_CLASSES
+from shiny_modules.bulk import bulk_decide
+from shiny_modules.instances import InstanceConflict, WorkflowInstanceStore
+from shiny_modules.workflow import ShinyWorkflow
+
+FORM = {'form': {'fields': {'amount': {'title': 'Amount', 'type': 'number_input'}}, 'actions': {}, 'permissions': {}}}
+
+
+class Pending:
+    """An async step that waits until the test releases it"""
+
+    release: asyncio.Event
+
+    def __init__(self, config):
+        self.config = config
+
+    async def process(self, form_data):
+        await Pending.release.wait()
+        return self.config['outputs'][0], "Called back"
+
+
+WORKFLOW = {'workflow': {
+    'start': {'class': 'Start', 'require_user_action': False, 'outputs': ['review']},
+    'review': {'class': 'ExclusiveChoice', 'require_user_action': True, 'role': ['clerk'],
+               'outputs': ['call'], 'conditions': {'default': 'call'}},
+    'call': {'class': 'Pending', 'require_user_action': False, 'outputs': ['done']},
+    'done': {'class': 'Simple', 'require_user_action': True, 'role': ['clerk'], 'outputs': ['stop']},
+    'stop': {'class': 'Stop', 'require_user_action': False},
+}}
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    monkeypatch.setitem(STEP_CLASSES, 'Pending', Pending)
+    graph = compile_workflow(WORKFLOW)
+    store = WorkflowInstanceStore({'amount': 0})
+    instance = store.create()
+
+    def session():
+        return ShinyWorkflow(WORKFLOW, FORM, graph=graph, instance=store.open(instance.instance_id), store=store)
+
+    return store, instance, session(), session()
+
+
+def test_a_claim_is_refused_while_held_or_once_the_instance_moved_on():
+    instance = WorkflowInstanceStore().create()
+    with instance.claim('start'):
+        with pytest.raises(InstanceConflict, match="being processed in another session"):
+            with instance.claim('start'):
+                pass
+    instance.status = 'review'
+    with pytest.raises(InstanceConflict, match="moved on to 'review'"):
+        with instance.claim('start'):
+            pass
+    assert not instance.claimed
+
+
+def test_a_stale_session_is_refused_and_refreshed(sessions):
+    store, instance, first, second = sessions
+    first.initiate()
+    first.process_workflow('clerk', first.form_data)
+    assert instance.status == 'review'
+    events = len(instance.audit)
+
+    second.handle_form_submission({'amount': 5}, 'submit', 'clerk')
+
+    assert instance.status == 'review'
+    assert instance.form_data['amount'] == 0
+    assert len(instance.audit) == events
+    with reactive.isolate():
+        assert second.current_status() == 'review'
+        assert "moved on to 'review'" in second.error_message()
+
+
+def test_an_instance_awaiting_a_step_cannot_be_changed_elsewhere(sessions):
+    store, instance, first, second = sessions
+    first.initiate()
+    first.process_workflow('clerk', first.form_data)
+    second.open_instance(instance)
+
+    async def run():
+        Pending.release = asyncio.Event()
+        processing = asyncio.create_task(first.process_workflow_async('clerk', first.form_data))
+        await asyncio.sleep(0)
+        assert instance.status == 'call' and instance.claimed
+        with pytest.raises(InstanceConflict, match="being processed in another session"):
+            await second.process_workflow_async('clerk', second.form_data)
+        Pending.release.set()
+        await processing
+
+    asyncio.run(run())
+    assert instance.status == 'done'
+    assert not instance.claimed
+    assert [event['action'] for event in instance.audit][-2:] == ["Decision made: default", "Called back"]
+
+
+def test_a_bulk_decision_skips_an_instance_a_session_holds(sessions):
+    store, instance, first, _ = sessions
+    first.initiate()
+    first.process_workflow('clerk', first.form_data)
+    frame = pd.DataFrame({'instance_id': [instance.instance_id], 'amount': [7]})
+    with instance.claim('review'):
+        result = bulk_decide(store, first.graph, 'review', frame, 'clerk')
+    assert result['applied'].tolist() == [False]
+    assert "being processed in another session" in result['error'][0]
+    assert instance.status == 'review' and instance.form_data['amount'] == 0
+
+
+def test_instances_get_distinct_ids_and_their_own_form_data():
+    store = WorkflowInstanceStore({'amount': 0, 'items': []})
+    first, second = store.create(), store.create({'amount': 3})
+    first.form_data['amount'] = 1
+    assert (first.instance_id, second.instance_id) == (1, 2)
+    assert second.form_data['amount'] == 3 and store.create().form_data['amount'] == 0
+    assert store.open(2) is second and list(store) == [first, second, store.get(3)]
+    with pytest.raises(KeyError):
+        store.open(99)
+
+
+def test_sessions_view_their_own_instances(monkeypatch):
+    monkeypatch.setitem(STEP_CLASSES, 'Pending', Pending)
+    graph = compile_workflow(WORKFLOW)
+    store = WorkflowInstanceStore({'amount': 0})
+    first = ShinyWorkflow(WORKFLOW, FORM, graph=graph, instance=store.create(), store=store)
+    second = ShinyWorkflow(WORKFLOW, FORM, graph=graph, instance=store.create(), store=store)
+    first.initiate()
+    first.process_workflow('clerk', first.form_data)
+    assert first.instance.status == 'review'
+    assert second.instance.status == 'start'
+    assert len(second.instance.audit) == 0
+
+
+def test_a_session_placeholder_is_never_saved():
+    saved = []
+
+    class Recorder:
+        def track_audit(self, log):
+            pass
+
+        def save_instance(self, instance):
+            saved.append(instance.instance_id)
+
+    store = WorkflowInstanceStore(persistence=Recorder())
+    graph = compile_workflow(WORKFLOW)
+    workflow = ShinyWorkflow(WORKFLOW, FORM, {'amount': 0}, graph=graph, store=store)
+    workflow.initiate()
+    assert saved == []
+    workflow.open_instance(store.create())
+    workflow.initiate()
+    assert saved == [1, 1]
@@ -0,0 +1,134 @@
+"""Validating only the fields an edit can affect"""
+
+import asyncio
+import copy
+
+import pytest
+from shiny import reactive, ui
+
+from approv.Validation import FormValidator, RuleSet
+from shiny_modules.form import ShinyForm
+from shiny_modules.live_validation import LiveValidation
+
+RULES = RuleSet({
+    'required_field': {'regex': '.+', 'description': 'Required'},
+    'email_validation': {'regex': r'^[^@\s]+@[^@\s]+\.[a-z]{2,}$', 'description': 'Email'},
+})
+
+FORM = {'form': {
+    'fields': {
+        'email': {'title': 'Email', 'type': 'text_input', 'validation': ['required_field', 'email_validation']},
+        'password': {'title': 'Password', 'type': 'text_input'},
+        'confirm': {'title': 'Confirm', 'type': 'text_input',
+                    'validation': [{'regex': '^{{password}}$', 'description': 'Same password'}]},
+        'end': {'title': 'End', 'type': 'text_input', 'validation': ['required_field'], 'depends_on': ['start']},
+        'start': {'title': 'Start', 'type': 'text_input'},
+        'note': {'title': 'Note', 'type': 'text_input'},
+    },
+    'actions': {},
+    'permissions': {'email': ['manager']},
+}}
+
+
+class Session:
+    def __init__(self):
+        self.messages = []
+
+    async def send_custom_message(self, message_type, message):
+        assert message_type == "approv-validation"
+        self.messages.append(message)
+
+
+def test_fields_know_which_fields_their_validity_depends_on():
+    validator = FormValidator(FORM, RULES)
+    assert validator.dependents == {
+        'email': {'email'}, 'confirm': {'confirm'}, 'password': {'confirm'}, 'end': {'end'}, 'start': {'end'}}
+    assert validator.affected(['password', 'note']) == {'confirm'}
+    assert validator.affected(['confirm', 'start']) == {'confirm', 'end'}
+    assert validator.inputs({'confirm'}) == {'confirm', 'password'}
+
+
+def test_a_dependency_on_an_unknown_field_is_rejected():
+    config = copy.deepcopy(FORM)
+    config['form']['fields']['end']['depends_on'] = ['begin']
+    with pytest.raises(ValueError, match="depends on unknown field 'begin'"):
+        FormValidator(config, RULES)
+
+
+def test_only_the_requested_fields_are_validated():
+    validator = FormValidator(FORM, RULES)
+    result = validator.validate({'email': 'nope', 'password': 'a', 'confirm': 'b'}, {'confirm'})
+    assert [(error.field, error.rule) for error in result.errors] == [('confirm', 'confirm.validation')]
+
+
+def test_messages_cover_the_editable_fields_asked_for(monkeypatch):
+    form = ShinyForm(copy.deepcopy(FORM), {'password': 'secret'})
+    monkeypatch.setattr(form, 'validator', FormValidator(form.form_config, RULES))
+    assert form.field_messages({'confirm': 'secret'}, {'confirm'}) == {'confirm': None}
+    assert form.field_messages({'confirm': 'other'}, {'confirm'}) == {'confirm': 'Confirm: Invalid Same password'}
+    # Fields the user cannot edit are not validated
+    assert form.field_messages({'email': 'nope'}, {'email'}, ['clerk']) == {}
+    assert 'email' in form.field_messages({'email': 'nope'}, {'email'}, ['manager'])
+
+
+@pytest.fixture
+def live(monkeypatch):
+    """A rendered form with live validation, inputs the test can edit and the messages sent"""
+    def start(debounce_ms):
+        form = ShinyForm(copy.deepcopy(FORM), {})
+        monkeypatch.setattr(form, 'validator', FormValidator(form.form_config, RULES))
+        form.create_form_ui(['manager'])
+        inputs = {name: reactive.Value(form._sent_values.get(name)) for name in FORM['form']['fields']}
+        session = Session()
+        LiveValidation(form, debounce_ms).setup(inputs, session, lambda: ['manager'])
+        return form, inputs, session
+    return start
+
+
+def test_an_edit_validates_the_fields_it_affects(live):
+    _, inputs, session = live(0)
+
+    async def edit():
+        await reactive.flush()
+        inputs['password'].set('secret')
+        await reactive.flush()
+        inputs['note'].set('unchecked')
+        await reactive.flush()
+        inputs['email'].set('a@b')
+        await reactive.flush()
+
+    asyncio.run(edit())
+    assert session.messages == [{'confirm': 'Confirm: Invalid Same password'}, {'email': 'Email: Invalid Email'}]
+
+
+def test_edits_are_validated_together_once_the_user_pauses(live):
+    _, inputs, session = live(50)
+
+    async def edit():
+        await reactive.flush()
+        inputs['email'].set('a@b.de')
+        await reactive.flush()
+        inputs['start'].set('today')
+        await reactive.flush()
+        assert session.messages == []
+        await asyncio.sleep(0.15)
+        await reactive.flush()
+
+    asyncio.run(edit())
+    assert session.messages == [{'email': None, 'end': 'End: Invalid Required'}]
+
+
+def test_a_value_sent_by_the_server_is_not_an_edit(live, monkeypatch):
+    monkeypatch.setattr(ui, 'update_text', lambda field_id, **kwargs: None)
+    form, inputs, session = live(0)
+
+    async def update():
+        await reactive.flush()
+        form.form_data['email'] = 'not an email'
+        form.update_form_ui(['manager'])
+        # The browser reports back the value it was sent
+        inputs['email'].set('not an email')
+        await reactive.flush()
+
+    asyncio.run(update())
+    assert session.messages == []
@@ -0,0 +1,123 @@
+"""Engine metrics and the /metrics endpoint"""
+
+import asyncio
+
+import pytest
+
+from approv.Metrics import MetricsRegistry, STEP_DURATION, STEP_EXECUTIONS, TRANSITIONS
+from approv.WorkflowGraph import compile_workflow
+from approv.WorkflowStep import STEP_CLASSES
+from shiny_modules.metrics import PROMETHEUS_CONTENT_TYPE, step_metrics_frame, with_metrics_endpoint
+
+
+class Fail:
+    def __init__(self, config):
+        self.config = config
+
+    def process(self, form_data):
+        raise RuntimeError("step failed")
+
+
+def request(app, method, path):
+    """Send one HTTP request to an ASGI app; returns (status, headers, body)"""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'headers': [], 'query_string': b''}
+    asyncio.run(app(scope, receive, send))
+    start = messages[0]
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return start['status'], {key.decode(): value.decode() for key, value in start['headers']}, body.decode()
+
+
+def test_counters_and_histograms_track_each_label_set():
+    registry = MetricsRegistry()
+    calls = registry.counter("calls_total", "Calls", ("route",))
+    calls.inc("a")
+    calls.inc("a", amount=2)
+    calls.inc("b")
+    assert calls.value("a") == 3 and calls.value("b") == 1 and calls.value("c") == 0
+    with pytest.raises(ValueError, match="expects labels"):
+        calls.inc()
+
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        latency.observe(value)
+    assert latency.samples()[()] == ([1, 2, 1], 6.05, 4)
+    assert latency.quantile(0.5) == 1.0
+    assert latency.quantile(1.0) == float('inf')
+
+
+def test_a_metric_name_is_registered_once():
+    registry = MetricsRegistry()
+    assert registry.counter("runs_total", "Runs", ("node",)) is registry.counter("runs_total", "Runs", ("node",))
+    with pytest.raises(ValueError, match="already registered differently"):
+        registry.gauge("runs_total", "Runs", ("node",))
+
+
+def test_the_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    registry.counter("calls_total", "Calls", ("route",)).inc('say "hi"')
+    registry.gauge("in_flight", "In flight").set(value=2)
+    registry.histogram("latency_seconds", "Latency", buckets=(0.5,)).observe(0.25)
+    assert registry.render_prometheus().splitlines() == [
+        '# HELP calls_total Calls',
+        '# TYPE calls_total counter',
+        'calls_total{route="say \\"hi\\""} 1',
+        '# HELP in_flight In flight',
+        '# TYPE in_flight gauge',
+        'in_flight 2',
+        '# HELP latency_seconds Latency',
+        '# TYPE latency_seconds histogram',
+        'latency_seconds_bucket{le="0.5"} 1',
+        'latency_seconds_bucket{le="+Inf"} 1',
+        'latency_seconds_sum 0.25',
+        'latency_seconds_count 1',
+    ]
+
+
+def test_advancing_a_node_records_its_step_and_transition(monkeypatch):
+    monkeypatch.setitem(STEP_CLASSES, 'Fail', Fail)
+    graph = compile_workflow({'workflow': {
+        'metrics_start': {'class': 'Start', 'require_user_action': False, 'outputs': ['metrics_fail']},
+        'metrics_fail': {'class': 'Fail', 'require_user_action': False, 'outputs': ['stop']},
+        'stop': {'class': 'Stop', 'require_user_action': False},
+    }})
+    graph.advance(graph.id_of('metrics_start'), {})
+    assert STEP_EXECUTIONS.value('metrics_start', 'Start', 'ok') == 1
+    assert TRANSITIONS.value('metrics_start', 'metrics_fail') == 1
+    assert STEP_DURATION.samples()[('metrics_start', 'Start')][2] == 1
+
+    with pytest.raises(RuntimeError):
+        graph.advance(graph.id_of('metrics_fail'), {})
+    assert STEP_EXECUTIONS.value('metrics_fail', 'Fail', 'error') == 1
+    assert TRANSITIONS.samples().keys().isdisjoint({('metrics_fail', 'stop')})
+
+    rows = step_metrics_frame().set_index('node')
+    assert rows.loc['metrics_fail', 'runs'] == 1
+    assert rows.loc['metrics_fail', 'errors'] == 1
+
+
+def test_the_metrics_endpoint_serves_the_registry_and_passes_everything_else_on():
+    registry = MetricsRegistry()
+    registry.counter("hits_total", "Hits").inc()
+    passed = []
+
+    async def app(scope, receive, send):
+        passed.append(scope['path'])
+        await send({'type': 'http.response.start', 'status': 204, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    wrapped = with_metrics_endpoint(app, registry=registry)
+    status, headers, body = request(wrapped, 'GET', '/metrics')
+    assert status == 200
+    assert headers['content-type'] == PROMETHEUS_CONTENT_TYPE
+    assert 'hits_total 1' in body.splitlines()
+    assert request(wrapped, 'POST', '/metrics')[0] == 405
+    assert request(wrapped, 'GET', '/')[0] == 204
+    assert passed == ['/']
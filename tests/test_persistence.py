@@ -0,0 +1,104 @@
+"""Group-committed instance persistence in DuckDB"""
+
+import time
+
+import pytest
+
+from shiny_modules.config import DatabaseManager
+from shiny_modules.instances import WorkflowInstanceStore
+from shiny_modules.persistence import InstancePersistence
+
+
+class CountingDatabase(DatabaseManager):
+    """Counts write connections, and fails the next ones when asked to"""
+
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        self.writes = 0
+        self.failures = 0
+
+    def get_connection(self, read_only=True):
+        if not read_only:
+            self.writes += 1
+            if self.failures:
+                self.failures -= 1
+                raise OSError("disk unavailable")
+        return super().get_connection(read_only)
+
+
+@pytest.fixture
+def db(tmp_path):
+    return CountingDatabase(str(tmp_path / 'bpms.db'))
+
+
+def stored_rows(db):
+    with db.connection() as con:
+        return con.execute("SELECT process_instance_id, status FROM bpms_process_instances ORDER BY 1").fetchall()
+
+
+def test_a_burst_of_saves_is_one_commit_of_the_latest_states(db):
+    persistence = InstancePersistence(db)
+    persistence.ensure_schema()
+    store = WorkflowInstanceStore({'amount': 0}, persistence=persistence)
+    instances = [store.create() for _ in range(50)]
+    for step in range(10):
+        for instance in instances:
+            instance.status = f"step_{step}"
+            instance.form_data['amount'] = step
+            store.save(instance)
+    writes = db.writes
+    # One row per instance, however often it was saved
+    assert persistence.flush() == 50
+    assert db.writes == writes + 1
+    assert stored_rows(db) == [(instance.instance_id, 'step_9') for instance in instances]
+    assert persistence.flush() == 0
+
+
+def test_restored_instances_have_their_last_saved_state(db):
+    persistence = InstancePersistence(db)
+    store = WorkflowInstanceStore({'amount': 0}, persistence=persistence)
+    first, second = store.create(), store.create({'amount': 5})
+    first.status, first.form_data['note'] = 'review', 'checked'
+    store.save_many([first, second])
+    persistence.flush()
+
+    restored = WorkflowInstanceStore(persistence=InstancePersistence(db))
+    assert restored.load() == 2
+    assert (restored.get(1).status, dict(restored.get(1).form_data)) == ('review', {'amount': 0, 'note': 'checked'})
+    assert dict(restored.get(2).form_data) == {'amount': 5}
+    # New ids continue after the restored ones
+    assert restored.create().instance_id == 3
+
+
+def test_a_failed_flush_keeps_the_saves_queued(db):
+    persistence = InstancePersistence(db)
+    persistence.ensure_schema()
+    store = WorkflowInstanceStore(persistence=persistence)
+    instance = store.create()
+    instance.status = 'failed_write'
+    store.save(instance)
+    db.failures = 1
+    assert persistence.flush() == 0
+    # A save queued after the failure wins over the requeued row
+    instance.status = 'newer'
+    store.save(instance)
+    assert persistence.flush() == 1
+    assert stored_rows(db) == [(instance.instance_id, 'newer')]
+
+
+def test_a_full_batch_is_flushed_without_waiting_for_the_interval(db):
+    persistence = InstancePersistence(db, batch_size=5, flush_interval=60)
+    persistence.start()
+    try:
+        store = WorkflowInstanceStore(persistence=persistence)
+        for _ in range(5):
+            store.create()
+        deadline = time.monotonic() + 5
+        while len(stored_rows(db)) < 5 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert len(stored_rows(db)) == 5
+        store.create()
+    finally:
+        persistence.stop()
+    # Stopping writes what is still queued
+    assert len(stored_rows(db)) == 6
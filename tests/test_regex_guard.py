@@ -0,0 +1,86 @@
+"""Flagging risky rules and matching them in time-limited workers"""
+
+import re
+import threading
+import time
+
+import pytest
+
+from approv.Metrics import VALIDATION_TIMEOUTS
+from approv.RegexGuard import MATCH_TIMEOUT_MS, GuardedMatcher, backtracking_risk
+from approv.Validation import compile_rule
+
+EVIL = re.compile(r'^(a+)+$')
+HOSTILE = 'a' * 40 + 'b'
+
+
+@pytest.fixture
+def guard():
+    matcher = GuardedMatcher(timeout_ms=100, workers=2)
+    yield matcher
+    matcher.close()
+
+
+@pytest.mark.parametrize('pattern, risk', [
+    (r'(a+)+$', 'nested quantifier'),
+    (r'^[0-9]+([-.\s]?[0-9]+)*$', 'nested quantifier'),
+    (r'(\w+\s?)*$', 'nested quantifier'),
+    (r'\d+\d+$', 'adjacent quantifiers over the same characters'),
+    (r'.*.*=.*', 'adjacent quantifiers over the same characters'),
+    (r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', None),
+    (r'^\w+$', None),
+    (r'(a|b)*$', None),
+    # Possessive quantifiers and atomic groups never backtrack into the repeat
+    (r'(?:a+)*+$', None),
+    (r'(?>a+)*$', None),
+])
+def test_risky_shapes_are_flagged(pattern, risk):
+    assert backtracking_risk(pattern) == risk
+
+
+def test_flagged_rules_are_guarded_unless_trusted():
+    assert compile_rule('phone', {'regex': r'^[0-9]+([-.\s]?[0-9]+)*$'}).timeout_ms == MATCH_TIMEOUT_MS
+    assert compile_rule('phone', {'regex': r'^[0-9]+([-.\s]?[0-9]+)*$', 'timeout_ms': 5}).timeout_ms == 5
+    assert compile_rule('phone', {'regex': r'^[0-9]+([-.\s]?[0-9]+)*$', 'guard': False}).timeout_ms is None
+    assert compile_rule('word', {'regex': r'^\w+$'}).timeout_ms is None
+    assert compile_rule('word', {'regex': r'^\w+$', 'guard': True}).timeout_ms == MATCH_TIMEOUT_MS
+
+
+def test_matches_run_in_the_workers(guard):
+    assert guard.match_all(re.compile(r'^\d+$'), ['12', 'x', '', '3']) == [True, False, False, True]
+    # Flags travel with the pattern
+    assert guard.match(re.compile(r'^abc$', re.IGNORECASE), 'ABC') is True
+
+
+def test_a_match_that_runs_out_of_time_fails_and_the_rest_still_run(guard):
+    started = time.perf_counter()
+    assert guard.match_all(EVIL, ['aaa', HOSTILE, 'aaaa', 'ab']) == [True, None, True, False]
+    assert time.perf_counter() - started < 5
+    # The pool recovers: the killed worker is replaced
+    assert guard.match(EVIL, 'aa') is True
+
+
+def test_a_hostile_value_only_holds_up_its_own_caller(guard):
+    guard.start()
+    guard.match(EVIL, 'a')
+    finished = {}
+
+    def hostile():
+        guard.match(EVIL, HOSTILE, timeout_ms=1000)
+        finished['hostile'] = time.perf_counter()
+
+    thread = threading.Thread(target=hostile)
+    thread.start()
+    time.sleep(0.05)
+    assert guard.match(EVIL, 'aaaa') is True
+    finished['benign'] = time.perf_counter()
+    thread.join()
+    assert finished['benign'] < finished['hostile']
+
+
+def test_timeouts_are_counted_per_rule():
+    rule = compile_rule('counted_nested', {'regex': r'^(a+)+$', 'timeout_ms': 50})
+    assert rule.match_all(['aa', HOSTILE, HOSTILE]).tolist() == [True, False, False]
+    assert VALIDATION_TIMEOUTS.value('counted_nested') == 2
+    assert not rule.matches(HOSTILE)
+    assert VALIDATION_TIMEOUTS.value('counted_nested') == 3
@@ -0,0 +1,71 @@
+"""Routing precedence of compiled decision steps"""
+
+import random
+
+import pytest
+
+from approv.Routing import OPERATORS, ConditionRouter
+from approv.WorkflowStep import ExclusiveChoice
+
+
+def linear_route(conditions, form_data):
+    """Reference: the first declared condition that matches"""
+    for name, operator, attribute, value, next_status in conditions:
+        predicate = OPERATORS.get(operator)
+        try:
+            if predicate is not None and predicate(form_data.get(attribute), value):
+                return name, next_status
+        except TypeError:
+            continue
+    return None
+
+
+def test_first_declared_condition_wins_across_index_kinds():
+    conditions = [
+        ('big', 'GreaterThan', 'amount', 1000, 'board'),
+        ('vip', 'Equal', 'customer', 'acme', 'fast_track'),
+        ('blocked', 'InList', 'country', ['XX', 'YY'], 'rejected'),
+        ('medium', 'GreaterThanOrEqual', 'amount', 100, 'manager'),
+        ('urgent', 'Contains', 'tags', 'urgent', 'fast_track'),
+    ]
+    router = ConditionRouter(conditions)
+
+    # Matches big, vip and blocked: big is declared first
+    assert router.route({'amount': 5000, 'customer': 'acme', 'country': 'XX'}) == ('big', 'board')
+    # vip is declared before medium
+    assert router.route({'amount': 500, 'customer': 'acme'}) == ('vip', 'fast_track')
+    # blocked (indexed) is declared before medium (range) and urgent (linear)
+    assert router.route({'amount': 500, 'country': 'YY', 'tags': ['urgent']}) == ('blocked', 'rejected')
+    assert router.route({'amount': 500, 'tags': ['urgent']}) == ('medium', 'manager')
+    assert router.route({'amount': 5, 'tags': ['urgent']}) == ('urgent', 'fast_track')
+    assert router.route({'amount': 5}) is None
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_router_matches_linear_scan(seed):
+    rng = random.Random(seed)
+    operators = ['Equal', 'InList', 'GreaterThan', 'GreaterThanOrEqual', 'LessThan', 'LessThanOrEqual']
+    conditions = []
+    for number in range(12):
+        operator = rng.choice(operators)
+        value = [rng.randint(0, 20) for _ in range(3)] if operator == 'InList' else rng.randint(0, 20)
+        conditions.append((f"c{number}", operator, rng.choice(['a', 'b']), value, f"s{number}"))
+    router = ConditionRouter(conditions)
+    for _ in range(200):
+        form_data = {'a': rng.randint(-1, 21), 'b': rng.choice([rng.randint(-1, 21), None, 'text'])}
+        assert router.route(form_data) == linear_route(conditions, form_data)
+
+
+def test_exclusive_choice_takes_default_when_nothing_matches():
+    step = ExclusiveChoice({
+        'outputs': ['rejected', 'approved', 'manual'],
+        'conditions': {
+            'default': 'manual',
+            'small': {'operator': 'LessThan', 'attribute': 'amount', 'value': 500, 'next_status': 'approved'},
+            'large': {'operator': 'GreaterThan', 'attribute': 'amount', 'value': 10000, 'next_status': 'rejected'},
+        },
+    })
+    assert step.process({'amount': 20}) == ('approved', 'Decision made: small')
+    assert step.process({'amount': 50000}) == ('rejected', 'Decision made: large')
+    assert step.process({'amount': 5000}) == ('manual', 'Decision made: default')
+    assert step.process({}) == ('manual', 'Decision made: default')
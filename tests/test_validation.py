@@ -0,0 +1,70 @@
+"""Form validation never accepts a field whose rules were not all checked"""
+
+import re
+
+import pytest
+
+from approv.RegexGuard import regex_guard
+from approv.Validation import RULES_PATH, FormValidator, RuleSet, ValidationError
+
+
+def form(budget_ms, validation=('slow', 'letters')):
+    return {'form': {
+        'fields': {'code': {'title': 'Code', 'type': 'text_input', 'validation': list(validation),
+                            'validation_budget_ms': budget_ms}},
+        'actions': {},
+        'permissions': {},
+    }}
+
+
+@pytest.fixture
+def rules():
+    return RuleSet({
+        'slow': {'regex': r'^\w+$', 'description': 'word'},
+        'letters': {'regex': r'^[a-z]+$', 'description': 'lower case letters'},
+    })
+
+
+def test_a_field_over_its_budget_fails(rules):
+    result = FormValidator(form(0.0), rules).validate({'code': 'abc'})
+    assert not result.valid
+    assert result.over_budget == ('code',)
+    assert [(error.field, error.rule) for error in result.errors] == [('code', 'letters')]
+    with pytest.raises(ValidationError, match="Could not be validated in time"):
+        raise ValidationError(result)
+
+
+def test_a_field_within_its_budget_is_checked_by_every_rule(rules):
+    validator = FormValidator(form(1000.0), rules)
+    assert validator.validate({'code': 'abc'}).valid
+    result = validator.validate({'code': 'ABC'})
+    assert [error.rule for error in result.errors] == ['letters']
+    assert result.over_budget == ()
+
+
+def test_a_single_rule_is_never_over_budget(rules):
+    # The budget is checked between rules; a lone rule always runs to the end
+    assert FormValidator(form(0.0, ['letters']), rules).validate({'code': 'abc'}).valid
+
+
+def test_a_guarded_match_that_times_out_fails_the_rule():
+    rules = RuleSet({'nested': {'regex': r'^(a|aa)*$', 'description': 'a run', 'guard': True, 'timeout_ms': 50}})
+    validator = FormValidator(form(10_000.0, ['nested']), rules)
+    assert validator.validate({'code': 'aaaa'}).valid
+    result = validator.validate({'code': 'a' * 40 + 'b'})
+    assert [error.rule for error in result.errors] == ['nested']
+    assert re.search('Invalid a run', result.errors[0].message)
+
+
+def test_a_fresh_validator_accepts_a_valid_guarded_value():
+    # Booting the guard's workers is not checking time: the first submission
+    # after the pool (re)starts is held to the default budget like any other
+    regex_guard.close()
+    rules = RuleSet.from_file(RULES_PATH)
+    validator = FormValidator({'form': {
+        'fields': {'phone': {'title': 'Phone', 'type': 'text_input',
+                             'validation': ['phone_number_validation', 'required_field']}},
+        'actions': {},
+        'permissions': {},
+    }}, rules)
+    assert validator.validate({'phone': '123-456-7890'}) == ((), ())
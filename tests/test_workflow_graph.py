@@ -0,0 +1,72 @@
+"""Compiling workflow.yaml into a graph"""
+
+import pytest
+import yaml
+
+from approv.WorkflowGraph import compile_workflow
+
+
+def workflow(**steps):
+    return {'workflow': {
+        'start': {'class': 'Start', 'require_user_action': False, 'outputs': ['call']},
+        **steps,
+        'stop': {'class': 'Stop', 'require_user_action': False},
+    }}
+
+
+@pytest.fixture
+def graph():
+    with open('workflow.yaml') as file:
+        return compile_workflow(yaml.safe_load(file))
+
+
+def test_nodes_get_ids_and_transitions_become_id_tuples(graph):
+    general = graph.node('general')
+    assert graph.nodes[graph.id_of('general')] is general
+    assert general.outputs == (graph.id_of('workflow_aborted'), graph.id_of('president'))
+    assert graph.nodes[graph.start_id].name == 'start' and graph.nodes[graph.stop_id].name == 'stop'
+    with pytest.raises(TypeError):
+        general.config['class'] = 'Simple'
+
+
+def test_instances_share_the_graph_and_its_steps(graph):
+    step = graph.node('general').step
+    first, second = {'general_confirmation': True}, {'general_confirmation': False}
+    assert graph.advance(graph.id_of('general'), first)[0] == graph.id_of('president')
+    assert graph.advance(graph.id_of('general'), second)[0] == graph.id_of('workflow_aborted')
+    # Advancing one instance leaves nothing behind for the next
+    assert graph.advance(graph.id_of('general'), first)[0] == graph.id_of('president')
+    assert graph.node('general').step is step
+
+
+def test_a_workflow_runs_from_start_to_stop(graph):
+    form_data = {'general_confirmation': True, 'president_confirmation': True}
+    visited = []
+    node_id = graph.start_id
+    while node_id != graph.stop_id:
+        node_id, _ = graph.advance(node_id, form_data)
+        visited.append(graph.nodes[node_id].name)
+    assert visited == ['general', 'president', 'nuclear_strike', 'api_call_nuclear_strike', 'stop']
+
+
+def test_an_unknown_status_is_rejected_when_compiling():
+    with pytest.raises(ValueError, match="'start' references unknown status 'nowhere'"):
+        compile_workflow({'workflow': {'start': {'class': 'Start', 'outputs': ['nowhere']}, 'stop': {'class': 'Stop'}}})
+
+
+def test_a_workflow_needs_a_stop_node():
+    with pytest.raises(ValueError, match="no 'stop' node"):
+        compile_workflow({'workflow': {'start': {'class': 'Start', 'outputs': ['end']}, 'end': {'class': 'Stop'}}})
+    assert compile_workflow({}).nodes == ()
+
+
+def test_a_rest_call_with_a_url_needs_its_default_error_status():
+    call = {'class': 'RESTCall', 'require_user_action': False, 'url': 'http://127.0.0.1:9/', 'outputs': ['stop']}
+    with pytest.raises(ValueError, match="'call' references unknown status 'error'"):
+        compile_workflow(workflow(call=call))
+    compile_workflow(workflow(call=call, error={'class': 'Simple', 'outputs': ['stop']}))
+    compile_workflow(workflow(call={**call, 'on_error': 'stop'}))
+
+
+def test_a_simulated_rest_call_needs_no_error_status():
+    compile_workflow(workflow(call={'class': 'RESTCall', 'require_user_action': False, 'outputs': ['stop']}))
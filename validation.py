@@ -1,9 +1,4 @@
-import yaml
-import re
-
-# Load the YAML configuration file
-with open('type_validation.yaml', 'r') as config_file:
-    config = yaml.safe_load(config_file)
+from approv.Validation import RULES_PATH, RuleSet, validate_data
 
 data = {
     "required_field": "Sample Data",
@@ -34,25 +29,8 @@ data = {
     "date_time_format_validation": "09/14/2023 10:30 AM"
 }
 
-def validate_data(data, config):
-    errors = {}
-    for field, value in data.items():
-        if field not in config['validations']:
-            continue  # Skip fields without validation rules
-
-        validation_rule = config['validations'][field]
-        regex_pattern = validation_rule.get('regex')
-        description = validation_rule.get('description')
-
-        if regex_pattern:
-            # Validate the field using the regex pattern
-            if not re.match(regex_pattern, value):
-                errors[field] = f"Invalid {description}: {value}"
-
-    return errors
-
-# Validate the data
-validation_errors = validate_data(data, config)
+# Validate the data against the rules of type_validation.yaml (compiled once)
+validation_errors = validate_data(data, RuleSet.from_file(RULES_PATH))
 
 # Print validation results
 if validation_errors:
@@ -4,6 +4,7 @@ import duckdb
 import json
 import yaml
 from approv.Workflow import Workflow
+from approv.WorkflowGraph import compile_workflow
 
 with open('workflow.yaml', 'r') as f:
     workflow_config = yaml.safe_load(f.read())
@@ -11,6 +12,11 @@ with open('workflow.yaml', 'r') as f:
 with open('form.yaml', 'r') as f:
     form_config = yaml.safe_load(f.read())
 
+# Compiled once per server process and shared by every session's Workflow
+@st.cache_resource
+def get_workflow_graph():
+    return compile_workflow(workflow_config)
+
 #print(form_config)
 st.selectbox("User", ["GENERAL_USER","PRESIDENT_USER"], key="user")
 
@@ -19,7 +25,7 @@ if 'form_data' not in st.session_state:
         st.session_state.form_data = dict(json.loads(f.read()))
 
 if 'workflow' not in st.session_state:
-    st.session_state.workflow = Workflow(st, workflow_config, form_config, st.session_state.form_data)
+    st.session_state.workflow = Workflow(st, workflow_config, form_config, st.session_state.form_data, graph=get_workflow_graph())
 
 st.write(st.session_state.workflow.current_status)
 